@@ -0,0 +1,693 @@
+#!/usr/bin/env python
+"""
+采集链路吞吐量基准测试
+使用模拟采集卡后端驱动 USB5121Driver 的完整采集路径，统计实际接收点数与丢点情况
+
+用法:
+    python benchmark_acquisition.py --channels 16 --rate 200000 --seconds 5
+    python benchmark_acquisition.py --replay media/monitor_data/xxx.csv --speed 10
+    python benchmark_acquisition.py --channels 8 --rate 100000 --rate-groups "1000:4,5;100:6,7"
+    python benchmark_acquisition.py --loopback step --rate 50000 --seconds 10 --websocket
+    python benchmark_acquisition.py --frames --channels 16 --points 5000
+"""
+
+import os
+import sys
+import json
+import time
+import logging
+import asyncio
+import argparse
+import threading
+from collections import deque
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from polls.dap_driver import USB5121Driver
+from polls.dap_simulator import SimulatedUSB5000
+from polls.dap_process import ProcessUSB5121Driver
+from polls.dap_manager import DeviceManager, channel_name
+from polls.dap_layout import AiLayout
+from polls.dap_async import AsyncUSB5121Driver, AsyncStream
+from polls.dap_replay import ReplaySource, ReplayUSB5000
+from polls.dap_loopback import LoopbackProbe, PATTERNS
+from polls.dap_packet import AiPacket
+from polls.dap_frame import encode_frame, DTYPES
+
+
+def parse_rate_groups_arg(text: str) -> dict:
+    """解析 "1000:4,5;100:6" 形式的多速率通道组"""
+    groups = {}
+    for item in filter(None, (text or '').split(';')):
+        rate, channels = item.split(':')
+        groups[int(rate)] = [int(ch) for ch in channels.split(',')]
+    return groups
+
+
+def run_continuous(channels: int, rate: int, seconds: float, callback_delay: float = 0.0,
+                   queue_policy: str = None, isolated: bool = False, rate_groups: dict = None):
+    """运行连续采集基准测试"""
+    if isolated:
+        # 驱动运行在独立采集进程中，模拟采集卡位于子进程内
+        simulator = None
+        driver = ProcessUSB5121Driver(backend=USB5121Driver.BACKEND_SIMULATED)
+    else:
+        simulator = SimulatedUSB5000()
+        driver = USB5121Driver(backend=simulator)
+    if queue_policy and not isolated:
+        driver.ai_queue_policy = queue_policy
+
+    received = {'packets': 0, 'points': 0}
+    lock = threading.Lock()
+
+    def data_callback(packet):
+        points = packet.points_per_channel * packet.num_channels
+        with lock:
+            received['packets'] += 1
+            received['points'] += points
+        if callback_delay:
+            time.sleep(callback_delay)
+
+    if not driver.open_device():
+        print("❌ 打开模拟设备失败")
+        return None
+    for ch in range(channels):
+        driver.configure_ai_channel(ch, True, 10.0)
+    driver.set_ai_sample_rate(rate)
+    driver.set_ai_sample_mode(USB5121Driver.MODE_CONTINUOUS)
+    if rate_groups and not driver.set_ai_rate_groups(rate_groups):
+        print("❌ 多速率通道组配置无效")
+        return None
+
+    start = time.perf_counter()
+    driver.start_continuous_acquisition(data_callback)
+    time.sleep(seconds)
+    elapsed = time.perf_counter() - start
+    driver.stop_continuous_acquisition()
+    rate_group_status = driver.get_ai_rate_groups()
+
+    stats = simulator.get_sim_stats(0) if simulator else {}
+    scheduler = driver.get_acquisition_metrics()
+    queue = driver.get_queue_metrics()
+    integrity = driver.get_integrity_metrics()
+    instrumentation = driver.get_instrumentation(histogram=False)
+    driver.close_device()
+
+    channel_rates = {ch: rate for ch in range(channels)}
+    for group_rate, group_channels in (rate_groups or {}).items():
+        channel_rates.update({ch: group_rate for ch in group_channels if ch in channel_rates})
+    expected = sum(int(ch_rate * elapsed) for ch_rate in channel_rates.values())
+    return {
+        'elapsed_s': elapsed,
+        'expected_points': expected,
+        'received_points': received['points'],
+        'received_packets': received['packets'],
+        'fifo_lost_points': stats.get('lost_points', 0),
+        'fifo_overruns': stats.get('overrun_count', 0),
+        'throughput_msps': received['points'] / elapsed / 1e6,
+        'scheduler': scheduler,
+        'queue': queue,
+        'integrity': integrity,
+        'instrumentation': instrumentation,
+        'rate_groups': rate_group_status if rate_groups else None,
+    }
+
+
+def run_replay(source_spec: str, speed: float, loop: bool, seconds: float, callback_delay: float = 0.0,
+               isolated: bool = False):
+    """回放已保存的监控数据，统计实际达到的采样率与各环节耗时"""
+    source = ReplaySource.open(source_spec)
+    if isolated:
+        # 采集进程按环境变量加载同一数据源
+        os.environ.update({'USB5121_REPLAY': source_spec, 'USB5121_REPLAY_SPEED': str(speed),
+                           'USB5121_REPLAY_LOOP': '1' if loop else '0'})
+        driver = ProcessUSB5121Driver(backend=USB5121Driver.BACKEND_REPLAY)
+    else:
+        driver = USB5121Driver(backend=ReplayUSB5000(source, speed=speed, loop=loop))
+
+    received = {'packets': 0, 'points': 0}
+
+    def data_callback(packet):
+        received['packets'] += 1
+        received['points'] += packet.points_per_channel * packet.num_channels
+        if callback_delay:
+            time.sleep(callback_delay)
+
+    if not driver.open_device():
+        print("❌ 打开回放设备失败")
+        return None
+    for ch in source.channels:
+        driver.configure_ai_channel(ch, True, 10.0)
+    driver.set_ai_sample_rate(int(round(source.sample_rate)))
+    driver.set_ai_sample_mode(USB5121Driver.MODE_CONTINUOUS)
+
+    start = time.perf_counter()
+    driver.start_continuous_acquisition(data_callback)
+    # 不循环时回放到数据源末尾为止，seconds 为上限
+    while time.perf_counter() - start < seconds and not driver.get_replay_status().get('finished'):
+        time.sleep(0.05)
+    replay = driver.get_replay_status()
+    driver.stop_continuous_acquisition()
+    elapsed = time.perf_counter() - start
+
+    result = {
+        'source': source,
+        'elapsed_s': elapsed,
+        'received_points': received['points'],
+        'received_packets': received['packets'],
+        'replay': replay,
+        'stage_latency': driver.get_stage_latency(),
+        'integrity': driver.get_integrity_metrics(),
+    }
+    driver.close_device()
+    return result
+
+
+def run_loopback(pattern: str, rate: int, seconds: float, interval: float, ai_channel: int = 0,
+                 ao_channel: int = 0, callback_delay: float = 0.0, isolated: bool = False):
+    """AI→AO回环延迟：驱动直接回调（不经过消费者与WebSocket）"""
+    if isolated:
+        os.environ['USB5121_SIM_LOOPBACK'] = f"{ai_channel}:{ao_channel}"
+        driver = ProcessUSB5121Driver(backend=USB5121Driver.BACKEND_SIMULATED)
+    else:
+        driver = USB5121Driver(backend=SimulatedUSB5000(loopback={ai_channel: ao_channel}))
+    probe = LoopbackProbe(ai_channel, ao_channel, pattern)
+
+    def data_callback(packet):
+        probe.observe(packet, 'callback')
+        if callback_delay:
+            time.sleep(callback_delay)
+
+    if not driver.open_device():
+        print("❌ 打开模拟设备失败")
+        return None
+    driver.configure_ai_channel(ai_channel, True, 10.0)
+    driver.set_ai_sample_rate(rate)
+    driver.set_ai_sample_mode(USB5121Driver.MODE_CONTINUOUS)
+    driver.set_ao_dc_voltage(ao_channel, 0.0)
+    driver.start_continuous_acquisition(data_callback)
+    time.sleep(0.2)
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        probe.emit(driver)
+        time.sleep(interval)
+    deadline = time.perf_counter() + 1.0
+    while probe.pending and time.perf_counter() < deadline:
+        time.sleep(0.02)
+    driver.stop_continuous_acquisition()
+    driver.close_device()
+    return probe.metrics()
+
+
+def run_loopback_websocket(pattern: str, rate: int, seconds: float, interval: float, ai_channel: int = 0,
+                           ao_channel: int = 0, isolated: bool = False):
+    """AI→AO回环延迟：经 SignalAcquisitionConsumer 与 WebSocket 发送（内存通道层，客户端同时接收全部数据）"""
+    os.environ.update({'USB5121_BACKEND': USB5121Driver.BACKEND_SIMULATED,
+                       'USB5121_SIM_LOOPBACK': f"{ai_channel}:{ao_channel}"})
+    if isolated:
+        os.environ['USB5121_ISOLATED'] = '1'
+    import django
+    from django.conf import settings
+    if not settings.configured:
+        settings.configure(INSTALLED_APPS=['channels'],
+                           CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}})
+        django.setup()
+    from channels.testing import WebsocketCommunicator
+    from polls.consumers import SignalAcquisitionConsumer
+
+    async def session():
+        client = WebsocketCommunicator(SignalAcquisitionConsumer.as_asgi(), '/ws/signal-acquisition/')
+        connected, _ = await client.connect()
+        if not connected:
+            return None
+        for message in (
+                {'type': 'open_device'},
+                {'type': 'configure_channels', 'channels': [{'channel': ai_channel, 'enabled': True}]},
+                {'type': 'configure_acquisition', 'config': {'mode': 0, 'sample_rate': rate}},
+                {'type': 'start_acquisition'},
+                {'type': 'start_loopback_test', 'config': {'ai_channel': ai_channel, 'ao_channel': ao_channel,
+                                                           'pattern': pattern, 'interval_s': interval}}):
+            await client.send_json_to(message)
+
+        result, frames = None, 0
+        loop = asyncio.get_running_loop()
+        end = loop.time() + seconds
+        stopping = False
+        while result is None:
+            if not stopping and loop.time() >= end:
+                await client.send_json_to({'type': 'stop_loopback_test'})
+                stopping = True
+            try:
+                message = await client.receive_json_from(timeout=5.0)
+            except asyncio.TimeoutError:
+                break
+            if message['type'] == 'acquisition_data':
+                frames += 1
+            elif message['type'] == 'loopback_result':
+                result = message['data']
+            elif message['type'] == 'error':
+                print(f"❌ {message['message']}")
+        await client.send_json_to({'type': 'stop_acquisition'})
+        await client.disconnect()
+        if result is not None:
+            result['frames'] = frames
+        return result
+
+    return asyncio.run(session())
+
+
+def run_fanout(viewers: int, channels: int, rate: int, seconds: float, data_format: str = 'json', width: int = 0):
+    """
+    多个WebSocket客户端观看同一采集：统计共享采集中心的编码次数与各客户端收到的数据块与字节数（内存通道层）；
+    width>0 时各客户端订阅 width 像素显示1秒的包络视图
+    """
+    os.environ['USB5121_BACKEND'] = USB5121Driver.BACKEND_SIMULATED
+    import django
+    from django.conf import settings
+    if not settings.configured:
+        settings.configure(INSTALLED_APPS=['channels'],
+                           CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}})
+        django.setup()
+    from channels.testing import WebsocketCommunicator
+    from polls.consumers import SignalAcquisitionConsumer
+
+    async def receive_blocks(client, counts, index, end):
+        loop = asyncio.get_running_loop()
+        while loop.time() < end:
+            try:
+                # 直接读取输出队列：receive_output 超时会取消消费者
+                message = await asyncio.wait_for(client.output_queue.get(), max(0.01, end - loop.time()))
+            except asyncio.TimeoutError:
+                break
+            if message.get('bytes') or '"acquisition_data"' in (message.get('text') or ''):
+                if index is not None:
+                    counts[index] += 1
+                    counts['bytes'][index] += len(message.get('bytes') or message.get('text'))
+            elif '"device_status"' in (message.get('text') or ''):
+                counts['status'] = json.loads(message['text'])['data']
+
+    async def session():
+        clients = [WebsocketCommunicator(SignalAcquisitionConsumer.as_asgi(), '/ws/signal-acquisition/')
+                   for _ in range(viewers)]
+        for client in clients:
+            await client.connect()
+            if data_format != 'json':
+                await client.send_json_to({'type': 'set_data_format', 'format': 'binary', 'dtype': data_format})
+            if width > 0:
+                await client.send_json_to({'type': 'subscribe', 'window_s': 1.0, 'width': width})
+        for message in (
+                {'type': 'open_device'},
+                {'type': 'configure_channels',
+                 'channels': [{'channel': ch, 'enabled': True} for ch in range(channels)]},
+                {'type': 'configure_acquisition', 'config': {'mode': 0, 'sample_rate': rate}},
+                {'type': 'start_acquisition'}):
+            await clients[0].send_json_to(message)
+        counts = {index: 0 for index in range(viewers)}
+        counts['bytes'] = [0] * viewers
+        end = asyncio.get_running_loop().time() + seconds
+        await asyncio.gather(*(receive_blocks(client, counts, index, end) for index, client in enumerate(clients)))
+        await clients[0].send_json_to({'type': 'get_status', 'histogram': False})
+        await receive_blocks(clients[0], counts, None, asyncio.get_running_loop().time() + 1.0)
+        await clients[0].send_json_to({'type': 'stop_acquisition'})
+        for client in clients:
+            await client.disconnect()
+        status = counts.pop('status', {})
+        return {
+            'viewers': viewers,
+            'received_blocks': [counts[index] for index in range(viewers)],
+            'received_bytes': counts['bytes'],
+            'hub': status.get('hub', {}),
+            'encode': status.get('instrumentation', {}).get('broadcast_encode', {}),
+        }
+
+    return asyncio.run(session())
+
+
+def print_loopback(result: dict):
+    print(f"  图样: 发出{result['emitted']}次, 检出{result['detected']}次, 漏检{result['missed']}次, "
+          f"未匹配{result['unmatched']}次, 最低相关系数{result['min_score']}")
+    labels = {'sample': 'AO命令→AI采样', 'read': '→读取线程', 'callback': '→驱动回调',
+              'consumer': '→消费者回调', 'websocket': '→WebSocket发送'}
+    for stage, m in result['latency'].items():
+        if not m['count']:
+            continue
+        print(f"  {labels.get(stage, stage)}: 平均{m['mean_ms']:.3f}ms, 抖动(std) {m['std_ms']:.3f}ms, "
+              f"p50 {m['p50_ms']:.3f}ms, p99 {m['p99_ms']:.3f}ms, 最大{m['max_ms']:.3f}ms")
+        peak = max(bucket['count'] for bucket in m['histogram'])
+        for bucket in m['histogram']:
+            print(f"      ≤{bucket['le_ms']:9.3f}ms {bucket['count']:5d} {'█' * max(1, bucket['count'] * 40 // peak)}")
+
+
+def run_multi_card(cards: int, channels: int, rate: int, seconds: float):
+    """多卡同时连续采集，统计对齐合并后的吞吐量"""
+    simulator = SimulatedUSB5000(num_devices=cards)
+    manager = DeviceManager(device_indices=list(range(cards)), backend=simulator)
+
+    received = {'packets': 0, 'points': 0}
+
+    def data_callback(packet):
+        received['packets'] += 1
+        received['points'] += packet.points_per_channel * packet.num_channels
+
+    if not manager.open():
+        print("❌ 打开模拟设备失败")
+        return None
+    for card in range(cards):
+        for ch in range(channels):
+            manager.configure_channel(channel_name(card, ch), True, 10.0)
+    manager.set_sample_rate(rate)
+
+    start = time.perf_counter()
+    manager.start(data_callback)
+    time.sleep(seconds)
+    elapsed = time.perf_counter() - start
+    manager.stop()
+
+    status = manager.get_status()
+    lost = sum(simulator.get_sim_stats(card).get('lost_points', 0) for card in range(cards))
+    manager.close()
+
+    expected = int(rate * elapsed) * channels * cards
+    return {
+        'elapsed_s': elapsed,
+        'expected_points': expected,
+        'received_points': received['points'],
+        'received_packets': received['packets'],
+        'fifo_lost_points': lost,
+        'fifo_overruns': 0,
+        'throughput_msps': received['points'] / elapsed / 1e6,
+        'scheduler': {},
+        'queue': {},
+        'alignment': status['alignment'],
+    }
+
+
+def run_burst(channels: int, rate: int, points: int, shots: int):
+    """连发单次采集：统计每次采集的耗时（从触发请求到最后一个数据包回调完成）"""
+    simulator = SimulatedUSB5000()
+    driver = USB5121Driver(backend=simulator)
+
+    received = {'packets': 0, 'points': 0}
+
+    def data_callback(packet):
+        received['packets'] += 1
+        received['points'] += packet.points_per_channel * packet.num_channels
+
+    if not driver.open_device():
+        print("❌ 打开模拟设备失败")
+        return None
+    for ch in range(channels):
+        driver.configure_ai_channel(ch, True, 10.0)
+
+    start = time.perf_counter()
+    driver.start_burst_mode(data_callback, rate, points)
+    setup_s = time.perf_counter() - start
+    durations = []
+    for _ in range(shots):
+        shot_start = time.perf_counter()
+        driver.acquire_burst().result(timeout=points / rate + 5)
+        durations.append(time.perf_counter() - shot_start)
+    driver.stop_burst_mode()
+    driver.close_device()
+
+    return {
+        'setup_ms': setup_s * 1000,
+        'theoretical_ms': points / rate * 1000,
+        'avg_ms': sum(durations) / len(durations) * 1000,
+        'max_ms': max(durations) * 1000,
+        'received_points': received['points'],
+        'expected_points': points * channels * shots,
+    }
+
+
+def run_frame_encoding(channels: int, points: int, rate: int, repeats: int = 20):
+    """数据消息编码微基准：JSON与二进制帧 float32/int16 的字节数与编码耗时（每百万样本）"""
+    data = np.random.default_rng(0).standard_normal((channels, points)).astype(np.float32)
+    packet = AiPacket(data, tuple(range(channels)), 0, rate, time.time(), 0)
+    msamples = channels * points / 1e6
+
+    def encode_json():
+        payload = packet.to_dict()
+        payload.update({'packet_id': 1, 'time_start_index': 0, 'dt': 1.0 / rate})
+        return json.dumps({'type': 'acquisition_data', 'data': payload})
+
+    encoders = {'json': encode_json}
+    for dtype in DTYPES:
+        encoders[dtype] = lambda dtype=dtype: encode_frame(packet, 'acquisition_data', dtype, {'packet_id': 1})
+    results = {}
+    for name, encode in encoders.items():
+        count = max(1, repeats // 10) if name == 'json' else repeats
+        start = time.perf_counter()
+        for _ in range(count):
+            size = len(encode())
+        results[name] = {
+            'bytes_per_sample': size / (channels * points),
+            'encode_us': (time.perf_counter() - start) / count / msamples * 1e6,  # 微秒/百万样本
+        }
+    return results
+
+
+def run_deinterleave(channels: int, points: int, repeats: int = 200):
+    """解交织微基准：比较 AiLayout 视图、视图+拷贝与逐通道切片转列表的耗时（每百万样本）"""
+    flat = np.random.default_rng(0).standard_normal(channels * points).astype(np.float32)
+    msamples = channels * points / 1e6
+    results = {}
+    for order in AiLayout.ORDERS:
+        layout = AiLayout(range(channels), order)
+
+        def timed(func, count):
+            start = time.perf_counter()
+            for _ in range(count):
+                func()
+            return (time.perf_counter() - start) / count / msamples * 1e6  # 微秒/百万样本
+
+        results[order] = {
+            'view_us': timed(lambda: layout.view(flat, points), repeats),
+            'contiguous_us': timed(lambda: np.ascontiguousarray(layout.view(flat, points)), repeats),
+        }
+    layout = AiLayout(range(channels))
+
+    def legacy():
+        # 原有实现：逐通道切片并转换为列表
+        return {str(ch): flat[ch * points:(ch + 1) * points].tolist() for ch in layout.channels}
+
+    results['legacy_tolist_us'] = timed(legacy, max(1, repeats // 20))
+    return results
+
+
+def run_async_control(calls: int, idle_seconds: float):
+    """
+    事件循环侧的控制命令延迟与空闲CPU，对比消费者的原有方式与 AsyncUSB5121Driver：
+    原有: 默认线程池 run_in_executor(None, lambda)，同时数据发送任务以1ms间隔轮询deque
+    现在: 专用I/O线程执行驱动调用，数据发送任务等待 AsyncStream
+    """
+    async def measure():
+        driver = USB5121Driver(backend=SimulatedUSB5000())
+        driver.open_device()
+        facade = AsyncUSB5121Driver(driver)
+        loop = asyncio.get_running_loop()
+
+        async def timed(func):
+            samples = []
+            for _ in range(calls):
+                start = time.perf_counter()
+                await func()
+                samples.append(time.perf_counter() - start)
+            samples.sort()
+            return {'avg_us': sum(samples) / len(samples) * 1e6, 'p99_us': samples[int(len(samples) * 0.99)] * 1e6}
+
+        async def polling():
+            queue = deque()
+            while True:
+                if queue:
+                    queue.popleft()
+                else:
+                    await asyncio.sleep(0.001)
+
+        async def waiting():
+            async for _ in AsyncStream():
+                pass
+
+        results = {}
+        for name, consumer, call in (
+                ('legacy', polling, lambda: loop.run_in_executor(None, lambda: driver.get_buffer_remaining())),
+                ('async', waiting, facade.get_buffer_remaining)):
+            task = asyncio.create_task(consumer())
+            start = time.process_time()
+            await asyncio.sleep(idle_seconds)
+            results[name] = {'cpu_percent': (time.process_time() - start) / idle_seconds * 100}
+            results[name].update(await timed(call))
+            task.cancel()
+        await facade.shutdown()
+        return results
+
+    return asyncio.run(measure())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="采集链路吞吐量基准测试（模拟采集卡）")
+    parser.add_argument('--channels', type=int, default=4, help="启用通道数(1-16)")
+    parser.add_argument('--rate', type=int, default=10000, help="每通道采样率(Hz)")
+    parser.add_argument('--seconds', type=float, default=3.0, help="采集时长(秒)")
+    parser.add_argument('--callback-delay', type=float, default=0.0, help="模拟下游处理耗时(秒/包)")
+    parser.add_argument('--burst', type=int, default=0, help="连发单次采集次数（>0时测试单次采集开销）")
+    parser.add_argument('--points', type=int, default=1000, help="连发单次采集每次的每通道点数")
+    parser.add_argument('--cards', type=int, default=1, help="采集卡数量（>1时经DeviceManager对齐合并）")
+    parser.add_argument('--frames', action='store_true', help="数据消息编码微基准（JSON与二进制帧，每通道点数由--points指定）")
+    parser.add_argument('--deinterleave', action='store_true', help="解交织微基准（每通道点数由--points指定）")
+    parser.add_argument('--async-control', action='store_true',
+                        help="控制命令延迟与空闲CPU：默认线程池/轮询 与 AsyncUSB5121Driver/AsyncStream 对比")
+    parser.add_argument('--isolated', action='store_true', help="在独立采集进程中运行驱动（共享内存传输）")
+    parser.add_argument('--replay', default=None,
+                        help="回放数据源：监控数据CSV、落盘记录路径或监控任务ID（通道与采样率取自数据源）")
+    parser.add_argument('--speed', type=float, default=1.0, help="回放倍速，0为尽可能快")
+    parser.add_argument('--loop', action='store_true', help="循环回放（时长由--seconds限制）")
+    parser.add_argument('--queue-policy', choices=['block', 'drop_oldest', 'coalesce'], default=None,
+                        help="读取线程与处理线程之间队列的溢出策略")
+    parser.add_argument('--rate-groups', default=None,
+                        help='多速率通道组，如 "1000:4,5;100:6,7"（输出采样率:通道号），降速组在读取线程中抽取')
+    parser.add_argument('--loopback', choices=PATTERNS, default=None,
+                        help="AI→AO回环延迟与抖动测量（模拟采集卡AO0回环到AI0）")
+    parser.add_argument('--interval', type=float, default=0.1, help="回环测量的图样间隔(秒)")
+    parser.add_argument('--websocket', action='store_true', help="回环测量经消费者与WebSocket发送")
+    parser.add_argument('--viewers', type=int, default=0,
+                        help="多个WebSocket客户端观看同一采集（共享采集中心广播），数据格式由--format指定")
+    parser.add_argument('--format', choices=('json',) + DTYPES, default='json', help="--viewers 的数据格式")
+    parser.add_argument('--width', type=int, default=0, help="--viewers 的客户端订阅包络视图的像素宽度（显示1秒）")
+    args = parser.parse_args()
+
+    logging.getLogger('polls.dap_driver').setLevel(logging.WARNING)
+
+    if args.async_control:
+        calls = 2000
+        print(f"📊 事件循环控制命令延迟({calls}次)与空闲CPU({args.seconds}秒)")
+        result = run_async_control(calls, args.seconds)
+        for name, label in (('legacy', '默认线程池+1ms轮询'), ('async', '专用I/O线程+AsyncStream')):
+            print(f"  {label}: 控制命令平均{result[name]['avg_us']:.0f}us, p99 {result[name]['p99_us']:.0f}us, "
+                  f"空闲CPU {result[name]['cpu_percent']:.2f}%")
+        return
+    if args.loopback:
+        path = '消费者+WebSocket' if args.websocket else '驱动回调'
+        print(f"📊 回环延迟({args.loopback}, {path}): {args.rate}Hz, 每{args.interval}秒一次, {args.seconds}秒")
+        if args.websocket:
+            result = run_loopback_websocket(args.loopback, args.rate, args.seconds, args.interval,
+                                            isolated=args.isolated)
+        else:
+            result = run_loopback(args.loopback, args.rate, args.seconds, args.interval,
+                                  callback_delay=args.callback_delay, isolated=args.isolated)
+        if result:
+            print_loopback(result)
+        return
+    if args.viewers > 0:
+        print(f"📊 多客户端广播: {args.viewers}个客户端, {args.channels}通道 × {args.rate}Hz, "
+              f"{args.format}, {args.seconds}秒")
+        result = run_fanout(args.viewers, args.channels, args.rate, args.seconds, args.format, args.width)
+        hub, encode = result['hub'], result['encode']
+        print(f"  采集数据块: {hub.get('packets')}, 各客户端收到: {result['received_blocks']}")
+        print(f"  每个客户端收到字节: {result['received_bytes'][0] / 1e6:.2f}MB ({args.width or '全速率'}像素宽)")
+        if encode.get('count'):
+            print(f"  中心编码: {encode['count']}次（与客户端数无关）, 平均{encode['mean_ms']:.3f}ms/块")
+        return
+    if args.replay:
+        speed = f"{args.speed:g}×" if args.speed > 0 else "尽可能快"
+        print(f"📊 回放基准: {args.replay}, {speed}, 最长{args.seconds}秒")
+        result = run_replay(args.replay, args.speed, args.loop, args.seconds, args.callback_delay, args.isolated)
+        if result:
+            source, replay = result['source'], result['replay']
+            print(f"  数据源: {source.channels}通道 × {source.sample_rate:g}Hz, {source.total_points}点/通道")
+            print(f"  回放: {replay['replayed_points']}点/通道, 进度{replay['progress'] * 100:.1f}%, "
+                  f"{'已结束' if replay['finished'] else '未结束'}")
+            print(f"  实际采样率: {replay['achieved_samples_per_s']:.0f}点/秒/通道 "
+                  f"({replay['achieved_total_samples_per_s'] / 1e6:.3f} MS/s, {replay['achieved_speed']:.2f}×)")
+            print(f"  接收: {result['received_packets']}包, {result['received_points']}点")
+            for stage, m in result['stage_latency'].items():
+                if m['count']:
+                    print(f"  {stage}耗时: 平均{m['mean_ms']:.3f}ms, p50 {m['p50_ms']:.3f}ms, "
+                          f"p99 {m['p99_ms']:.3f}ms, 最大{m['max_ms']:.3f}ms")
+            print(f"  数据完整性: {'无损' if result['integrity']['lossless'] else '有缺失'}")
+        return
+    if args.frames:
+        print(f"📊 数据消息编码微基准: {args.channels}通道 × {args.points}点 @ {args.rate}Hz")
+        result = run_frame_encoding(args.channels, args.points, args.rate)
+        for name, m in result.items():
+            print(f"  {name}: {m['bytes_per_sample']:.2f}字节/样本, 编码{m['encode_us']:.0f}us/MSample")
+        return
+    if args.deinterleave:
+        print(f"📊 解交织微基准: {args.channels}通道 × {args.points}点")
+        result = run_deinterleave(args.channels, args.points)
+        for order in AiLayout.ORDERS:
+            print(f"  {order}: 视图 {result[order]['view_us']:.2f}us/MSample, "
+                  f"连续化 {result[order]['contiguous_us']:.1f}us/MSample")
+        print(f"  原逐通道切片+tolist: {result['legacy_tolist_us']:.0f}us/MSample")
+        return
+    if args.burst > 0:
+        print(f"📊 连发单次采集基准: {args.channels}通道 × {args.rate}Hz × {args.points}点, {args.burst}次")
+        result = run_burst(args.channels, args.rate, args.points, args.burst)
+        if result:
+            print(f"  进入连发模式: {result['setup_ms']:.1f}ms")
+            print(f"  理论采集时间: {result['theoretical_ms']:.1f}ms/次")
+            print(f"  实际耗时: 平均{result['avg_ms']:.1f}ms/次, 最大{result['max_ms']:.1f}ms")
+            print(f"  接收点数: {result['received_points']}/{result['expected_points']}")
+        return
+    if args.cards > 1:
+        print(f"📊 多卡连续采集基准: {args.cards}卡 × {args.channels}通道 × {args.rate}Hz, 时长{args.seconds}秒")
+        result = run_multi_card(args.cards, args.channels, args.rate, args.seconds)
+    else:
+        print(f"📊 连续采集基准: {args.channels}通道 × {args.rate}Hz, 时长{args.seconds}秒")
+        result = run_continuous(args.channels, args.rate, args.seconds, args.callback_delay, args.queue_policy,
+                                args.isolated, parse_rate_groups_arg(args.rate_groups))
+    if result is None:
+        return
+
+    received_ratio = result['received_points'] / result['expected_points'] if result['expected_points'] else 0
+    print(f"  实际时长: {result['elapsed_s']:.3f}秒")
+    print(f"  期望点数: {result['expected_points']}")
+    print(f"  接收点数: {result['received_points']} ({received_ratio * 100:.1f}%)")
+    print(f"  数据包数: {result['received_packets']}")
+    print(f"  FIFO溢出丢点: {result['fifo_lost_points']} (溢出{result['fifo_overruns']}次)")
+    print(f"  吞吐量: {result['throughput_msps']:.3f} MS/s")
+    scheduler = result['scheduler']
+    if scheduler:
+        print(f"  读取调度: 每次{scheduler['base_points']}~{scheduler['max_points']}点/通道, "
+              f"平均{scheduler['avg_points_per_read']:.0f}点, 追赶读取{scheduler['catchup_reads']}次, "
+              f"最大积压{scheduler['max_backlog_points']}点/通道, 超时{scheduler['timeouts']}次")
+    integrity = result.get('integrity')
+    if integrity:
+        print(f"  数据完整性: {'无损' if integrity['lossless'] else '有缺失'}, "
+              + ", ".join(f"{stage}缺口{m['gap_count']}处/{m['gap_points']}点, 丢弃{m['dropped_packets']}包"
+                          for stage, m in integrity.items() if isinstance(m, dict)))
+        if scheduler:
+            print(f"  FIFO溢出: {scheduler['overruns']}次, 积压增长告警{scheduler['overrun_warnings']}次")
+    rate_groups = result.get('rate_groups')
+    if rate_groups:
+        runtime = rate_groups['runtime']
+        if runtime:
+            print("  多速率输出: " + ", ".join(f"{g['sample_rate']}Hz×{g['channels']}(抽取{g['factor']}倍, 级{g['stages']})"
+                                          for g in runtime['groups']))
+        else:
+            print(f"  多速率输出: 未拆分 (配置{rate_groups['groups']}, 未启用通道{rate_groups['disabled_channels']})")
+    alignment = result.get('alignment')
+    if alignment:
+        print(f"  多卡对齐: 偏移{alignment['offsets']}点, 缺口{alignment['gaps']}次, "
+              f"丢弃{alignment['dropped_points']}点/通道, 槽位失效{alignment['stale_points']}点")
+    queue = result['queue']
+    if queue:
+        print(f"  处理队列({queue['policy']}): 容量{queue['capacity']}, 最高{queue['high_watermark']}, "
+              f"丢弃{queue['dropped_count']}, 合并{queue['coalesced_count']}, 阻塞{queue['blocked_count']}次")
+    instrumentation = result.get('instrumentation')
+    if instrumentation:
+        print("  各环节计量:")
+        for name, m in instrumentation.items():
+            if not m['count']:
+                continue
+            if 'mean_ms' in m:
+                print(f"    {name}: 平均{m['mean_ms']:.3f}ms, p50 {m['p50_ms']:.3f}ms, "
+                      f"p99 {m['p99_ms']:.3f}ms, 最大{m['max_ms']:.3f}ms")
+            else:
+                print(f"    {name}: 平均{m['mean']}, p50≤{m['p50']}, p99≤{m['p99']}, 最大{m['max']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,77 +5,97 @@ import json
 import asyncio
 import logging
 from channels.generic.websocket import AsyncWebsocketConsumer
-from .dap_driver import USB5121Driver
-import threading
-from typing import Dict, Any, List
-import numpy as np
-from collections import deque
+from .dap_packet import AiPacket
+from .dap_frame import DTYPES
+from .dap_hub import (KIND_ACQUISITION, acquire_hub, release_hub, data_format_key, device_index_from_scope,
+                      StreamView)
+from .dap_integrity import StreamIntegrity
+from .dap_metrics import LatencyStats
+from .dap_loopback import LoopbackProbe
+from typing import Dict, Any
 import time
 
 logger = logging.getLogger(__name__)
 
 
 class SignalAcquisitionConsumer(AsyncWebsocketConsumer):
-    """信号采集WebSocket消费者"""
+    """
+    信号采集WebSocket消费者
+
+    设备由采集卡的共享采集中心（dap_hub.AcquisitionHub）持有，连接只是订阅者：多个页面可同时观看同一采集，
+    数据块由中心编码一次后经 channel layer 组广播，断开连接不关闭设备
+    """
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.driver = None
+        self.hub = None  # 共享采集中心
+        self.driver = None  # 中心持有的异步驱动（self.hub.driver）
         self.group_name = "signal_acquisition"
-        self.data_packet_count = 0
-        self.data_queue = deque(maxlen=100)  # 限制队列大小，避免内存溢出
-        self.processing_task = None
-        self.global_time_offset = 0  # 全局时间偏移量
-        self.last_data_packet = None  # 用于存储最后一个有效数据包
+        self.integrity = StreamIntegrity('WebSocket发送')  # 本连接收到的数据流缺口（channel layer 丢弃等）
+        self.send_latency = LatencyStats('send')  # 读取完成到WebSocket发送完成的耗时
+        self.send_duration = LatencyStats('websocket_send')  # 单个数据块写入套接字的耗时
+        self.data_format = 'json'  # 数据消息格式：json / binary（二进制帧，见 dap_frame）
+        self.frame_dtype = 'float32'  # 二进制帧的样本编码：float32 / int16
+        self.view = None  # 显示视图（StreamView：通道、时间窗口与像素宽度），None为全部通道的全速率数据
+        self.loopback_probe = None  # AI→AO回环延迟测量（LoopbackProbe）
+        self.loopback_task = None
         self.enabled_channels = []  # 存储启用的通道列表
-        self.global_point_index = 0  # 新增：全局采集点计数器
 
     async def connect(self):
-        """WebSocket连接"""
+        """WebSocket连接：订阅采集卡的共享采集中心"""
         try:
             await self.channel_layer.group_add(self.group_name, self.channel_name)
             await self.accept()
             await self.initialize_driver()
-            # 启动数据处理任务
-            self.processing_task = asyncio.create_task(self.process_data_queue())
+            if self.hub:
+                await self.hub.subscribe(self.channel_layer, self.channel_name, KIND_ACQUISITION,
+                                         data_format_key(self.data_format, self.frame_dtype))
             logger.info(f"WebSocket连接已建立: {self.channel_name}")
         except Exception as e:
             logger.error(f"WebSocket连接失败: {e}")
             await self.close()
 
     async def disconnect(self, close_code):
-        """WebSocket断开连接"""
+        """WebSocket断开连接：只退订，设备与采集由共享采集中心继续持有"""
         try:
-            if self.processing_task:
-                self.processing_task.cancel()
+            if self.loopback_task:
+                self.loopback_task.cancel()
                 try:
-                    await self.processing_task
+                    await self.loopback_task
                 except asyncio.CancelledError:
                     pass
-            if self.driver:
-                await asyncio.get_event_loop().run_in_executor(None, self.driver.close_device)
+            if self.hub:
+                self.set_loopback_probe(None)
+                await self.hub.unsubscribe(self.channel_layer, self.channel_name)
+                await release_hub(self.hub)
             await self.channel_layer.group_discard(self.group_name, self.channel_name)
             logger.info(f"WebSocket连接已断开: {self.channel_name}")
         except Exception as e:
             logger.error(f"WebSocket断开异常: {e}")
 
-    async def process_data_queue(self):
-        """处理数据队列的任务"""
+    async def daq_block(self, event: Dict[str, Any]):
+        """共享采集中心广播的数据块（已按本连接的数据格式编码）"""
         try:
-            while True:
-                if self.data_queue:
-                    data_packet = self.data_queue.popleft()
-                    try:
-                        await self.send_acquisition_data(data_packet)
-                        logger.info(f"发送数据包 #{data_packet.get('packet_id', 0)}")
-                    except Exception as e:
-                        logger.error(f"发送数据包异常: {e}")
-                else:
-                    await asyncio.sleep(0.001)  # 避免CPU空转
-        except asyncio.CancelledError:
-            logger.info("数据处理任务已取消")
+            self.integrity.observe(event['seq'], event['start_index'], event['points'], event['timestamp'],
+                                   tuple(event['channels']))
+            if 'bytes' not in event and 'text' not in event:
+                return  # 本视图本次没有完整的像素
+            started = time.perf_counter()
+            if 'bytes' in event:
+                await self.send(bytes_data=event['bytes'])
+            else:
+                await self.send(text_data=event['text'])
+            self.send_duration.record(time.perf_counter() - started)
+            self.send_latency.record(time.time() - event['timestamp'])
+            probe = self.loopback_probe
+            if probe is not None:
+                probe.observe_delivery(event['seq'], 'websocket')
         except Exception as e:
-            logger.error(f"数据处理任务异常: {e}")
+            logger.error(f"发送采集数据异常: {e}")
+
+    async def daq_event(self, event: Dict[str, Any]):
+        """共享采集中心广播的JSON消息（触发事件等）"""
+        await self.send(text_data=event['text'])
 
     async def receive(self, text_data):
         """接收WebSocket消息"""
@@ -91,7 +111,13 @@ class SignalAcquisitionConsumer(AsyncWebsocketConsumer):
                 'configure_acquisition': self.handle_configure_acquisition,
                 'start_acquisition': self.handle_start_acquisition,
                 'stop_acquisition': self.handle_stop_acquisition,
-                'get_status': self.handle_get_status
+                'get_status': self.handle_get_status,
+                'start_event_capture': self.handle_start_event_capture,
+                'stop_event_capture': self.handle_stop_event_capture,
+                'start_loopback_test': self.handle_start_loopback_test,
+                'stop_loopback_test': self.handle_stop_loopback_test,
+                'set_data_format': self.handle_set_data_format,
+                'subscribe': self.handle_subscribe
             }
 
             handler = handlers.get(message_type)
@@ -107,9 +133,10 @@ class SignalAcquisitionConsumer(AsyncWebsocketConsumer):
             await self.send_error(f"处理消息异常: {str(e)}")
 
     async def initialize_driver(self):
-        """初始化驱动"""
+        """取得采集卡的共享采集中心（首个连接时创建驱动）"""
         try:
-            self.driver = await asyncio.get_event_loop().run_in_executor(None, USB5121Driver)
+            self.hub = await acquire_hub(device_index_from_scope(self.scope))
+            self.driver = self.hub.driver
             logger.info("驱动初始化成功")
         except Exception as e:
             logger.error(f"驱动初始化失败: {str(e)}")
@@ -122,7 +149,7 @@ class SignalAcquisitionConsumer(AsyncWebsocketConsumer):
                 return
 
             logger.info("正在打开设备...")
-            success = await asyncio.get_event_loop().run_in_executor(None, self.driver.open_device)
+            success = await self.hub.open_device()
 
             if success:
                 logger.info("设备打开成功")
@@ -140,11 +167,14 @@ class SignalAcquisitionConsumer(AsyncWebsocketConsumer):
             if not self.driver:
                 logger.error("驱动未初始化")
                 return
+            if not await self.check_control():
+                return
 
             logger.info("正在关闭设备...")
-            success = await asyncio.get_event_loop().run_in_executor(None, self.driver.close_device)
+            success = await self.driver.close_device()
 
             if success:
+                self.hub.release_control(self.channel_name)
                 logger.info("设备关闭成功")
                 await self.send_success("设备关闭成功")
             else:
@@ -160,27 +190,27 @@ class SignalAcquisitionConsumer(AsyncWebsocketConsumer):
             if not self.driver:
                 logger.error("驱动未初始化")
                 return
+            if not await self.check_control():
+                return
 
             channels_config = data.get('channels', [])
             results = []
 
             logger.info("开始配置AI通道...")
 
-            # 先关闭所有通道
+            # 目标状态：未列出的通道全部关闭；一次事务只下发发生变化的寄存器
+            tx = self.driver.configure_transaction()
             for i in range(16):
-                await asyncio.get_event_loop().run_in_executor(
-                    None,
-                    self.driver.configure_ai_channel,
-                    i, False, 10.0
-                )
+                tx.ai_channel(i, False)
 
-            # 配置启用的通道
+            valid_configs = []
+            calibrations = {}
             for config in channels_config:
                 channel = config.get('channel')
                 enabled = config.get('enabled', False)
                 voltage_range = config.get('range', 10.0)
 
-                if not (0 <= channel <= 15):
+                if not isinstance(channel, int) or not (0 <= channel <= 15):
                     logger.error(f"无效的通道号: {channel}")
                     results.append({
                         'channel': channel,
@@ -188,12 +218,22 @@ class SignalAcquisitionConsumer(AsyncWebsocketConsumer):
                     })
                     continue
 
-                success = await asyncio.get_event_loop().run_in_executor(
-                    None,
-                    self.driver.configure_ai_channel,
-                    channel, enabled, voltage_range
-                )
-
+                tx.ai_channel(channel, enabled, voltage_range)
+                valid_configs.append((channel, enabled, voltage_range))
+                if enabled:
+                    calibrations[channel] = {
+                        'sensitivity': config.get('sensitivity', 1.0),
+                        'offset': config.get('offset', 0.0),
+                        'unit': config.get('unit')
+                    }
+
+            await self.driver.commit(tx)
+            # 驱动按灵敏度换算为工程量，推送与存储的数据均为换算后的值
+            await self.driver.set_ai_calibrations(calibrations)
+            failed_channels = {channel for _, channel in tx.report['failed']}
+
+            for channel, enabled, voltage_range in valid_configs:
+                success = channel not in failed_channels
                 if enabled:
                     if success:
                         logger.info(f"AI通道{channel}配置成功 (±{voltage_range}V)")
@@ -208,7 +248,14 @@ class SignalAcquisitionConsumer(AsyncWebsocketConsumer):
             enabled_count = sum(1 for config in channels_config if config.get('enabled', False))
             logger.info(f"通道配置完成，已启用{enabled_count}个通道")
 
-            await self.send_response('configure_channels_result', {'results': results})
+            await self.send_response('configure_channels_result', {
+                'results': results,
+                'config_report': {
+                    'written': tx.report['written'],
+                    'skipped': tx.report['skipped'],
+                    'elapsed_ms': tx.report['elapsed_ms']
+                }
+            })
 
         except Exception as e:
             logger.error(f"配置通道异常: {str(e)}")
@@ -220,6 +267,8 @@ class SignalAcquisitionConsumer(AsyncWebsocketConsumer):
             if not self.driver:
                 logger.error("驱动未初始化")
                 return
+            if not await self.check_control():
+                return
 
             config = data.get('config', {})
             mode = config.get('mode', 0)
@@ -228,42 +277,28 @@ class SignalAcquisitionConsumer(AsyncWebsocketConsumer):
 
             logger.info(f"配置采集参数: 模式={mode}, 采样率={sample_rate}Hz, 单次点数={oneshot_points}")
 
-            # 设置采集模式
-            success = await asyncio.get_event_loop().run_in_executor(
-                None,
-                self.driver.set_ai_sample_mode,
-                mode
-            )
-
-            if not success:
-                logger.error("设置采集模式失败")
-                await self.send_error("设置采集模式失败")
+            try:
+                tx = self.driver.configure_transaction()
+                tx.ai_sample_mode(mode)
+                tx.ai_sample_rate(sample_rate)
+                # 如果是单次采集模式，设置点数
+                if mode == 1:
+                    tx.ai_oneshot_points(oneshot_points)
+            except ValueError as e:
+                logger.error(f"采集参数无效: {e}")
+                await self.send_error(f"采集参数无效: {e}")
                 return
 
-            # 设置采样率
-            success = await asyncio.get_event_loop().run_in_executor(
-                None,
-                self.driver.set_ai_sample_rate,
-                sample_rate
-            )
-
+            success = await self.driver.commit(tx)
             if not success:
-                logger.error("设置采样率失败")
-                await self.send_error("设置采样率失败")
+                logger.error("设置采集参数失败")
+                await self.send_error("设置采集参数失败")
                 return
 
-            # 如果是单次采集模式，设置点数
-            if mode == 1:
-                success = await asyncio.get_event_loop().run_in_executor(
-                    None,
-                    self.driver.set_ai_oneshot_points,
-                    oneshot_points
-                )
-
-                if not success:
-                    logger.error("设置单次采集点数失败")
-                    await self.send_error("设置单次采集点数失败")
-                    return
+            # 多速率通道组：{输出采样率: [通道号]}，慢变通道抽取后以较低采样率推送
+            if not await self.driver.set_ai_rate_groups(config.get('rate_groups')):
+                await self.send_error("多速率通道组配置无效")
+                return
 
             logger.info("采集参数配置成功")
             await self.send_success("采集参数配置成功")
@@ -272,56 +307,6 @@ class SignalAcquisitionConsumer(AsyncWebsocketConsumer):
             logger.error(f"配置采集参数异常: {str(e)}")
             await self.send_error(f"配置采集参数异常: {str(e)}")
 
-    def data_callback(self, data_packet: Dict[str, Any]):
-        """数据回调函数 - 只接收 data_packet 字典"""
-        try:
-            self.data_packet_count += 1
-
-            # 从 data_packet 读取必要信息
-            channel_data = data_packet.get('channel_data', {})
-            points_per_channel = data_packet.get('points_per_channel', 0)
-            sample_rate = data_packet.get('sample_rate', 0)
-            remaining_points = data_packet.get('remaining_points', 0)
-            enabled_channels = data_packet.get('enabled_channels', [])
-            timestamp = data_packet.get('timestamp', time.time())
-
-            # 全局时间轴递增
-            time_step = 1.0 / sample_rate if sample_rate else 0
-            start_idx = self.global_point_index
-            end_idx = self.global_point_index + points_per_channel
-            time_axis = [i * time_step for i in range(start_idx, end_idx)]
-            self.global_point_index += points_per_channel
-
-            # 调试日志：检查时间轴是否正常
-            logger.info(f"时间轴生成: sample_rate={sample_rate}Hz, time_step={time_step}s, 前5个值={time_axis[:5]}")
-
-            # 构建新的数据包，加入时间轴和 packet_id
-            data_packet_out = dict(data_packet)
-            data_packet_out.update({
-                'packet_id': self.data_packet_count,
-                'time_axis': time_axis,
-                'enabled_channels': enabled_channels,
-            })
-
-            # 将数据包加入队列
-            self.data_queue.append(data_packet_out)
-
-            # 详细的本地日志
-            logger.info(f"数据包 #{self.data_packet_count}: 通道数={len(channel_data)}, 剩余点数={remaining_points}")
-
-            # 记录每个通道的数据统计
-            for ch_str, ch_data in channel_data.items():
-                if ch_data:
-                    ch = int(ch_str)
-                    v_min = min(ch_data)
-                    v_max = max(ch_data)
-                    v_avg = sum(ch_data) / len(ch_data)
-                    v_rms = (sum(v*v for v in ch_data) / len(ch_data)) ** 0.5
-                    logger.info(f"  CH{ch}: 最小={v_min:.4f}V, 最大={v_max:.4f}V, 平均={v_avg:.4f}V, RMS={v_rms:.4f}V")
-
-        except Exception as e:
-            logger.error(f"数据回调函数异常: {e}")
-
     async def handle_start_acquisition(self, data: Dict[str, Any]):
         """处理开始采集请求"""
         try:
@@ -338,15 +323,13 @@ class SignalAcquisitionConsumer(AsyncWebsocketConsumer):
 
             logger.info(f"开始采集，启用通道: {self.enabled_channels}")
 
-            # 重置数据包计数和全局点数
-            self.data_packet_count = 0
-            self.global_point_index = 0
+            # 重置本连接的计数；采集已由其他连接启动时直接加入其数据流
+            self.integrity.reset()
+            self.send_latency.reset()
+            self.send_duration.reset()
 
-            # 启动连续采集
-            success = await asyncio.get_event_loop().run_in_executor(
-                None,
-                lambda: self.driver.start_continuous_acquisition(self.data_callback)
-            )
+            # 启动连续采集（数据由共享采集中心接收并广播），本连接成为控制者
+            success = await self.hub.start_continuous_acquisition(self.channel_name)
 
             if success:
                 logger.info("连续采集启动成功")
@@ -365,18 +348,20 @@ class SignalAcquisitionConsumer(AsyncWebsocketConsumer):
             if not self.driver:
                 logger.error("驱动未初始化")
                 return
+            if not await self.check_control():
+                return
 
             logger.info("停止采集...")
 
             # 停止连续采集
-            success = await asyncio.get_event_loop().run_in_executor(
-                None,
-                self.driver.stop_continuous_acquisition
-            )
+            success = await self.driver.stop_continuous_acquisition()
 
             if success:
-                logger.info(f"采集已停止，本次共采集 {self.data_packet_count} 个数据包")
-                await self.send_success(f"采集已停止，本次共采集 {self.data_packet_count} 个数据包")
+                self.hub.release_control(self.channel_name)
+                packets = self.hub.packet_count[KIND_ACQUISITION]
+                logger.info(f"采集已停止，本次共采集 {packets} 个数据包，"
+                            f"数据完整性: {self.integrity.metrics(include_gaps=False)}")
+                await self.send_success(f"采集已停止，本次共采集 {packets} 个数据包")
             else:
                 logger.error("停止采集失败")
                 await self.send_error("停止采集失败")
@@ -385,6 +370,144 @@ class SignalAcquisitionConsumer(AsyncWebsocketConsumer):
             logger.error(f"停止采集异常: {str(e)}")
             await self.send_error(f"停止采集异常: {str(e)}")
 
+    async def handle_start_event_capture(self, data: Dict[str, Any]):
+        """处理开始触发事件采集请求"""
+        try:
+            if not self.driver:
+                logger.error("驱动未初始化")
+                return
+            if not await self.check_control():
+                return
+
+            config = data.get('config', {})
+            conditions = config.get('conditions', [])
+            if not conditions:
+                await self.send_error("请设置触发条件")
+                return
+
+            # 事件发布到驱动的 events 流，由 process_event_queue 发送
+            success = await self.driver.start_event_capture(
+                conditions,
+                int(config.get('pre_points', 1000)),
+                int(config.get('post_points', 1000)),
+                int(config.get('holdoff_points', 0))
+            )
+
+            if success:
+                await self.send_success("触发事件采集已开始")
+            else:
+                await self.send_error("触发事件采集启动失败，请检查触发条件")
+
+        except Exception as e:
+            logger.error(f"开始触发事件采集异常: {str(e)}")
+            await self.send_error(f"开始触发事件采集异常: {str(e)}")
+
+    async def handle_stop_event_capture(self, data: Dict[str, Any]):
+        """处理停止触发事件采集请求"""
+        try:
+            if not self.driver:
+                logger.error("驱动未初始化")
+                return
+            if not await self.check_control():
+                return
+
+            metrics = await self.driver.stop_event_capture()
+            await self.send_response('event_capture_stopped', metrics or {})
+
+        except Exception as e:
+            logger.error(f"停止触发事件采集异常: {str(e)}")
+            await self.send_error(f"停止触发事件采集异常: {str(e)}")
+
+    async def handle_start_loopback_test(self, data: Dict[str, Any]):
+        """
+        开始AI→AO回环延迟测量：AO通道周期性输出阶跃或扫频图样，在回环的AI通道上检测，
+        统计读取线程、数据回调、WebSocket发送各环节相对AO命令的延迟
+        """
+        try:
+            if not self.driver:
+                logger.error("驱动未初始化")
+                return
+            if not await self.check_control():
+                return
+
+            config = data.get('config', {})
+            ai_channel = int(config.get('ai_channel', 0))
+            if not self.driver.ai_channels[ai_channel]:
+                await self.send_error(f"回环AI通道{ai_channel}未启用")
+                return
+            try:
+                probe = LoopbackProbe(ai_channel, int(config.get('ao_channel', 0)), config.get('pattern', 'step'),
+                                      float(config.get('duration_s', 0.005)), float(config.get('amplitude', 1.0)))
+            except ValueError as e:
+                await self.send_error(f"回环测量参数无效: {e}")
+                return
+
+            await self.stop_loopback_task()
+            self.set_loopback_probe(probe)
+            self.loopback_task = asyncio.create_task(
+                self.loopback_loop(probe, float(config.get('interval_s', 0.2)), int(config.get('count', 0))))
+            await self.send_success("回环延迟测量已开始")
+
+        except Exception as e:
+            logger.error(f"开始回环延迟测量异常: {str(e)}")
+            await self.send_error(f"开始回环延迟测量异常: {str(e)}")
+
+    async def loopback_loop(self, probe: LoopbackProbe, interval_s: float, count: int):
+        """每 interval_s 秒在I/O线程中发出一次图样，count 为0时直到停止测量"""
+        try:
+            emitted = 0
+            while count <= 0 or emitted < count:
+                await self.driver.call(probe.emit, self.driver.driver)
+                emitted += 1
+                await asyncio.sleep(interval_s)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.error(f"回环图样输出任务异常: {e}")
+
+    def set_loopback_probe(self, probe):
+        """更换回环延迟测量：数据回调环节的检测作为共享采集中心的数据包监听"""
+        if self.loopback_probe is not None:
+            self.hub.remove_listener(KIND_ACQUISITION, self._loopback_listener)
+        self.loopback_probe = probe
+        if probe is not None:
+            self.hub.add_listener(KIND_ACQUISITION, self._loopback_listener)
+
+    def _loopback_listener(self, packet: AiPacket):
+        probe = self.loopback_probe
+        if probe is not None:
+            probe.observe(packet, 'consumer')
+
+    async def stop_loopback_task(self):
+        if self.loopback_task:
+            self.loopback_task.cancel()
+            try:
+                await self.loopback_task
+            except asyncio.CancelledError:
+                pass
+            self.loopback_task = None
+
+    async def handle_stop_loopback_test(self, data: Dict[str, Any]):
+        """停止回环延迟测量，等待已发出的图样检出后返回测量结果"""
+        try:
+            probe = self.loopback_probe
+            if probe is None:
+                await self.send_error("未在进行回环延迟测量")
+                return
+            await self.stop_loopback_task()
+            deadline = time.time() + 1.0
+            while probe.pending and time.time() < deadline:
+                await asyncio.sleep(0.02)
+            self.set_loopback_probe(None)
+            await self.driver.set_ao_dc_voltage(probe.ao_channel, 0.0)
+            result = probe.metrics()
+            logger.info(f"回环延迟测量结果: {result}")
+            await self.send_response('loopback_result', result)
+
+        except Exception as e:
+            logger.error(f"停止回环延迟测量异常: {str(e)}")
+            await self.send_error(f"停止回环延迟测量异常: {str(e)}")
+
     async def handle_get_status(self, data: Dict[str, Any]):
         """处理获取状态请求"""
         try:
@@ -405,17 +528,32 @@ class SignalAcquisitionConsumer(AsyncWebsocketConsumer):
             # 获取缓冲区剩余点数
             buffer_remaining = 0
             if self.driver.is_opened:
-                buffer_remaining = await asyncio.get_event_loop().run_in_executor(
-                    None,
-                    self.driver._get_buffer_remaining
-                )
+                buffer_remaining = await self.driver.get_buffer_remaining()
+
+            histogram = bool(data.get('histogram', True))
+            broadcast = self.hub.metrics(KIND_ACQUISITION, histogram)
+            integrity = await self.driver.get_integrity_metrics()
+            integrity['broadcast'] = broadcast.pop('integrity')
+            integrity['send'] = self.integrity.metrics()
+            stage_latency = await self.driver.get_stage_latency()
+            stage_latency['send'] = self.send_latency.metrics()
+            instrumentation = await self.driver.get_instrumentation(histogram=histogram)
+            instrumentation.update(broadcast.pop('instrumentation'))
+            instrumentation.update(self.send_instrumentation(histogram))
 
             status_data = {
                 'opened': self.driver.is_opened,
                 'acquiring': self.driver.is_acquiring,
                 'enabled_channels': enabled_channels,
                 'sample_rate': sample_rate,
-                'buffer_remaining': buffer_remaining
+                'buffer_remaining': buffer_remaining,
+                'integrity': integrity,
+                'stage_latency': stage_latency,
+                'instrumentation': instrumentation,
+                'replay': await self.driver.get_replay_status(),
+                'send_queue': broadcast.pop('send_queue'),
+                'hub': broadcast,
+                'loopback': self.loopback_probe.metrics(histogram=False) if self.loopback_probe else None
             }
 
             await self.send_response('device_status', status_data)
@@ -424,15 +562,65 @@ class SignalAcquisitionConsumer(AsyncWebsocketConsumer):
             logger.error(f"获取状态异常: {str(e)}")
             await self.send_error(f"获取状态异常: {str(e)}")
 
-    async def send_acquisition_data(self, data_packet: Dict[str, Any]):
-        """发送采集数据"""
+    def send_instrumentation(self, histogram: bool = True) -> Dict[str, Any]:
+        """本连接发送环节的计量：websocket_send（写入套接字耗时，毫秒）"""
+        result = {}
+        for stats in (self.send_duration,):
+            result[stats.name] = stats.metrics()
+            if histogram:
+                result[stats.name]['histogram'] = stats.histogram()
+        return result
+
+    async def handle_set_data_format(self, data: Dict[str, Any]):
+        """
+        设置数据消息格式：format 为 json（默认）或 binary（二进制帧，控制消息仍为JSON），
+        dtype 为二进制帧的样本编码 float32（默认）或 int16（按帧内各通道峰峰值量化）
+        """
         try:
-            await self.send(text_data=json.dumps({
-                'type': 'acquisition_data',
-                'data': data_packet
-            }))
+            data_format = data.get('format', 'json')
+            dtype = data.get('dtype', 'float32')
+            if data_format not in ('json', 'binary') or dtype not in DTYPES:
+                await self.send_error(f"不支持的数据格式: {data_format}/{dtype}")
+                return
+            self.data_format = data_format
+            self.frame_dtype = dtype
+            if self.hub:
+                # 改为订阅该格式的广播组：同一格式的订阅者共用一次编码
+                await self.hub.subscribe(self.channel_layer, self.channel_name, KIND_ACQUISITION,
+                                         data_format_key(data_format, dtype), self.view)
+            await self.send_response('data_format', {'format': data_format, 'dtype': dtype})
         except Exception as e:
-            logger.error(f"发送采集数据异常: {e}")
+            logger.error(f"设置数据格式异常: {str(e)}")
+            await self.send_error(f"设置数据格式异常: {str(e)}")
+
+    async def handle_subscribe(self, data: Dict[str, Any]):
+        """
+        订阅显示视图：channels 为显示的通道（缺省为全部），width 个像素显示 window_s 秒时服务端按像素做
+        min/max 包络抽取后发送（消息带 envelope 字段，数据按 min、max 交错排列）；
+        full_rate 为 true 或不给 width 时发送所选通道的全速率数据
+        """
+        try:
+            width = None if data.get('full_rate') else data.get('width')
+            try:
+                view = StreamView(data.get('channels'), data.get('window_s'), width)
+            except (TypeError, ValueError) as e:
+                await self.send_error(f"订阅参数无效: {e}")
+                return
+            self.view = view
+            if self.hub:
+                await self.hub.subscribe(self.channel_layer, self.channel_name, KIND_ACQUISITION,
+                                         data_format_key(self.data_format, self.frame_dtype), view)
+            await self.send_response('subscription', view.to_dict())
+        except Exception as e:
+            logger.error(f"订阅显示视图异常: {str(e)}")
+            await self.send_error(f"订阅显示视图异常: {str(e)}")
+
+    async def check_control(self) -> bool:
+        """采集由其他连接发起时拒绝停止、重新配置采集或关闭设备的请求（本连接仍可观看）"""
+        if self.hub.may_control(self.channel_name):
+            return True
+        await self.send_error("采集由其他页面控制，本页面只能观看")
+        return False
 
     async def send_success(self, message: str):
         """发送成功消息"""
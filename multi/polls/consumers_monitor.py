@@ -1,42 +1,68 @@
 """
 信号监控WebSocket消费者 - 支持定时采集功能
 """
+import os
 import json
 import asyncio
 import logging
 from channels.generic.websocket import AsyncWebsocketConsumer
-from .dap_driver import USB5121Driver
+from django.conf import settings
+from .dap_packet import AiPacket
+from .dap_frame import DTYPES
+from .dap_hub import (KIND_MONITOR, acquire_hub, release_hub, data_format_key, device_index_from_scope,
+                      StreamView)
+from .dap_integrity import StreamIntegrity
+from .dap_metrics import LatencyStats
+from .dap_decimate import parse_rate_groups
 import threading
 from typing import Dict, Any, List
 import numpy as np
-from collections import deque
 import time
 from datetime import datetime, timedelta
 
 logger = logging.getLogger(__name__)
 
 
+def monitor_recording_dir() -> str:
+    """监控数据直接落盘记录的存放目录"""
+    return os.path.join(settings.MEDIA_ROOT, 'monitor_data', 'recordings')
+
+
 class SignalMonitorConsumer(AsyncWebsocketConsumer):
-    """信号监控WebSocket消费者"""
+    """
+    信号监控WebSocket消费者
+
+    设备由采集卡的共享采集中心（dap_hub.AcquisitionHub）持有。监控任务及其累积的待保存数据属于发起监控的连接，
+    监控数据经中心编码一次后广播给所有订阅监控数据的连接
+    """
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.driver = None
+        self.hub = None  # 共享采集中心
+        self.driver = None  # 中心持有的异步驱动（self.hub.driver）
         self.group_name = "signal_monitor"
         self.data_packet_count = 0
-        self.data_queue = deque(maxlen=100)
-        self.processing_task = None
+        # 监控数据完整性：样本序号缺口，保存时随数据一并记录
+        self.integrity = StreamIntegrity('监控数据')
+        self.send_latency = LatencyStats('send')  # 读取完成到WebSocket发送完成的耗时
+        self.send_duration = LatencyStats('websocket_send')  # 单个数据块写入套接字的耗时
+        self.data_format = 'json'  # 数据消息格式：json / binary（二进制帧，见 dap_frame）
+        self.frame_dtype = 'float32'  # 二进制帧的样本编码：float32 / int16
+        self.view = None  # 显示视图（StreamView：通道、时间窗口与像素宽度），None为全部通道的全速率数据
         self.monitoring_task = None
         self.enabled_channels = []
         self.channel_configs = {}
-        self.global_point_index = 0  # 全局采集点计数器
+        self.rate_point_index = {}  # 全局采集点计数器 {采样率: 点数}，多速率采集时各速率组分别计数
         
         # 监控配置
         self.monitor_config = {
             'interval_seconds': 5,  # 采集间隔（秒）
             'points_per_acquisition': 1000,  # 每次采集点数
             'total_duration_minutes': 60,  # 总监控时长（分钟）
-            'sample_rate': 10000  # 采样率
+            'sample_rate': 10000,  # 采样率
+            'record_to_disk': False,  # 直接落盘记录：数据由采集线程写入本地文件，前端只接收预览
+            'preview_rate': 1000,  # 落盘记录时推送给前端的预览采样率（Hz/通道）
+            'rate_groups': {}  # 多速率通道组 {输出采样率: [通道号]}，慢变通道抽取后以较低采样率输出与保存
         }
         
         # 监控状态
@@ -50,10 +76,18 @@ class SignalMonitorConsumer(AsyncWebsocketConsumer):
         self.paused_time_total = 0  # 新增：累计暂停时长（秒）
         self.paused_time_start = None  # 新增：本次暂停开始时间
         
-        # 数据存储
-        self.all_time_axis = []
-        self.all_channel_data = {}
+        # 数据存储：按数据包分块保存float数组，保存时再拼接转换；时间轴隐式表示为 样本序号 × dt，
+        # 各次采集在累积时间轴上的起点与采集时刻记入 burst_offsets
+        self.all_channel_data = {}  # {通道号: List[np.ndarray]}
+        self.monitor_point_count = 0  # 累积的每通道点数
+        self.burst_offsets = []  # [{'acquisition_id', 'index': 累积时间轴上的起始样本序号, 'time': 首个样本的系统时间(估算)}]
+        self.rate_group_data = {}  # 降速组的累积数据 {采样率: {'channel_data', 'points'}}
         self.monitor_data_ready = False
+        self.is_recording = False  # 驱动正在落盘记录，数据回调收到的是预览数据
+        self.recording_info = None  # 最近一次落盘记录的统计（AiRecorder.metrics）
+
+        # 连发单次采集模式的当前配置 (采样率, 每次点数, 启用通道)，None表示未进入连发模式
+        self.burst_config = None
 
     async def connect(self):
         """WebSocket连接"""
@@ -61,54 +95,46 @@ class SignalMonitorConsumer(AsyncWebsocketConsumer):
             await self.channel_layer.group_add(self.group_name, self.channel_name)
             await self.accept()
             await self.initialize_driver()
-            # 启动数据处理任务
-            self.processing_task = asyncio.create_task(self.process_data_queue())
+            if self.hub:
+                await self.hub.subscribe(self.channel_layer, self.channel_name, KIND_MONITOR,
+                                         data_format_key(self.data_format, self.frame_dtype))
             logger.info(f"信号监控WebSocket连接已建立: {self.channel_name}")
         except Exception as e:
             logger.error(f"信号监控WebSocket连接失败: {e}")
             await self.close()
 
     async def disconnect(self, close_code):
-        """WebSocket断开连接"""
+        """WebSocket断开连接：结束本连接发起的监控并退订，设备由共享采集中心继续持有"""
         try:
-            if self.processing_task:
-                self.processing_task.cancel()
-                try:
-                    await self.processing_task
-                except asyncio.CancelledError:
-                    pass
-            
             if self.monitoring_task:
-                self.monitoring_task.cancel()
-                try:
-                    await self.monitoring_task
-                except asyncio.CancelledError:
-                    pass
-                
-            if self.driver:
-                await asyncio.get_event_loop().run_in_executor(None, self.driver.close_device)
+                await self.stop_monitoring()
+
+            if self.hub:
+                await self.hub.unsubscribe(self.channel_layer, self.channel_name)
+                await release_hub(self.hub)
             await self.channel_layer.group_discard(self.group_name, self.channel_name)
             logger.info(f"信号监控WebSocket连接已断开: {self.channel_name}")
         except Exception as e:
             logger.error(f"信号监控WebSocket断开异常: {e}")
 
-    async def process_data_queue(self):
-        """处理数据队列的任务"""
+    async def daq_block(self, event: Dict[str, Any]):
+        """共享采集中心广播的监控数据块（已按本连接的数据格式编码）"""
         try:
-            while True:
-                if self.data_queue:
-                    data_packet = self.data_queue.popleft()
-                    try:
-                        await self.send_monitor_data(data_packet)
-                        logger.info(f"发送监控数据包 #{data_packet.get('packet_id', 0)}")
-                    except Exception as e:
-                        logger.error(f"发送监控数据包异常: {e}")
-                else:
-                    await asyncio.sleep(0.001)
-        except asyncio.CancelledError:
-            logger.info("监控数据处理任务已取消")
+            if 'bytes' not in event and 'text' not in event:
+                return  # 本视图本次没有完整的像素
+            started = time.perf_counter()
+            if 'bytes' in event:
+                await self.send(bytes_data=event['bytes'])
+            else:
+                await self.send(text_data=event['text'])
+            self.send_duration.record(time.perf_counter() - started)
+            self.send_latency.record(time.time() - event['timestamp'])
         except Exception as e:
-            logger.error(f"监控数据处理任务异常: {e}")
+            logger.error(f"发送监控数据异常: {e}")
+
+    async def daq_event(self, event: Dict[str, Any]):
+        """共享采集中心广播的JSON消息"""
+        await self.send(text_data=event['text'])
 
     async def receive(self, text_data):
         """接收WebSocket消息"""
@@ -130,6 +156,8 @@ class SignalMonitorConsumer(AsyncWebsocketConsumer):
                 'reset_monitor': self.handle_reset_monitor,
                 'stop_monitoring_and_reset': self.handle_stop_monitoring_and_reset,
                 'save_monitor_data': self.handle_save_monitor_data,
+                'set_data_format': self.handle_set_data_format,
+                'subscribe': self.handle_subscribe,
             }
 
             handler = handlers.get(message_type)
@@ -145,9 +173,10 @@ class SignalMonitorConsumer(AsyncWebsocketConsumer):
             await self.send_error(f"处理监控消息异常: {str(e)}")
 
     async def initialize_driver(self):
-        """初始化驱动"""
+        """取得采集卡的共享采集中心（首个连接时创建驱动）"""
         try:
-            self.driver = await asyncio.get_event_loop().run_in_executor(None, USB5121Driver)
+            self.hub = await acquire_hub(device_index_from_scope(self.scope))
+            self.driver = self.hub.driver
             logger.info("监控驱动初始化成功")
         except Exception as e:
             logger.error(f"监控驱动初始化失败: {str(e)}")
@@ -160,7 +189,7 @@ class SignalMonitorConsumer(AsyncWebsocketConsumer):
                 return
 
             logger.info("正在打开监控设备...")
-            success = await asyncio.get_event_loop().run_in_executor(None, self.driver.open_device)
+            success = await self.hub.open_device()
 
             if success:
                 logger.info("监控设备打开成功")
@@ -178,15 +207,18 @@ class SignalMonitorConsumer(AsyncWebsocketConsumer):
             if not self.driver:
                 logger.error("驱动未初始化")
                 return
+            if not await self.check_control():
+                return
 
             # 停止监控
             if self.is_monitoring:
                 await self.stop_monitoring()
 
             logger.info("正在关闭监控设备...")
-            success = await asyncio.get_event_loop().run_in_executor(None, self.driver.close_device)
+            success = await self.driver.close_device()
 
             if success:
+                self.hub.release_control(self.channel_name)
                 logger.info("监控设备关闭成功")
                 await self.send_success("监控设备关闭成功")
             else:
@@ -202,6 +234,8 @@ class SignalMonitorConsumer(AsyncWebsocketConsumer):
             if not self.driver:
                 logger.error("驱动未初始化")
                 return
+            if not await self.check_control():
+                return
 
             channels_config = data.get('channels', [])
             results = []
@@ -210,22 +244,20 @@ class SignalMonitorConsumer(AsyncWebsocketConsumer):
 
             logger.info("开始配置监控AI通道...")
 
-            # 先关闭所有通道
+            # 目标状态：未列出的通道全部关闭；一次事务只下发发生变化的寄存器
+            tx = self.driver.configure_transaction()
             for i in range(16):
-                await asyncio.get_event_loop().run_in_executor(
-                    None,
-                    self.driver.configure_ai_channel,
-                    i, False, 10.0
-                )
+                tx.ai_channel(i, False)
 
-            # 配置启用的通道
+            valid_configs = []
+            calibrations = {}
             for config in channels_config:
                 channel = config.get('channel')
                 enabled = config.get('enabled', False)
                 voltage_range = config.get('range', 10.0)
                 sensitivity = config.get('sensitivity', 1.0)
 
-                if not (0 <= channel <= 15):
+                if not isinstance(channel, int) or not (0 <= channel <= 15):
                     logger.error(f"无效的通道号: {channel}")
                     results.append({
                         'channel': channel,
@@ -233,18 +265,33 @@ class SignalMonitorConsumer(AsyncWebsocketConsumer):
                     })
                     continue
 
-                success = await asyncio.get_event_loop().run_in_executor(
-                    None,
-                    self.driver.configure_ai_channel,
-                    channel, enabled, voltage_range
-                )
-
+                tx.ai_channel(channel, enabled, voltage_range)
+                valid_configs.append((channel, enabled, voltage_range, sensitivity))
+                if enabled:
+                    calibrations[channel] = {
+                        'sensitivity': sensitivity,
+                        'offset': config.get('offset', 0.0),
+                        'unit': config.get('unit')
+                    }
+
+            await self.driver.commit(tx)
+            # 驱动按灵敏度换算为工程量，监控数据与保存的数据均为换算后的值
+            await self.driver.set_ai_calibrations(calibrations)
+            applied = await self.driver.get_ai_calibration()
+            failed_channels = {channel for _, channel in tx.report['failed']}
+
+            for channel, enabled, voltage_range, sensitivity in valid_configs:
+                success = channel not in failed_channels
                 if enabled:
                     if success:
                         self.enabled_channels.append(channel)
+                        calibration = applied.get(channel)
                         self.channel_configs[channel] = {
                             'range': voltage_range,
-                            'sensitivity': sensitivity
+                            'sensitivity': sensitivity,
+                            # calibrated=True 表示保存的数据已按灵敏度换算，分析与训练时不应再次换算
+                            'calibrated': calibration is not None,
+                            'unit': calibration['unit'] if calibration else 'V'
                         }
                         logger.info(f"监控AI通道{channel}配置成功 (±{voltage_range}V, 灵敏度:{sensitivity})")
                     else:
@@ -267,6 +314,8 @@ class SignalMonitorConsumer(AsyncWebsocketConsumer):
     async def handle_configure_monitor(self, data: Dict[str, Any]):
         """处理监控配置请求"""
         try:
+            if self.driver and not await self.check_control():
+                return
             config = data.get('config', {})
             
             # 更新监控配置
@@ -274,8 +323,15 @@ class SignalMonitorConsumer(AsyncWebsocketConsumer):
                 'interval_seconds': config.get('interval_seconds', 5),
                 'points_per_acquisition': config.get('points_per_acquisition', 1000),
                 'total_duration_minutes': config.get('total_duration_minutes', 60),
-                'sample_rate': config.get('sample_rate', 10000)
+                'sample_rate': config.get('sample_rate', 10000),
+                'record_to_disk': bool(config.get('record_to_disk', False)),
+                'preview_rate': config.get('preview_rate', 1000),
+                'rate_groups': parse_rate_groups(config.get('rate_groups'))
             })
+            if self.driver and not await self.driver.set_ai_rate_groups(self.monitor_config['rate_groups'],
+                                                                         self.monitor_config['sample_rate']):
+                await self.send_error("多速率通道组配置无效")
+                return
 
             # 计算总采集次数（考虑采集时间）
             # 每次采集的总时间 = 采集时间 + 间隔时间
@@ -305,6 +361,8 @@ class SignalMonitorConsumer(AsyncWebsocketConsumer):
             if not self.driver:
                 await self.send_error("设备未连接")
                 return
+            if not await self.check_control():
+                return
 
             if not self.enabled_channels:
                 await self.send_error("请先配置通道")
@@ -356,6 +414,8 @@ class SignalMonitorConsumer(AsyncWebsocketConsumer):
             if not self.driver:
                 await self.send_error("设备未连接")
                 return
+            if not await self.check_control():
+                return
 
             if not self.enabled_channels:
                 await self.send_error("请先配置通道")
@@ -377,6 +437,8 @@ class SignalMonitorConsumer(AsyncWebsocketConsumer):
                 await self.monitoring_task
             except asyncio.CancelledError:
                 pass
+        await self.stop_burst_mode()
+        await self.stop_recording()
         logger.info("监控已停止")
 
     async def monitoring_loop(self):
@@ -387,10 +449,12 @@ class SignalMonitorConsumer(AsyncWebsocketConsumer):
             self.monitor_start_time = datetime.now()
             self.monitor_end_time = self.monitor_start_time + timedelta(minutes=self.monitor_config['total_duration_minutes'])
             self.acquisition_count = 0
-            self.global_point_index = 0
+            self.rate_point_index = {}
             self.paused_time_total = 0
             self.paused_time_start = None
             logger.info(f"开始监控循环: 预计结束时间 {self.monitor_end_time}")
+            if self.monitor_config.get('record_to_disk'):
+                await self.start_recording()
             
             while self.is_monitoring:
                 current_time = datetime.now()
@@ -420,6 +484,8 @@ class SignalMonitorConsumer(AsyncWebsocketConsumer):
             
             logger.info(f"监控循环结束: 共完成{self.acquisition_count}次采集")
             self.is_monitoring = False
+            await self.stop_burst_mode()
+            await self.stop_recording()
             self.paused_time_total = 0
             self.paused_time_start = None
             
@@ -436,168 +502,186 @@ class SignalMonitorConsumer(AsyncWebsocketConsumer):
             self.paused_time_total = 0
             self.paused_time_start = None
 
+    async def ensure_burst_mode(self) -> bool:
+        """确保驱动处于与当前监控配置一致的连发单次采集模式（配置变化时才重新配置）"""
+        config = (
+            self.monitor_config['sample_rate'],
+            self.monitor_config['points_per_acquisition'],
+            tuple(self.enabled_channels),
+            tuple(sorted((rate, tuple(channels)) for rate, channels in self.monitor_config['rate_groups'].items()))
+        )
+        if self.burst_config == config and self.driver.burst_active:
+            return True
+        # 连发采集的发起者成为中心的控制者，退出连发模式时释放
+        if not self.hub.take_control(self.channel_name):
+            logger.error("采集卡正由其他连接控制，无法进入连发单次采集模式")
+            return False
+
+        await self.driver.stop_burst_mode()
+        if not await self.driver.set_ai_rate_groups(self.monitor_config['rate_groups'],
+                                                    self.monitor_config['sample_rate']):
+            return False
+        success = await self.driver.start_burst_mode(
+            self.data_callback,
+            self.monitor_config['sample_rate'],
+            self.monitor_config['points_per_acquisition']
+        )
+        self.burst_config = config if success else None
+        if not success:
+            self.hub.release_control(self.channel_name)
+        return success
+
+    async def stop_burst_mode(self):
+        """退出连发单次采集模式，释放采集卡"""
+        if self.driver and self.burst_config is not None:
+            self.burst_config = None
+            await self.driver.stop_burst_mode()
+            self.hub.release_control(self.channel_name)
+
+    async def start_recording(self) -> bool:
+        """开始直接落盘记录：每次采集的完整数据由驱动写入本地文件，数据回调只收到预览"""
+        name = f"monitor_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        path = os.path.join(monitor_recording_dir(), name)
+        metadata = {
+            'monitor_config': self.monitor_config,
+            'channel_configs': self.channel_configs,
+            'start_time': self.monitor_start_time.isoformat() if self.monitor_start_time else None,
+        }
+        success = await self.driver.start_recording(path, self.monitor_config.get('preview_rate'), metadata)
+        self.is_recording = bool(success)
+        self.recording_info = None
+        if success:
+            logger.info(f"监控数据落盘记录: {path}")
+        else:
+            logger.error("启动落盘记录失败，改为在内存中累积数据")
+        return self.is_recording
+
+    async def stop_recording(self):
+        """停止落盘记录，保存记录统计供保存任务使用"""
+        if not self.is_recording or not self.driver:
+            return
+        self.is_recording = False
+        info = await self.driver.stop_recording()
+        if info:
+            self.recording_info = info
+            self.monitor_point_count = info['points_per_channel']
+            self.monitor_data_ready = self.monitor_point_count > 0
+            logger.info(f"监控数据落盘记录完成: {info['points_per_channel']}点/通道, "
+                        f"{info['bytes_written'] / 1e6:.1f}MB")
+
     async def perform_single_acquisition(self):
-        """执行单次采集"""
+        """执行单次采集：连发模式下只重新布防并触发，等待最后一个数据包回调后返回"""
         try:
             logger.info(f"执行第{self.acquisition_count + 1}次采集...")
 
-            # 配置采集参数
-            success = await asyncio.get_event_loop().run_in_executor(
-                None,
-                self.driver.configure_ai_acquisition,
-                1,  # 单次采集模式
-                self.monitor_config['sample_rate'],
-                self.monitor_config['points_per_acquisition']
-            )
-
-            if not success:
-                logger.error("配置采集参数失败")
-                return
-
-            # 开始采集
-            success = await asyncio.get_event_loop().run_in_executor(
-                None,
-                lambda: self.driver.start_ai_acquisition(self.data_callback)
-            )
-
-            if not success:
-                logger.error("开始采集失败")
-                return
-
-            # 触发单次采集
-            success = await asyncio.get_event_loop().run_in_executor(
-                None,
-                self.driver.trigger_ai_acquisition
-            )
-
-            if not success:
-                logger.error("触发采集失败")
+            if not await self.ensure_burst_mode():
+                logger.error("启动连发单次采集模式失败")
                 return
 
-            # 等待采集完成
-            # 计算理论采集时间：点数/采样率，再加上一些缓冲时间
+            # 理论采集时间：点数/采样率，另留出读取超时余量
             theoretical_time = self.monitor_config['points_per_acquisition'] / self.monitor_config['sample_rate']
-            wait_time = max(theoretical_time + 0.5, 1.0)  # 至少等待1秒，确保采集完成
-            logger.info(f"等待采集完成，理论时间: {theoretical_time:.3f}秒，实际等待: {wait_time:.3f}秒")
-            await asyncio.sleep(wait_time)
-
-            # 停止采集
-            await asyncio.get_event_loop().run_in_executor(
-                None,
-                self.driver.stop_ai_acquisition
-            )
+            await asyncio.wait_for(self.driver.acquire_burst(), timeout=theoretical_time + 2.0)
 
             logger.info(f"第{self.acquisition_count + 1}次采集完成")
 
+        except asyncio.TimeoutError:
+            logger.error(f"第{self.acquisition_count + 1}次采集超时")
         except Exception as e:
             logger.error(f"执行采集异常: {e}")
 
-    def data_callback(self, data_packet: Dict[str, Any]):
-        """数据回调函数"""
+    def data_callback(self, packet: AiPacket):
+        """数据回调函数 - 接收驱动产生的 AiPacket"""
         try:
             self.data_packet_count += 1
+            self.integrity.observe_packet(packet)
 
-            # 从 data_packet 读取必要信息
-            channel_data = data_packet.get('channel_data', {})
-            points_per_channel = data_packet.get('points_per_channel', 0)
-            sample_rate = data_packet.get('sample_rate', 0)
-            remaining_points = data_packet.get('remaining_points', 0)
-            enabled_channels = data_packet.get('enabled_channels', [])
-            timestamp = data_packet.get('timestamp', time.time())
-
-            # 本地详细打印数据内容，便于调试
-            logger.info(f"[DEBUG] 数据包时间戳: {timestamp}")
-            logger.info(f"[DEBUG] 启用通道: {enabled_channels}")
-            logger.info(f"[DEBUG] 通道数据键: {list(channel_data.keys())}")
-            
-            for ch_str, ch_data in channel_data.items():
-                if ch_data and len(ch_data) > 0:
-                    logger.info(f"[DEBUG] CH{ch_str} 前5个点: {ch_data[:5]}")
-                    logger.info(f"[DEBUG] CH{ch_str} 数据长度: {len(ch_data)}")
-                    logger.info(f"[DEBUG] CH{ch_str} 数据范围: {min(ch_data):.4f} ~ {max(ch_data):.4f}")
-                else:
-                    logger.info(f"[DEBUG] CH{ch_str} 数据为空或None")
+            points_per_channel = packet.points_per_channel
+            sample_rate = packet.sample_rate
 
-            # 全局时间轴递增
-            time_step = 1.0 / sample_rate if sample_rate else 0
-            start_idx = self.global_point_index
-            end_idx = self.global_point_index + points_per_channel
-            time_axis = [i * time_step for i in range(start_idx, end_idx)]
-            self.global_point_index += points_per_channel
+            # 逐包的数据统计只在DEBUG级别计算与输出，吞吐与延迟见 get_monitor_status 的 instrumentation
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(f"监控数据包 #{self.data_packet_count}: 时间戳={packet.timestamp}, "
+                             f"通道={list(packet.channels)}, 每通道{points_per_channel}点, "
+                             f"剩余点数={packet.remaining_points}")
+                for ch, st in packet.stats().items():
+                    logger.debug(f"  CH{ch}: 前5个点={packet.channel(ch)[:5]}, 最小={st['min']:.4f}V, "
+                                 f"最大={st['max']:.4f}V, 平均={st['mean']:.4f}V, RMS={st['rms']:.4f}V")
 
-            # 累积数据用于保存
-            self.all_time_axis.extend(time_axis)
-            
-            # 确保所有启用的通道都有数据存储
-            # 使用传入的enabled_channels参数，而不是self.enabled_channels
-            for ch in enabled_channels:
-                if ch not in self.all_channel_data:
-                    self.all_channel_data[ch] = []
-                
-                # 如果当前数据包中有这个通道的数据，则添加
-                ch_str = str(ch)
-                if ch_str in channel_data and channel_data[ch_str]:
-                    self.all_channel_data[ch].extend(channel_data[ch_str])
-                    logger.info(f"累积CH{ch}数据: {len(channel_data[ch_str])}个点, 值范围: {min(channel_data[ch_str]):.4f}~{max(channel_data[ch_str]):.4f}")
+            # 全局时间轴递增（各速率组按自己的采样率分别计数）
+            time_step = 1.0 / sample_rate if sample_rate else 0
+            start_idx = self.rate_point_index.get(sample_rate, 0)
+            end_idx = start_idx + points_per_channel
+            self.rate_point_index[sample_rate] = end_idx
+
+            acquisition_id = self.acquisition_count + 1
+            if packet.start_index == 0 and (not self.burst_offsets
+                                            or self.burst_offsets[-1]['acquisition_id'] != acquisition_id):
+                # 一次采集的第一个数据块：起点换算为监控采样率下的样本序号，
+                # 首个样本的时刻由读取时刻与FIFO中更新的样本数推算
+                backlog = (packet.remaining_points or 0) / max(1, packet.num_channels)
+                self.burst_offsets.append({
+                    'acquisition_id': acquisition_id,
+                    'index': round(start_idx * self.monitor_config['sample_rate'] / sample_rate) if sample_rate else 0,
+                    'time': packet.timestamp - (points_per_channel + backlog) * time_step,
+                })
+
+            # 落盘记录时完整数据已由驱动写入文件，此处收到的是预览，不再累积
+            if not self.is_recording:
+                # 累积数据用于保存：环形缓冲区槽位会被复用，此处整体拷贝一次
+                block = np.array(packet.data, dtype=np.float32)
+                if self.is_rate_group(sample_rate):
+                    group = self.rate_group_data.setdefault(sample_rate, {'channel_data': {}, 'points': 0})
+                    for i, ch in enumerate(packet.channels):
+                        group['channel_data'].setdefault(ch, []).append(block[i])
+                    group['points'] += points_per_channel
                 else:
-                    # 如果没有数据，用NaN填充
-                    self.all_channel_data[ch].extend([float('nan')] * len(time_axis))
-                    logger.info(f"CH{ch}无数据，用NaN填充: {len(time_axis)}个点")
-            
+                    for i, ch in enumerate(packet.channels):
+                        self.all_channel_data.setdefault(ch, []).append(block[i])
+                    self.monitor_point_count += points_per_channel
+
             # 标记数据已准备好
-            if len(self.all_time_axis) > 0:
+            if self.monitor_point_count > 0 or self.rate_group_data:
                 self.monitor_data_ready = True
-                logger.info(f"数据累积状态: 时间轴{len(self.all_time_axis)}点, 通道数据{list(self.all_channel_data.keys())}")
-                # 打印每个通道的累积数据统计
-                for ch in self.all_channel_data:
-                    if self.all_channel_data[ch]:
-                        valid_data = [x for x in self.all_channel_data[ch] if not np.isnan(x)]
-                        if valid_data:
-                            logger.info(f"  累积CH{ch}: {len(valid_data)}个有效数据点, 范围: {min(valid_data):.4f}~{max(valid_data):.4f}")
-                        else:
-                            logger.info(f"  累积CH{ch}: 只有NaN数据")
-                    else:
-                        logger.info(f"  累积CH{ch}: 无数据")
 
-            # 构建新的数据包，加入时间轴和 packet_id
-            data_packet_out = dict(data_packet)
-            data_packet_out.update({
+            # 数据包交给共享采集中心编码一次后广播，附加字段在编码时合并
+            # 时间轴不逐点发送：第i个样本的时刻为 (time_start_index + i) × dt，由客户端按需生成
+            self.hub.publish(KIND_MONITOR, packet, {
                 'packet_id': self.data_packet_count,
-                'time_axis': time_axis,
-                'enabled_channels': enabled_channels,
-                'acquisition_id': self.acquisition_count + 1,
+                'time_start_index': start_idx,
+                'dt': time_step,
+                'acquisition_id': acquisition_id,
                 'channel_configs': self.channel_configs
             })
 
-            # 将数据包加入队列
-            self.data_queue.append(data_packet_out)
-
-            # 详细的本地日志
-            logger.info(f"监控数据包 #{self.data_packet_count}: 通道数={len(channel_data)}, 剩余点数={remaining_points}")
-
-            # 记录每个通道的数据统计
-            for ch_str, ch_data in channel_data.items():
-                if ch_data:
-                    ch = int(ch_str)
-                    v_min = min(ch_data)
-                    v_max = max(ch_data)
-                    v_avg = sum(ch_data) / len(ch_data)
-                    v_rms = (sum(v*v for v in ch_data) / len(ch_data)) ** 0.5
-                    logger.info(f"  CH{ch}: 最小={v_min:.4f}V, 最大={v_max:.4f}V, 平均={v_avg:.4f}V, RMS={v_rms:.4f}V")
-
         except Exception as e:
             logger.error(f"监控数据回调函数异常: {e}")
 
+    def is_rate_group(self, sample_rate: int) -> bool:
+        """数据包是否属于降速组（采样率低于监控采样率的速率组）"""
+        return sample_rate in self.monitor_config['rate_groups'] and sample_rate < self.monitor_config['sample_rate']
+
+    def rate_group_channels(self) -> Dict[int, List[int]]:
+        """降速组的启用通道 {采样率: [通道号]}"""
+        return {
+            rate: [ch for ch in channels if ch in self.enabled_channels]
+            for rate, channels in self.monitor_config['rate_groups'].items() if self.is_rate_group(rate)
+        }
+
     async def handle_get_monitor_status(self, data: Dict[str, Any]):
         """处理获取监控状态请求"""
         try:
-            await self.send_monitor_status()
+            await self.send_monitor_status(histogram=bool(data.get('histogram', True)))
         except Exception as e:
             logger.error(f"获取监控状态异常: {str(e)}")
             await self.send_error(f"获取监控状态异常: {str(e)}")
 
-    async def send_monitor_status(self):
-        """发送监控状态"""
+    async def send_monitor_status(self, histogram: bool = False):
+        """
+        发送监控状态
+
+        Args:
+            histogram: 计量（instrumentation）是否附带直方图分桶；周期性推送的状态不带分桶
+        """
         try:
             current_time = datetime.now()
             remaining_time = 0
@@ -626,21 +710,84 @@ class SignalMonitorConsumer(AsyncWebsocketConsumer):
                 'progress_percent': round(progress, 1),
                 'next_acquisition_time': None,  # 不再使用固定时间，改为采集完成后等待间隔
                 'enabled_channels': self.enabled_channels,
-                'monitor_config': self.monitor_config
+                'monitor_config': self.monitor_config,
+                'is_recording': self.is_recording
             }
+            if self.driver:
+                broadcast = self.hub.metrics(KIND_MONITOR, histogram)
+                stage_latency = await self.driver.get_stage_latency()
+                stage_latency['send'] = self.send_latency.metrics()
+                status_data['stage_latency'] = stage_latency
+                instrumentation = await self.driver.get_instrumentation(histogram=histogram)
+                instrumentation.update(broadcast.pop('instrumentation'))
+                instrumentation.update(self.send_instrumentation(histogram))
+                status_data['instrumentation'] = instrumentation
+                status_data['replay'] = await self.driver.get_replay_status()
+                status_data['send_queue'] = broadcast.pop('send_queue')
+                status_data['hub'] = broadcast
             await self.send_response('monitor_status', status_data)
         except Exception as e:
             logger.error(f"发送监控状态异常: {e}")
 
-    async def send_monitor_data(self, data_packet: Dict[str, Any]):
-        """发送监控数据"""
+    def send_instrumentation(self, histogram: bool = True) -> Dict[str, Any]:
+        """本连接发送环节的计量：websocket_send（写入套接字耗时，毫秒）"""
+        result = {}
+        for stats in (self.send_duration,):
+            result[stats.name] = stats.metrics()
+            if histogram:
+                result[stats.name]['histogram'] = stats.histogram()
+        return result
+
+    async def handle_set_data_format(self, data: Dict[str, Any]):
+        """
+        设置数据消息格式：format 为 json（默认）或 binary（二进制帧，控制消息仍为JSON），
+        dtype 为二进制帧的样本编码 float32（默认）或 int16（按帧内各通道峰峰值量化）
+        """
         try:
-            await self.send(text_data=json.dumps({
-                'type': 'monitor_data',
-                'data': data_packet
-            }))
+            data_format = data.get('format', 'json')
+            dtype = data.get('dtype', 'float32')
+            if data_format not in ('json', 'binary') or dtype not in DTYPES:
+                await self.send_error(f"不支持的数据格式: {data_format}/{dtype}")
+                return
+            self.data_format = data_format
+            self.frame_dtype = dtype
+            if self.hub:
+                # 改为订阅该格式的广播组：同一格式的订阅者共用一次编码
+                await self.hub.subscribe(self.channel_layer, self.channel_name, KIND_MONITOR,
+                                         data_format_key(data_format, dtype), self.view)
+            await self.send_response('data_format', {'format': data_format, 'dtype': dtype})
         except Exception as e:
-            logger.error(f"发送监控数据异常: {e}")
+            logger.error(f"设置数据格式异常: {str(e)}")
+            await self.send_error(f"设置数据格式异常: {str(e)}")
+
+    async def handle_subscribe(self, data: Dict[str, Any]):
+        """
+        订阅显示视图：channels 为显示的通道（缺省为全部），width 个像素显示 window_s 秒时服务端按像素做
+        min/max 包络抽取后发送（消息带 envelope 字段，数据按 min、max 交错排列）；
+        full_rate 为 true 或不给 width 时发送所选通道的全速率数据
+        """
+        try:
+            width = None if data.get('full_rate') else data.get('width')
+            try:
+                view = StreamView(data.get('channels'), data.get('window_s'), width)
+            except (TypeError, ValueError) as e:
+                await self.send_error(f"订阅参数无效: {e}")
+                return
+            self.view = view
+            if self.hub:
+                await self.hub.subscribe(self.channel_layer, self.channel_name, KIND_MONITOR,
+                                         data_format_key(self.data_format, self.frame_dtype), view)
+            await self.send_response('subscription', view.to_dict())
+        except Exception as e:
+            logger.error(f"订阅显示视图异常: {str(e)}")
+            await self.send_error(f"订阅显示视图异常: {str(e)}")
+
+    async def check_control(self) -> bool:
+        """采集由其他连接发起时拒绝停止、重新配置采集或关闭设备的请求（本连接仍可观看）"""
+        if self.hub.may_control(self.channel_name):
+            return True
+        await self.send_error("采集由其他页面控制，本页面只能观看")
+        return False
 
     async def send_success(self, message: str):
         """发送成功消息"""
@@ -676,6 +823,8 @@ class SignalMonitorConsumer(AsyncWebsocketConsumer):
                 except Exception:
                     pass
                 self.monitoring_task = None
+            await self.stop_burst_mode()
+            await self.stop_recording()
             # 重置所有状态
             self.acquisition_count = 0
             self.total_acquisitions = 0
@@ -684,13 +833,20 @@ class SignalMonitorConsumer(AsyncWebsocketConsumer):
             self.monitor_start_time = None
             self.monitor_end_time = None
             self.next_acquisition_time = None
-            self.global_point_index = 0
-            self.data_queue.clear()
+            self.rate_point_index = {}
+            if self.hub:
+                self.hub.reset_stream(KIND_MONITOR)
             
             # 清空数据存储
-            self.all_time_axis = []
+            self.burst_offsets = []
             self.all_channel_data = {}
+            self.monitor_point_count = 0
+            self.rate_group_data = {}
             self.monitor_data_ready = False
+            self.recording_info = None
+            self.integrity.reset()
+            self.send_latency.reset()
+            self.send_duration.reset()
             
             await self.send_success("监控已重置")
             await self.send_monitor_status()
@@ -711,6 +867,8 @@ class SignalMonitorConsumer(AsyncWebsocketConsumer):
                 except Exception:
                     pass
                 self.monitoring_task = None
+            await self.stop_burst_mode()
+            await self.stop_recording()
             # 重置采集次数、时间、进度等（不清空通道配置）
             self.acquisition_count = 0
             self.total_acquisitions = 0
@@ -719,12 +877,18 @@ class SignalMonitorConsumer(AsyncWebsocketConsumer):
             self.monitor_start_time = None
             self.monitor_end_time = None
             self.next_acquisition_time = None
-            self.global_point_index = 0
+            self.rate_point_index = {}
             
             # 清空数据存储
-            self.all_time_axis = []
+            self.burst_offsets = []
             self.all_channel_data = {}
+            self.monitor_point_count = 0
+            self.rate_group_data = {}
             self.monitor_data_ready = False
+            self.recording_info = None
+            self.integrity.reset()
+            self.send_latency.reset()
+            self.send_duration.reset()
             
             await self.send_success("监控已停止并重置")
             await self.send_monitor_status()
@@ -740,29 +904,64 @@ class SignalMonitorConsumer(AsyncWebsocketConsumer):
                 return
             
             # 添加调试信息
-            logger.info(f"准备保存监控数据:")
-            logger.info(f"  时间轴长度: {len(self.all_time_axis)}")
-            logger.info(f"  启用的通道: {self.enabled_channels}")
-            logger.info(f"  累积的通道数据: {list(self.all_channel_data.keys())}")
-            
-            for ch in self.enabled_channels:
-                if ch in self.all_channel_data:
-                    data_length = len(self.all_channel_data[ch])
-                    logger.info(f"  CH{ch} 数据长度: {data_length}")
-                    if data_length > 0:
-                        # 检查有效数据（非NaN）
-                        valid_data = [x for x in self.all_channel_data[ch] if not np.isnan(x)]
-                        logger.info(f"  CH{ch} 有效数据点: {len(valid_data)}")
-                        if valid_data:
-                            logger.info(f"  CH{ch} 前5个有效值: {valid_data[:5]}")
-                            logger.info(f"  CH{ch} 数据范围: {min(valid_data):.4f}~{max(valid_data):.4f}")
-                        else:
-                            logger.info(f"  CH{ch} 只有NaN数据")
+            logger.info(f"准备保存监控数据: 时间轴长度{self.monitor_point_count}, 启用的通道{self.enabled_channels}")
+
+            nan_filled_channels = []
+            group_channels = self.rate_group_channels()
+            grouped = {ch for channels in group_channels.values() for ch in channels}
+            main_channels = [ch for ch in self.enabled_channels if ch not in grouped]
+
+            def concat_channels(data_chunks, channels, points):
+                # 持久化边界：拼接分块数组并转换为列表，缺失的通道用NaN填充（记入完整性信息）
+                result = {}
+                for ch in channels:
+                    chunks = data_chunks.get(ch)
+                    if chunks:
+                        result[ch] = np.concatenate(chunks).tolist()
                     else:
-                        logger.info(f"  CH{ch} 数据为空")
-                else:
-                    logger.info(f"  CH{ch} 没有数据")
-            
+                        logger.warning(f"  CH{ch} 没有数据，用NaN填充")
+                        result[ch] = [float('nan')] * points
+                        nan_filled_channels.append(ch)
+                return result
+
+            def time_base(sample_rate, points, bursts=None):
+                # 隐式时间轴：第i个样本的时刻为 t0 + i × dt，只在导出CSV时生成时间列
+                base = {'t0': 0.0, 'dt': 1.0 / sample_rate, 'sample_rate': sample_rate, 'points': points}
+                if bursts is not None:
+                    base['bursts'] = bursts
+                return base
+
+            main_rate = self.monitor_config['sample_rate']
+            if not main_channels and group_channels:
+                # 全部通道都在降速组中：最高速率组作为主数据（与落盘记录的主记录一致）
+                main_rate = max(group_channels)
+                main_channels = group_channels.pop(main_rate)
+                top_group = self.rate_group_data.get(main_rate, {})
+                main_data_chunks, main_points = top_group.get('channel_data', {}), top_group.get('points', 0)
+            else:
+                main_data_chunks, main_points = self.all_channel_data, self.monitor_point_count
+            # 采集偏移表的样本序号以监控采样率计，换算到主数据的采样率
+            bursts = [dict(burst, index=burst['index'] * main_rate // self.monitor_config['sample_rate'])
+                      for burst in self.burst_offsets]
+
+            rate_groups = []
+            if self.recording_info:
+                # 数据已在本地文件中，只告知记录名称，由保存接口从文件流式导出
+                channel_data = {}
+                main_time_base = time_base(main_rate, self.recording_info['points_per_channel'], bursts)
+            else:
+                channel_data = concat_channels(main_data_chunks, main_channels, main_points)
+                main_time_base = time_base(main_rate, main_points, bursts)
+                for rate, channels in sorted(group_channels.items(), reverse=True):
+                    group = self.rate_group_data.get(rate, {})
+                    points = group.get('points', 0)
+                    rate_groups.append({
+                        'sample_rate': rate,
+                        'channels': channels,
+                        'time_base': time_base(rate, points),
+                        'channel_data': concat_channels(group.get('channel_data', {}), channels, points)
+                    })
+
             # 准备保存的数据
             save_data = {
                 'task_name': data.get('task_name', '未命名任务'),
@@ -773,10 +972,26 @@ class SignalMonitorConsumer(AsyncWebsocketConsumer):
                 'channel_configs': self.channel_configs,
                 'enabled_channels': self.enabled_channels,
                 'monitor_data': {
-                    'time_axis': self.all_time_axis,
-                    'channel_data': self.all_channel_data
+                    'time_base': main_time_base,
+                    'channel_data': channel_data,
+                    # 降速组的数据各自带时间基准，主数据只含以监控采样率采集的通道
+                    'rate_groups': rate_groups
                 },
-                'total_acquisitions': self.total_acquisitions
+                'total_acquisitions': self.total_acquisitions,
+                # 保存的数据是否完整只取决于样本序号缺口与NaN填充，发送队列丢弃只影响实时显示
+                'integrity': dict(self.integrity.metrics(), nan_filled_channels=nan_filled_channels,
+                                  lossless=self.integrity.gap_count == 0 and not nan_filled_channels),
+                'recording': {
+                    'name': os.path.basename(self.recording_info['path']),
+                    'points_per_channel': self.recording_info['points_per_channel'],
+                    'bytes_written': self.recording_info['bytes_written'],
+                    'groups': [{
+                        'name': os.path.basename(group['path']),
+                        'sample_rate': group['sample_rate'],
+                        'channels': group['channels'],
+                        'points_per_channel': group['points_per_channel'],
+                    } for group in self.recording_info.get('groups', [])],
+                } if self.recording_info else None
             }
             
             # 发送保存成功消息
@@ -801,7 +1016,7 @@ class SignalMonitorConsumer(AsyncWebsocketConsumer):
             complete_data = {
                 'acquisition_count': self.acquisition_count,
                 'total_acquisitions': self.total_acquisitions,
-                'data_points': len(self.all_time_axis),
+                'data_points': self.monitor_point_count,
                 'enabled_channels': len(self.enabled_channels),
                 'duration_minutes': duration_minutes,
                 'sample_rate': self.monitor_config.get('sample_rate', 0)
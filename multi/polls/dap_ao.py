@@ -0,0 +1,376 @@
+"""
+AO流式输出与标准激励波形缓存
+AoStreamer 在后台线程中按块向AO FIFO补充数据（非循环模式），支持生成器、数组与内存映射文件，
+适用于扫频、实测振动谱回放等过长或非周期的激励信号；
+WaveformCache 按参数缓存预先生成的float32波形，重复输出标准激励时无需重新计算
+"""
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterator, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# AO FIFO深度（每通道点数），补充数据时队列中的待输出点数不超过该值
+AO_FIFO_POINTS = 32 * 1024
+
+
+class WaveformCache:
+    """
+    标准激励波形缓存（LRU）
+
+    键为波形参数，值为只读的float32数组，可直接作为 SetUSB5AoDataFifo 的数据指针。
+    周期波形按整数个周期生成，循环输出时首尾相接无相位跳变。
+    """
+
+    KINDS = ('sine', 'square', 'triangle', 'sawtooth', 'chirp', 'dc', 'noise')
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, min_points: int = 1000):
+        """
+        初始化缓存
+
+        Args:
+            max_bytes: 缓存占用内存上限
+            min_points: 周期波形的最少点数（不足时生成多个周期）
+        """
+        self.max_bytes = max_bytes
+        self.min_points = min_points
+        self._items: 'OrderedDict[tuple, np.ndarray]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, kind: str, sample_rate_hz: int, frequency: float = 1000.0, amplitude: float = 1.0,
+            offset: float = 0.0, **params) -> np.ndarray:
+        """
+        获取标准波形（未缓存时生成）
+
+        Args:
+            kind: 波形类型 sine/square/triangle/sawtooth/chirp/dc/noise
+            sample_rate_hz: 输出采样率
+            frequency: 频率(Hz)；chirp为起始频率
+            amplitude: 幅值(V)
+            offset: 直流偏置(V)
+            **params: 其他参数，如 duty(方波占空比)、end_frequency/duration_s(chirp)、
+                      duration_s/seed(noise)、phase(起始相位, 弧度)
+
+        Returns:
+            np.ndarray: 只读float32波形
+        """
+        if kind not in self.KINDS:
+            raise ValueError(f"未知的波形类型: {kind}")
+        key = (kind, int(sample_rate_hz), float(frequency), float(amplitude), float(offset),
+               tuple(sorted(params.items())))
+        with self._lock:
+            data = self._items.get(key)
+            if data is not None:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return data
+            self.misses += 1
+
+        data = self._generate(kind, int(sample_rate_hz), frequency, amplitude, offset, params)
+        data.setflags(write=False)
+
+        with self._lock:
+            if key not in self._items:
+                self._items[key] = data
+                self.bytes += data.nbytes
+                while self.bytes > self.max_bytes and len(self._items) > 1:
+                    _, evicted = self._items.popitem(last=False)
+                    self.bytes -= evicted.nbytes
+                    self.evictions += 1
+        return data
+
+    def _generate(self, kind: str, sample_rate_hz: int, frequency: float, amplitude: float,
+                  offset: float, params: Dict) -> np.ndarray:
+        """按参数生成波形"""
+        if sample_rate_hz <= 0:
+            raise ValueError(f"采样率无效: {sample_rate_hz}")
+
+        if kind == 'dc':
+            return np.full(self.min_points, offset, dtype=np.float32)
+
+        if kind in ('chirp', 'noise'):
+            duration_s = float(params.get('duration_s', 1.0))
+            points = max(1, int(round(duration_s * sample_rate_hz)))
+            t = np.arange(points, dtype=np.float64) / sample_rate_hz
+            if kind == 'chirp':
+                # 线性扫频：f(t) = f0 + (f1 - f0) * t / T
+                end_frequency = float(params.get('end_frequency', frequency))
+                k = (end_frequency - frequency) / duration_s
+                phase = 2 * np.pi * (frequency * t + 0.5 * k * t * t) + params.get('phase', 0.0)
+                data = amplitude * np.sin(phase) + offset
+            else:
+                rng = np.random.default_rng(params.get('seed', 0))
+                data = amplitude * rng.standard_normal(points) + offset
+            return data.astype(np.float32)
+
+        if frequency <= 0:
+            raise ValueError(f"频率无效: {frequency}")
+        # 周期波形：取整数个周期，使点数不少于 min_points
+        periods = max(1, int(np.ceil(self.min_points * frequency / sample_rate_hz)))
+        points = max(2, int(round(periods * sample_rate_hz / frequency)))
+        cycle_pos = (np.arange(points, dtype=np.float64) * periods / points
+                     + params.get('phase', 0.0) / (2 * np.pi)) % 1.0
+        if kind == 'sine':
+            data = np.sin(2 * np.pi * cycle_pos)
+        elif kind == 'square':
+            data = np.where(cycle_pos < params.get('duty', 0.5), 1.0, -1.0)
+        elif kind == 'triangle':
+            data = 1.0 - 4.0 * np.abs(cycle_pos - 0.5)
+        else:
+            data = 2.0 * cycle_pos - 1.0
+        return (amplitude * data + offset).astype(np.float32)
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._items.clear()
+            self.bytes = 0
+
+    def metrics(self) -> Dict:
+        """缓存统计"""
+        with self._lock:
+            return {
+                'entries': len(self._items),
+                'bytes': self.bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+
+_shared_cache: Optional[WaveformCache] = None
+_shared_cache_lock = threading.Lock()
+
+
+def get_waveform_cache() -> WaveformCache:
+    """进程内共享的波形缓存（各驱动实例、各WebSocket连接共用）"""
+    global _shared_cache
+    with _shared_cache_lock:
+        if _shared_cache is None:
+            _shared_cache = WaveformCache()
+        return _shared_cache
+
+
+def open_waveform_source(source: Any) -> Any:
+    """
+    将文件路径解析为内存映射数组：.npy 文件按其头信息映射，其他文件按原始float32数据映射
+    其他类型原样返回
+    """
+    if isinstance(source, (str, os.PathLike)):
+        path = os.fspath(source)
+        if path.endswith('.npy'):
+            return np.load(path, mmap_mode='r')
+        return np.memmap(path, dtype=np.float32, mode='r')
+    return source
+
+
+def iter_chunks(source: Any, chunk_points: int, cycles: int = 1) -> Iterator[np.ndarray]:
+    """
+    按块产生连续的float32数据
+
+    Args:
+        source: 一维数组/内存映射数组，或产生一维数组的可迭代对象（生成器）
+        chunk_points: 每块点数
+        cycles: 数组数据源的重复次数（0为无限重复）；可迭代对象忽略该参数
+    """
+    if isinstance(source, np.ndarray):
+        data = source.reshape(-1)
+        if len(data) == 0:
+            return
+        cycle = 0
+        while cycles == 0 or cycle < cycles:
+            for start in range(0, len(data), chunk_points):
+                # 内存映射数据只在此处按块读入
+                yield np.ascontiguousarray(data[start:start + chunk_points], dtype=np.float32)
+            cycle += 1
+        return
+
+    for block in source:
+        block = np.asarray(block).reshape(-1)
+        for start in range(0, len(block), chunk_points):
+            yield np.ascontiguousarray(block[start:start + chunk_points], dtype=np.float32)
+
+
+class AoStreamer:
+    """
+    AO流式输出
+
+    通道工作在非循环模式，启动时先预填 lead_seconds 的数据再软件触发，之后后台线程按块补充。
+    USB5000.dll 不提供AO FIFO剩余点数查询，因此按触发后经过的时间与采样率推算已输出点数，
+    使FIFO中的待输出数据保持在 lead_seconds 左右；数据来不及补充时记为欠载（硬件保持最后输出值）。
+    """
+
+    def __init__(self,
+                 driver: Any,
+                 channel: int,
+                 source: Any,
+                 sample_rate_hz: int,
+                 chunk_points: Optional[int] = None,
+                 lead_seconds: float = 0.2,
+                 cycles: int = 1,
+                 fifo_points: int = AO_FIFO_POINTS,
+                 on_finished: Optional[Callable[['AoStreamer'], None]] = None):
+        """
+        初始化流式输出
+
+        Args:
+            driver: USB5121Driver 实例（使用其 configure_ao_output / write_ao_fifo / trigger_ao 方法）
+            channel: AO通道号(0-3)
+            source: 数据源，数组、内存映射数组、文件路径或产生数组的生成器
+            sample_rate_hz: 输出采样率
+            chunk_points: 每次补充的点数，默认为 lead_seconds 对应点数的1/4
+            lead_seconds: FIFO中保持的待输出时长
+            cycles: 数组数据源的重复次数（0为无限重复）
+            fifo_points: AO FIFO深度，待输出点数不超过该值
+            on_finished: 数据全部输出完毕或停止后的回调
+        """
+        self.driver = driver
+        self.channel = channel
+        self.sample_rate_hz = max(1, int(sample_rate_hz))
+        self.lead_points = max(2, min(fifo_points, int(self.sample_rate_hz * lead_seconds)))
+        self.chunk_points = max(1, min(self.lead_points, chunk_points or self.lead_points // 4))
+        self.on_finished = on_finished
+        self._chunks = iter_chunks(open_waveform_source(source), self.chunk_points, cycles)
+
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._start_time: Optional[float] = None
+        self.finished = threading.Event()
+
+        # 统计
+        self.written_points = 0
+        self.chunks = 0
+        self.underruns = 0
+        self.underrun_points = 0
+        self.min_queued_points = self.lead_points
+        self.error: Optional[str] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def played_points(self) -> int:
+        """按触发后经过的时间推算的已输出点数"""
+        if self._start_time is None:
+            return 0
+        return int((time.perf_counter() - self._start_time) * self.sample_rate_hz)
+
+    def start(self) -> bool:
+        """配置通道、预填FIFO并触发输出，然后启动补充线程"""
+        if not self.driver.configure_ao_output(self.channel, self.driver.AO_MODE_CONTINUOUS,
+                                               self.sample_rate_hz, 0):
+            return False
+        try:
+            exhausted = False
+            while self.written_points < self.lead_points:
+                if not self._write_next():
+                    exhausted = True
+                    break
+            if self.written_points == 0:
+                logger.error(f"AO通道{self.channel}流式输出数据源为空")
+                return False
+            if not self.driver.trigger_ao(self.channel):
+                return False
+            self._start_time = time.perf_counter()
+        except Exception as e:
+            logger.error(f"AO通道{self.channel}流式输出预填异常: {e}")
+            return False
+
+        self._thread = threading.Thread(target=self._run, args=(exhausted,), daemon=True,
+                                        name=f"ao-stream-{self.channel}")
+        self._thread.start()
+        logger.info(f"AO通道{self.channel}流式输出已启动: {self.sample_rate_hz}Hz, "
+                    f"预填{self.written_points}点, 每块{self.chunk_points}点")
+        return True
+
+    def stop(self, timeout: float = 2.0):
+        """停止补充数据（不清除已写入FIFO的数据，由调用方决定是否清除AO触发）"""
+        self._stop_event.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """等待数据全部输出完毕"""
+        return self.finished.wait(timeout)
+
+    def _write_next(self) -> bool:
+        """写入下一块数据，数据源耗尽时返回False"""
+        chunk = next(self._chunks, None)
+        if chunk is None:
+            return False
+        if len(chunk) and not self.driver.write_ao_fifo(self.channel, chunk):
+            raise RuntimeError("写入AO FIFO失败")
+        self.written_points += len(chunk)
+        self.chunks += 1
+        return True
+
+    def _run(self, exhausted: bool):
+        """补充线程：待输出点数低于 lead_points - chunk_points 时写入下一块"""
+        low_watermark = self.lead_points - self.chunk_points
+        underrun = False
+        try:
+            while not self._stop_event.is_set():
+                queued = self.written_points - self.played_points()
+                if exhausted:
+                    if queued <= 0:
+                        break
+                    self._stop_event.wait(queued / self.sample_rate_hz)
+                    continue
+
+                if queued < 0:
+                    if not underrun:
+                        self.underruns += 1
+                        logger.warning(f"AO通道{self.channel}流式输出欠载: 缺少{-queued}点")
+                    underrun = True
+                else:
+                    underrun = False
+                if queued < self.min_queued_points:
+                    self.min_queued_points = queued
+
+                if queued <= low_watermark:
+                    if underrun:
+                        # 硬件在欠载期间保持最后输出值，后续数据顺延输出
+                        self.underrun_points += -queued
+                        self._start_time += -queued / self.sample_rate_hz
+                    if not self._write_next():
+                        exhausted = True
+                    continue
+                self._stop_event.wait((queued - low_watermark) / self.sample_rate_hz)
+        except Exception as e:
+            self.error = str(e)
+            logger.error(f"AO通道{self.channel}流式输出异常: {e}")
+        finally:
+            self.finished.set()
+            if self.on_finished:
+                try:
+                    self.on_finished(self)
+                except Exception as e:
+                    logger.error(f"AO流式输出结束回调异常: {e}")
+
+    def metrics(self) -> Dict:
+        """流式输出统计"""
+        return {
+            'channel': self.channel,
+            'sample_rate_hz': self.sample_rate_hz,
+            'lead_points': self.lead_points,
+            'chunk_points': self.chunk_points,
+            'written_points': self.written_points,
+            'played_points': min(self.played_points(), self.written_points),
+            'chunks': self.chunks,
+            'underruns': self.underruns,
+            'underrun_points': self.underrun_points,
+            'min_queued_points': self.min_queued_points,
+            'running': self.running,
+            'finished': self.finished.is_set(),
+            'error': self.error,
+        }
@@ -0,0 +1,295 @@
+"""
+asyncio 原生的采集卡驱动外观
+所有驱动调用在一个专用I/O线程中按提交顺序串行执行，不占用事件循环默认线程池；
+驱动线程产生的数据经 loop.call_soon_threadsafe 投递到事件循环，以异步迭代器的形式消费，无需轮询
+"""
+import asyncio
+import logging
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+from .dap_config import ConfigTransaction
+from .dap_process import create_driver
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncStream:
+    """
+    任意线程发布、事件循环中消费的有界流
+
+    publish() 线程安全，数据经 call_soon_threadsafe 进入事件循环后唤醒等待中的消费者；
+    消费方使用 async for 或 await get()。
+
+    背压：提供 merge 时，消费者落后（流中已有未取走的数据）时新数据优先合并到已排队的数据中
+    （从队尾向前找可合并的一条），消费者下次取到的是一个更大的数据块；
+    仍无法容纳时丢弃最旧的数据并调用 on_drop(被丢弃的数据)。
+    """
+
+    _CLOSED = object()
+
+    def __init__(self, loop: Optional[asyncio.AbstractEventLoop] = None, maxlen: int = 100,
+                 on_drop: Optional[Callable[[Any], None]] = None,
+                 merge: Optional[Callable[[Any, Any], Any]] = None):
+        """
+        Args:
+            loop: 消费所在的事件循环，默认为当前运行中的事件循环
+            maxlen: 最多缓存的数据条数
+            on_drop: 数据因队满被丢弃时的回调（在事件循环中调用）
+            merge: 合并函数 merge(已排队的数据, 新数据) -> 合并后的数据，不可合并时返回 None（在事件循环中调用）
+        """
+        self.loop = loop or asyncio.get_running_loop()
+        self.maxlen = maxlen
+        self.on_drop = on_drop
+        self.merge = merge
+        self._items: deque = deque()
+        self._waiter: Optional[asyncio.Future] = None
+        self._closed = False
+        self.published = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.high_watermark = 0
+
+    def __len__(self):
+        return len(self._items)
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def publish(self, item: Any) -> bool:
+        """
+        发布数据（任意线程）
+
+        Returns:
+            bool: 事件循环已关闭或流已关闭时返回 False
+        """
+        if self._closed:
+            return False
+        try:
+            self.loop.call_soon_threadsafe(self._append, item)
+            return True
+        except RuntimeError:
+            # 事件循环已关闭（连接断开后驱动仍有数据到达）
+            return False
+
+    def _append(self, item: Any):
+        if item is self._CLOSED:
+            self._closed = True
+        elif self._closed:
+            return
+        else:
+            self.published += 1
+            if self._items and self.merge is not None and self._coalesce(item):
+                return
+            if len(self._items) >= self.maxlen:
+                dropped = self._items.popleft()
+                self.dropped += 1
+                if self.on_drop is not None:
+                    try:
+                        self.on_drop(dropped)
+                    except Exception as e:
+                        logger.error(f"数据流丢弃回调异常: {e}")
+            self._items.append(item)
+            if len(self._items) > self.high_watermark:
+                self.high_watermark = len(self._items)
+        waiter = self._waiter
+        if waiter is not None and not waiter.done():
+            waiter.set_result(None)
+
+    def _coalesce(self, item: Any) -> bool:
+        """将新数据合并到已排队的数据中（消费者此时必然不在等待，无需唤醒）"""
+        for i in range(len(self._items) - 1, -1, -1):
+            try:
+                merged = self.merge(self._items[i], item)
+            except Exception as e:
+                logger.error(f"数据流合并异常: {e}")
+                return False
+            if merged is not None:
+                self._items[i] = merged
+                self.coalesced += 1
+                return True
+        return False
+
+    def metrics(self) -> Dict:
+        """发布、合并、丢弃计数与当前/最高深度"""
+        return {
+            'depth': len(self._items),
+            'maxlen': self.maxlen,
+            'high_watermark': self.high_watermark,
+            'published': self.published,
+            'coalesced': self.coalesced,
+            'dropped': self.dropped,
+        }
+
+    async def get(self) -> Any:
+        """
+        取出下一条数据
+
+        Raises:
+            StopAsyncIteration: 流已关闭且数据已取完
+        """
+        while not self._items:
+            if self._closed:
+                raise StopAsyncIteration
+            self._waiter = self.loop.create_future()
+            try:
+                await self._waiter
+            finally:
+                self._waiter = None
+        return self._items.popleft()
+
+    def clear(self):
+        """丢弃尚未消费的数据（事件循环中调用）"""
+        self._items.clear()
+
+    def close(self):
+        """关闭流：已发布的数据取完后迭代结束（任意线程）"""
+        try:
+            self.loop.call_soon_threadsafe(self._append, self._CLOSED)
+        except RuntimeError:
+            self._closed = True
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> Any:
+        return await self.get()
+
+
+class AsyncUSB5121Driver:
+    """
+    USB5121Driver / ProcessUSB5121Driver 的 asyncio 外观
+
+    控制命令提交到专属的单线程执行器，按调用顺序执行，返回值与同步驱动一致；
+    未传入回调的采集方法把数据包发布到 packets 流，触发事件发布到 events 流：
+
+        driver = await AsyncUSB5121Driver.create()
+        await driver.open_device()
+        await driver.start_continuous_acquisition()
+        async for packet in driver.packets:
+            ...
+
+    未单独封装的驱动方法通过属性访问得到对应的协程函数，非方法属性直接返回其值。
+    """
+
+    def __init__(self, driver: Any, loop: Optional[asyncio.AbstractEventLoop] = None,
+                 executor: Optional[ThreadPoolExecutor] = None, max_pending: int = 100):
+        """
+        Args:
+            driver: 同步驱动实例
+            loop: 所在事件循环，默认为当前运行中的事件循环
+            executor: 执行驱动调用的单线程执行器，默认新建
+            max_pending: packets / events 流最多缓存的条数
+        """
+        self.driver = driver
+        self.loop = loop or asyncio.get_running_loop()
+        self._executor = executor or ThreadPoolExecutor(max_workers=1, thread_name_prefix='dap-io')
+        self.packets = AsyncStream(self.loop, max_pending)
+        self.events = AsyncStream(self.loop, max_pending)
+
+    @classmethod
+    async def create(cls, max_pending: int = 100, **driver_kwargs) -> 'AsyncUSB5121Driver':
+        """在I/O线程中创建驱动（可能加载DLL或启动采集进程）"""
+        executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='dap-io')
+        loop = asyncio.get_running_loop()
+        driver = await asyncio.wrap_future(executor.submit(create_driver, **driver_kwargs))
+        return cls(driver, loop, executor, max_pending)
+
+    async def call(self, func: Callable, *args, **kwargs) -> Any:
+        """在I/O线程中执行 func(*args, **kwargs)（在当前事件循环中等待，原事件循环结束后仍可关闭设备）"""
+        return await asyncio.wrap_future(self._executor.submit(func, *args, **kwargs))
+
+    def __getattr__(self, name: str):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        value = getattr(self.driver, name)
+        if not callable(value):
+            return value
+
+        async def method(*args, **kwargs):
+            return await self.call(value, *args, **kwargs)
+        method.__name__ = name
+        return method
+
+    # ------------------------------------------------------------------
+    # 设备与配置
+
+    async def open_device(self) -> bool:
+        return await self.call(self.driver.open_device)
+
+    async def close_device(self) -> bool:
+        return await self.call(self.driver.close_device)
+
+    def configure_transaction(self, force: bool = False) -> ConfigTransaction:
+        """创建配置事务（只在本地暂存，不访问设备），用 await commit(tx) 下发"""
+        return self.driver.configure_transaction(force)
+
+    async def commit(self, transaction: ConfigTransaction) -> bool:
+        """在I/O线程中提交配置事务"""
+        return await self.call(transaction.commit)
+
+    async def set_ai_calibrations(self, configs: Dict[int, Optional[Dict]]) -> bool:
+        return await self.call(self.driver.set_ai_calibrations, configs)
+
+    async def set_ai_rate_groups(self, groups: Optional[Dict], sample_rate_hz: Optional[int] = None) -> bool:
+        return await self.call(self.driver.set_ai_rate_groups, groups, sample_rate_hz)
+
+    # ------------------------------------------------------------------
+    # 采集控制
+
+    async def start_continuous_acquisition(self, callback: Optional[Callable] = None) -> bool:
+        """开始连续采集，callback 为 None 时数据包发布到 packets 流"""
+        return await self.call(self.driver.start_continuous_acquisition, callback or self.packets.publish)
+
+    async def stop_continuous_acquisition(self) -> bool:
+        return await self.call(self.driver.stop_continuous_acquisition)
+
+    async def start_ai_acquisition(self, data_callback: Optional[Callable] = None,
+                                   trigger_callback: Optional[Callable] = None) -> bool:
+        """开始AI采集，data_callback 为 None 时数据包发布到 packets 流"""
+        return await self.call(self.driver.start_ai_acquisition, data_callback or self.packets.publish,
+                               trigger_callback)
+
+    async def stop_ai_acquisition(self) -> bool:
+        return await self.call(self.driver.stop_ai_acquisition)
+
+    async def trigger_ai_acquisition(self) -> bool:
+        return await self.call(self.driver.trigger_ai_acquisition)
+
+    async def start_burst_mode(self, data_callback: Optional[Callable] = None,
+                               sample_rate_hz: Optional[int] = None,
+                               oneshot_points: Optional[int] = None) -> bool:
+        """进入连发单次采集模式，data_callback 为 None 时数据包发布到 packets 流"""
+        return await self.call(self.driver.start_burst_mode, data_callback or self.packets.publish,
+                               sample_rate_hz, oneshot_points)
+
+    async def acquire_burst(self) -> Any:
+        """触发一次采集并等待其最后一个数据包回调完成，返回本次采集的每通道点数"""
+        future: Future = await self.call(self.driver.acquire_burst)
+        return await asyncio.wrap_future(future, loop=self.loop)
+
+    async def stop_burst_mode(self) -> bool:
+        return await self.call(self.driver.stop_burst_mode)
+
+    async def start_event_capture(self, conditions: List[Any], pre_points: int = 1000, post_points: int = 1000,
+                                  holdoff_points: int = 0, on_event: Optional[Callable] = None) -> bool:
+        """开始触发事件采集，on_event 为 None 时事件发布到 events 流"""
+        return await self.call(self.driver.start_event_capture, conditions, pre_points, post_points,
+                               holdoff_points, on_event=on_event or self.events.publish)
+
+    async def stop_event_capture(self) -> Optional[Dict]:
+        return await self.call(self.driver.stop_event_capture)
+
+    # ------------------------------------------------------------------
+
+    async def shutdown(self):
+        """关闭设备、结束数据流并释放I/O线程"""
+        try:
+            await self.close_device()
+        except Exception as e:
+            logger.error(f"关闭设备异常: {e}")
+        self.packets.close()
+        self.events.close()
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,143 @@
+"""
+AI采集数据环形缓冲区
+预分配的float32槽位环，DLL直接写入槽位内存，下游通过带序号的只读视图访问，避免逐次分配与拷贝
+"""
+import ctypes
+import threading
+import logging
+from typing import Optional, Tuple
+import numpy as np
+
+from .dap_layout import AiLayout
+from .dap_calibration import CalibrationPlan
+
+logger = logging.getLogger(__name__)
+
+
+class AiBlock:
+    """
+    环形缓冲区中一次读取的数据块句柄
+
+    data 为 (通道数, 每通道点数) 的只读视图，直接引用环形缓冲区槽位内存，行顺序见 layout.channels；
+    units 为各行的工程量单位，None表示未标定（单位为伏）。
+    槽位被后续读取覆盖后 is_valid() 返回 False，需要长期保存的数据应在失效前完成拷贝/序列化。
+    """
+
+    __slots__ = ('ring', 'seq', 'data', 'layout', 'units')
+
+    def __init__(self, ring: 'AiRingBuffer', seq: int, data: np.ndarray, layout: Optional[AiLayout] = None,
+                 units: Optional[Tuple[str, ...]] = None):
+        self.ring = ring
+        self.seq = seq
+        self.data = data
+        self.layout = layout
+        self.units = units
+
+    @property
+    def num_channels(self) -> int:
+        return self.data.shape[0]
+
+    @property
+    def points_per_channel(self) -> int:
+        return self.data.shape[1]
+
+    def is_valid(self) -> bool:
+        """槽位是否尚未被覆盖"""
+        return self.ring.is_valid(self.seq)
+
+
+class AiRingBuffer:
+    """
+    AI数据环形缓冲区
+
+    每个槽位容纳一次 USB5GetAi 的全部数据（排列方式由 AiLayout 描述），
+    提交后以 (通道数, N) 的只读视图交给下游，整个过程不产生额外拷贝。
+    仅允许单个写入线程（驱动读取线程）调用 reserve/commit。
+    """
+
+    def __init__(self, slot_points: int, num_slots: int = 128):
+        """
+        初始化环形缓冲区
+
+        Args:
+            slot_points: 每个槽位的容量（所有通道合计的数据点数）
+            num_slots: 槽位数量
+        """
+        if slot_points <= 0 or num_slots < 2:
+            raise ValueError(f"环形缓冲区参数无效: slot_points={slot_points}, num_slots={num_slots}")
+        self.slot_points = slot_points
+        self.num_slots = num_slots
+        self._storage = np.zeros((num_slots, slot_points), dtype=np.float32)
+        # 预先构造各槽位的ctypes指针，读取时无需重复转换
+        self._slot_pointers = [
+            self._storage[i].ctypes.data_as(ctypes.POINTER(ctypes.c_float)) for i in range(num_slots)
+        ]
+        self._lock = threading.Lock()
+        self.write_seq = 0  # 下一个待写入块的序号
+
+    @property
+    def nbytes(self) -> int:
+        return self._storage.nbytes
+
+    def reserve(self, total_points: int):
+        """
+        获取下一个槽位的写入指针
+
+        Args:
+            total_points: 本次写入的数据点数（通道数×每通道点数）
+
+        Returns:
+            ctypes float指针，可直接传给 USB5GetAi
+        """
+        if total_points > self.slot_points:
+            raise ValueError(f"单次读取点数({total_points})超过槽位容量({self.slot_points})")
+        return self._slot_pointers[self.write_seq % self.num_slots]
+
+    def commit(self, layout: AiLayout, points_per_channel: int,
+               calibration: Optional[CalibrationPlan] = None) -> AiBlock:
+        """
+        提交已写入的槽位
+
+        Args:
+            layout: 本次读取的数据排列（启用通道与样本顺序）
+            points_per_channel: 每通道点数
+            calibration: 标定计划，在解交织视图上原地换算为工程量
+
+        Returns:
+            AiBlock: 带序号的只读数据块
+        """
+        with self._lock:
+            seq = self.write_seq
+        # 槽位在提交前只属于写入线程，可原地换算
+        view = layout.view(self._storage[seq % self.num_slots], points_per_channel)
+        units = None
+        if calibration is not None and calibration.calibrated:
+            calibration.apply(view)
+            units = calibration.units
+        with self._lock:
+            self.write_seq += 1
+        view.flags.writeable = False
+        return AiBlock(self, seq, view, layout, units)
+
+    def rollback(self, block: AiBlock) -> bool:
+        """
+        归还最近提交的槽位（数据已被拷贝或丢弃，不再被引用），下一次读取复用该槽位
+
+        Returns:
+            bool: block为最近提交的块时归还成功
+        """
+        with self._lock:
+            if block.ring is not self or block.seq != self.write_seq - 1:
+                return False
+            self.write_seq -= 1
+            return True
+
+    def is_valid(self, seq: int) -> bool:
+        """
+        判断序号为seq的块是否仍然有效
+
+        下一次 reserve 会覆盖 write_seq - num_slots 号块，因此保守地将其视为已失效。
+        """
+        with self._lock:
+            return self.write_seq - self.num_slots < seq < self.write_seq
+
@@ -0,0 +1,175 @@
+"""
+AI通道标定与工程量换算
+在读取线程中、数据提交到环形缓冲区时原地换算（与解交织视图融合），
+下游的实时推送、存储与模型训练都直接使用换算后的工程量
+"""
+import logging
+import threading
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .dap_layout import AiLayout
+
+logger = logging.getLogger(__name__)
+
+
+class ChannelCalibration:
+    """
+    单通道标定
+
+    工程量 = c0 + c1·V + c2·V² + ...（coefficients 按升幂排列）
+    仅有一次项时即仿射换算：工程量 = gain·V + offset
+    """
+
+    __slots__ = ('coefficients', 'unit')
+
+    def __init__(self, gain: float = 1.0, offset: float = 0.0,
+                 coefficients: Optional[Sequence[float]] = None, unit: str = 'V'):
+        """
+        Args:
+            gain: 增益（工程量/伏），传感器灵敏度折算后的系数
+            offset: 零点偏置（工程量）
+            coefficients: 多项式系数 [c0, c1, c2, ...]，给出时忽略 gain/offset
+            unit: 工程量单位
+        """
+        if coefficients is None:
+            coefficients = (offset, gain)
+        coefficients = tuple(float(c) for c in coefficients)
+        if not coefficients:
+            raise ValueError("标定多项式系数为空")
+        # 去掉末尾的零高次项
+        while len(coefficients) > 1 and coefficients[-1] == 0.0:
+            coefficients = coefficients[:-1]
+        self.coefficients: Tuple[float, ...] = coefficients
+        self.unit = unit
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any]) -> 'ChannelCalibration':
+        """
+        由通道配置字典构造
+
+        支持的键：sensitivity（工程量/伏，与前端换算一致）、gain、offset、coefficients、unit
+        """
+        if config.get('coefficients'):
+            calibration = cls(coefficients=config['coefficients'])
+        else:
+            gain = float(config.get('gain', 1.0)) * float(config.get('sensitivity', 1.0))
+            calibration = cls(gain=gain, offset=float(config.get('offset', 0.0)))
+        # 未指定单位时：恒等换算仍为伏，否则标记为通用工程量单位
+        calibration.unit = config.get('unit') or ('V' if calibration.coefficients == (0.0, 1.0) else 'EU')
+        return calibration
+
+    @property
+    def degree(self) -> int:
+        return len(self.coefficients) - 1
+
+    def is_identity(self) -> bool:
+        return self.coefficients == (0.0, 1.0) and self.unit == 'V'
+
+    def apply(self, volts: np.ndarray) -> np.ndarray:
+        """对单通道数据换算（返回新数组，用于离线数据）"""
+        return np.polynomial.polynomial.polyval(volts, self.coefficients).astype(np.float32)
+
+    def to_dict(self) -> Dict:
+        return {'coefficients': list(self.coefficients), 'unit': self.unit}
+
+    def __repr__(self):
+        return f"ChannelCalibration(coefficients={list(self.coefficients)}, unit={self.unit!r})"
+
+
+class CalibrationPlan:
+    """
+    某一数据排列下的标定执行计划
+
+    将各通道系数整理为 (通道数, 1) 的列向量，对整个 (通道数, 点数) 数据块一次完成换算；
+    全部为恒等标定时 apply 不做任何运算。
+    """
+
+    __slots__ = ('units', 'calibrated', '_gain', '_offset', '_poly', '_scratch')
+
+    def __init__(self, layout: AiLayout, calibrations: Dict[int, ChannelCalibration]):
+        cals = [calibrations.get(ch) for ch in layout.channels]
+        self.calibrated = any(cal is not None and not cal.is_identity() for cal in cals)
+        self.units: Optional[Tuple[str, ...]] = (
+            tuple(cal.unit if cal is not None else 'V' for cal in cals) if self.calibrated else None
+        )
+        self._gain = self._offset = self._poly = None
+        self._scratch: Optional[np.ndarray] = None
+        if not self.calibrated:
+            return
+
+        degree = max(cal.degree if cal is not None else 1 for cal in cals)
+        coeffs = np.zeros((len(cals), max(degree, 1) + 1), dtype=np.float32)
+        for i, cal in enumerate(cals):
+            if cal is None:
+                coeffs[i, 1] = 1.0
+            else:
+                coeffs[i, :len(cal.coefficients)] = cal.coefficients
+        if degree <= 1:
+            self._offset = coeffs[:, 0:1]
+            self._gain = coeffs[:, 1:2]
+        else:
+            # Horner 法：由最高次项开始，每次 y = y·V + c_k
+            self._poly = [coeffs[:, k:k + 1] for k in range(degree, -1, -1)]
+
+    def apply(self, data: np.ndarray):
+        """原地换算 (通道数, 点数) 数据块"""
+        if not self.calibrated:
+            return
+        if self._poly is None:
+            np.multiply(data, self._gain, out=data)
+            np.add(data, self._offset, out=data)
+            return
+        if self._scratch is None or self._scratch.size < data.size:
+            self._scratch = np.empty(data.size, dtype=np.float32)
+        acc = self._scratch[:data.size].reshape(data.shape)
+        acc[...] = self._poly[0]
+        for coeff in self._poly[1:]:
+            np.multiply(acc, data, out=acc)
+            np.add(acc, coeff, out=acc)
+        np.copyto(data, acc)
+
+
+class CalibrationTable:
+    """
+    驱动的通道标定表
+
+    set/clear 可在任意线程调用；读取线程通过 plan(layout) 获取按当前排列缓存的执行计划。
+    """
+
+    def __init__(self):
+        self._calibrations: Dict[int, ChannelCalibration] = {}
+        self._lock = threading.Lock()
+        self._plan: Optional[CalibrationPlan] = None
+        self._plan_layout: Optional[AiLayout] = None
+
+    def set(self, channel: int, calibration: Optional[ChannelCalibration]):
+        """设置通道标定，None 表示恢复为电压输出"""
+        with self._lock:
+            if calibration is None or calibration.is_identity():
+                self._calibrations.pop(channel, None)
+            else:
+                self._calibrations[channel] = calibration
+            self._plan = None
+
+    def clear(self):
+        with self._lock:
+            self._calibrations.clear()
+            self._plan = None
+
+    def get(self, channel: int) -> Optional[ChannelCalibration]:
+        with self._lock:
+            return self._calibrations.get(channel)
+
+    def plan(self, layout: AiLayout) -> CalibrationPlan:
+        """当前标定在给定排列下的执行计划（标定与排列不变时复用）"""
+        with self._lock:
+            if self._plan is None or self._plan_layout != layout:
+                self._plan = CalibrationPlan(layout, self._calibrations)
+                self._plan_layout = layout
+            return self._plan
+
+    def to_dict(self) -> Dict[int, Dict]:
+        with self._lock:
+            return {ch: cal.to_dict() for ch, cal in sorted(self._calibrations.items())}
@@ -0,0 +1,209 @@
+"""
+采集卡寄存器影子状态与配置事务
+驱动记录已下发到采集卡的寄存器值，配置事务只下发与影子状态不同的寄存器，
+监控间隙的重复配置几乎不产生DLL调用
+"""
+import time
+import ctypes
+import logging
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 寄存器键：(寄存器名, 通道号)，设备级寄存器的通道号为None
+RegisterKey = Tuple[str, Optional[int]]
+
+# 寄存器定义，按下发顺序排列：寄存器名 -> (DLL函数名, 通道参数类型, 值类型, 描述)
+# 通道参数类型为None表示设备级寄存器；通道开关须先于量程下发，采集模式须先于单次点数下发
+REGISTERS = {
+    'ai_chan_sel': ('SetUSB5AiChanSel', ctypes.c_int, ctypes.c_char, "AI通道开关"),
+    'ai_range': ('SetUSB5AiRange', ctypes.c_int, ctypes.c_float, "AI通道量程"),
+    'ai_sample_mode': ('SetUSB5AiSampleMode', None, ctypes.c_char, "AI采集模式"),
+    'ai_sample_rate_ns': ('SetUSB5AiSampleRate', None, ctypes.c_int, "AI采样率"),
+    'ai_oneshot_points': ('SetUSB5AiOneShotPoints', None, ctypes.c_uint, "AI单次采集点数"),
+    'ai_trig_source': ('SetUSB5AiTrigSource', None, ctypes.c_char, "AI触发源"),
+    'ai_conv_source': ('SetUSB5AiConvSource', None, ctypes.c_char, "AI时钟源"),
+    'ao_sample_mode': ('SetUSB5AoSampleMode', ctypes.c_char, ctypes.c_char, "AO输出模式"),
+    'ao_sample_rate_ns': ('SetUSB5AoSampleRate', ctypes.c_char, ctypes.c_uint, "AO采样率"),
+    'ao_trig_source': ('SetUSB5AoTrigSource', ctypes.c_char, ctypes.c_char, "AO触发源"),
+    'ao_conv_source': ('SetUSB5AoConvSource', ctypes.c_char, ctypes.c_char, "AO时钟源"),
+    'ao_cycle': ('SetUSB5AoCycle', ctypes.c_char, ctypes.c_uint, "AO循环次数"),
+}
+_REGISTER_ORDER = {name: index for index, name in enumerate(REGISTERS)}
+
+
+def register_order(key: RegisterKey) -> Tuple[int, int]:
+    """寄存器下发顺序"""
+    name, channel = key
+    return _REGISTER_ORDER[name], -1 if channel is None else channel
+
+
+def describe_register(key: RegisterKey) -> str:
+    """寄存器的可读描述，如 'AI通道量程[CH3]'"""
+    name, channel = key
+    label = REGISTERS[name][3]
+    return label if channel is None else f"{label}[CH{channel}]"
+
+
+class ShadowRegisters:
+    """
+    已下发到采集卡的寄存器值
+
+    键不存在表示状态未知（设备刚打开、下发失败或调用异常），下次配置时必然重新下发。
+    """
+
+    def __init__(self):
+        self._values: Dict[RegisterKey, Any] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: RegisterKey, default: Any = None) -> Any:
+        with self._lock:
+            return self._values.get(key, default)
+
+    def set(self, key: RegisterKey, value: Any):
+        with self._lock:
+            self._values[key] = value
+
+    def diff(self, registers: Dict[RegisterKey, Any]) -> Dict[RegisterKey, Any]:
+        """返回与影子状态不同（或状态未知）的寄存器"""
+        with self._lock:
+            return {key: value for key, value in registers.items()
+                    if key not in self._values or self._values[key] != value}
+
+    def invalidate(self, keys: Optional[Iterable[RegisterKey]] = None):
+        """将寄存器标记为状态未知，keys为None时清空全部"""
+        with self._lock:
+            if keys is None:
+                self._values.clear()
+            else:
+                for key in keys:
+                    self._values.pop(key, None)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """可序列化的影子状态，键为寄存器描述"""
+        with self._lock:
+            items = sorted(self._values.items(), key=lambda item: register_order(item[0]))
+        return {describe_register(key): value for key, value in items}
+
+
+class ConfigTransaction:
+    """
+    配置事务：先暂存目标寄存器值，commit 时一次性下发与影子状态不同的寄存器
+
+    用法:
+        with driver.configure_transaction() as tx:
+            tx.ai_channel(0, True, 10.0)
+            tx.ai_sample_rate(10000)
+        print(tx.report)
+    """
+
+    def __init__(self, driver: Any, force: bool = False):
+        """
+        Args:
+            driver: USB5121Driver（或其进程代理），提供 commit_configuration
+            force: 忽略影子状态，全部重新下发
+        """
+        self.driver = driver
+        self.force = force
+        self.registers: Dict[RegisterKey, Any] = {}
+        self.report: Optional[Dict] = None
+
+    def set(self, name: str, value: Any, channel: Optional[int] = None) -> 'ConfigTransaction':
+        """暂存一个寄存器值"""
+        if name not in REGISTERS:
+            raise ValueError(f"未知的寄存器: {name}")
+        self.registers[(name, channel)] = value
+        return self
+
+    def ai_channel(self, channel: int, enabled: bool, voltage_range: Optional[float] = None) -> 'ConfigTransaction':
+        """AI通道开关与量程（关闭的通道不下发量程）"""
+        if not (0 <= channel <= 15):
+            raise ValueError(f"AI通道号无效: {channel}")
+        self.set('ai_chan_sel', 1 if enabled else 0, channel)
+        if enabled and voltage_range is not None:
+            self.set('ai_range', float(voltage_range), channel)
+        return self
+
+    def ai_sample_mode(self, mode: int) -> 'ConfigTransaction':
+        if mode not in (0, 1):
+            raise ValueError(f"无效的采集模式: {mode}")
+        return self.set('ai_sample_mode', mode)
+
+    def ai_sample_rate(self, sample_rate_hz: int) -> 'ConfigTransaction':
+        if sample_rate_hz <= 0:
+            raise ValueError(f"无效的采样率: {sample_rate_hz}")
+        return self.set('ai_sample_rate_ns', int(1e9 / sample_rate_hz))
+
+    def ai_oneshot_points(self, points: int) -> 'ConfigTransaction':
+        if points <= 0:
+            raise ValueError(f"无效的采集点数: {points}")
+        return self.set('ai_oneshot_points', int(points))
+
+    def ai_sources(self, trigger_source: int = 0, clock_source: int = 0) -> 'ConfigTransaction':
+        self.set('ai_trig_source', trigger_source)
+        return self.set('ai_conv_source', clock_source)
+
+    def ao_output(self, channel: int, mode: int, sample_rate_hz: int, cycle_count: int = 0) -> 'ConfigTransaction':
+        """AO输出模式、采样率、触发源、时钟源与循环次数"""
+        if not (0 <= channel <= 3):
+            raise ValueError(f"AO通道号无效: {channel}")
+        self.set('ao_sample_mode', mode, channel)
+        self.set('ao_sample_rate_ns', int(1e9 / sample_rate_hz), channel)
+        self.set('ao_trig_source', 0, channel)
+        self.set('ao_conv_source', 0, channel)
+        return self.set('ao_cycle', cycle_count, channel)
+
+    def commit(self) -> bool:
+        """下发暂存的寄存器，结果保存在 report 中"""
+        self.report = self.driver.commit_configuration(self.registers, self.force)
+        return self.report['success']
+
+    def __enter__(self) -> 'ConfigTransaction':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.commit()
+        return False
+
+
+def apply_registers(dll: Any, device_index: Any, shadow: ShadowRegisters,
+                    registers: Dict[RegisterKey, Any], force: bool = False) -> Dict:
+    """
+    按定义顺序下发与影子状态不同的寄存器，并更新影子状态
+
+    Returns:
+        Dict: success / written / skipped / failed(失败的寄存器键列表) / elapsed_ms
+    """
+    start = time.perf_counter()
+    pending = dict(registers) if force else shadow.diff(registers)
+    failed: List[RegisterKey] = []
+    for key in sorted(pending, key=register_order):
+        name, channel = key
+        func_name, chan_type, value_type, _ = REGISTERS[name]
+        value = pending[key]
+        try:
+            func = getattr(dll, func_name)
+            if chan_type is None:
+                result = func(device_index, value_type(value))
+            else:
+                result = func(device_index, chan_type(channel), value_type(value))
+        except Exception as e:
+            logger.error(f"下发{describe_register(key)}异常: {e}")
+            result = None
+        if result == 0:
+            shadow.set(key, value)
+        else:
+            if result is not None:
+                logger.error(f"下发{describe_register(key)}={value}失败: {result}")
+            shadow.invalidate([key])
+            failed.append(key)
+
+    return {
+        'success': not failed,
+        'written': len(pending) - len(failed),
+        'skipped': len(registers) - len(pending),
+        'failed': failed,
+        'elapsed_ms': (time.perf_counter() - start) * 1000,
+    }
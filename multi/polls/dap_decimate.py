@@ -0,0 +1,357 @@
+"""
+多速率通道组的流式抽取
+温度、压力等慢变信号不必以振动通道的采样率输出与保存：按通道划分输出速率组，
+读取线程对降速组做抗混叠低通+抽取（多相FIR，跨数据块保留滤波器状态），各组以自己的采样率发出数据包
+
+滤波器为Kaiser窗零相位FIR：抽取后第m个样本对应输入第 m*factor 个样本的时刻（无群延迟），
+各速率组的时间轴 start_index/sample_rate 与全速率通道对齐。大抽取倍数分解为多级（每级不超过 MAX_STAGE_FACTOR）。
+"""
+import logging
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from .dap_packet import AiPacket
+
+logger = logging.getLogger(__name__)
+
+MAX_STAGE_FACTOR = 8  # 单级最大抽取倍数
+TAPS_PER_PHASE = 24  # 每个多相分支的抽头数（滤波器长度约 TAPS_PER_PHASE*factor）
+PASSBAND_RATIO = 0.8  # 截止频率相对输出奈奎斯特频率的比例
+KAISER_BETA = 8.0  # 阻带衰减约80dB
+
+
+def lowpass_taps(factor: int, taps_per_phase: int = TAPS_PER_PHASE) -> np.ndarray:
+    """
+    factor倍抽取的抗混叠低通滤波器（奇数长度、对称、直流增益为1）
+
+    Returns:
+        np.ndarray: 长度 2*(taps_per_phase*factor//2)+1 的float32抽头
+    """
+    half = taps_per_phase * factor // 2
+    n = np.arange(-half, half + 1, dtype=np.float64)
+    cutoff = PASSBAND_RATIO * 0.5 / factor  # 周期/样本
+    taps = 2 * cutoff * np.sinc(2 * cutoff * n) * np.kaiser(2 * half + 1, KAISER_BETA)
+    return (taps / taps.sum()).astype(np.float32)
+
+
+def split_factor(factor: int, max_stage: int = MAX_STAGE_FACTOR) -> List[int]:
+    """
+    将抽取倍数分解为各级倍数（先大后小，使第一级处理的样本最少经过的抽头最少）
+
+    大于 max_stage 的质因数单独成为一级
+    """
+    primes = []
+    n, p = factor, 2
+    while p * p <= n:
+        while n % p == 0:
+            primes.append(p)
+            n //= p
+        p += 1
+    if n > 1:
+        primes.append(n)
+    stages: List[int] = []
+    for prime in sorted(primes, reverse=True):
+        for i, stage in enumerate(stages):
+            if stage * prime <= max_stage:
+                stages[i] = stage * prime
+                break
+        else:
+            stages.append(prime)
+    return sorted(stages, reverse=True)
+
+
+class FirDecimator:
+    """
+    单级流式多相FIR抽取（多通道）
+
+    输出样本 m 为以输入样本 m*factor 为中心的加权和，按多相分解只计算需要输出的样本。
+    滤波器状态（最近 2*delay 个输入样本）跨数据块保留；输入样本序号不连续（新的一次采集或数据缺口）时
+    以新数据块的首个样本值填充历史重新开始，避免把缺口两侧的数据混在一起。
+    """
+
+    def __init__(self, factor: int, taps_per_phase: int = TAPS_PER_PHASE):
+        self.factor = int(factor)
+        self.taps = lowpass_taps(self.factor, taps_per_phase)
+        self.delay = (len(self.taps) - 1) // 2
+        # 多相分支：分支r的抽头为 taps[r::factor]，补零到相同长度
+        self.phase_taps = int(np.ceil(len(self.taps) / self.factor))
+        padded = np.zeros(self.phase_taps * self.factor, dtype=np.float32)
+        padded[:len(self.taps)] = self.taps
+        self._phases = padded.reshape(self.phase_taps, self.factor).T.copy()  # (factor, phase_taps)
+        self.reset()
+
+    def reset(self):
+        self._history: Optional[np.ndarray] = None  # 输入样本 [consumed-2*delay, consumed)
+        self._consumed = 0  # 已输入的下一个样本序号
+        self._next_center = 0  # 下一个输出样本对应的输入样本序号（m*factor）
+
+    def process(self, block: np.ndarray, start_index: int, final: bool = False) -> Tuple[np.ndarray, int]:
+        """
+        输入一个数据块
+
+        Args:
+            block: (通道数, 点数) 输入数据
+            start_index: 数据块首个样本的输入样本序号
+            final: 本次采集的最后一个数据块：以末尾样本值延拓，输出全部剩余样本并复位
+
+        Returns:
+            Tuple[np.ndarray, int]: (通道数, 输出点数) float32 输出，首个输出样本的输出样本序号
+        """
+        num_channels, points = block.shape
+        factor, delay = self.factor, self.delay
+        if self._history is None or start_index != self._consumed:
+            if points == 0:
+                return np.zeros((num_channels, 0), dtype=np.float32), -(-start_index // factor)
+            self._history = np.repeat(block[:, :1].astype(np.float32), 2 * delay, axis=1)
+            self._consumed = start_index
+            self._next_center = -(-start_index // factor) * factor
+        first = self._next_center // factor
+
+        # x[i] 对应输入样本 consumed-2*delay+i；末尾补零使各多相分支的跨步视图长度足够（补零处抽头为0）
+        tail = delay if final else 0
+        end = self._consumed + points + tail  # 可用输入样本的结束序号
+        parts = [self._history, block.astype(np.float32, copy=False)]
+        if final:
+            parts.append(np.repeat(parts[-1][:, -1:] if points else self._history[:, -1:], tail, axis=1))
+        parts.append(np.zeros((num_channels, factor * self.phase_taps), dtype=np.float32))
+        x = np.concatenate(parts, axis=1)
+
+        count = max(0, (end - 1 - delay - self._next_center) // factor + 1)
+        out = np.zeros((num_channels, count), dtype=np.float32)
+        if count:
+            j0 = self._next_center - self._consumed + delay  # 首个输出窗口在x中的起点
+            for r in range(factor):
+                branch = x[:, j0 + r::factor][:, :count + self.phase_taps - 1]
+                out += sliding_window_view(branch, self.phase_taps, axis=1) @ self._phases[r]
+
+        if final:
+            self.reset()
+        else:
+            self._history = x[:, points:points + 2 * delay].copy()
+            self._consumed += points
+            self._next_center += count * factor
+        return out, first
+
+
+class DecimationChain:
+    """多级流式抽取，总倍数为各级倍数之积"""
+
+    def __init__(self, factor: int, taps_per_phase: int = TAPS_PER_PHASE):
+        self.factor = int(factor)
+        self.stages = [FirDecimator(f, taps_per_phase) for f in split_factor(self.factor)]
+
+    def reset(self):
+        for stage in self.stages:
+            stage.reset()
+
+    def process(self, block: np.ndarray, start_index: int, final: bool = False) -> Tuple[np.ndarray, int]:
+        """输入一个数据块，返回 (抽取后的数据, 首个输出样本的输出样本序号)"""
+        for stage in self.stages:
+            block, start_index = stage.process(block, start_index, final)
+        return block, start_index
+
+
+class EnvelopeDecimator:
+    """
+    流式 min/max 包络抽取（实时显示用，多通道）
+
+    每 bucket 个输入样本（一个像素）输出一对 (最小值, 最大值)，按 min0, max0, min1, max1, ... 交错排列：
+    以 2×采样率/bucket 的速率绘制即为每个像素一条竖线，不会像抽点那样漏掉尖峰。
+    桶边界按输入样本序号对齐到 bucket 的整数倍，不足一桶的样本留到下一块；
+    输入样本序号不连续（新的一次采集或数据缺口）时丢弃未满的桶重新开始。
+    """
+
+    def __init__(self, bucket: int):
+        self.bucket = max(1, int(bucket))
+        self.reset()
+
+    def reset(self):
+        self._pending: Optional[np.ndarray] = None  # 未满一桶的输入样本 [pending_start, next_index)
+        self._pending_start = 0
+        self._next_index = 0
+
+    def process(self, block: np.ndarray, start_index: int, final: bool = False) -> Tuple[np.ndarray, int]:
+        """
+        输入一个数据块
+
+        Args:
+            block: (通道数, 点数) 输入数据
+            start_index: 数据块首个样本的输入样本序号
+            final: 本次采集的最后一个数据块：末尾不足一桶的样本也输出并复位
+
+        Returns:
+            Tuple[np.ndarray, int]: (通道数, 2×桶数) float32 交错的 min/max，首个输出值的输出序号（2×桶序号）
+        """
+        bucket = self.bucket
+        if self._pending is None or start_index != self._next_index:
+            self._pending = block[:, :0].astype(np.float32)
+            self._pending_start = start_index
+        x = np.concatenate((self._pending, block.astype(np.float32, copy=False)), axis=1)
+        first = self._pending_start
+        end = start_index + block.shape[1]
+        cut = end if final else end // bucket * bucket
+        # 各桶在 x 中的起点：首桶可能不满（从不对齐的序号开始），其余按 bucket 对齐
+        starts = np.arange(-(-first // bucket) * bucket, cut, bucket) - first
+        if not len(starts) or starts[0] != 0:
+            starts = np.concatenate(([0], starts)).astype(np.intp)
+        count = len(starts) if cut > first else 0
+        out = np.empty((x.shape[0], 2 * count), dtype=np.float32)
+        if count:
+            used = x[:, :cut - first]
+            out[:, 0::2] = np.minimum.reduceat(used, starts, axis=1)
+            out[:, 1::2] = np.maximum.reduceat(used, starts, axis=1)
+        if final:
+            self.reset()
+        else:
+            self._pending = x[:, max(0, cut - first):].copy()
+            self._pending_start = max(cut, first)
+            self._next_index = end
+        return out, 2 * (first // bucket)
+
+
+class RateGroup:
+    """一个输出速率组：组内通道以 sample_rate 输出"""
+
+    __slots__ = ('sample_rate', 'factor', 'channels', 'rows', 'chain')
+
+    def __init__(self, sample_rate: int, factor: int, channels: Tuple[int, ...], rows: np.ndarray):
+        self.sample_rate = sample_rate
+        self.factor = factor
+        self.channels = channels
+        self.rows = rows
+        self.chain = DecimationChain(factor) if factor > 1 else None
+
+    def to_dict(self) -> Dict:
+        return {
+            'sample_rate': self.sample_rate,
+            'factor': self.factor,
+            'channels': list(self.channels),
+            'stages': [stage.factor for stage in self.chain.stages] if self.chain else [],
+        }
+
+
+def parse_rate_groups(groups: Optional[Dict]) -> Dict[int, List[int]]:
+    """
+    规范化速率组配置
+
+    Args:
+        groups: {输出采样率: [通道号, ...]}（JSON传入时键为字符串），或
+                [{'sample_rate': 输出采样率, 'channels': [...]}, ...]
+
+    Raises:
+        ValueError: 采样率无效或通道重复
+    """
+    if not groups:
+        return {}
+    items = groups.items() if isinstance(groups, dict) else ((g['sample_rate'], g['channels']) for g in groups)
+    result: Dict[int, List[int]] = {}
+    seen = set()
+    for rate, channels in items:
+        rate = int(float(rate))
+        if rate <= 0:
+            raise ValueError(f"输出采样率无效: {rate}")
+        for ch in channels:
+            ch = int(ch)
+            if ch in seen:
+                raise ValueError(f"通道{ch}属于多个速率组")
+            seen.add(ch)
+            result.setdefault(rate, []).append(ch)
+    return result
+
+
+class RateGroupSplitter:
+    """
+    按速率组拆分数据包
+
+    未列入任何速率组的通道以采集采样率原样输出（通道连续时为视图，不拷贝）；
+    降速组经 DecimationChain 抽取后作为独立的数据包发出，包序号与原数据包相同、样本序号以本组采样率计。
+    """
+
+    def __init__(self, groups: Dict[int, List[int]], channels: Tuple[int, ...], sample_rate: int):
+        """
+        Args:
+            groups: {输出采样率: [通道号]}（见 parse_rate_groups）
+            channels: 采集的通道（数据包的行顺序）
+            sample_rate: 采集采样率
+
+        Raises:
+            ValueError: 输出采样率不能整除采集采样率或高于采集采样率，或速率组中的通道未启用
+        """
+        self.sample_rate = int(sample_rate)
+        self.channels = tuple(channels)
+        assigned = {}
+        for rate, group_channels in groups.items():
+            if rate > self.sample_rate or self.sample_rate % rate:
+                raise ValueError(f"输出采样率{rate}Hz必须能整除采集采样率{self.sample_rate}Hz")
+            disabled = [ch for ch in group_channels if ch not in self.channels]
+            if disabled:
+                raise ValueError(f"速率组{rate}Hz中的通道{disabled}未启用")
+            assigned.update((ch, rate) for ch in group_channels)
+
+        self.groups: List[RateGroup] = []
+        rates = sorted({assigned.get(ch, self.sample_rate) for ch in self.channels}, reverse=True)
+        for rate in rates:
+            rows = [i for i, ch in enumerate(self.channels) if assigned.get(ch, self.sample_rate) == rate]
+            self.groups.append(RateGroup(rate, self.sample_rate // rate,
+                                         tuple(self.channels[i] for i in rows), np.array(rows)))
+
+    @property
+    def active(self) -> bool:
+        """是否有降速组（否则数据包原样输出）"""
+        return any(group.factor > 1 for group in self.groups)
+
+    @property
+    def rates(self) -> List[int]:
+        return [group.sample_rate for group in self.groups]
+
+    def reset(self):
+        for group in self.groups:
+            if group.chain is not None:
+                group.chain.reset()
+
+    def split(self, packet: AiPacket) -> List[AiPacket]:
+        """
+        拆分一个全速率数据包
+
+        Returns:
+            List[AiPacket]: 各速率组本次产生的数据包（降速组可能本次没有输出）；
+                            is_final 只出现在最后一个数据包上
+        """
+        packets = []
+        for group in self.groups:
+            rows = group.rows
+            units = tuple(packet.units[i] for i in rows) if packet.units else None
+            if group.chain is None:
+                if len(rows) == packet.num_channels:
+                    packets.append(packet)
+                    continue
+                contiguous = rows[-1] - rows[0] + 1 == len(rows)
+                data = packet.data[rows[0]:rows[-1] + 1] if contiguous else packet.data[rows]
+                packets.append(AiPacket(data, group.channels, packet.start_index, packet.sample_rate,
+                                        packet.timestamp, packet.seq, packet.remaining_points,
+                                        packet.block if contiguous else None, False, packet.oneshot_progress,
+                                        packet.total_points, units))
+                continue
+            data, start_index = group.chain.process(packet.data[rows], packet.start_index, packet.is_final)
+            if data.shape[1] == 0:
+                continue
+            total_points = -(-packet.total_points // group.factor) if packet.total_points else packet.total_points
+            packets.append(AiPacket(data, group.channels, start_index, group.sample_rate, packet.timestamp,
+                                    packet.seq, packet.remaining_points, None, False, packet.oneshot_progress,
+                                    total_points, units))
+        if packet.is_final:
+            if packets:
+                packets[-1].is_final = True
+            else:
+                packets.append(AiPacket(packet.data[:, :0], packet.channels, packet.start_index,
+                                        packet.sample_rate, packet.timestamp, packet.seq, packet.remaining_points,
+                                        None, True, packet.oneshot_progress, packet.total_points, packet.units))
+        return packets
+
+    def metrics(self) -> Dict:
+        return {
+            'sample_rate': self.sample_rate,
+            'groups': [group.to_dict() for group in self.groups],
+        }
@@ -10,8 +10,24 @@ import time
 import json
 import logging
 from typing import Optional, Dict, List, Callable, Any
+from concurrent.futures import Future
 from pathlib import Path
 import math
+import os
+
+from .dap_buffer import AiRingBuffer, AiBlock
+from .dap_layout import AiLayout
+from .dap_calibration import CalibrationTable, ChannelCalibration
+from .dap_packet import AiPacket
+from .dap_scheduler import ReadScheduler, AI_FIFO_POINTS
+from .dap_queue import SpscQueue
+from .dap_config import ShadowRegisters, ConfigTransaction, RegisterKey, apply_registers, describe_register
+from .dap_ao import AoStreamer, WaveformCache, get_waveform_cache, AO_FIFO_POINTS
+from .dap_recorder import AiRecorder, MultiRateRecorder, preview_packet
+from .dap_decimate import RateGroupSplitter, parse_rate_groups
+from .dap_trigger import TriggerCapture, TriggerCondition, TriggerEvent
+from .dap_integrity import StreamIntegrity, StreamGap
+from .dap_metrics import LatencyStats, ValueStats
 
 # 配置日志
 logging.basicConfig(level=logging.INFO)
@@ -51,16 +67,26 @@ class USB5121Driver:
     AO_MODE_CONTINUOUS = 0  # 连续不循环输出
     AO_MODE_CYCLE = 1  # 循环输出
 
-    def __init__(self, dll_path: str = r"D:\multi\multi\polls\lib\x64\USB5000.dll"):
+    # 设备后端
+    BACKEND_DLL = 'dll'  # 通过USB5000.dll访问真实采集卡
+    BACKEND_SIMULATED = 'simulated'  # 软件模拟采集卡
+    BACKEND_REPLAY = 'replay'  # 回放已保存的监控数据（数据源见 dap_replay.get_shared_replay）
+
+    def __init__(self, dll_path: str = r"D:\multi\multi\polls\lib\x64\USB5000.dll", backend: Any = None,
+                 device_index: int = 0):
         """
         初始化USB5121驱动
 
         Args:
             dll_path: DLL文件路径
+            backend: 设备后端，'dll'/'simulated'/'replay' 或直接传入实现USB5000接口的对象；
+                     为None时读取环境变量 USB5121_BACKEND（默认 'dll'）
+            device_index: 采集卡序号（多卡时由 DeviceManager 指定）
         """
         self.dll_path = dll_path
+        self.backend = backend if backend is not None else os.environ.get('USB5121_BACKEND', self.BACKEND_DLL)
         self.dll: Optional[Any] = None  # 添加类型注解
-        self.device_index = ctypes.c_int(0)
+        self.device_index = ctypes.c_int(device_index)
         self.is_opened = False
         self.is_acquiring = False
         self.acquisition_thread = None
@@ -75,23 +101,107 @@ class USB5121Driver:
         self.ai_oneshot_points = 1000
         self.ai_buffer_size = 16000  # 增加缓冲区大小以支持16个通道
         self.ai_timeout_ms = 1000
+        self.ai_target_latency_s = 0.05  # 连续采集目标延迟：无积压时单次读取约50ms数据
+        self.ai_max_read_latency_s = 0.2  # 积压时单次读取的最大时长
+        self.read_scheduler: Optional[ReadScheduler] = None
+        self.ai_fifo_points = AI_FIFO_POINTS  # 采集卡AI FIFO容量，用于判定溢出
+
+        # 读取线程与数据处理线程之间的有界队列，数据回调在处理线程中执行
+        self.ai_queue_policy = SpscQueue.POLICY_DROP_OLDEST
+        self.ai_queue_capacity = 32
+        self.ai_queue: Optional[SpscQueue] = None
+        self.processing_thread = None
+        self.ai_stale_packets = 0  # 出队时槽位已被覆盖而丢弃的数据包数
 
         # 单次采集状态
         self.oneshot_triggered = False
         self.oneshot_completed = False
         self.oneshot_progress = 0
+        self._oneshot_trigger_event = threading.Event()
+
+        # 连发单次采集模式：配置一次，重复布防+触发
+        self.burst_active = False
+        self.burst_count = 0
+        self._burst_request = threading.Event()
+        self._burst_lock = threading.Lock()
+        self._burst_future: Optional[Future] = None
 
         # AO输出参数
         self.ao_channels = [False] * 4  # AO通道状态
         self.ao_voltages = [0.0] * 4  # 各通道直流电压
-
-        # 数据缓冲区
-        self.ai_data_buffer = None
+        self.ao_fifo_points = AO_FIFO_POINTS
+        self.ao_streamers: Dict[int, AoStreamer] = {}
+        self.waveform_cache: WaveformCache = get_waveform_cache()
+
+        # 数据缓冲区：打开设备时分配，USB5GetAi直接写入环形缓冲区槽位
+        self.ai_ring_slots = 128
+        self.ai_ring_min_slots = 8
+        self.ai_ring_max_bytes = 64 * 1024 * 1024  # 环形缓冲区内存上限
+        self.ai_ring: Optional[AiRingBuffer] = None
+        self.ai_remaining_points = 0  # 最近一次读取后FIFO剩余点数
+        self.ai_sample_index = 0  # 本次采集已读取的每通道样本数（下一个数据包的起始样本序号）
+        self.ai_packet_seq = 0  # 下一个数据包的序号，驱动生命周期内单调递增（与环形缓冲区槽位序号无关）
+        # 数据流完整性核算：读取线程记录FIFO溢出与队列丢弃，处理线程核对交给数据回调的数据是否连续
+        self.ai_integrity = StreamIntegrity('读取线程')
+        self.ai_delivery_integrity = StreamIntegrity('处理线程')
+        self._ai_clock_deficit: Optional[int] = None  # 采样时钟推算的样本数与已读取+积压之差（无溢出时的基线）
+        # 各环节耗时：queue 为读取完成到处理线程取出，callback 为数据回调执行时长
+        self.ai_stage_latency = {'queue': LatencyStats('queue'), 'callback': LatencyStats('callback')}
+        # 读取线程的计量：USB5GetAi 调用耗时、返回的FIFO积压（每通道点数）、每次读取点数、处理队列深度
+        self.ai_read_stats = {
+            'usb5_get_ai': LatencyStats('usb5_get_ai'),
+            'backlog_points': ValueStats('backlog_points'),
+            'points_per_read': ValueStats('points_per_read'),
+            'queue_depth': ValueStats('queue_depth'),
+        }
+        self.ai_trigger_time: Optional[float] = None  # 最近一次软件触发的系统时间，多卡对齐使用
+        self.ai_fifo_order = AiLayout.CHANNEL_MAJOR  # USB5GetAi 缓冲区样本排列：[CHa的N点][CHb的N点]...
+        self._ai_layout: Optional[AiLayout] = None
+        # 通道标定：读取线程在提交数据块时原地换算为工程量
+        self.calibration = CalibrationTable()
+        # 多速率通道组：{输出采样率: [通道号]}，读取线程对降速组流式抗混叠抽取，各组以自己的采样率发出数据包
+        self.ai_rate_groups: Dict[int, List[int]] = {}
+        self.rate_splitter: Optional[RateGroupSplitter] = None
+
+        # 直接落盘记录：读取线程将数据块写入本地文件，数据回调只收到抽取后的预览数据
+        self.recorder: Optional[AiRecorder] = None
+        self.recording_preview_rate_hz: Optional[float] = None
+        self.last_recording: Optional[Dict] = None
+
+        # 软件触发事件采集：读取线程在全速率数据上检测触发，输出触发前+触发后记录
+        self.event_capture: Optional[TriggerCapture] = None
+        self.last_event_capture: Optional[Dict] = None
+
+        # 寄存器影子状态：配置事务只下发与之不同的寄存器
+        self.shadow = ShadowRegisters()
+        self.last_config_report: Optional[Dict] = None
 
         self._load_dll()
 
     def _load_dll(self):
         """加载DLL库"""
+        if not isinstance(self.backend, str):
+            # 直接注入的后端对象
+            self.dll = self.backend
+            logger.info(f"使用注入的设备后端: {type(self.backend).__name__}")
+            return
+
+        if self.backend == self.BACKEND_SIMULATED:
+            from .dap_simulator import get_shared_simulator
+            self.dll = get_shared_simulator()
+            logger.info("使用模拟采集卡后端")
+            return
+
+        if self.backend == self.BACKEND_REPLAY:
+            from .dap_replay import get_shared_replay
+            try:
+                self.dll = get_shared_replay()
+                logger.info(f"使用回放后端: {self.dll.source.description}")
+            except Exception as e:
+                logger.error(f"加载回放数据源失败: {e}")
+                self.dll = None
+            return
+
         try:
             if Path(self.dll_path).exists():
                 self.dll = windll.LoadLibrary(self.dll_path)
@@ -144,12 +254,15 @@ class USB5121Driver:
             success = self._check_result(result, "打开设备")
             if success:
                 self.is_opened = True
-                # 初始化AI数据缓冲区
-                self.ai_data_buffer = np.zeros(self.ai_buffer_size, dtype='float32')
+                self.shadow.invalidate()
+                # 初始化AI数据环形缓冲区
+                self.ai_ring = AiRingBuffer(self.ai_buffer_size, self.ai_ring_slots)
 
                 # 默认关闭所有AI通道
+                tx = self.configure_transaction()
                 for i in range(16):
-                    self.dll.SetUSB5AiChanSel(self.device_index, ctypes.c_int(i), ctypes.c_char(0))
+                    tx.ai_channel(i, False)
+                tx.commit()
 
             return success
         except Exception as e:
@@ -167,9 +280,13 @@ class USB5121Driver:
             return False
 
         try:
-            if self.is_acquiring:
+            if self.is_acquiring or self.burst_active:
                 self.stop_ai_acquisition()
 
+            self.stop_ao_stream()
+            self.stop_recording()
+            self.stop_event_capture()
+
             if self.is_opened:
                 # 清除AI触发和FIFO
                 self.dll.SetUSB5ClrAiTrigger(self.device_index)
@@ -184,6 +301,7 @@ class USB5121Driver:
                 success = self._check_result(result, "关闭设备")
                 if success:
                     self.is_opened = False
+                    self.shadow.invalidate()
                 return success
             return True
         except Exception as e:
@@ -214,37 +332,7 @@ class USB5121Driver:
             return False
 
         try:
-            # 设置通道开关
-            chan_sel = ctypes.c_char(1 if enabled else 0)
-            result1 = self.dll.SetUSB5AiChanSel(
-                self.device_index,
-                ctypes.c_int(channel),
-                chan_sel
-            )
-
-            success1 = self._check_result(result1, f"设置AI通道{channel}开关")
-
-            if enabled:
-                # 设置量程
-                range_val = ctypes.c_float(voltage_range)
-                result2 = self.dll.SetUSB5AiRange(
-                    self.device_index,
-                    ctypes.c_int(channel),
-                    range_val
-                )
-                success2 = self._check_result(result2, f"设置AI通道{channel}量程")
-
-                if success1 and success2:
-                    self.ai_channels[channel] = enabled
-                    self.ai_channel_ranges[channel] = voltage_range
-                    return True
-            else:
-                if success1:
-                    self.ai_channels[channel] = enabled
-                    return True
-
-            return False
-
+            return self.configure_transaction().ai_channel(channel, enabled, voltage_range).commit()
         except Exception as e:
             logger.error(f"配置AI通道{channel}异常: {e}")
             return False
@@ -276,49 +364,14 @@ class USB5121Driver:
             return False
 
         try:
-            # 转换采样率为ns
-            sample_rate_ns = int(1e9 / sample_rate_hz)
-
-            # 设置采集模式
-            result1 = self.dll.SetUSB5AiSampleMode(
-                self.device_index,
-                ctypes.c_char(mode)
-            )
-            success1 = self._check_result(result1, "设置AI采集模式")
-
-            # 设置单次采集点数(仅在oneshot模式下)
-            success2 = True
+            tx = self.configure_transaction()
+            tx.ai_sample_mode(mode)
+            # 单次采集点数仅在oneshot模式下设置
             if mode == self.MODE_ONESHOT:
-                result2 = self.dll.SetUSB5AiOneShotPoints(
-                    self.device_index,
-                    ctypes.c_uint(oneshot_points)
-                )
-                success2 = self._check_result(result2, "设置AI单次采集点数")
-
-            # 设置采样率
-            result3 = self.dll.SetUSB5AiSampleRate(
-                self.device_index,
-                ctypes.c_int(sample_rate_ns)
-            )
-            success3 = self._check_result(result3, "设置AI采样率")
-
-            # 设置触发源
-            result4 = self.dll.SetUSB5AiTrigSource(
-                self.device_index,
-                ctypes.c_char(trigger_source)
-            )
-            success4 = self._check_result(result4, "设置AI触发源")
-
-            # 设置时钟源
-            result5 = self.dll.SetUSB5AiConvSource(
-                self.device_index,
-                ctypes.c_char(clock_source)
-            )
-            success5 = self._check_result(result5, "设置AI时钟源")
-
-            if all([success1, success2, success3, success4, success5]):
-                self.ai_sample_mode = mode
-                self.ai_sample_rate_ns = sample_rate_ns
+                tx.ai_oneshot_points(oneshot_points)
+            tx.ai_sample_rate(sample_rate_hz)
+            tx.ai_sources(trigger_source, clock_source)
+            if tx.commit():
                 self.ai_oneshot_points = oneshot_points
                 return True
 
@@ -328,6 +381,64 @@ class USB5121Driver:
             logger.error(f"配置AI采集参数异常: {e}")
             return False
 
+    def configure_transaction(self, force: bool = False) -> ConfigTransaction:
+        """
+        创建配置事务：暂存目标寄存器值，commit 时一次性下发与影子状态不同的寄存器
+
+        Args:
+            force: 忽略影子状态，全部重新下发
+
+        Returns:
+            ConfigTransaction: 配置事务
+        """
+        return ConfigTransaction(self, force)
+
+    def commit_configuration(self, registers: Dict[RegisterKey, Any], force: bool = False) -> Dict:
+        """
+        下发一组寄存器并同步驱动的配置状态
+
+        Args:
+            registers: {(寄存器名, 通道号): 值}
+            force: 忽略影子状态，全部重新下发
+
+        Returns:
+            Dict: success / written / skipped / failed / elapsed_ms
+        """
+        if not self.is_opened or not self._check_dll_loaded():
+            logger.error("设备未打开")
+            return {'success': False, 'written': 0, 'skipped': 0, 'failed': list(registers), 'elapsed_ms': 0.0}
+
+        report = apply_registers(self.dll, self.device_index, self.shadow, registers, force)
+        failed = set(report['failed'])
+        for (name, channel), value in registers.items():
+            if (name, channel) in failed:
+                continue
+            if name == 'ai_chan_sel':
+                self.ai_channels[channel] = bool(value)
+            elif name == 'ai_range':
+                self.ai_channel_ranges[channel] = value
+            elif name == 'ai_sample_mode':
+                self.ai_sample_mode = value
+            elif name == 'ai_sample_rate_ns':
+                self.ai_sample_rate_ns = value
+            elif name == 'ai_oneshot_points':
+                self.ai_oneshot_points = value
+
+        self.last_config_report = report
+        if report['written'] or failed:
+            logger.info(f"配置事务: 下发{report['written']}个寄存器, 跳过{report['skipped']}个, "
+                        f"失败{len(failed)}个, 耗时{report['elapsed_ms']:.2f}ms")
+        if failed:
+            logger.error(f"寄存器下发失败: {', '.join(describe_register(key) for key in report['failed'])}")
+        return report
+
+    def get_config_state(self) -> Dict:
+        """寄存器影子状态与最近一次配置事务的结果"""
+        return {
+            'registers': self.shadow.snapshot(),
+            'last_commit': self.last_config_report,
+        }
+
     def trigger_ai_acquisition(self) -> bool:
         """
         触发AI采集（主要用于单次采集模式）
@@ -351,11 +462,14 @@ class USB5121Driver:
             self.dll.SetUSB5ClrAiTrigger(self.device_index)
             
             # 软件触发
+            trigger_start = time.time()
             result = self.dll.SetUSB5AiSoftTrig(self.device_index)
             success = self._check_result(result, "AI软件触发")
 
             if success:
+                self.ai_trigger_time = (trigger_start + time.time()) / 2
                 self.oneshot_triggered = True
+                self._oneshot_trigger_event.set()
                 self.oneshot_completed = False
                 self.oneshot_progress = 0
                 logger.info("AI采集已触发")
@@ -416,8 +530,10 @@ class USB5121Driver:
         try:
             # 重置状态
             self.oneshot_triggered = False
+            self._oneshot_trigger_event.clear()
             self.oneshot_completed = False
             self.oneshot_progress = 0
+            self.ai_sample_index = 0
 
             # 清空FIFO缓冲区
             if not self.clear_ai_fifo():
@@ -429,6 +545,9 @@ class USB5121Driver:
 
             # 启动采集线程
             if self.ai_sample_mode == self.MODE_CONTINUOUS:
+                if not self._create_read_scheduler():
+                    self.is_acquiring = False
+                    return False
                 self.acquisition_thread = threading.Thread(
                     target=self._ai_continuous_acquisition_loop,
                     daemon=True
@@ -443,6 +562,7 @@ class USB5121Driver:
                     daemon=True
                 )
 
+            self._start_processing_stage()
             self.acquisition_thread.start()
             logger.info("AI采集已启动")
             return True
@@ -462,13 +582,18 @@ class USB5121Driver:
         if not self._check_dll_loaded():
             return False
 
+        if self.burst_active:
+            return self.stop_burst_mode()
+
         try:
             if self.is_acquiring:
                 self.is_acquiring = False
+                self._oneshot_trigger_event.set()  # 唤醒等待触发的单次采集线程
 
-                # 等待采集线程结束
+                # 等待采集线程与处理线程结束
                 if self.acquisition_thread and self.acquisition_thread.is_alive():
                     self.acquisition_thread.join(timeout=2.0)
+                self._stop_processing_stage()
 
                 # 清除触发
                 if self.is_opened:
@@ -483,102 +608,261 @@ class USB5121Driver:
             logger.error(f"停止AI采集异常: {e}")
             return False
 
-    def _ai_continuous_acquisition_loop1(self):
-        """AI连续采集循环"""
+    def _ai_continuous_acquisition_loop(self):
+        """
+        AI连续采集循环
+
+        每次读取的点数由 ReadScheduler 根据FIFO积压、采样率与目标延迟决定，
+        等待数据时阻塞在 USB5GetAi 的超时上，不再固定点数+sleep轮询。
+        """
         logger.info("开始AI连续采集循环")
 
-        # 计算每次读取的点数
-        sample_rate_hz = int(1e9 / self.ai_sample_rate_ns)
-        
-        # 根据采样率动态调整读取点数
-        if sample_rate_hz <= 1000:  # 1kHz以下
-            points_per_read = max(100, sample_rate_hz // 10)
-        elif sample_rate_hz <= 10000:  # 1kHz-10kHz
-            points_per_read = max(500, sample_rate_hz // 20)
-        elif sample_rate_hz <= 100000:  # 10kHz-100kHz
-            points_per_read = max(1000, sample_rate_hz // 50)
-        else:  # 100kHz以上
-            points_per_read = max(2000, sample_rate_hz // 100)
-
-        # 确保点数不超过缓冲区大小
-        points_per_read = min(points_per_read, self.ai_buffer_size)
-        
-        logger.info(f"采样率: {sample_rate_hz}Hz, 每次读取点数: {points_per_read}")
+        scheduler = self.read_scheduler
+        layout = self.ai_layout()
+        logger.info(f"采样率: {scheduler.sample_rate_hz}Hz, 每次读取点数: {scheduler.base_points}~{scheduler.max_points}")
 
         while self.is_acquiring:
             try:
-                # 获取数据
-                remaining_points = self.dll.USB5GetAi(
-                    self.device_index,
-                    ctypes.c_long(points_per_read),
-                    self.ai_data_buffer.ctypes.data_as(POINTER(c_float)),
-                    ctypes.c_long(self.ai_timeout_ms)
+                points_per_read = scheduler.next_points()
+                start = time.perf_counter()
+                remaining_points, block = self._read_ai_block(
+                    points_per_read, layout, scheduler.timeout_ms(points_per_read, self.ai_timeout_ms)
                 )
+                scheduler.record(points_per_read, remaining_points, time.perf_counter() - start)
 
                 if remaining_points >= 0:
-                    # 处理数据
                     try:
-                        self._process_ai_acquired_data(points_per_read, remaining_points)
+                        self._account_fifo_backlog(scheduler, points_per_read)
+                        self._process_ai_acquired_data(block, remaining_points)
                     except Exception as e:
                         logger.error(f"处理数据异常: {e}")
                         # 继续执行，不中断采集
-                    
-                    # 如果缓冲区剩余点数过多，说明数据处理跟不上，需要调整读取策略
-                    if remaining_points > points_per_read * 0.8:
-                        points_per_read = max(100, points_per_read // 2)
-                        logger.warning(f"缓冲区积压，调整读取点数为: {points_per_read}")
+                elif remaining_points == -7:  # 超时错误可以继续尝试
+                    logger.debug("AI数据获取超时，继续等待")
                 else:
                     error_msg = self.ERROR_CODES.get(remaining_points, '未知错误')
                     logger.error(f"AI数据获取失败: {error_msg}")
-                    if remaining_points == -7:  # 超时错误
-                        continue  # 超时错误可以继续尝试
                     break
 
             except Exception as e:
                 logger.error(f"AI连续采集异常: {e}")
                 break
 
-        logger.info("AI连续采集循环结束")
+        if self.ai_queue is not None:
+            self.ai_queue.close()
+        logger.info(f"AI连续采集循环结束: {scheduler.metrics()}")
 
-    def _continuous_acquisition_loop(self):
+    def _account_fifo_backlog(self, scheduler: ReadScheduler, points: int):
         """
-        连续采集循环
+        核对采样时钟与已读取样本数，读取前FIFO已满时记录溢出缺口
+
+        溢出时采集卡丢弃最旧的数据（与模拟后端一致），缺口位于本次读取的数据块之前：
+        以采样时钟推算丢失点数（扣除无溢出时的基线，抵消时钟偏差与读取延迟），
+        推进样本序号使本数据块及之后的 start_index 越过缺口。
         """
-        try:
-            logger.info("连续采集循环开始")
-            time.sleep(0.1)
-            while self.is_acquiring:
+        if self.ai_trigger_time is None:
+            return
+        produced = int((time.time() - self.ai_trigger_time) * scheduler.sample_rate_hz)
+        deficit = produced - (self.ai_sample_index + points + scheduler.backlog_points)
+        if not scheduler.overrun:
+            self._ai_clock_deficit = deficit
+            return
+        lost = max(0, deficit - (self._ai_clock_deficit or 0))
+        gap = self.ai_integrity.record_gap(self.ai_sample_index, lost, StreamGap.FIFO_OVERRUN,
+                                           self.ai_packet_seq, time.time())
+        recorder = self.recorder
+        if recorder is not None:
+            recorder.mark_gap(gap, scheduler.sample_rate_hz)
+        self.ai_sample_index += lost
+
+    def _create_read_scheduler(self) -> bool:
+        """按当前通道与采样率创建读取调度器，并按最大读取量准备环形缓冲区"""
+        num_enabled_channels = sum(self.ai_channels)
+        if num_enabled_channels == 0:
+            logger.error("没有启用的AI通道")
+            return False
+        sample_rate_hz = int(1e9 / self.ai_sample_rate_ns) if self.ai_sample_rate_ns > 0 else 1
+        self.read_scheduler = ReadScheduler(
+            sample_rate_hz,
+            num_enabled_channels,
+            target_latency_s=self.ai_target_latency_s,
+            max_latency_s=self.ai_max_read_latency_s,
+            fifo_points=self.ai_fifo_points,
+        )
+        self._prepare_ai_ring(self.read_scheduler.max_points * num_enabled_channels)
+        return True
+
+    def _start_processing_stage(self):
+        """
+        创建数据队列并启动处理线程
+
+        队列容量小于环形缓冲区槽位数，保证排队中的数据包引用的槽位不会被读取线程覆盖
+        """
+        capacity = max(1, min(self.ai_queue_capacity, self.ai_ring.num_slots - 2))
+        merge = AiPacket.concat if self.ai_queue_policy == SpscQueue.POLICY_COALESCE else None
+        self.ai_queue = SpscQueue(capacity, self.ai_queue_policy, merge=merge,
+                                  on_drop=lambda p: self.ai_integrity.drop(p.points_per_channel, 'processing_queue'))
+        self.ai_stale_packets = 0
+        self.ai_integrity.reset()
+        self.ai_delivery_integrity.reset()
+        self._ai_clock_deficit = None
+        for stats in (*self.ai_stage_latency.values(), *self.ai_read_stats.values()):
+            stats.reset()
+        self.rate_splitter = self._create_rate_splitter()
+        self.processing_thread = threading.Thread(
+            target=self._ai_processing_loop,
+            args=(self.ai_queue,),
+            daemon=True
+        )
+        self.processing_thread.start()
+
+    def _stop_processing_stage(self):
+        """关闭数据队列并等待处理线程处理完剩余数据"""
+        if self.ai_queue is not None:
+            self.ai_queue.close()
+        if self.processing_thread and self.processing_thread.is_alive():
+            self.processing_thread.join(timeout=2.0)
+
+    def _ai_processing_loop(self, queue: SpscQueue):
+        """数据处理线程：从队列取出数据包并执行数据回调"""
+        logger.info("AI数据处理线程启动")
+        while True:
+            packet = queue.get(timeout=0.5)
+            if packet is None:
+                if queue.drained():
+                    break
+                continue
+            if not packet.is_valid():
+                self.ai_stale_packets += 1
+                self.ai_delivery_integrity.drop(packet.points_per_channel, 'stale')
+                logger.warning(f"数据块 #{packet.seq} 出队时已被覆盖，丢弃")
+            else:
+                self.ai_delivery_integrity.observe_packet(packet)
+                started = time.time()
+                self.ai_stage_latency['queue'].record(started - packet.timestamp)
                 try:
-                    enabled_channels = [i for i, enabled in enumerate(self.ai_channels) if enabled]
-                    num_enabled_channels = len(enabled_channels)
-                    if num_enabled_channels == 0:
-                        logger.warning("没有启用的AI通道，跳过数据获取。")
-                        time.sleep(0.1)
-                        continue
-                    points_per_channel = 100
-                    channel_data = self._get_ai_data(points_per_channel)
-                    if channel_data is not None:
-                        remaining_points = self._get_buffer_remaining()
-                        sample_rate_hz = int(1e9 / self.ai_sample_rate_ns) if self.ai_sample_rate_ns > 0 else 0
-                        data_packet = {
-                            'timestamp': time.time(),
-                            'sample_rate': sample_rate_hz,
-                            'points_per_channel': points_per_channel,
-                            'remaining_points': remaining_points,
-                            'channel_data': channel_data,
-                            'enabled_channels': enabled_channels,
-                        }
-                        if self.data_callback:
-                            self.data_callback(data_packet)
-                    else:
-                        time.sleep(0.01)
-                    time.sleep(0.01)
+                    if self.data_callback:
+                        self.data_callback(packet)
+                        self.ai_stage_latency['callback'].record(time.time() - started)
+                    if logger.isEnabledFor(logging.DEBUG):
+                        for i, ch in enumerate(packet.channels):
+                            logger.debug(f"分离后CH{ch}前5个: {packet.data[i, :5]}")
                 except Exception as e:
-                    logger.error(f"连续采集循环异常: {e}")
-                    time.sleep(0.1)
-            logger.info("连续采集循环结束")
-        except Exception as e:
-            logger.error(f"连续采集循环严重异常: {e}")
+                    logger.error(f"数据回调异常: {e}")
+            if packet.is_final and self.burst_active:
+                self._complete_burst(result=packet.end_index)
+        logger.info(f"AI数据处理线程结束: {queue.metrics()}, "
+                    f"数据完整性: {self.ai_delivery_integrity.metrics(include_gaps=False)}")
+
+    def _dispatch_packet(self, packet: AiPacket):
+        """将数据包交给处理阶段；未启动处理线程时直接在当前线程回调"""
+        if self.ai_queue is not None and not self.ai_queue.closed:
+            status = self.ai_queue.put(packet)
+            self.ai_read_stats['queue_depth'].record(len(self.ai_queue))
+            # 数据被合并(已拷贝)或丢弃时归还其槽位，避免读取线程越过仍在排队的数据
+            if status != SpscQueue.QUEUED and packet.block is not None:
+                self.ai_ring.rollback(packet.block)
+        elif self.data_callback:
+            self.data_callback(packet)
+
+    def _prepare_ai_ring(self, slot_points: int):
+        """
+        确保环形缓冲区槽位能容纳单次最大读取量
+
+        槽位数量按 ai_ring_max_bytes 限制内存占用，至少保留 ai_ring_min_slots 个槽位
+        """
+        slot_points = max(slot_points, self.ai_buffer_size)
+        if self.ai_ring is not None and self.ai_ring.slot_points >= slot_points:
+            return
+        num_slots = self.ai_ring_max_bytes // (slot_points * 4)
+        num_slots = max(self.ai_ring_min_slots, min(self.ai_ring_slots, num_slots))
+        self.ai_ring = AiRingBuffer(slot_points, num_slots)
+        logger.info(f"AI环形缓冲区: {num_slots}个槽位 × {slot_points}点 ({self.ai_ring.nbytes / 1e6:.1f}MB)")
+
+    def get_acquisition_metrics(self) -> Dict:
+        """
+        获取连续采集读取调度指标
+
+        Returns:
+            Dict: 调度器指标，未进行过连续采集时为空字典
+        """
+        if self.read_scheduler is None:
+            return {}
+        return self.read_scheduler.metrics()
+
+    def get_queue_metrics(self) -> Dict:
+        """
+        获取读取线程与处理线程之间队列的统计
+
+        Returns:
+            Dict: 队列指标（深度、丢弃、合并、阻塞等），未启动过采集时为空字典
+        """
+        if self.ai_queue is None:
+            return {}
+        metrics = self.ai_queue.metrics()
+        metrics['stale_packets'] = self.ai_stale_packets
+        return metrics
+
+    def get_integrity_metrics(self) -> Dict:
+        """
+        获取本次采集的数据完整性核算
+
+        Returns:
+            Dict: reader（读取线程：FIFO溢出缺口、处理队列丢弃）、delivery（处理线程：交给数据回调的数据连续性），
+                  lossless 为两者均未发现缺口与丢弃
+        """
+        reader = self.ai_integrity.metrics()
+        delivery = self.ai_delivery_integrity.metrics()
+        return {
+            'lossless': reader['lossless'] and delivery['lossless'],
+            'reader': reader,
+            'delivery': delivery,
+        }
+
+    def get_stage_latency(self) -> Dict:
+        """
+        获取本次采集各环节的耗时统计
+
+        Returns:
+            Dict: queue（读取完成→处理线程取出）、callback（数据回调执行）的直方图统计（毫秒）；
+                  回放后端另有 fifo（数据就绪→被读走）
+        """
+        latency = {name: stats.metrics() for name, stats in self.ai_stage_latency.items()}
+        replay = self.get_replay_status()
+        if replay:
+            latency['fifo'] = replay['fifo_latency']
+        return latency
+
+    def get_instrumentation(self, histogram: bool = True) -> Dict:
+        """
+        获取本次采集各环节的计量，用于判断哪个环节限制了吞吐
+
+        Args:
+            histogram: 是否附带非空分桶
+
+        Returns:
+            Dict: usb5_get_ai（调用耗时，毫秒）、backlog_points（读取后FIFO积压，每通道点数）、
+                  points_per_read（每次读取的每通道点数）、queue_depth（入队后的处理队列深度）、
+                  queue（读取完成→处理线程取出，毫秒）、callback（数据回调执行，毫秒）
+        """
+        result = {}
+        for name, stats in (*self.ai_read_stats.items(), *self.ai_stage_latency.items()):
+            result[name] = stats.metrics()
+            if histogram:
+                result[name]['histogram'] = stats.histogram()
+        return result
+
+    def get_replay_status(self) -> Dict:
+        """
+        获取回放进度与实际达到的采样率
+
+        Returns:
+            Dict: 回放统计（见 ReplayUSB5000.get_replay_stats），非回放后端时为空字典
+        """
+        get_stats = getattr(self.dll, 'get_replay_stats', None)
+        if get_stats is None:
+            return {}
+        return get_stats(self.device_index.value)
 
     def _ai_oneshot_acquisition(self):
         """AI单次采集"""
@@ -588,71 +872,16 @@ class USB5121Driver:
             return
 
         try:
-            last_data_packet = None  # 修复UnboundLocalError
-            # 等待触发
-            while self.is_acquiring and not self.oneshot_triggered:
-                time.sleep(0.01)
+            # 等待触发（trigger_ai_acquisition / stop_ai_acquisition 会唤醒）
+            while self.is_acquiring and not self._oneshot_trigger_event.wait(0.5):
+                pass
 
             if not self.is_acquiring:
                 logger.info("单次采集已取消")
                 return
 
             logger.info("单次采集已触发，开始获取数据...")
-            total_points_acquired = 0
-            last_data_packet = None  # 用于存储最后一个有效数据包
-
-            while self.is_acquiring and not self.oneshot_completed:
-                # 计算本次需要获取的点数
-                points_to_read = min(
-                    self.ai_oneshot_points - total_points_acquired,
-                    self.ai_buffer_size
-                )
-
-                if points_to_read <= 0:
-                    self.oneshot_completed = True
-                    break
-
-                # 获取数据
-                remaining_points = self.dll.USB5GetAi(
-                    self.device_index,
-                    ctypes.c_long(points_to_read),
-                    self.ai_data_buffer.ctypes.data_as(POINTER(c_float)),
-                    ctypes.c_long(self.ai_timeout_ms)
-                )
-
-                if remaining_points >= 0:
-                    # 计算实际获取的点数
-                    points_acquired = points_to_read - remaining_points
-                    total_points_acquired += points_acquired
-
-                    # 更新进度
-                    self.oneshot_progress = min(100, int(total_points_acquired * 100 / self.ai_oneshot_points))
-                    
-                    # 处理数据
-                    if points_acquired > 0:
-                        try:
-                            # 保存最后一个有效数据包
-                            last_data_packet = self._process_ai_acquired_data(points_acquired, remaining_points, is_final=False)
-                        except Exception as e:
-                            logger.error(f"处理数据异常: {e}")
-                    
-                    # 检查是否完成
-                    if total_points_acquired >= self.ai_oneshot_points:
-                        self.oneshot_completed = True
-                        logger.info(f"单次采集完成，共获取 {total_points_acquired} 点数据")
-                        break
-
-                    # 如果还有剩余点数，继续获取
-                    if remaining_points > 0:
-                        continue
-
-                elif remaining_points == -7:  # 超时错误
-                    logger.warning("获取数据超时，重试...")
-                    continue
-                else:
-                    error_msg = self.ERROR_CODES.get(remaining_points, '未知错误')
-                    logger.error(f"单次采集失败: {error_msg}")
-                    break
+            self._read_oneshot_points(self.ai_layout(), lambda: self.is_acquiring)
 
         except Exception as e:
             logger.error(f"单次采集异常: {e}")
@@ -666,65 +895,505 @@ class USB5121Driver:
                     self.dll.SetUSB5ClrAiFifo(self.device_index)
                 except Exception as e:
                     logger.error(f"清理资源异常: {e}")
+            if self.ai_queue is not None:
+                self.ai_queue.close()
+
+            logger.info("单次采集线程结束")
+
+    def _read_oneshot_points(self, layout: AiLayout, active: Callable[[], bool]) -> int:
+        """
+        读取一次单次采集的全部数据，读满 ai_oneshot_points 时最后一个数据包标记为 is_final
+
+        Args:
+            layout: 数据排列（启用通道）
+            active: 返回False时中止读取
 
-            # 发送最后一个有效数据包，标记为最终状态
-            if self.data_callback and last_data_packet is not None:
+        Returns:
+            int: 已读取的每通道点数
+        """
+        total_points_acquired = 0
+        # 每次读取的点数受环形缓冲区槽位容量限制
+        max_points = max(1, self.ai_ring.slot_points // layout.num_channels)
+
+        while active() and total_points_acquired < self.ai_oneshot_points:
+            points_to_read = min(self.ai_oneshot_points - total_points_acquired, max_points)
+            remaining_points, block = self._read_ai_block(points_to_read, layout)
+
+            if remaining_points >= 0:
+                # 返回值为FIFO剩余点数，成功时已读满每通道points_to_read个点
+                total_points_acquired += points_to_read
+                self.oneshot_progress = min(100, int(total_points_acquired * 100 / self.ai_oneshot_points))
+                is_final = total_points_acquired >= self.ai_oneshot_points
                 try:
-                    # 更新数据包为最终状态
-                    last_data_packet['is_final'] = True
-                    self.data_callback(last_data_packet)
+                    self._process_ai_acquired_data(block, remaining_points, is_final=is_final)
                 except Exception as e:
-                    logger.error(f"发送最终数据包异常: {e}")
+                    logger.error(f"处理数据异常: {e}")
+            elif remaining_points == -7:  # 超时错误
+                logger.warning("获取数据超时，重试...")
+            else:
+                error_msg = self.ERROR_CODES.get(remaining_points, '未知错误')
+                logger.error(f"单次采集失败: {error_msg}")
+                break
 
-            logger.info("单次采集线程结束")
+        if total_points_acquired >= self.ai_oneshot_points:
+            self.oneshot_completed = True
+            logger.info(f"单次采集完成，共获取 {total_points_acquired} 点数据")
+        return total_points_acquired
+
+    def start_burst_mode(self, data_callback: Optional[Callable] = None,
+                         sample_rate_hz: Optional[int] = None,
+                         oneshot_points: Optional[int] = None) -> bool:
+        """
+        进入连发单次采集模式：只配置一次，之后每次 acquire_burst 仅重新布防并软件触发
+
+        Args:
+            data_callback: 数据回调函数
+            sample_rate_hz: 采样率(Hz)，None时保持当前设置
+            oneshot_points: 每次采集的每通道点数，None时保持当前设置
+
+        Returns:
+            bool: 是否成功进入连发模式
+        """
+        if not self.is_opened:
+            logger.error("设备未打开")
+            return False
+        if self.is_acquiring:
+            logger.warning("采集已在进行中")
+            return False
+        num_enabled_channels = sum(self.ai_channels)
+        if num_enabled_channels == 0:
+            logger.error("没有启用的AI通道")
+            return False
+
+        try:
+            if sample_rate_hz is None:
+                sample_rate_hz = int(1e9 / self.ai_sample_rate_ns)
+            if oneshot_points is None:
+                oneshot_points = self.ai_oneshot_points
+            if not self.configure_ai_acquisition(self.MODE_ONESHOT, sample_rate_hz, oneshot_points):
+                return False
+
+            # 槽位尽量容纳一次采集的全部数据，减少单次采集的读取次数
+            max_slot_points = self.ai_ring_max_bytes // (4 * self.ai_ring_min_slots)
+            self._prepare_ai_ring(min(oneshot_points * num_enabled_channels, max_slot_points))
+
+            self.data_callback = data_callback
+            self.burst_count = 0
+            self._burst_future = None
+            self._burst_request.clear()
+            self.burst_active = True
+            self.is_acquiring = True
+            self._start_processing_stage()
+            self.acquisition_thread = threading.Thread(target=self._ai_burst_loop, daemon=True)
+            self.acquisition_thread.start()
+            logger.info(f"连发单次采集模式已启动: {sample_rate_hz}Hz × {oneshot_points}点")
+            return True
+        except Exception as e:
+            logger.error(f"启动连发单次采集模式异常: {e}")
+            self.burst_active = False
+            self.is_acquiring = False
+            return False
+
+    def acquire_burst(self) -> Future:
+        """
+        重新布防并触发一次单次采集
+
+        Returns:
+            Future: 本次采集的最后一个数据包交给数据回调后完成，结果为每通道点数；
+                    asyncio中可通过 asyncio.wrap_future 等待
+        """
+        future = Future()
+        with self._burst_lock:
+            if not self.burst_active:
+                future.set_exception(RuntimeError("连发单次采集模式未启动"))
+            elif self._burst_future is not None and not self._burst_future.done():
+                future.set_exception(RuntimeError("上一次单次采集尚未完成"))
+            else:
+                self._burst_future = future
+                self._burst_request.set()
+        return future
+
+    def stop_burst_mode(self) -> bool:
+        """退出连发单次采集模式"""
+        if not self.burst_active:
+            return True
+        try:
+            self.burst_active = False
+            self.is_acquiring = False
+            self._burst_request.set()
+            if self.acquisition_thread and self.acquisition_thread.is_alive():
+                self.acquisition_thread.join(timeout=2.0)
+            self._stop_processing_stage()
+            self._complete_burst(error=RuntimeError("连发单次采集模式已停止"))
+            if self.is_opened:
+                self.dll.SetUSB5ClrAiTrigger(self.device_index)
+                self.dll.SetUSB5ClrAiFifo(self.device_index)
+            logger.info(f"连发单次采集模式已停止，共采集 {self.burst_count} 次")
+            return True
+        except Exception as e:
+            logger.error(f"停止连发单次采集模式异常: {e}")
+            return False
+
+    def _ai_burst_loop(self):
+        """连发单次采集线程：等待 acquire_burst 请求，重新布防、触发并读取一次单次采集"""
+        logger.info("连发单次采集线程启动")
+        layout = self.ai_layout()
+        try:
+            while self.burst_active:
+                if not self._burst_request.wait(0.5):
+                    continue
+                self._burst_request.clear()
+                if not self.burst_active:
+                    break
+
+                # 重新布防：清除上一次的触发与FIFO，然后软件触发
+                self.dll.SetUSB5ClrAiTrigger(self.device_index)
+                self.dll.SetUSB5ClrAiFifo(self.device_index)
+                self.ai_sample_index = 0
+                self.oneshot_progress = 0
+                self.oneshot_completed = False
+                trigger_start = time.time()
+                result = self.dll.SetUSB5AiSoftTrig(self.device_index)
+                if not self._check_result(result, "AI软件触发"):
+                    self._complete_burst(error=RuntimeError("AI软件触发失败"))
+                    continue
+                self.ai_trigger_time = (trigger_start + time.time()) / 2
+                if self.trigger_callback:
+                    self.trigger_callback()
 
-    def _process_ai_acquired_data(self, points_acquired: int, remaining_points: int, is_final: bool = False) -> Optional[Dict]:
+                points = self._read_oneshot_points(layout, lambda: self.burst_active)
+                self.burst_count += 1
+                if points < self.ai_oneshot_points:
+                    self._complete_burst(error=RuntimeError(f"单次采集未完成: {points}/{self.ai_oneshot_points}"))
+                # 读满时由处理线程在最后一个数据包回调后完成Future
+        except Exception as e:
+            logger.error(f"连发单次采集异常: {e}")
+            self._complete_burst(error=e)
+        finally:
+            if self.ai_queue is not None:
+                self.ai_queue.close()
+            logger.info("连发单次采集线程结束")
+
+    def _complete_burst(self, result: Any = None, error: Optional[BaseException] = None):
+        """完成当前连发单次采集的Future"""
+        with self._burst_lock:
+            future = self._burst_future
+            if future is None or future.done():
+                return
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+    def set_ai_calibration(self, channel: int, config: Optional[Dict] = None) -> bool:
+        """
+        设置AI通道标定，之后读取的数据直接为工程量
+
+        Args:
+            channel: 通道号(0-15)
+            config: 标定参数 sensitivity/gain/offset/coefficients/unit（见 ChannelCalibration.from_config），
+                    None 表示取消标定、输出电压
+
+        Returns:
+            bool: 设置是否成功
+        """
+        if not (0 <= channel <= 15):
+            logger.error(f"AI通道号无效: {channel}")
+            return False
+        try:
+            calibration = ChannelCalibration.from_config(config) if config else None
+            self.calibration.set(channel, calibration)
+            if calibration is not None and not calibration.is_identity():
+                logger.info(f"AI通道{channel}标定: {calibration}")
+            return True
+        except Exception as e:
+            logger.error(f"设置AI通道{channel}标定异常: {e}")
+            return False
+
+    def set_ai_calibrations(self, configs: Dict[int, Optional[Dict]]) -> bool:
+        """
+        整体替换标定表：未列出的通道恢复为电压输出
+
+        Args:
+            configs: {通道号: 标定参数}，参数格式同 set_ai_calibration
+
+        Returns:
+            bool: 全部设置成功
+        """
+        self.calibration.clear()
+        return all([self.set_ai_calibration(int(ch), config) for ch, config in configs.items()])
+
+    def get_ai_calibration(self) -> Dict[int, Dict]:
+        """已设置标定的通道 {通道号: {'coefficients', 'unit'}}"""
+        return self.calibration.to_dict()
+
+    def set_ai_rate_groups(self, groups: Optional[Dict], sample_rate_hz: Optional[int] = None) -> bool:
+        """
+        设置多速率通道组，下一次开始采集时生效
+
+        未列入速率组的通道以采集采样率输出；降速组的通道经抗混叠滤波抽取后以组采样率发出数据包、
+        记录到 <记录路径>_<采样率>Hz
+
+        Args:
+            groups: {输出采样率: [通道号]}，输出采样率须能整除采集采样率，通道须已启用；
+                    None或空表示全部通道以采集采样率输出
+            sample_rate_hz: 校验所用的采集采样率，None时为当前设置（开始采集时按届时的配置重新创建）
+
+        Returns:
+            bool: 设置是否成功；速率组中有未启用的通道时拒绝设置
+        """
+        try:
+            parsed = parse_rate_groups(groups)
+            disabled = self._rate_group_disabled_channels(parsed)
+            if disabled:
+                raise ValueError(f"速率组中的通道{disabled}未启用")
+            if sample_rate_hz is None and self.ai_sample_rate_ns > 0:
+                sample_rate_hz = int(1e9 / self.ai_sample_rate_ns)
+            if parsed and sample_rate_hz:
+                RateGroupSplitter(parsed, self.ai_layout().channels, sample_rate_hz)
+            self.ai_rate_groups = parsed
+            if parsed:
+                logger.info(f"多速率通道组: {parsed}")
+            return True
+        except Exception as e:
+            logger.error(f"设置多速率通道组异常: {e}")
+            return False
+
+    def _rate_group_disabled_channels(self, groups: Dict[int, List[int]]) -> List[int]:
+        """速率组中未启用的通道"""
+        enabled = self.ai_layout().channels
+        return sorted(ch for channels in groups.values() for ch in channels if ch not in enabled)
+
+    def get_ai_rate_groups(self) -> Dict:
+        """
+        多速率通道组状态
+
+        Returns:
+            Dict: groups 为配置 {输出采样率字符串: [通道号]}；disabled_channels 为速率组中当前未启用的通道
+                  （此时开始采集不会按速率组拆分）；runtime 为最近一次采集的拆分器状态
+                  {'sample_rate', 'groups': [各组的采样率、抽取倍数、通道与级数]}，未按速率组拆分时为None
+        """
+        splitter = self.rate_splitter
+        return {
+            'groups': {str(rate): channels for rate, channels in self.ai_rate_groups.items()},
+            'disabled_channels': self._rate_group_disabled_channels(self.ai_rate_groups),
+            'runtime': splitter.metrics() if splitter is not None else None,
+        }
+
+    def _create_rate_splitter(self) -> Optional[RateGroupSplitter]:
+        """按当前通道与采样率创建速率组拆分器，没有降速组时为None"""
+        if not self.ai_rate_groups or self.ai_sample_rate_ns <= 0:
+            return None
+        try:
+            splitter = RateGroupSplitter(self.ai_rate_groups, self.ai_layout().channels,
+                                         int(1e9 / self.ai_sample_rate_ns))
+        except Exception as e:
+            logger.error(f"多速率通道组与采集配置不符，全部通道以采集采样率输出: {e}")
+            return None
+        if not splitter.active:
+            return None
+        logger.info(f"多速率输出: {splitter.metrics()['groups']}")
+        return splitter
+
+    def start_recording(self, path: str, preview_rate_hz: Optional[float] = 1000.0,
+                        metadata: Optional[Dict] = None, **options) -> bool:
+        """
+        开始直接落盘记录：之后读取的每个数据块都由读取线程写入本地文件，
+        数据回调只收到按 preview_rate_hz 抽取的预览数据包
+
+        可在采集开始前或采集过程中调用，连续采集与连发单次采集均适用
+
+        Args:
+            path: 记录路径，生成 .json/.idx/.NNNN.dat 文件（见 AiRecorder）
+            preview_rate_hz: 预览数据的每通道采样率，None表示回调仍接收全部数据
+            metadata: 写入记录元数据的附加信息
+            **options: AiRecorder 参数 chunk_bytes/segment_bytes/fsync_interval_s/buffer_bytes
+
+        Returns:
+            bool: 是否成功开始记录
+
+        设置了多速率通道组时使用 MultiRateRecorder，降速组记录在 path_<采样率>Hz
+        """
+        if self.recorder is not None:
+            logger.warning("已在记录中")
+            return False
+        try:
+            recorder_class = MultiRateRecorder if self.ai_rate_groups else AiRecorder
+            recorder = recorder_class(path, metadata, **options)
+            if not recorder.open():
+                return False
+            self.recording_preview_rate_hz = preview_rate_hz
+            self.recorder = recorder
+            return True
+        except Exception as e:
+            logger.error(f"开始记录异常: {e}")
+            return False
+
+    def stop_recording(self) -> Optional[Dict]:
+        """
+        停止记录并关闭文件
+
+        Returns:
+            Optional[Dict]: 记录统计（路径、点数、字节数等，见 AiRecorder.metrics），未在记录时为None
+        """
+        recorder = self.recorder
+        if recorder is None:
+            return None
+        self.recorder = None
+        try:
+            self.last_recording = recorder.close()
+            return self.last_recording
+        except Exception as e:
+            logger.error(f"停止记录异常: {e}")
+            return None
+
+    def get_recording_status(self) -> Dict:
+        """当前记录状态；未在记录时返回最近一次记录的统计"""
+        recorder = self.recorder
+        if recorder is not None:
+            return recorder.metrics()
+        return self.last_recording or {}
+
+    def start_event_capture(self, conditions: List[Any], pre_points: int = 1000, post_points: int = 1000,
+                            holdoff_points: int = 0,
+                            on_event: Optional[Callable[[TriggerEvent], None]] = None) -> bool:
+        """
+        开始软件触发事件采集：在连续采集的全速率数据上检测触发条件，
+        每次触发输出 pre_points+post_points 点的事件记录（TriggerEvent）
+
+        可在采集开始前或采集过程中调用
+
+        Args:
+            conditions: 触发条件列表，元素为 TriggerCondition 或其配置字典（任一满足即触发）
+            pre_points: 触发前点数（每通道）
+            post_points: 触发后点数（每通道）
+            holdoff_points: 事件结束后不检测触发的点数
+            on_event: 事件回调，在事件分发线程中执行
+
+        Returns:
+            bool: 是否成功开始
+        """
+        try:
+            conditions = [c if isinstance(c, TriggerCondition) else TriggerCondition.from_config(c)
+                          for c in conditions]
+            capture = TriggerCapture(conditions, pre_points, post_points, holdoff_points, on_event)
+        except Exception as e:
+            logger.error(f"触发条件配置异常: {e}")
+            return False
+        self.stop_event_capture()
+        capture.start()
+        self.event_capture = capture
+        logger.info(f"触发事件采集已开始: {[c.describe() for c in conditions]}, "
+                    f"触发前{pre_points}点, 触发后{post_points}点")
+        return True
+
+    def stop_event_capture(self) -> Optional[Dict]:
+        """
+        停止触发事件采集
+
+        Returns:
+            Optional[Dict]: 事件采集统计（见 TriggerCapture.metrics），未在采集时为None
+        """
+        capture = self.event_capture
+        if capture is None:
+            return None
+        self.event_capture = None
+        capture.stop()
+        self.last_event_capture = capture.metrics()
+        logger.info(f"触发事件采集已停止: 共{capture.event_count}个事件")
+        return self.last_event_capture
+
+    def get_event_capture_status(self) -> Dict:
+        """当前触发事件采集统计；未在采集时返回最近一次的统计"""
+        capture = self.event_capture
+        if capture is not None:
+            return capture.metrics()
+        return self.last_event_capture or {}
+
+    def ai_layout(self) -> AiLayout:
+        """当前启用通道与 ai_fifo_order 对应的数据排列（通道配置不变时复用同一对象）"""
+        layout = self._ai_layout
+        channels = tuple(i for i, enabled in enumerate(self.ai_channels) if enabled)
+        if layout is None or layout.channels != channels or layout.order != self.ai_fifo_order:
+            layout = self._ai_layout = AiLayout(channels, self.ai_fifo_order)
+        return layout
+
+    def _read_ai_block(self, points_per_channel: int, layout: AiLayout, timeout_ms: Optional[int] = None):
+        """
+        从FIFO读取每通道points_per_channel个点，直接写入环形缓冲区槽位
+
+        Args:
+            points_per_channel: 每通道点数
+            layout: 本次读取的数据排列
+            timeout_ms: 读取超时，默认使用 ai_timeout_ms
+
+        Returns:
+            (remaining_points, block): USB5GetAi返回值及数据块，读取失败时block为None
+        """
+        pointer = self.ai_ring.reserve(layout.total_points(points_per_channel))
+        started = time.perf_counter()
+        remaining_points = self.dll.USB5GetAi(
+            self.device_index,
+            ctypes.c_long(points_per_channel),
+            pointer,
+            ctypes.c_long(self.ai_timeout_ms if timeout_ms is None else timeout_ms)
+        )
+        stats = self.ai_read_stats
+        stats['usb5_get_ai'].record(time.perf_counter() - started)
+        if remaining_points < 0:
+            return remaining_points, None
+        self.ai_remaining_points = remaining_points
+        stats['points_per_read'].record(points_per_channel)
+        stats['backlog_points'].record(remaining_points // max(1, layout.num_channels))
+        return remaining_points, self.ai_ring.commit(layout, points_per_channel, self.calibration.plan(layout))
+
+    def _make_packet(self, block: AiBlock, is_final: bool = False) -> AiPacket:
+        """由数据块构造数据包，并推进样本序号"""
+        oneshot = self.ai_sample_mode == self.MODE_ONESHOT
+        packet = AiPacket(
+            block.data,
+            block.layout.channels,
+            start_index=self.ai_sample_index,
+            sample_rate=int(1e9 / self.ai_sample_rate_ns) if self.ai_sample_rate_ns > 0 else 0,
+            timestamp=time.time(),
+            seq=self.ai_packet_seq,
+            remaining_points=self.ai_remaining_points,
+            block=block,
+            is_final=is_final,
+            oneshot_progress=self.oneshot_progress if oneshot else None,
+            total_points=self.ai_oneshot_points if oneshot else None,
+            units=block.units,
+        )
+        self.ai_sample_index += block.points_per_channel
+        self.ai_packet_seq += 1
+        self.ai_integrity.observe_packet(packet)
+        return packet
+
+    def _process_ai_acquired_data(self, block: AiBlock, remaining_points: int, is_final: bool = False) -> Optional[AiPacket]:
         """
         处理AI采集到的数据
         Args:
-            points_acquired: 本次采集的点数（总点数=每通道点数*通道数）
+            block: 环形缓冲区中本次读取的数据块
             remaining_points: 缓冲区剩余点数
             is_final: 是否为最终数据包
         Returns:
-            Optional[Dict]: 处理后的数据包
+            Optional[AiPacket]: 处理后的数据包
         """
         if not self._check_dll_loaded():
             return None
         try:
-            enabled_channels = [i for i, enabled in enumerate(self.ai_channels) if enabled]
-            num_enabled_channels = len(enabled_channels)
-            if num_enabled_channels == 0:
-                return None
-            points_per_channel = points_acquired // num_enabled_channels if num_enabled_channels > 0 else 0
-            if points_per_channel == 0:
-                logger.warning(f"采集点数({points_acquired})不足以分配给通道")
-                return None
-            channel_data = {}
-            for i, ch in enumerate(enabled_channels):
-                start = i * points_per_channel
-                end = start + points_per_channel
-                if self.ai_data_buffer is not None and end <= len(self.ai_data_buffer):
-                    channel_data[ch] = self.ai_data_buffer[start:end].copy()
-                else:
-                    channel_data[ch] = np.zeros(points_per_channel, dtype='float32')
-            sample_rate_hz = int(1e9 / self.ai_sample_rate_ns)
-            data_packet = {
-                'timestamp': time.time(),
-                'sample_rate': sample_rate_hz,
-                'points_per_channel': points_per_channel,
-                'remaining_points': remaining_points,
-                'channel_data': {str(ch): data.tolist() for ch, data in channel_data.items()},
-                'enabled_channels': enabled_channels,
-                'oneshot_progress': self.oneshot_progress if self.ai_sample_mode == self.MODE_ONESHOT else None,
-                'is_final': is_final,
-                'total_points': self.ai_oneshot_points if self.ai_sample_mode == self.MODE_ONESHOT else None
-            }
-            if self.data_callback:
-                self.data_callback(data_packet)
-            logger.info(f"原始数据前20个: {self.ai_data_buffer[:20] if self.ai_data_buffer is not None else []}")
-            for ch in enabled_channels:
-                ch_data = channel_data.get(ch, [])
-                logger.info(f"分离后CH{ch}前5个: {ch_data[:5]}")
+            data_packet = self._make_packet(block, is_final)
+            capture = self.event_capture
+            if capture is not None:
+                capture.process(data_packet)
+            splitter = self.rate_splitter
+            packets = splitter.split(data_packet) if splitter is not None else (data_packet,)
+            recorder = self.recorder
+            for packet in packets:
+                if recorder is not None:
+                    recorder.write(packet)
+                    packet = preview_packet(packet, self.recording_preview_rate_hz)
+                self._dispatch_packet(packet)
             return data_packet
         except Exception as e:
             logger.error(f"AI数据处理异常: {e}")
@@ -752,6 +1421,8 @@ class USB5121Driver:
         if not self._check_dll_loaded():
             return False
 
+        self._stop_ao_streamer(channel)
+
         try:
             result = self.dll.SetUSB5AoImmediately(
                 self.device_index,
@@ -770,19 +1441,18 @@ class USB5121Driver:
             logger.error(f"设置AO通道{channel}电压异常: {e}")
             return False
 
-    def output_ao_waveform(self, channel: int, waveform_data: np.ndarray,
-                           sample_rate_hz: int = 10000, cycle_count: int = 0) -> bool:
+    def configure_ao_output(self, channel: int, mode: int, sample_rate_hz: int, cycle_count: int = 0) -> bool:
         """
-        AO通道波形输出
+        清除AO触发和FIFO，并下发输出模式、采样率、触发源、时钟源与循环次数（只下发发生变化的寄存器）
 
         Args:
             channel: AO通道号(0-3)
-            waveform_data: 波形数据
+            mode: AO_MODE_CONTINUOUS / AO_MODE_CYCLE
             sample_rate_hz: 输出采样率
-            cycle_count: 循环次数(0为无限循环)
+            cycle_count: 循环次数(0为无限循环)，仅循环模式有效
 
         Returns:
-            bool: 输出是否成功
+            bool: 配置是否成功
         """
         if not self.is_opened:
             logger.error("设备未打开")
@@ -797,61 +1467,180 @@ class USB5121Driver:
 
         try:
             chan = ctypes.c_char(channel)
-            sample_rate_ns = int(1e9 / sample_rate_hz)
 
             # 清除AO触发和FIFO
             self.dll.SetUSB5ClrAoTrigger(self.device_index, chan)
             self.dll.SetUSB5ClrAoFifo(self.device_index, chan)
 
-            # 设置AO输出模式
-            result1 = self.dll.SetUSB5AoSampleMode(
-                self.device_index, chan, ctypes.c_char(self.AO_MODE_CYCLE)
-            )
-            success1 = self._check_result(result1, f"设置AO通道{channel}输出模式")
+            return self.configure_transaction().ao_output(channel, mode, sample_rate_hz, cycle_count).commit()
 
-            # 设置采样率
-            result2 = self.dll.SetUSB5AoSampleRate(
-                self.device_index, chan, ctypes.c_uint(sample_rate_ns)
-            )
-            success2 = self._check_result(result2, f"设置AO通道{channel}采样率")
+        except Exception as e:
+            logger.error(f"AO通道{channel}输出配置异常: {e}")
+            return False
 
-            # 设置触发源
-            result3 = self.dll.SetUSB5AoTrigSource(
-                self.device_index, chan, ctypes.c_char(0)
-            )
-            success3 = self._check_result(result3, f"设置AO通道{channel}触发源")
+    def write_ao_fifo(self, channel: int, data: np.ndarray) -> bool:
+        """
+        向AO FIFO写入一段float32数据
 
-            # 设置时钟源
-            result4 = self.dll.SetUSB5AoConvSource(
-                self.device_index, chan, ctypes.c_char(0)
-            )
-            success4 = self._check_result(result4, f"设置AO通道{channel}时钟源")
+        Args:
+            channel: AO通道号(0-3)
+            data: 波形数据（float32连续数组可零拷贝传入）
 
-            # 设置循环次数
-            result5 = self.dll.SetUSB5AoCycle(
-                self.device_index, chan, ctypes.c_uint(cycle_count)
-            )
-            success5 = self._check_result(result5, f"设置AO通道{channel}循环次数")
-
-            # 设置波形数据
-            waveform_float32 = waveform_data.astype('float32')
-            result6 = self.dll.SetUSB5AoDataFifo(
-                self.device_index, chan,
-                waveform_float32.ctypes.data_as(POINTER(c_float)),
-                ctypes.c_uint(len(waveform_float32))
+        Returns:
+            bool: 写入是否成功
+        """
+        try:
+            data = np.ascontiguousarray(data, dtype=np.float32)
+            result = self.dll.SetUSB5AoDataFifo(
+                self.device_index, ctypes.c_char(channel),
+                data.ctypes.data_as(POINTER(c_float)),
+                ctypes.c_uint(len(data))
             )
-            success6 = self._check_result(result6, f"设置AO通道{channel}波形数据")
+            return self._check_result(result, f"设置AO通道{channel}波形数据")
+        except Exception as e:
+            logger.error(f"AO通道{channel}写入波形数据异常: {e}")
+            return False
 
-            # 软件触发
-            result7 = self.dll.SetUSB5AoSoftTrig(self.device_index, chan)
-            success7 = self._check_result(result7, f"AO通道{channel}软件触发")
+    def trigger_ao(self, channel: int) -> bool:
+        """AO通道软件触发"""
+        try:
+            result = self.dll.SetUSB5AoSoftTrig(self.device_index, ctypes.c_char(channel))
+            return self._check_result(result, f"AO通道{channel}软件触发")
+        except Exception as e:
+            logger.error(f"AO通道{channel}软件触发异常: {e}")
+            return False
+
+    def output_ao_waveform(self, channel: int, waveform_data: np.ndarray,
+                           sample_rate_hz: int = 10000, cycle_count: int = 0) -> bool:
+        """
+        AO通道波形输出
+
+        Args:
+            channel: AO通道号(0-3)
+            waveform_data: 波形数据
+            sample_rate_hz: 输出采样率
+            cycle_count: 循环次数(0为无限循环)
+
+        Returns:
+            bool: 输出是否成功
+        """
+        self._stop_ao_streamer(channel)
+
+        if not self.configure_ao_output(channel, self.AO_MODE_CYCLE, sample_rate_hz, cycle_count):
+            return False
+
+        if not self.write_ao_fifo(channel, waveform_data):
+            return False
+
+        if not self.trigger_ao(channel):
+            return False
+
+        self.ao_channels[channel] = True
+        return True
+
+    def output_ao_standard_waveform(self, channel: int, kind: str, sample_rate_hz: int = 10000,
+                                    cycle_count: int = 0, **params) -> bool:
+        """
+        输出标准激励波形，波形数据取自共享缓存，相同参数重复输出时无需重新生成
+
+        Args:
+            channel: AO通道号(0-3)
+            kind: 波形类型 sine/square/triangle/sawtooth/chirp/dc/noise
+            sample_rate_hz: 输出采样率
+            cycle_count: 循环次数(0为无限循环)
+            **params: 波形参数，见 WaveformCache.get
+
+        Returns:
+            bool: 输出是否成功
+        """
+        try:
+            waveform = self.waveform_cache.get(kind, sample_rate_hz, **params)
+        except Exception as e:
+            logger.error(f"生成AO标准波形异常: {e}")
+            return False
+
+        if len(waveform) > self.ao_fifo_points:
+            # 超出AO FIFO深度的波形（如长时扫频）改为流式输出
+            return self.start_ao_stream(channel, waveform, sample_rate_hz, cycles=cycle_count)
+        return self.output_ao_waveform(channel, waveform, sample_rate_hz, cycle_count)
+
+    def start_ao_stream(self, channel: int, source: Any, sample_rate_hz: int = 10000,
+                        chunk_points: Optional[int] = None, lead_seconds: float = 0.2,
+                        cycles: int = 1) -> bool:
+        """
+        启动AO流式输出：后台线程按块补充FIFO，适用于扫频、实测振动谱等长时或非周期信号
+
+        Args:
+            channel: AO通道号(0-3)
+            source: 数组、内存映射数组、文件路径(.npy或原始float32)或产生数组的生成器
+            sample_rate_hz: 输出采样率
+            chunk_points: 每次补充的点数
+            lead_seconds: FIFO中保持的待输出时长
+            cycles: 数组数据源的重复次数（0为无限重复）
+
+        Returns:
+            bool: 启动是否成功
+        """
+        if not (0 <= channel <= 3):
+            logger.error(f"AO通道号无效: {channel}")
+            return False
 
-            return all([success1, success2, success3, success4, success5, success6, success7])
+        self._stop_ao_streamer(channel)
 
+        try:
+            streamer = AoStreamer(self, channel, source, sample_rate_hz,
+                                  chunk_points=chunk_points,
+                                  lead_seconds=lead_seconds,
+                                  cycles=cycles,
+                                  fifo_points=self.ao_fifo_points)
         except Exception as e:
-            logger.error(f"AO通道{channel}波形输出异常: {e}")
+            logger.error(f"AO通道{channel}打开流式数据源异常: {e}")
+            return False
+
+        if not streamer.start():
             return False
 
+        self.ao_streamers[channel] = streamer
+        self.ao_channels[channel] = True
+        return True
+
+    def stop_ao_stream(self, channel: Optional[int] = None) -> bool:
+        """
+        停止AO流式输出并清除AO触发
+
+        Args:
+            channel: AO通道号，None表示全部通道
+
+        Returns:
+            bool: 是否成功
+        """
+        channels = list(self.ao_streamers) if channel is None else [channel]
+        for ch in channels:
+            if self._stop_ao_streamer(ch) and self.is_opened and self.dll is not None:
+                try:
+                    self.dll.SetUSB5ClrAoTrigger(self.device_index, ctypes.c_char(ch))
+                    self.dll.SetUSB5ClrAoFifo(self.device_index, ctypes.c_char(ch))
+                except Exception as e:
+                    logger.error(f"AO通道{ch}停止流式输出异常: {e}")
+                    return False
+        return True
+
+    def _stop_ao_streamer(self, channel: int) -> bool:
+        """停止通道上的流式输出线程，返回该通道是否有流式输出"""
+        streamer = self.ao_streamers.pop(channel, None)
+        if streamer is None:
+            return False
+        streamer.stop()
+        logger.info(f"AO通道{channel}流式输出已停止: 共写入{streamer.written_points}点, 欠载{streamer.underruns}次")
+        return True
+
+    def get_ao_metrics(self) -> Dict:
+        """AO流式输出与波形缓存统计"""
+        return {
+            'streams': {ch: streamer.metrics() for ch, streamer in self.ao_streamers.items()},
+            'waveform_cache': self.waveform_cache.metrics(),
+        }
+
     def get_device_status(self) -> Dict:
         """
         获取设备状态
@@ -867,7 +1656,19 @@ class USB5121Driver:
             'ai_enabled_channels': [i for i, enabled in enumerate(self.ai_channels) if enabled],
             'ai_channel_ranges': self.ai_channel_ranges,
             'ao_channels': self.ao_channels,
-            'ao_voltages': self.ao_voltages
+            'ao_voltages': self.ao_voltages,
+            'read_scheduler': self.get_acquisition_metrics(),
+            'processing_queue': self.get_queue_metrics(),
+            'ao_output': self.get_ao_metrics(),
+            'config_state': self.get_config_state(),
+            'ai_calibration': self.get_ai_calibration(),
+            'recording': self.get_recording_status(),
+            'event_capture': self.get_event_capture_status(),
+            'rate_groups': self.get_ai_rate_groups(),
+            'integrity': self.get_integrity_metrics(),
+            'stage_latency': self.get_stage_latency(),
+            'instrumentation': self.get_instrumentation(histogram=False),
+            'replay': self.get_replay_status()
         }
 
     def __del__(self):
@@ -877,54 +1678,36 @@ class USB5121Driver:
         except:
             pass
 
-    def _separate_channel_data(self, raw_data: np.ndarray, points_per_channel: int) -> Dict[str, List[float]]:
+    def _separate_channel_data(self, raw_data: np.ndarray, points_per_channel: int) -> Dict[str, np.ndarray]:
         """
-        USB5000系列多通道连续采样分离：按物理通道号分段切片
-        raw_data = [CH0的N点][CH1的N点]...[CH15的N点]
-        enabled_channels = [a, b, c, ...]
+        将一次读取的原始数据按启用通道拆分，排列方式见 ai_layout()
+        返回的各通道数据均为 raw_data 的视图，不拷贝
         """
         try:
-            enabled_channels = [i for i, enabled in enumerate(self.ai_channels) if enabled]
-            num_channels = 16
-            separated_data = {}
-            for ch in enabled_channels:
-                start_idx = ch * points_per_channel
-                end_idx = start_idx + points_per_channel
-                if end_idx <= len(raw_data):
-                    separated_data[str(ch)] = raw_data[start_idx:end_idx].tolist()
-                else:
-                    separated_data[str(ch)] = [0.0] * points_per_channel
-            return separated_data
+            return {str(ch): data for ch, data in self.ai_layout().split(raw_data, points_per_channel).items()}
         except Exception as e:
             logger.error(f"数据分离失败: {e}")
             return {}
 
-    def _get_ai_data(self, points_per_channel: int) -> Optional[Dict[str, List[float]]]:
+    def _get_ai_data(self, points_per_channel: int) -> Optional[AiBlock]:
         """
         获取AI数据
         Args:
             points_per_channel: 每个通道需要获取的数据点数
         Returns:
-            通道数据字典
+            环形缓冲区中的数据块，失败返回None
         """
         try:
             if not self.is_opened:
                 logger.error("设备未打开")
                 return None
-            enabled_channels = [i for i, enabled in enumerate(self.ai_channels) if enabled]
-            num_enabled_channels = len(enabled_channels)
+            layout = self.ai_layout()
+            num_enabled_channels = layout.num_channels
             if num_enabled_channels == 0:
                 logger.warning("没有启用的AI通道")
-                return {}
-            total_points = points_per_channel * num_enabled_channels
-            data_buffer = (ctypes.c_float * total_points)()
+                return None
             # 关键修正：Points参数为每通道点数
-            result = self.dll.USB5GetAi(
-                self.device_index,
-                ctypes.c_uint(points_per_channel),
-                ctypes.cast(data_buffer, ctypes.POINTER(ctypes.c_float)),
-                ctypes.c_long(self.ai_timeout_ms)
-            )
+            result, block = self._read_ai_block(points_per_channel, layout)
             if result < 0:
                 if result == -7:
                     logger.debug(f"获取AI数据超时，可能缓冲区数据不足: {result}")
@@ -932,19 +1715,25 @@ class USB5121Driver:
                 else:
                     logger.error(f"获取AI数据失败: {result}")
                     return None
-            raw_data = np.array(data_buffer, dtype=np.float32)
-            # 按文档顺序分离数据
-            separated_data = {}
-            for i, ch in enumerate(enabled_channels):
-                start = i * points_per_channel
-                end = start + points_per_channel
-                separated_data[str(ch)] = raw_data[start:end].tolist()
-            logger.debug(f"获取AI数据成功: 通道数={len(separated_data)}, 每通道点数={points_per_channel}")
-            return separated_data
+            logger.debug(f"获取AI数据成功: 通道数={num_enabled_channels}, 每通道点数={points_per_channel}")
+            return block
         except Exception as e:
             logger.error(f"获取AI数据异常: {e}")
             return None
 
+    def get_buffer_remaining(self) -> int:
+        """
+        获取FIFO剩余点数
+
+        采集进行中返回读取线程最近一次读取后的剩余点数，避免与读取线程并发调用 USB5GetAi
+
+        Returns:
+            剩余点数
+        """
+        if self.is_acquiring:
+            return self.ai_remaining_points
+        return self._get_buffer_remaining()
+
     def _get_buffer_remaining(self) -> int:
         """
         获取缓冲区剩余点数
@@ -988,13 +1777,11 @@ class USB5121Driver:
                 logger.error(f"无效的采集模式: {mode}")
                 return False
             
-            result = self.dll.SetUSB5AiSampleMode(self.device_index, ctypes.c_char(mode))
-            if result == 0:
-                self.ai_sample_mode = mode
+            if self.configure_transaction().ai_sample_mode(mode).commit():
                 logger.info(f"设置AI采集模式成功: {'连续' if mode == 0 else '单次'}")
                 return True
             else:
-                logger.error(f"设置AI采集模式失败: {result}")
+                logger.error("设置AI采集模式失败")
                 return False
                 
         except Exception as e:
@@ -1023,13 +1810,11 @@ class USB5121Driver:
             # 转换为纳秒周期
             sample_rate_ns = int(1e9 / sample_rate_hz)
             
-            result = self.dll.SetUSB5AiSampleRate(self.device_index, ctypes.c_int(sample_rate_ns))
-            if result == 0:
-                self.ai_sample_rate_ns = sample_rate_ns
+            if self.configure_transaction().ai_sample_rate(sample_rate_hz).commit():
                 logger.info(f"设置AI采样率成功: {sample_rate_hz}Hz ({sample_rate_ns}ns)")
                 return True
             else:
-                logger.error(f"设置AI采样率失败: {result}")
+                logger.error("设置AI采样率失败")
                 return False
                 
         except Exception as e:
@@ -1055,13 +1840,11 @@ class USB5121Driver:
                 logger.error(f"无效的采集点数: {points}")
                 return False
             
-            result = self.dll.SetUSB5AiOneShotPoints(self.device_index, ctypes.c_uint(points))
-            if result == 0:
-                self.ai_oneshot_points = points
+            if self.configure_transaction().ai_oneshot_points(points).commit():
                 logger.info(f"设置AI单次采集点数成功: {points}")
                 return True
             else:
-                logger.error(f"设置AI单次采集点数失败: {result}")
+                logger.error("设置AI单次采集点数失败")
                 return False
                 
         except Exception as e:
@@ -1082,9 +1865,10 @@ class USB5121Driver:
             
             self.is_acquiring = False
             
-            # 等待采集线程结束
+            # 等待采集线程与处理线程结束
             if self.acquisition_thread and self.acquisition_thread.is_alive():
                 self.acquisition_thread.join(timeout=2.0)
+            self._stop_processing_stage()
             
             # 清除触发和缓冲区
             if self.is_opened:
@@ -1110,37 +1894,18 @@ class USB5121Driver:
                 logger.error("设备未打开")
                 return False
             
-            # 设置采集模式
-            result = self.dll.SetUSB5AiSampleMode(self.device_index, ctypes.c_char(self.ai_sample_mode))
-            if result != 0:
-                logger.error(f"设置AI采集模式失败: {result}")
-                return False
-            
-            # 设置采样率
-            result = self.dll.SetUSB5AiSampleRate(self.device_index, ctypes.c_int(self.ai_sample_rate_ns))
-            if result != 0:
-                logger.error(f"设置AI采样率失败: {result}")
-                return False
-            
+            tx = self.configure_transaction()
+            tx.ai_sample_mode(self.ai_sample_mode)
+            tx.set('ai_sample_rate_ns', self.ai_sample_rate_ns)
             # 如果是单次采集模式，设置点数
-            if self.ai_sample_mode == 1:
-                result = self.dll.SetUSB5AiOneShotPoints(self.device_index, ctypes.c_uint(self.ai_oneshot_points))
-                if result != 0:
-                    logger.error(f"设置AI单次采集点数失败: {result}")
-                    return False
-            
-            # 设置触发源（软件触发）
-            result = self.dll.SetUSB5AiTrigSource(self.device_index, ctypes.c_char(0))
-            if result != 0:
-                logger.error(f"设置AI触发源失败: {result}")
+            if self.ai_sample_mode == self.MODE_ONESHOT:
+                tx.ai_oneshot_points(self.ai_oneshot_points)
+            # 软件触发、内部时钟
+            tx.ai_sources(self.TRIG_SOFTWARE, self.CLOCK_INTERNAL)
+            if not tx.commit():
+                logger.error("配置AI采集参数失败")
                 return False
-            
-            # 设置时钟源（内部时钟）
-            result = self.dll.SetUSB5AiConvSource(self.device_index, ctypes.c_char(0))
-            if result != 0:
-                logger.error(f"设置AI时钟源失败: {result}")
-                return False
-            
+
             logger.info("AI采集参数配置成功")
             return True
             
@@ -1169,17 +1934,23 @@ class USB5121Driver:
                 return False
             if not self._configure_ai_acquisition():
                 return False
+            if not self._create_read_scheduler():
+                return False
             self.dll.SetUSB5ClrAiFifo(self.device_index)
+            trigger_start = time.time()
             result = self.dll.SetUSB5AiSoftTrig(self.device_index)
             if result != 0:
                 logger.error(f"启动软件触发失败: {result}")
                 return False
+            self.ai_trigger_time = (trigger_start + time.time()) / 2
             self.is_acquiring = True
+            self.ai_sample_index = 0
             self.data_callback = callback
             self.acquisition_thread = threading.Thread(
-                target=self._continuous_acquisition_loop,
+                target=self._ai_continuous_acquisition_loop,
                 daemon=True
             )
+            self._start_processing_stage()
             self.acquisition_thread.start()
             logger.info(f"连续采集已启动: 启用通道数={enabled_count}")
             return True
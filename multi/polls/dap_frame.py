@@ -0,0 +1,154 @@
+"""
+采样数据的二进制WebSocket帧
+数据消息（acquisition_data / monitor_data）以二进制帧发送：紧凑的定长帧头 + 通道号 + JSON元数据 + 按通道排列的
+小端 float32 或 int16 数据块，不再逐点编码为JSON文本；控制消息仍为JSON。浏览器端解码见 static/js/daq_frame.js。
+
+帧格式（小端）：
+    帧头 FRAME_HEADER: magic 'DAQF', 版本, 消息类型, 数据类型, 标志, 通道数, 元数据字节数,
+                       包序号, 起始样本序号, 每通道点数, 采样率(f64), 时间戳(f64)
+    通道号: uint16 × 通道数
+    元数据: UTF-8 JSON（剩余点数、单位、消费者附加字段等），之后补零到4字节对齐
+    int16 时: 每通道 (offset, scale) float32 对，样本值 = offset + 整数值 × scale
+    数据: 通道数 × 每通道点数，按通道连续排列
+"""
+import json
+import struct
+import logging
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+from .dap_packet import AiPacket
+
+logger = logging.getLogger(__name__)
+
+FRAME_MAGIC = b'DAQF'
+FRAME_VERSION = 1
+FRAME_HEADER = struct.Struct('<4sBBBBHIQqIdd')
+
+# 消息类型
+FRAME_KINDS = ('acquisition_data', 'monitor_data')
+
+# 数据类型
+DTYPE_FLOAT32 = 'float32'
+DTYPE_INT16 = 'int16'
+DTYPES = (DTYPE_FLOAT32, DTYPE_INT16)
+
+# 标志位
+FLAG_FINAL = 0x01
+FLAG_CALIBRATED = 0x02
+
+INT16_FULL_SCALE = 32767
+
+
+def _align4(n: int) -> int:
+    return (n + 3) & ~3
+
+
+def quantize_int16(data: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    各通道按本帧的最小/最大值线性量化为int16（分辨率为通道峰峰值的1/65534）
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: ((通道数, 2) float32 的 (offset, scale)，(通道数, 点数) int16)
+    """
+    low = data.min(axis=1)
+    high = data.max(axis=1)
+    offset = (high + low) / 2
+    scale = (high - low) / (2 * INT16_FULL_SCALE)
+    scale[scale == 0] = 1.0
+    quantized = np.rint((data - offset[:, None]) / scale[:, None]).astype('<i2')
+    return np.stack([offset, scale], axis=1).astype('<f4'), quantized
+
+
+def encode_frame(packet: AiPacket, kind: str = 'acquisition_data', dtype: str = DTYPE_FLOAT32,
+                 extra: Optional[Dict[str, Any]] = None) -> Optional[bytes]:
+    """
+    将数据包编码为二进制帧（网络边界）
+
+    Args:
+        packet: 数据包
+        kind: 消息类型 acquisition_data / monitor_data
+        dtype: 样本编码 float32 / int16
+        extra: 消费者附加字段（packet_id、time_start_index、dt 等），写入元数据
+
+    Returns:
+        Optional[bytes]: 二进制帧；数据所在槽位已被覆盖时返回 None
+    """
+    if dtype not in DTYPES:
+        raise ValueError(f"未知的样本编码: {dtype}")
+    meta = {
+        'remaining_points': packet.remaining_points,
+        'oneshot_progress': packet.oneshot_progress,
+        'total_points': packet.total_points,
+        'units': {str(ch): unit for ch, unit in zip(packet.channels, packet.units)} if packet.units else None,
+    }
+    if extra:
+        meta.update(extra)
+    meta_bytes = json.dumps(meta, separators=(',', ':')).encode('utf-8')
+
+    if dtype == DTYPE_FLOAT32:
+        body = (np.ascontiguousarray(packet.data, dtype='<f4').tobytes(),)
+    elif packet.points_per_channel:
+        scales, samples = quantize_int16(packet.data)
+        body = (scales.tobytes(), samples.tobytes())
+    else:
+        body = (np.zeros((packet.num_channels, 2), dtype='<f4').tobytes(),)
+    # 先拷贝后校验：拷贝期间槽位若被覆盖，则丢弃该包
+    if not packet.is_valid():
+        logger.warning(f"数据块 #{packet.seq} 在发送前已被覆盖，丢弃")
+        return None
+
+    flags = (FLAG_FINAL if packet.is_final else 0) | (FLAG_CALIBRATED if packet.units is not None else 0)
+    channels = np.asarray(packet.channels, dtype='<u2').tobytes()
+    head_size = FRAME_HEADER.size + len(channels) + len(meta_bytes)
+    header = FRAME_HEADER.pack(FRAME_MAGIC, FRAME_VERSION, FRAME_KINDS.index(kind), DTYPES.index(dtype), flags,
+                               packet.num_channels, len(meta_bytes), packet.seq, packet.start_index,
+                               packet.points_per_channel, float(packet.sample_rate), float(packet.timestamp))
+    return b''.join((header, channels, meta_bytes, b'\0' * (_align4(head_size) - head_size)) + body)
+
+
+def decode_frame(frame: bytes) -> Dict[str, Any]:
+    """
+    解码二进制帧（测试与Python客户端使用）
+
+    Returns:
+        Dict: 与 AiPacket.to_dict() 相同的字段，另有 type；channel_data 为 {通道号字符串: float32数组}
+
+    Raises:
+        ValueError: 不是数据帧或版本不支持
+    """
+    (magic, version, kind, dtype, flags, num_channels, meta_len, seq, start_index, points,
+     sample_rate, timestamp) = FRAME_HEADER.unpack_from(frame, 0)
+    if magic != FRAME_MAGIC or version != FRAME_VERSION:
+        raise ValueError(f"不支持的数据帧: {magic!r} v{version}")
+    offset = FRAME_HEADER.size
+    channels = np.frombuffer(frame, dtype='<u2', count=num_channels, offset=offset).tolist()
+    offset += 2 * num_channels
+    meta = json.loads(bytes(frame[offset:offset + meta_len]).decode('utf-8'))
+    offset = _align4(offset + meta_len)
+
+    if DTYPES[dtype] == DTYPE_INT16:
+        scales = np.frombuffer(frame, dtype='<f4', count=2 * num_channels, offset=offset).reshape(num_channels, 2)
+        offset += scales.nbytes
+        samples = np.frombuffer(frame, dtype='<i2', count=num_channels * points, offset=offset)
+        data = samples.reshape(num_channels, points) * scales[:, 1:2] + scales[:, 0:1]
+    else:
+        data = np.frombuffer(frame, dtype='<f4', count=num_channels * points, offset=offset)
+        data = data.reshape(num_channels, points)
+
+    result = dict(meta)
+    result.update({
+        'type': FRAME_KINDS[kind],
+        'dtype': DTYPES[dtype],
+        'seq': seq,
+        'start_index': start_index,
+        'points_per_channel': points,
+        'sample_rate': sample_rate,
+        'timestamp': timestamp,
+        'enabled_channels': channels,
+        'channel_data': {str(ch): data[i] for i, ch in enumerate(channels)},
+        'is_final': bool(flags & FLAG_FINAL),
+        'calibrated': bool(flags & FLAG_CALIBRATED),
+    })
+    return result
@@ -0,0 +1,527 @@
+"""
+采集卡共享采集中心
+每张采集卡一个 AcquisitionHub，驱动由中心持有而不属于某个WebSocket连接；连接订阅/退订中心的数据流，
+断开连接不关闭设备。数据块在中心编码一次（每种在用的数据格式各一次），经 channel layer 组广播给所有订阅者，
+增加观看者只增加套接字写入，不增加设备读取与编码。
+
+    hub = await acquire_hub(device_index)
+    await hub.subscribe(channel_layer, channel_name, KIND_ACQUISITION)
+    await hub.start_continuous_acquisition(channel_name)
+    ...
+    await hub.unsubscribe(channel_layer, channel_name)
+    await release_hub(hub)
+
+发起采集（连续采集或监控连发）的连接是中心的控制者，采集期间只有控制者可以停止、重新配置采集或关闭设备，
+其他连接只能观看；控制者停止采集或断开后控制权释放。最后一个订阅者断开时若仍在采集，空闲 IDLE_SHUTDOWN_S 秒
+（期间可刷新页面重新加入）后停止采集并关闭设备。
+
+订阅时可指定显示视图（StreamView）：只接收部分通道，并按显示的时间窗口与像素宽度做 min/max 包络抽取；
+包络每个数据块按抽取倍数计算一次，同一视图的订阅者共用一次编码。
+
+订阅者（AsyncWebsocketConsumer）处理两种组消息：
+    daq.block  {'seq', 'start_index', 'points', 'sample_rate', 'timestamp', 'channels'（原始数据块，用于核算连续性）,
+                'text' 或 'bytes'（本视图本次没有输出时两者都没有）}
+    daq.event  {'text'}（触发事件等JSON控制消息）
+"""
+import json
+import time
+import asyncio
+import logging
+import weakref
+from urllib.parse import parse_qs
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .dap_async import AsyncUSB5121Driver, AsyncStream
+from .dap_packet import AiPacket, coalesce_pending
+from .dap_frame import encode_frame, DTYPES
+from .dap_integrity import StreamIntegrity
+from .dap_decimate import EnvelopeDecimator
+from .dap_metrics import LatencyStats, ValueStats
+
+logger = logging.getLogger(__name__)
+
+KIND_ACQUISITION = 'acquisition_data'
+KIND_MONITOR = 'monitor_data'
+KINDS = (KIND_ACQUISITION, KIND_MONITOR)
+
+FORMAT_JSON = 'json'
+FORMATS = (FORMAT_JSON,) + DTYPES  # json 或二进制帧的样本编码
+
+SEND_QUEUE_LENGTH = 32  # 每种数据流最多排队的数据块数（合并后每块最长约0.5秒数据）
+IDLE_SHUTDOWN_S = 30.0  # 没有订阅者时采集继续保留的秒数，超时后停止采集并关闭设备
+
+
+def data_format_key(data_format: str, dtype: str = 'float32') -> str:
+    """连接的数据格式设置（json / binary + 样本编码）对应的广播格式"""
+    return FORMAT_JSON if data_format == FORMAT_JSON else dtype
+
+
+class StreamView:
+    """
+    订阅者的显示视图
+
+    channels 为 None 时接收全部通道；width 为 None 时接收全速率数据，否则 width 个像素显示 window_s 秒，
+    每个像素（window_s×采样率/width 个样本）输出一对 min/max（见 EnvelopeDecimator），每像素不足2个样本时不抽取。
+    像素时长相同的视图抽取倍数相同，共用同一份包络计算。
+    """
+
+    __slots__ = ('channels', 'window_s', 'width')
+
+    def __init__(self, channels: Optional[List[int]] = None, window_s: Optional[float] = None,
+                 width: Optional[int] = None):
+        """
+        Raises:
+            ValueError: 参数无效
+        """
+        if channels is not None:
+            channels = tuple(sorted({int(ch) for ch in channels}))
+            if not channels or channels[0] < 0:
+                raise ValueError(f"无效的订阅通道: {channels}")
+        if width is not None:
+            width, window_s = int(width), float(window_s or 0)
+            if width <= 0 or window_s <= 0:
+                raise ValueError(f"无效的显示窗口: {window_s}秒/{width}像素")
+        self.channels = channels
+        self.window_s = window_s if width is not None else None
+        self.width = width
+
+    @property
+    def key(self) -> str:
+        """广播组名中的视图标识（全部通道、全速率时为空）"""
+        parts = []
+        if self.channels is not None:
+            parts.append(f"m{sum(1 << ch for ch in self.channels):x}")
+        if self.width is not None:
+            parts.append(f"p{round(self.window_s / self.width * 1e9)}")  # 像素时长(ns)
+        return '.'.join(parts)
+
+    def bucket(self, sample_rate: float) -> int:
+        """每个像素的样本数（包络抽取倍数），1表示不抽取"""
+        if self.width is None or not sample_rate:
+            return 1
+        return max(1, int(self.window_s * sample_rate / self.width))
+
+    def rows(self, channels: Tuple) -> Optional[List[int]]:
+        """数据包中属于本视图的行，None表示全部"""
+        if self.channels is None:
+            return None
+        rows = [i for i, ch in enumerate(channels) if ch in self.channels]
+        return None if len(rows) == len(channels) else rows
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'channels': list(self.channels) if self.channels is not None else None,
+                'window_s': self.window_s, 'width': self.width}
+
+
+FULL_VIEW = StreamView()
+
+
+class AcquisitionHub:
+    """
+    一张采集卡的共享采集中心
+
+    连续采集的数据包由中心的数据回调接收（KIND_ACQUISITION）；监控的连发采集由发起监控的连接处理后
+    经 publish(KIND_MONITOR, ...) 交给中心广播。每种数据流一个发送队列，客户端整体跟不上时排队的数据块
+    合并为更大的数据块；单个连接跟不上时由 channel layer 丢弃发给它的消息，订阅者按样本序号核算缺口。
+    """
+
+    def __init__(self, device_index: int, driver: AsyncUSB5121Driver):
+        """
+        Args:
+            device_index: 采集卡序号
+            driver: 中心持有的异步驱动
+        """
+        self.device_index = device_index
+        self.driver = driver
+        self.loop = driver.loop
+        self.subscribers: Dict[str, Tuple[str, str, StreamView]] = {}  # channel_name -> (数据流, 格式, 视图)
+        self.listeners: Dict[str, List[Callable[[AiPacket], None]]] = {kind: [] for kind in KINDS}
+        self.packet_count = {kind: 0 for kind in KINDS}
+        # 编码前的丢弃（发送队列溢出、槽位已被覆盖），各订阅者另行核算自己收到的数据
+        self.integrity = {kind: StreamIntegrity(f'广播:{kind}') for kind in KINDS}
+        self.encode_duration = {kind: LatencyStats('broadcast_encode') for kind in KINDS}
+        self.send_queue_depth = {kind: ValueStats('send_queue_depth') for kind in KINDS}
+        # 包络抽取状态 {数据流: {(数据包通道, 抽取倍数): EnvelopeDecimator}}，跨数据块保留未满的像素
+        self.envelopes: Dict[str, Dict[Tuple, EnvelopeDecimator]] = {kind: {} for kind in KINDS}
+        self.streams = {
+            kind: AsyncStream(self.loop, SEND_QUEUE_LENGTH, merge=coalesce_pending,
+                              on_drop=lambda item, kind=kind: self.integrity[kind].drop(
+                                  item[0].points_per_channel, 'send_queue'))
+            for kind in KINDS
+        }
+        self.channel_layer = None
+        self.lock = asyncio.Lock()  # 串行化打开设备（各页面连接后都会请求打开）
+        self.controller: Optional[str] = None  # 发起当前采集的连接（channel_name），None表示任何连接均可控制
+        self.idle_task: Optional[asyncio.Task] = None  # 没有订阅者时的延迟关闭任务
+        self._tasks = [self.loop.create_task(self._broadcast_loop(kind)) for kind in KINDS]
+        self._tasks.append(self.loop.create_task(self._event_loop()))
+
+    def group_name(self, kind: str, fmt: str, view: StreamView = FULL_VIEW) -> str:
+        """数据流在某种格式、视图下的广播组"""
+        key = view.key
+        return f"daq.dev{self.device_index}.{kind}.{fmt}" + (f".{key}" if key else '')
+
+    # ------------------------------------------------------------------
+    # 订阅
+
+    async def subscribe(self, channel_layer: Any, channel_name: str, kind: str, data_format: str = FORMAT_JSON,
+                        view: Optional[StreamView] = None):
+        """订阅数据流（已订阅时改为新的数据流/格式/视图），view 为 None 时为全部通道的全速率数据"""
+        if kind not in KINDS or data_format not in FORMATS:
+            raise ValueError(f"不支持的订阅: {kind}/{data_format}")
+        view = view or FULL_VIEW
+        self.channel_layer = channel_layer
+        group = self.group_name(kind, data_format, view)
+        previous = self.subscribers.get(channel_name)
+        if previous is not None:
+            if self.group_name(*previous) == group:
+                return
+            await channel_layer.group_discard(self.group_name(*previous), channel_name)
+        await channel_layer.group_add(group, channel_name)
+        self.subscribers[channel_name] = (kind, data_format, view)
+        logger.info(f"采集卡{self.device_index} 订阅 {group}: {channel_name}，共{len(self.subscribers)}个订阅者")
+
+    async def unsubscribe(self, channel_layer: Any, channel_name: str):
+        """退订，不影响设备与其他订阅者"""
+        previous = self.subscribers.pop(channel_name, None)
+        self.release_control(channel_name)
+        if previous is not None:
+            await channel_layer.group_discard(self.group_name(*previous), channel_name)
+            logger.info(f"采集卡{self.device_index} 退订: {channel_name}，剩余{len(self.subscribers)}个订阅者")
+
+    def groups(self, kind: str) -> Dict[Tuple[str, str], StreamView]:
+        """数据流当前有订阅者的 {(格式, 视图标识): 视图}"""
+        return {(fmt, view.key): view for sub_kind, fmt, view in self.subscribers.values() if sub_kind == kind}
+
+    # ------------------------------------------------------------------
+    # 数据
+
+    def add_listener(self, kind: str, callback: Callable[[AiPacket], None]):
+        """注册数据包监听（在驱动线程中、广播之前调用，如回环延迟测量）"""
+        self.listeners[kind].append(callback)
+
+    def remove_listener(self, kind: str, callback: Callable[[AiPacket], None]):
+        if callback in self.listeners[kind]:
+            self.listeners[kind].remove(callback)
+
+    def publish(self, kind: str, packet: AiPacket, extra: Dict[str, Any]) -> bool:
+        """交给中心广播一个数据包（任意线程），extra 为附加字段"""
+        for callback in self.listeners[kind]:
+            try:
+                callback(packet)
+            except Exception as e:
+                logger.error(f"数据包监听异常: {e}")
+        self.packet_count[kind] += 1
+        self.integrity[kind].observe_packet(packet)
+        return self.streams[kind].publish((packet, extra))
+
+    def acquisition_callback(self, packet: AiPacket):
+        """连续采集的驱动数据回调：时间轴以 (time_start_index + i) × dt 表示"""
+        try:
+            sample_rate = packet.sample_rate
+            self.publish(KIND_ACQUISITION, packet, {
+                'packet_id': self.packet_count[KIND_ACQUISITION] + 1,
+                'time_start_index': packet.start_index,
+                'dt': 1.0 / sample_rate if sample_rate else 0,
+            })
+        except Exception as e:
+            logger.error(f"采集数据回调异常: {e}")
+
+    def reset_stream(self, kind: str):
+        """开始新的一次采集：清空计数与核算"""
+        self.packet_count[kind] = 0
+        self.integrity[kind].reset()
+        self.encode_duration[kind].reset()
+        self.send_queue_depth[kind].reset()
+        self.envelopes[kind].clear()
+        self.streams[kind].clear()
+
+    def encode(self, kind: str, fmt: str, packet: AiPacket, extra: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        按格式编码一个数据块
+
+        Returns:
+            Optional[Dict]: {'text': JSON} 或 {'bytes': 二进制帧}；槽位已被覆盖时返回 None
+        """
+        if fmt == FORMAT_JSON:
+            payload = packet.to_dict()
+            if payload is None:
+                return None
+            payload.update(extra)
+            return {'text': json.dumps({'type': kind, 'data': payload})}
+        frame = encode_frame(packet, kind, fmt, extra)
+        return {'bytes': frame} if frame is not None else None
+
+    def view_packet(self, kind: str, view: StreamView, packet: AiPacket, extra: Dict[str, Any],
+                    envelopes: Dict[int, Tuple[np.ndarray, int]]) -> Optional[Tuple[AiPacket, Dict[str, Any]]]:
+        """
+        数据包在视图下的内容：选出视图的通道，需要时做包络抽取
+
+        Args:
+            envelopes: 本数据块已算出的包络 {抽取倍数: (包络, 首个输出序号)}，同一倍数的视图共用
+
+        Returns:
+            Optional[Tuple[AiPacket, Dict]]: (数据包, 附加字段)；视图不含本数据包的通道或本次没有完整像素时为 None
+        """
+        rows = view.rows(packet.channels)
+        if rows is not None and not rows:
+            return None
+        channels = packet.channels if rows is None else tuple(packet.channels[i] for i in rows)
+        units = packet.units if rows is None or not packet.units else tuple(packet.units[i] for i in rows)
+        bucket = view.bucket(packet.sample_rate)
+        if bucket <= 1:
+            if rows is None:
+                return packet, extra
+            # 选行会拷贝数据，保留槽位引用以便编码时校验拷贝期间是否被覆盖
+            return AiPacket(packet.data[rows], channels, packet.start_index, packet.sample_rate, packet.timestamp,
+                            packet.seq, packet.remaining_points, packet.block, packet.is_final,
+                            packet.oneshot_progress, packet.total_points, units), extra
+
+        if bucket not in envelopes:
+            decimators = self.envelopes[kind]
+            decimator = decimators.get((packet.channels, bucket))
+            if decimator is None:
+                decimator = decimators[(packet.channels, bucket)] = EnvelopeDecimator(bucket)
+            envelopes[bucket] = decimator.process(packet.data, packet.start_index, packet.is_final)
+        data, first = envelopes[bucket]
+        if not data.shape[1]:
+            return None
+        # 包络以 2×采样率/bucket 的速率表示；时间基准换算到包络序号（监控数据的 time_start_index 为跨采集累积序号）
+        offset = extra.get('time_start_index', packet.start_index) - packet.start_index
+        total_points = 2 * -(-packet.total_points // bucket) if packet.total_points else packet.total_points
+        envelope = AiPacket(data if rows is None else data[rows], channels, first,
+                            2 * packet.sample_rate / bucket, packet.timestamp, packet.seq, packet.remaining_points,
+                            None, packet.is_final, packet.oneshot_progress, total_points, units)
+        envelope_extra = dict(extra, time_start_index=first + 2 * offset / bucket,
+                              dt=bucket / (2 * packet.sample_rate),
+                              envelope={'bucket_points': bucket, 'layout': 'min_max'})
+        return envelope, envelope_extra
+
+    async def broadcast(self, kind: str, packet: AiPacket, extra: Dict[str, Any]):
+        """每个在用的 (格式, 视图) 编码一次，发给对应的广播组"""
+        groups = self.groups(kind)
+        if not groups or self.channel_layer is None:
+            return
+        started = time.perf_counter()
+        envelopes: Dict[int, Tuple[np.ndarray, int]] = {}
+        contents = {key: self.view_packet(kind, view, packet, extra, envelopes)
+                    for (_, key), view in groups.items()}
+        # 包络由环形缓冲区中的数据算出：先计算后校验
+        if envelopes and not packet.is_valid():
+            self.integrity[kind].drop(packet.points_per_channel, 'stale')
+            return
+        messages = {}
+        for (fmt, key), view in groups.items():
+            message = {}
+            if contents[key] is not None:
+                message = self.encode(kind, fmt, *contents[key])
+                if message is None:
+                    self.integrity[kind].drop(packet.points_per_channel, 'stale')
+                    return
+            messages[self.group_name(kind, fmt, view)] = message
+        self.encode_duration[kind].record(time.perf_counter() - started)
+        header = {
+            'type': 'daq.block',
+            'seq': packet.seq,
+            'start_index': packet.start_index,
+            'points': packet.points_per_channel,
+            'sample_rate': packet.sample_rate,
+            'timestamp': packet.timestamp,
+            'channels': list(packet.channels),
+        }
+        for group, message in messages.items():
+            await self.channel_layer.group_send(group, dict(header, **message))
+
+    async def broadcast_event(self, kind: str, message_type: str, data: Dict[str, Any]):
+        """向数据流的所有订阅者发送JSON消息"""
+        if self.channel_layer is None:
+            return
+        text = json.dumps({'type': message_type, 'data': data})
+        for (fmt, _), view in self.groups(kind).items():
+            await self.channel_layer.group_send(self.group_name(kind, fmt, view), {'type': 'daq.event', 'text': text})
+
+    async def _broadcast_loop(self, kind: str):
+        stream = self.streams[kind]
+        try:
+            async for packet, extra in stream:
+                try:
+                    self.send_queue_depth[kind].record(len(stream))
+                    await self.broadcast(kind, packet, extra)
+                except Exception as e:
+                    logger.error(f"广播数据块异常: {e}")
+        except asyncio.CancelledError:
+            pass
+
+    async def _event_loop(self):
+        """触发事件（驱动 events 流）广播给连续采集的订阅者"""
+        try:
+            async for event in self.driver.events:
+                logger.info(f"触发事件 #{event.seq}: {event.condition}, 样本序号{event.trigger_index}")
+                try:
+                    await self.broadcast_event(KIND_ACQUISITION, 'trigger_event', event.to_dict())
+                except Exception as e:
+                    logger.error(f"广播触发事件异常: {e}")
+        except asyncio.CancelledError:
+            pass
+
+    # ------------------------------------------------------------------
+    # 采集控制
+
+    async def open_device(self) -> bool:
+        """
+        打开设备：已打开时直接返回成功，不再访问设备
+
+        每个页面连接后都会请求打开设备；重复打开会重建AI环形缓冲区并关闭所有AI通道，打断进行中的采集
+        """
+        async with self.lock:
+            if self.driver.is_opened:
+                logger.info(f"采集卡{self.device_index} 已打开，加入共享采集")
+                return True
+            return await self.driver.open_device()
+
+    def may_control(self, channel_name: str) -> bool:
+        """连接能否停止、重新配置采集或关闭设备：没有控制者或本连接就是控制者"""
+        return self.controller is None or self.controller == channel_name
+
+    def take_control(self, channel_name: str) -> bool:
+        """连接发起采集前取得控制权，已由其他连接控制时返回False"""
+        if not self.may_control(channel_name):
+            return False
+        self.controller = channel_name
+        return True
+
+    def release_control(self, channel_name: str):
+        """控制者停止采集或断开后释放控制权"""
+        if self.controller == channel_name:
+            self.controller = None
+            logger.info(f"采集卡{self.device_index} 控制权已释放: {channel_name}")
+
+    async def start_continuous_acquisition(self, channel_name: str) -> bool:
+        """
+        开始连续采集，发起的连接成为控制者；已在采集时直接返回成功，新订阅者只加入同一数据流
+
+        Returns:
+            bool: 采集是否在进行；设备由其他连接控制（如监控连发采集中）时返回False
+        """
+        if self.driver.is_acquiring:
+            return True
+        if not self.take_control(channel_name):
+            return False
+        self.reset_stream(KIND_ACQUISITION)
+        success = await self.driver.start_continuous_acquisition(self.acquisition_callback)
+        if not success:
+            self.release_control(channel_name)
+        return success
+
+    def metrics(self, kind: str, histogram: bool = True) -> Dict[str, Any]:
+        """数据流的广播计量"""
+        instrumentation = {}
+        for stats in (self.encode_duration[kind], self.send_queue_depth[kind]):
+            instrumentation[stats.name] = stats.metrics()
+            if histogram:
+                instrumentation[stats.name]['histogram'] = stats.histogram()
+        return {
+            'device_index': self.device_index,
+            'controller': self.controller,
+            'subscribers': sum(1 for sub_kind, _, _ in self.subscribers.values() if sub_kind == kind),
+            'groups': [dict(view.to_dict(), format=fmt) for (fmt, _), view in self.groups(kind).items()],
+            'packets': self.packet_count[kind],
+            'integrity': self.integrity[kind].metrics(include_gaps=False),
+            'send_queue': self.streams[kind].metrics(),
+            'instrumentation': instrumentation,
+        }
+
+    async def shutdown(self):
+        """停止广播、关闭设备并释放驱动（原事件循环已结束时其任务已随之结束，只关闭设备）"""
+        if not self.loop.is_closed():
+            if self.idle_task is not None and self.idle_task is not asyncio.current_task():
+                self.idle_task.cancel()
+            for task in self._tasks:
+                task.cancel()
+        for stream in self.streams.values():
+            stream.close()
+        await self.driver.shutdown()
+
+
+_hubs: Dict[int, AcquisitionHub] = {}
+_locks: 'weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Lock]' = weakref.WeakKeyDictionary()
+
+
+def _lock() -> asyncio.Lock:
+    """当前事件循环上保护 _hubs 的锁（创建驱动期间会让出事件循环）"""
+    loop = asyncio.get_running_loop()
+    lock = _locks.get(loop)
+    if lock is None:
+        lock = _locks[loop] = asyncio.Lock()
+    return lock
+
+
+async def acquire_hub(device_index: int = 0) -> AcquisitionHub:
+    """取得采集卡的共享采集中心，首次使用时在I/O线程中创建驱动"""
+    async with _lock():
+        hub = _hubs.get(device_index)
+        if hub is not None and hub.loop is not asyncio.get_running_loop():
+            if not hub.loop.is_closed():
+                raise RuntimeError(f"采集卡{device_index} 的采集中心属于另一个运行中的事件循环")
+            # 原事件循环已结束（如测试中多次 asyncio.run）：先关闭其设备，否则设备一直处于打开状态无法再打开
+            logger.warning(f"采集卡{device_index} 的采集中心属于已结束的事件循环，关闭设备后重新创建")
+            await _close_hub(hub)
+            hub = None
+        if hub is None:
+            driver = await AsyncUSB5121Driver.create(device_index=device_index)
+            hub = _hubs[device_index] = AcquisitionHub(device_index, driver)
+            logger.info(f"采集卡{device_index} 共享采集中心已创建")
+        elif hub.idle_task is not None:
+            hub.idle_task.cancel()
+            hub.idle_task = None
+            logger.info(f"采集卡{device_index} 有新的连接，取消空闲关闭")
+        return hub
+
+
+async def release_hub(hub: AcquisitionHub):
+    """
+    订阅者断开后调用：没有订阅者时关闭设备并移除中心；若仍在采集，保留 IDLE_SHUTDOWN_S 秒
+    供重新连接的客户端加入，超时仍无订阅者则停止采集并关闭
+    """
+    async with _lock():
+        if hub.subscribers:
+            return
+        if hub.driver.is_acquiring or hub.driver.burst_active:
+            if hub.idle_task is None:
+                hub.idle_task = hub.loop.create_task(_shutdown_when_idle(hub))
+                logger.info(f"采集卡{hub.device_index} 已无订阅者，{IDLE_SHUTDOWN_S}秒内无连接加入则停止采集")
+            return
+        await _close_hub(hub)
+
+
+async def _shutdown_when_idle(hub: AcquisitionHub):
+    """空闲超时后停止采集并关闭中心（期间有连接加入时由 acquire_hub 取消）"""
+    try:
+        await asyncio.sleep(IDLE_SHUTDOWN_S)
+        async with _lock():
+            if hub.subscribers:
+                hub.idle_task = None
+                return
+            logger.warning(f"采集卡{hub.device_index} 空闲{IDLE_SHUTDOWN_S}秒无订阅者，停止采集")
+            await _close_hub(hub)
+    except asyncio.CancelledError:
+        pass
+
+
+async def _close_hub(hub: AcquisitionHub):
+    """移除并关闭中心（调用方持有 _lock）"""
+    if _hubs.get(hub.device_index) is hub:
+        del _hubs[hub.device_index]
+    await hub.shutdown()
+    logger.info(f"采集卡{hub.device_index} 已无订阅者，共享采集中心已关闭")
+
+
+def device_index_from_scope(scope: Dict[str, Any]) -> int:
+    """WebSocket连接的采集卡序号：查询参数 ?device=N，默认0"""
+    query = parse_qs(scope.get('query_string', b'').decode('latin-1'))
+    try:
+        return int(query.get('device', ['0'])[0])
+    except ValueError:
+        return 0
@@ -0,0 +1,223 @@
+"""
+采集数据流完整性核算
+每个数据包带有单调递增的包序号(seq)与采集内样本序号(start_index)，数据流经的各个环节
+（读取线程、处理线程、采集进程代理、WebSocket发送、落盘记录）按这两个序号检查连续性，
+记录缺口并统计各队列的丢弃，用于证明某一采样率与通道数下的采集/记录是否无损
+"""
+import logging
+import threading
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class StreamGap:
+    """
+    数据流中的一处缺口
+
+    Attributes:
+        start_index: 缺失的第一个样本序号（每通道计）
+        points: 缺失的每通道点数，0表示丢失的数据包不在样本序号上留下缺口（如单次采集的末尾数据包）
+        seq: 缺口之后第一个数据包的序号
+        lost_packets: 由包序号推算的丢失数据包数
+        reason: 缺口原因
+        timestamp: 缺口之后第一个数据包的时间戳
+    """
+
+    FIFO_OVERRUN = 'fifo_overrun'  # 采集卡FIFO溢出，数据在读取前已被覆盖
+    MISSING = 'missing'  # 下游检查到的样本序号不连续（队列丢弃、槽位覆盖等）
+
+    __slots__ = ('start_index', 'points', 'seq', 'lost_packets', 'reason', 'timestamp')
+
+    def __init__(self, start_index: int, points: int, seq: int, lost_packets: int, reason: str,
+                 timestamp: float = 0.0):
+        self.start_index = int(start_index)
+        self.points = int(points)
+        self.seq = int(seq)
+        self.lost_packets = int(lost_packets)
+        self.reason = reason
+        self.timestamp = float(timestamp)
+
+    def to_dict(self) -> Dict:
+        return {
+            'start_index': self.start_index,
+            'points': self.points,
+            'seq': self.seq,
+            'lost_packets': self.lost_packets,
+            'reason': self.reason,
+            'timestamp': self.timestamp,
+        }
+
+    def __repr__(self):
+        return (f"StreamGap({self.reason}, start_index={self.start_index}, points={self.points}, "
+                f"lost_packets={self.lost_packets})")
+
+
+class StreamIntegrity:
+    """
+    单个环节的数据流连续性核算
+
+    observe() 由该环节唯一的消费线程按顺序调用：
+        样本序号跳变 → 记录缺口；
+        样本序号回退到0 → 新的一次采集（连发单次采集的每一发），不计为缺口；
+        包序号跳变但样本连续 → 数据包被合并（coalesce），不计为丢失。
+    drop() 记录本环节主动丢弃的数据（队列溢出等）。
+    多速率采集时各速率组的数据包共用包序号、各自计样本序号，按 stream（通道组）分别核对连续性。
+    """
+
+    def __init__(self, name: str, max_gaps: int = 1000):
+        """
+        Args:
+            name: 环节名称（日志与指标中使用）
+            max_gaps: 保留的缺口明细条数，超出后只计数
+        """
+        self.name = name
+        self.max_gaps = max_gaps
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """开始新的一次采集"""
+        with self._lock:
+            self._cursors: Dict = {}  # stream -> [下一个包序号, 下一个样本序号]
+            self.gaps: deque = deque(maxlen=self.max_gaps)
+            self.packets = 0
+            self.points = 0
+            self.gap_count = 0
+            self.gap_points = 0
+            self.lost_packets = 0
+            self.merged_packets = 0
+            self.restarts = 0
+            self.out_of_order = 0
+            self.dropped_packets = 0
+            self.dropped_points = 0
+            self.drop_reasons: Dict[str, int] = {}
+
+    def observe(self, seq: int, start_index: int, points: int, timestamp: float = 0.0,
+                stream: Any = None) -> Optional[StreamGap]:
+        """
+        检查一个数据包与同一数据流上一个数据包的连续性
+
+        Args:
+            stream: 数据流标识（多速率采集时为速率组的通道），None为单一数据流
+
+        Returns:
+            Optional[StreamGap]: 发现缺口时返回缺口记录
+        """
+        gap = None
+        with self._lock:
+            cursor = self._cursors.get(stream)
+            next_seq, next_index = cursor if cursor is not None else (None, None)
+            missing = 0 if next_seq is None else seq - next_seq
+            if missing < 0:
+                self.out_of_order += 1
+            if next_index is not None and start_index != next_index:
+                if start_index > next_index:
+                    gap = self._add_gap(next_index, start_index - next_index, seq,
+                                        max(0, missing), StreamGap.MISSING, timestamp)
+                elif start_index == 0:
+                    self.restarts += 1
+                    if missing > 0:
+                        # 上一次采集末尾的数据包丢失：样本序号已回零，只能由包序号发现
+                        gap = self._add_gap(next_index, 0, seq, missing, StreamGap.MISSING, timestamp)
+                else:
+                    self.out_of_order += 1
+            elif missing > 0:
+                self.merged_packets += missing
+            self._cursors[stream] = [seq + 1, start_index + points]
+            self.packets += 1
+            self.points += points
+        if gap is not None:
+            logger.warning(f"[{self.name}] 数据不连续: {gap!r}")
+        return gap
+
+    def observe_packet(self, packet) -> Optional[StreamGap]:
+        """observe 的 AiPacket 版本（以数据包的通道组区分数据流）"""
+        return self.observe(packet.seq, packet.start_index, packet.points_per_channel, packet.timestamp,
+                            packet.channels)
+
+    def record_gap(self, start_index: int, points: int, reason: str, seq: int = 0,
+                   timestamp: float = 0.0, stream: Any = None) -> StreamGap:
+        """
+        记录由本环节直接测得的缺口（如FIFO溢出），随后数据包的样本序号应已越过该缺口
+
+        Args:
+            stream: 缺口所在的数据流，None时适用于样本序号恰好在缺口起点的所有数据流
+        """
+        with self._lock:
+            gap = self._add_gap(start_index, points, seq, 0, reason, timestamp)
+            # 缺口已记录，后续数据包从缺口之后开始不再重复计入
+            for key, cursor in self._cursors.items():
+                if (stream is None or key == stream) and cursor[1] == start_index:
+                    cursor[1] = start_index + points
+        logger.warning(f"[{self.name}] 数据缺口: {gap!r}")
+        return gap
+
+    def drop(self, points: int, reason: str, packets: int = 1):
+        """记录本环节主动丢弃的数据"""
+        with self._lock:
+            self.dropped_packets += packets
+            self.dropped_points += points
+            self.drop_reasons[reason] = self.drop_reasons.get(reason, 0) + packets
+
+    def _add_gap(self, start_index: int, points: int, seq: int, lost_packets: int, reason: str,
+                 timestamp: float) -> StreamGap:
+        gap = StreamGap(start_index, points, seq, lost_packets, reason, timestamp)
+        self.gaps.append(gap)
+        self.gap_count += 1
+        self.gap_points += points
+        self.lost_packets += lost_packets
+        return gap
+
+    @property
+    def lossless(self) -> bool:
+        """至今未发现缺口，也没有主动丢弃"""
+        return self.gap_count == 0 and self.dropped_packets == 0
+
+    def metrics(self, include_gaps: bool = True) -> Dict:
+        """核算结果"""
+        with self._lock:
+            metrics = {
+                'name': self.name,
+                'lossless': self.gap_count == 0 and self.dropped_packets == 0,
+                'packets': self.packets,
+                'points': self.points,
+                'gap_count': self.gap_count,
+                'gap_points': self.gap_points,
+                'lost_packets': self.lost_packets,
+                'merged_packets': self.merged_packets,
+                'restarts': self.restarts,
+                'out_of_order': self.out_of_order,
+                'dropped_packets': self.dropped_packets,
+                'dropped_points': self.dropped_points,
+                'drop_reasons': dict(self.drop_reasons),
+            }
+            if include_gaps:
+                metrics['gaps'] = [gap.to_dict() for gap in self.gaps]
+            return metrics
+
+
+def index_gaps(start_index: np.ndarray, points: np.ndarray, seq: np.ndarray,
+               timestamp: Optional[np.ndarray] = None) -> List[StreamGap]:
+    """
+    由块索引（各块的采集内起始样本序号、点数、包序号）找出缺口，用于校验已保存的记录
+
+    规则与 StreamIntegrity.observe 相同：样本序号回零视为新的一次采集。
+    """
+    if len(start_index) < 2:
+        return []
+    start_index = start_index.astype(np.int64)
+    seq = seq.astype(np.int64)
+    expected = start_index[:-1] + points[:-1].astype(np.int64)
+    missing = np.maximum(seq[1:] - seq[:-1] - 1, 0)
+    jump = start_index[1:] > expected
+    lost_at_restart = (start_index[1:] == 0) & (expected != 0) & (missing > 0)
+    gaps = []
+    for i in np.flatnonzero(jump | lost_at_restart):
+        size = int(start_index[i + 1] - expected[i]) if jump[i] else 0
+        gaps.append(StreamGap(expected[i], size, seq[i + 1], missing[i], StreamGap.MISSING,
+                              timestamp[i + 1] if timestamp is not None else 0.0))
+    return gaps
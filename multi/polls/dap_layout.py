@@ -0,0 +1,90 @@
+"""
+USB5000 AI数据排列描述与解交织
+USB5GetAi 写入缓冲区的样本顺序由 AiLayout 描述，所有采集路径都通过 AiLayout.view
+将一次读取的一维数据映射为 (通道数, 每通道点数) 的视图，不做逐通道拷贝
+"""
+import logging
+from typing import Dict, Iterable, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class AiLayout:
+    """
+    一次AI读取的缓冲区排列
+
+    channel_major: [CHa的N点][CHb的N点]...，USB5000系列连续/单次采集的排列方式，
+                   解交织为 reshape(通道数, N)，得到连续内存视图
+    sample_major: [CHa CHb ...][CHa CHb ...]...，逐样本交错排列，
+                  解交织为 reshape(N, 通道数).T，得到跨步视图（同样不拷贝）
+    通道按物理通道号升序排列，与 USB5GetAi 的输出顺序一致。
+    """
+
+    CHANNEL_MAJOR = 'channel_major'
+    SAMPLE_MAJOR = 'sample_major'
+    ORDERS = (CHANNEL_MAJOR, SAMPLE_MAJOR)
+
+    __slots__ = ('channels', 'order', '_rows')
+
+    def __init__(self, channels: Iterable[int], order: str = CHANNEL_MAJOR):
+        """
+        Args:
+            channels: 启用的物理通道号
+            order: 样本排列方式
+        """
+        if order not in self.ORDERS:
+            raise ValueError(f"未知的数据排列方式: {order}")
+        self.channels: Tuple[int, ...] = tuple(sorted(channels))
+        self.order = order
+        self._rows = {ch: i for i, ch in enumerate(self.channels)}
+
+    @classmethod
+    def from_mask(cls, enabled: Iterable[bool], order: str = CHANNEL_MAJOR) -> 'AiLayout':
+        """由通道启用状态列表构造"""
+        return cls([i for i, on in enumerate(enabled) if on], order)
+
+    @property
+    def num_channels(self) -> int:
+        return len(self.channels)
+
+    def total_points(self, points_per_channel: int) -> int:
+        """一次读取的数据点数（所有通道合计）"""
+        return self.num_channels * points_per_channel
+
+    def row(self, channel: int) -> int:
+        """物理通道号在视图中的行号"""
+        return self._rows[channel]
+
+    def view(self, flat: np.ndarray, points_per_channel: int) -> np.ndarray:
+        """
+        解交织：将一次读取的一维数据映射为 (通道数, 每通道点数) 视图
+
+        Args:
+            flat: 一维数据（长度不少于 total_points，多余部分忽略）
+            points_per_channel: 每通道点数
+
+        Returns:
+            np.ndarray: 与 flat 共享内存的视图，可写性与 flat 相同
+        """
+        total = self.total_points(points_per_channel)
+        if flat.shape[0] < total:
+            raise ValueError(f"数据长度({flat.shape[0]})小于 {self.num_channels}通道×{points_per_channel}点")
+        if self.order == self.CHANNEL_MAJOR:
+            return flat[:total].reshape(self.num_channels, points_per_channel)
+        return flat[:total].reshape(points_per_channel, self.num_channels).T
+
+    def split(self, flat: np.ndarray, points_per_channel: int) -> Dict[int, np.ndarray]:
+        """按物理通道号返回各通道的数据视图"""
+        data = self.view(flat, points_per_channel)
+        return {ch: data[i] for i, ch in enumerate(self.channels)}
+
+    def __eq__(self, other):
+        return isinstance(other, AiLayout) and self.channels == other.channels and self.order == other.order
+
+    def __hash__(self):
+        return hash((self.channels, self.order))
+
+    def __repr__(self):
+        return f"AiLayout(channels={list(self.channels)}, order={self.order})"
@@ -0,0 +1,294 @@
+"""
+AI→AO 回环延迟与抖动测量
+AO通道周期性输出阶跃或扫频图样，回环到某个AI通道；在各环节收到的数据包中以向量化归一化互相关定位图样，
+统计从发出AO命令到数据经读取线程、数据回调、WebSocket发送各环节的延迟分布。
+模拟后端通过 SimulatedUSB5000(loopback=...) 或环境变量 USB5121_SIM_LOOPBACK 回环。
+"""
+import time
+import logging
+import threading
+from collections import deque
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .dap_metrics import LatencyStats
+
+logger = logging.getLogger(__name__)
+
+PATTERN_STEP = 'step'
+PATTERN_CHIRP = 'chirp'
+PATTERNS = (PATTERN_STEP, PATTERN_CHIRP)
+
+
+def chirp_waveform(sample_rate: float, duration_s: float, amplitude: float = 1.0) -> np.ndarray:
+    """
+    Hann窗线性扫频，首尾为0，输出结束后AO保持0V
+
+    频率由 2/duration_s 扫到 10/duration_s（与采样率无关，AO输出与AI模板一致），
+    AI采样率需高于 20/duration_s
+    """
+    points = max(8, int(round(duration_s * sample_rate)))
+    t = np.arange(points, dtype=np.float64) / sample_rate
+    f0, f1 = 2.0 / duration_s, 10.0 / duration_s
+    phase = 2 * np.pi * (f0 * t + (f1 - f0) * t * t / (2 * duration_s))
+    return (amplitude * np.hanning(points) * np.sin(phase)).astype(np.float32)
+
+
+def pattern_template(kind: str, sample_rate: float, duration_s: float) -> Tuple[np.ndarray, int]:
+    """
+    AI采样率下的匹配模板
+
+    Returns:
+        Tuple[np.ndarray, int]: (零均值模板, 图样基准点在模板中的位置：阶跃为跳变处，扫频为起点)
+    """
+    if kind == PATTERN_STEP:
+        half = max(4, int(round(duration_s * sample_rate / 2)))
+        template = np.concatenate([-np.ones(half), np.ones(half)])
+        return template, half
+    if kind == PATTERN_CHIRP:
+        template = chirp_waveform(sample_rate, duration_s).astype(np.float64)
+        return template - template.mean(), 0
+    raise ValueError(f"未知的回环图样: {kind}")
+
+
+class PatternDetector:
+    """
+    流式图样检测：归一化互相关（FFT计算相关、累加和计算窗口能量），与极性无关
+
+    跨数据块保留末尾样本，跨越数据块边界的图样同样能被检出；样本序号不连续时重新开始
+    """
+
+    def __init__(self, template: np.ndarray, anchor: int = 0, threshold: float = 0.8):
+        """
+        Args:
+            template: 零均值模板
+            anchor: 图样基准点在模板中的位置
+            threshold: 检出阈值（|相关系数|）
+        """
+        self.template = np.asarray(template, dtype=np.float64)
+        self.length = len(self.template)
+        self.anchor = anchor
+        self.threshold = threshold
+        self._template_norm = float(np.sqrt(np.dot(self.template, self.template)))
+        self.reset()
+
+    def reset(self):
+        self._tail = np.zeros(0, dtype=np.float64)
+        self._tail_start = 0
+        self._last_match = -self.length  # 上一次检出的窗口起点（样本序号）
+
+    def feed(self, data: np.ndarray, start_index: int) -> List[Tuple[int, float]]:
+        """
+        输入一个数据块
+
+        Returns:
+            List[Tuple[int, float]]: 检出的图样 [(基准点样本序号, 相关系数)]
+        """
+        if len(self._tail) and self._tail_start + len(self._tail) != start_index:
+            self._tail = np.zeros(0, dtype=np.float64)
+        if not len(self._tail):
+            self._tail_start = start_index
+        x = np.concatenate([self._tail, np.asarray(data, dtype=np.float64)])
+        length = self.length
+        windows = len(x) - length + 1
+        if windows <= 0:
+            self._tail = x
+            return []
+
+        # 相关：irfft(X·conj(T)) 的前 windows 项；补零到 len(x)+length 避免循环卷绕
+        nfft = 1 << int(np.ceil(np.log2(len(x) + length)))
+        corr = np.fft.irfft(np.fft.rfft(x, nfft) * np.conj(np.fft.rfft(self.template, nfft)), nfft)[:windows]
+        csum = np.concatenate([[0.0], np.cumsum(x)])
+        csum2 = np.concatenate([[0.0], np.cumsum(x * x)])
+        window_sum = csum[length:] - csum[:-length]
+        energy = np.maximum(csum2[length:] - csum2[:-length] - window_sum * window_sum / length, 0.0)
+        score = np.abs(corr) / (np.sqrt(energy) * self._template_norm + 1e-12)
+
+        # 末尾 length 个窗口留到下一块再判定（峰值可能还在上升）
+        settled = max(0, windows - length)
+        matches = []
+        candidates = np.flatnonzero(score[:settled] >= self.threshold)
+        if len(candidates):
+            # 相距不足一个模板长度的超阈值窗口（主峰与旁瓣）属于同一个图样，取其中相关系数最大者；
+            # 离判定边界不足一个模板长度的留到下一块（持续超阈值的不再推迟，避免保留的样本无限增长）
+            runs = np.split(candidates, np.flatnonzero(np.diff(candidates) > length) + 1)
+            if runs[-1][-1] > settled - 1 - length and runs[-1][0] > settled - 4 * length:
+                settled = int(runs.pop()[0])
+            for run in runs:
+                best = int(run[np.argmax(score[run])])
+                position = self._tail_start + best
+                if position - self._last_match >= self.length:
+                    self._last_match = position
+                    matches.append((position + self.anchor, float(score[best])))
+        self._tail = x[settled:]
+        self._tail_start += settled
+        return matches
+
+
+class LoopbackProbe:
+    """
+    回环延迟测量
+
+    emit() 在I/O线程中发出一次图样并记下发出时刻；observe() 由数据回调对每个数据包调用，检出图样时
+    记录该环节的延迟，并记住包含图样的数据包序号；之后的环节（如WebSocket发送完成）调用 observe_delivery()。
+
+    延迟统计（均相对AO命令发出时刻）：
+        sample: 图样出现在AI数据中的采样时刻（由读取时刻与FIFO剩余点数推算，反映AO输出与采样本身的延迟）
+        read: 读取线程取得包含图样的数据块
+        <环节名>: observe()/observe_delivery() 指定的环节，如 callback、consumer、websocket
+    """
+
+    def __init__(self, ai_channel: int, ao_channel: int, kind: str = PATTERN_STEP, duration_s: float = 0.005,
+                 amplitude: float = 1.0, ao_sample_rate_hz: int = 100000, threshold: float = 0.8):
+        """
+        Args:
+            ai_channel: 回环的AI通道号
+            ao_channel: 输出图样的AO通道号
+            kind: 图样 step（直流电平交替跳变）/ chirp（单次扫频波形）
+            duration_s: 图样时长（阶跃为跳变前后各一半的匹配窗口）
+            amplitude: 图样幅值(V)
+            ao_sample_rate_hz: 扫频波形的AO输出采样率
+            threshold: 检出阈值
+        """
+        if kind not in PATTERNS:
+            raise ValueError(f"未知的回环图样: {kind}")
+        self.ai_channel = ai_channel
+        self.ao_channel = ao_channel
+        self.kind = kind
+        self.duration_s = duration_s
+        self.amplitude = amplitude
+        self.ao_sample_rate_hz = ao_sample_rate_hz
+        self.threshold = threshold
+        self.waveform = chirp_waveform(ao_sample_rate_hz, duration_s, amplitude) if kind == PATTERN_CHIRP else None
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._detector: Optional[PatternDetector] = None
+            self._sample_rate = 0
+            self._pending: deque = deque()  # 尚未检出的图样发出时刻
+            self._delivering: Dict[int, float] = {}  # 包含图样的数据包序号 -> 图样发出时刻
+            self._level = -self.amplitude
+            self.emitted = 0
+            self.detected = 0
+            self.missed = 0
+            self.unmatched = 0
+            self.emit_errors = 0
+            self.scores: List[float] = []
+            self.latency: Dict[str, LatencyStats] = {}
+
+    @property
+    def pending(self) -> int:
+        """已发出、尚未检出的图样数"""
+        return len(self._pending)
+
+    def _stats(self, name: str) -> LatencyStats:
+        stats = self.latency.get(name)
+        if stats is None:
+            stats = self.latency[name] = LatencyStats(name)
+        return stats
+
+    def emit(self, driver: Any) -> bool:
+        """
+        发出一次图样（阻塞调用驱动，应在I/O线程中执行）
+
+        Args:
+            driver: USB5121Driver 或 ProcessUSB5121Driver
+        """
+        emitted = time.time()
+        try:
+            if self.kind == PATTERN_STEP:
+                self._level = -self._level
+                success = driver.set_ao_dc_voltage(self.ao_channel, self._level)
+            else:
+                success = driver.output_ao_waveform(self.ao_channel, self.waveform, self.ao_sample_rate_hz, 1)
+        except Exception as e:
+            logger.error(f"回环图样输出异常: {e}")
+            success = False
+        with self._lock:
+            if success:
+                self._pending.append(emitted)
+                self.emitted += 1
+            else:
+                self.emit_errors += 1
+        return success
+
+    def observe(self, packet: Any, stage: str) -> int:
+        """
+        在数据包中检测图样（数据回调中调用）
+
+        Returns:
+            int: 本数据包中检出的图样数
+        """
+        now = time.time()
+        if self.ai_channel not in packet.channels or not packet.sample_rate:
+            return 0
+        with self._lock:
+            if self._detector is None or self._sample_rate != packet.sample_rate:
+                template, anchor = pattern_template(self.kind, packet.sample_rate, self.duration_s)
+                self._detector = PatternDetector(template, anchor, self.threshold)
+                self._sample_rate = packet.sample_rate
+            matches = self._detector.feed(packet.channel(self.ai_channel), packet.start_index)
+            if not matches:
+                return 0
+            # 图样的采样时刻：最新样本在读取时刻产生，FIFO中仍有 remaining_points/通道数 个更新的样本
+            newest = packet.end_index + (packet.remaining_points or 0) / max(1, packet.num_channels)
+            for index, score in matches:
+                sample_time = packet.timestamp - (newest - index) / packet.sample_rate
+                emitted = self._match(sample_time)
+                if emitted is None:
+                    self.unmatched += 1
+                    continue
+                self.detected += 1
+                self.scores.append(score)
+                self._stats('sample').record(sample_time - emitted)
+                self._stats('read').record(packet.timestamp - emitted)
+                self._stats(stage).record(now - emitted)
+                self._delivering[packet.seq] = emitted
+            return len(matches)
+
+    def _match(self, sample_time: float) -> Optional[float]:
+        """为检出的图样找到对应的发出时刻：取采样时刻之前最近一次发出，更早的未检出图样计为漏检"""
+        # 推算的采样时刻有读取时刻与FIFO剩余点数带来的误差，允许略早于发出时刻
+        tolerance = max(0.002, 2 * self.duration_s)
+        emitted = None
+        while self._pending and self._pending[0] <= sample_time + tolerance:
+            if emitted is not None:
+                self.missed += 1
+            emitted = self._pending.popleft()
+        return emitted
+
+    def observe_delivery(self, seq: int, stage: str):
+        """包序号为 seq 的数据块到达后续环节（如WebSocket发送完成）时记录延迟；发送队列合并的数据块带最新的包序号"""
+        if not self._delivering:
+            return
+        with self._lock:
+            now = time.time()
+            for delivered in [key for key in self._delivering if key <= seq]:
+                self._stats(stage).record(now - self._delivering.pop(delivered))
+            if len(self._delivering) > 1000:
+                self._delivering.clear()
+
+    def metrics(self, histogram: bool = True) -> Dict:
+        """测量结果：各环节延迟（含抖动std_ms与分桶直方图）、检出/漏检计数"""
+        with self._lock:
+            latency = {}
+            for name, stats in self.latency.items():
+                latency[name] = stats.metrics()
+                if histogram:
+                    latency[name]['histogram'] = stats.histogram()
+            return {
+                'pattern': self.kind,
+                'ai_channel': self.ai_channel,
+                'ao_channel': self.ao_channel,
+                'emitted': self.emitted,
+                'detected': self.detected,
+                'missed': self.missed,
+                'pending': len(self._pending),
+                'unmatched': self.unmatched,
+                'emit_errors': self.emit_errors,
+                'min_score': round(min(self.scores), 4) if self.scores else None,
+                'latency': latency,
+            }
@@ -0,0 +1,401 @@
+"""
+多采集卡设备管理器
+同时打开多张USB5121采集卡，每张卡独立读取线程，对外提供统一的逻辑通道空间（如 dev1/CH3），
+并按采样序号与触发时间对齐各卡数据后合并为一个数据流
+
+目前只供脚本使用（如 benchmark_acquisition.py --cards N）；网页的共享采集中心（dap_hub）与 WebSocket 消费者
+仍按连接的 ?device=N 各绑定一张卡、通道号 0-15，尚不接受 devN/CHm 逻辑通道
+"""
+import re
+import time
+import logging
+import threading
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .dap_driver import USB5121Driver
+from .dap_packet import AiPacket
+
+logger = logging.getLogger(__name__)
+
+_CHANNEL_PATTERN = re.compile(r'^dev(\d+)/CH(\d+)$', re.IGNORECASE)
+
+
+def channel_name(device_index: int, channel: int) -> str:
+    """逻辑通道名，如 dev1/CH3"""
+    return f"dev{device_index}/CH{channel}"
+
+
+def parse_channel(name: str) -> Tuple[int, int]:
+    """
+    解析逻辑通道名
+
+    Returns:
+        (采集卡序号, 物理通道号)
+    """
+    match = _CHANNEL_PATTERN.match(name.strip())
+    if not match:
+        raise ValueError(f"无效的逻辑通道名: {name}")
+    return int(match.group(1)), int(match.group(2))
+
+
+class _CardStream:
+    """单张卡待对齐的数据（全局样本序号区间 [start, end)）"""
+
+    __slots__ = ('channels', 'chunks', 'start', 'end', 'offset', 'units')
+
+    def __init__(self, channels: List[str]):
+        self.channels = channels
+        self.units: Optional[Tuple[str, ...]] = None  # 最近数据包的工程量单位，None表示伏
+        self.chunks = deque()  # (全局起始序号, AiPacket)
+        self.start = 0
+        self.end = 0
+        self.offset: Optional[int] = None  # 本卡样本序号到全局样本序号的偏移
+
+    @property
+    def pending(self) -> int:
+        return self.end - self.start
+
+    def take(self, hi: int, out: Optional[np.ndarray] = None, lo: int = 0) -> int:
+        """
+        取出 [start, hi) 的数据写入out（out为None时直接丢弃），返回槽位已失效的点数
+        """
+        stale = 0
+        while self.chunks and self.start < hi:
+            chunk_start, packet = self.chunks[0]
+            length = packet.points_per_channel
+            a = self.start - chunk_start
+            b = min(chunk_start + length, hi) - chunk_start
+            if out is not None and b > a:
+                dst = self.start - lo
+                if packet.is_valid():
+                    out[:, dst:dst + b - a] = packet.data[:, a:b]
+                else:
+                    out[:, dst:dst + b - a] = np.nan
+                    stale += b - a
+            self.start = chunk_start + b
+            if b >= length:
+                self.chunks.popleft()
+        return stale
+
+
+class StreamAligner:
+    """
+    多卡数据对齐合并
+
+    各卡数据包的样本序号加上本卡偏移（由触发时间差换算）得到全局样本序号，
+    当所有卡都覆盖同一全局区间时合并输出 (总通道数, 点数) 的数据包；
+    某卡出现数据缺口时丢弃其待合并数据并从新位置重新对齐，合并流的 start_index 随之跳变。
+    """
+
+    def __init__(self,
+                 card_channels: Dict[int, List[str]],
+                 sample_rate: int,
+                 callback: Callable[[AiPacket], Any],
+                 max_pending_seconds: float = 2.0):
+        """
+        初始化对齐器
+
+        Args:
+            card_channels: {采集卡序号: 该卡启用的逻辑通道名}，按卡序号排列决定合并后的通道顺序
+            sample_rate: 各卡统一的采样率(Hz)
+            callback: 合并数据包回调
+            max_pending_seconds: 单卡最多缓存的待对齐数据时长，超出后丢弃最旧数据
+        """
+        self.sample_rate = sample_rate
+        self.callback = callback
+        self.max_pending_points = max(1, int(sample_rate * max_pending_seconds))
+        self.streams = {card: _CardStream(channels) for card, channels in sorted(card_channels.items())}
+        self.channels = tuple(ch for stream in self.streams.values() for ch in stream.channels)
+        self.reference_time: Optional[float] = None
+        self._lock = threading.Lock()
+
+        self.merged_packets = 0
+        self.merged_points = 0
+        self.gaps = 0
+        self.dropped_points = 0  # 因缺口、无对应数据或积压而丢弃的点数（每通道计）
+        self.stale_points = 0
+
+    def push(self, card: int, packet: AiPacket, trigger_time: Optional[float] = None):
+        """
+        加入一张卡的数据包（由各卡的数据处理线程调用）
+
+        Args:
+            card: 采集卡序号
+            packet: 数据包
+            trigger_time: 该卡的触发时间，用于计算对齐偏移
+        """
+        with self._lock:
+            stream = self.streams[card]
+            if stream.offset is None:
+                # 以最先送达数据的卡的触发时间作为全局样本序号0的时间基准
+                if self.reference_time is None:
+                    self.reference_time = trigger_time
+                if self.reference_time is not None and trigger_time is not None:
+                    stream.offset = int(round((trigger_time - self.reference_time) * self.sample_rate))
+                else:
+                    stream.offset = 0
+            global_start = packet.start_index + stream.offset
+
+            if stream.chunks and global_start != stream.end:
+                # 数据缺口：丢弃待合并数据，从新位置重新对齐
+                self.gaps += 1
+                self.dropped_points += stream.pending
+                stream.chunks.clear()
+            if not stream.chunks:
+                stream.start = global_start
+            stream.chunks.append((global_start, packet))
+            stream.units = packet.units
+            stream.end = global_start + packet.points_per_channel
+
+            if stream.pending > self.max_pending_points:
+                hi = stream.end - self.max_pending_points
+                self.dropped_points += hi - stream.start
+                stream.take(hi)
+
+            self._merge(timestamp=packet.timestamp, remaining_points=packet.remaining_points)
+
+    def _merge(self, timestamp: float, remaining_points: int):
+        """所有卡均有数据时合并共同覆盖的区间"""
+        streams = self.streams.values()
+        if any(not stream.chunks for stream in streams):
+            return
+        lo = max(stream.start for stream in streams)
+        hi = min(stream.end for stream in streams)
+        if hi <= lo:
+            return
+
+        data = np.empty((len(self.channels), hi - lo), dtype=np.float32)
+        row = 0
+        for stream in streams:
+            if stream.start < lo:
+                # 其他卡没有对应数据的部分
+                self.dropped_points += lo - stream.start
+                stream.take(lo)
+            n = len(stream.channels)
+            self.stale_points += stream.take(hi, data[row:row + n], lo)
+            row += n
+
+        units = None
+        if any(stream.units for stream in streams):
+            units = tuple(unit for stream in streams for unit in (stream.units or ('V',) * len(stream.channels)))
+        packet = AiPacket(data, self.channels, lo, self.sample_rate, timestamp,
+                          seq=self.merged_packets, remaining_points=remaining_points, units=units)
+        self.merged_packets += 1
+        self.merged_points += hi - lo
+        try:
+            self.callback(packet)
+        except Exception as e:
+            logger.error(f"合并数据回调异常: {e}")
+
+    def metrics(self) -> Dict:
+        """对齐统计"""
+        with self._lock:
+            return {
+                'merged_packets': self.merged_packets,
+                'merged_points': self.merged_points,
+                'gaps': self.gaps,
+                'dropped_points': self.dropped_points,
+                'stale_points': self.stale_points,
+                'offsets': {card: stream.offset for card, stream in self.streams.items()},
+                'pending_points': {card: stream.pending for card, stream in self.streams.items()},
+            }
+
+
+class DeviceManager:
+    """
+    多采集卡设备管理器
+
+    每张卡对应一个 USB5121Driver（各自的读取线程与处理线程），
+    通道以逻辑名 devN/CHm 配置，连续采集数据经 StreamAligner 对齐后以单一数据流回调。
+    """
+
+    def __init__(self,
+                 device_indices: Optional[List[int]] = None,
+                 backend: Any = None,
+                 dll_path: Optional[str] = None,
+                 max_pending_seconds: float = 2.0):
+        """
+        初始化设备管理器
+
+        Args:
+            device_indices: 要打开的采集卡序号，None时打开 FindUSB5DAQ 找到的所有卡
+            backend: 设备后端，同 USB5121Driver
+            dll_path: DLL文件路径，None时使用驱动默认路径
+            max_pending_seconds: 单卡待对齐数据的最大缓存时长
+        """
+        self.device_indices = device_indices
+        self.backend = backend
+        self.dll_path = dll_path
+        self.max_pending_seconds = max_pending_seconds
+        self.drivers: Dict[int, USB5121Driver] = {}
+        self.aligner: Optional[StreamAligner] = None
+        self.data_callback: Optional[Callable] = None
+        self.is_acquiring = False
+
+    def _create_driver(self, device_index: int) -> USB5121Driver:
+        kwargs = {'backend': self.backend, 'device_index': device_index}
+        if self.dll_path is not None:
+            kwargs['dll_path'] = self.dll_path
+        return USB5121Driver(**kwargs)
+
+    def open(self) -> bool:
+        """
+        打开所有采集卡
+
+        Returns:
+            bool: 全部打开成功
+        """
+        try:
+            indices = self.device_indices
+            if indices is None:
+                probe = self._create_driver(0)
+                count = probe.dll.FindUSB5DAQ() if probe.dll else 0
+                indices = list(range(count))
+                if not indices:
+                    logger.error("未找到采集卡")
+                    return False
+            for index in indices:
+                driver = self._create_driver(index)
+                if not driver.open_device():
+                    logger.error(f"打开采集卡 dev{index} 失败")
+                    self.close()
+                    return False
+                self.drivers[index] = driver
+            logger.info(f"已打开 {len(self.drivers)} 张采集卡: {list(self.drivers)}")
+            return True
+        except Exception as e:
+            logger.error(f"打开采集卡异常: {e}")
+            self.close()
+            return False
+
+    def close(self) -> bool:
+        """停止采集并关闭所有采集卡"""
+        self.stop()
+        success = True
+        for driver in self.drivers.values():
+            success = driver.close_device() and success
+        self.drivers.clear()
+        return success
+
+    @property
+    def channels(self) -> List[str]:
+        """所有卡的全部逻辑通道"""
+        return [channel_name(index, ch) for index in sorted(self.drivers) for ch in range(16)]
+
+    @property
+    def enabled_channels(self) -> List[str]:
+        """已启用的逻辑通道，顺序与合并数据包的行顺序一致"""
+        return [
+            channel_name(index, ch)
+            for index in sorted(self.drivers)
+            for ch, enabled in enumerate(self.drivers[index].ai_channels) if enabled
+        ]
+
+    def configure_channel(self, name: str, enabled: bool, voltage_range: float = 10.0) -> bool:
+        """
+        按逻辑通道名配置AI通道
+
+        Args:
+            name: 逻辑通道名，如 dev1/CH3
+            enabled: 是否启用
+            voltage_range: 量程
+        """
+        try:
+            index, channel = parse_channel(name)
+        except ValueError as e:
+            logger.error(str(e))
+            return False
+        driver = self.drivers.get(index)
+        if driver is None:
+            logger.error(f"采集卡 dev{index} 未打开")
+            return False
+        return driver.configure_ai_channel(channel, enabled, voltage_range)
+
+    def set_calibration(self, name: str, config: Optional[Dict] = None) -> bool:
+        """按逻辑通道名设置标定，参数见 USB5121Driver.set_ai_calibration"""
+        try:
+            index, channel = parse_channel(name)
+        except ValueError as e:
+            logger.error(str(e))
+            return False
+        driver = self.drivers.get(index)
+        if driver is None:
+            logger.error(f"采集卡 dev{index} 未打开")
+            return False
+        return driver.set_ai_calibration(channel, config)
+
+    def set_sample_rate(self, sample_rate_hz: int) -> bool:
+        """所有卡使用相同的采样率"""
+        return all(driver.set_ai_sample_rate(sample_rate_hz) for driver in self.drivers.values())
+
+    def start(self, callback: Callable[[AiPacket], Any]) -> bool:
+        """
+        所有有启用通道的卡同时开始连续采集
+
+        Args:
+            callback: 合并数据包回调，数据包通道为逻辑通道名
+        """
+        if self.is_acquiring:
+            logger.warning("多卡采集已在进行中")
+            return True
+        active = {index: driver for index, driver in self.drivers.items() if any(driver.ai_channels)}
+        if not active:
+            logger.error("没有启用的AI通道")
+            return False
+        rates = {int(1e9 / driver.ai_sample_rate_ns) for driver in active.values()}
+        if len(rates) != 1:
+            logger.error(f"各采集卡采样率不一致: {rates}")
+            return False
+
+        card_channels = {
+            index: [channel_name(index, ch) for ch, enabled in enumerate(driver.ai_channels) if enabled]
+            for index, driver in active.items()
+        }
+        self.data_callback = callback
+        self.aligner = StreamAligner(card_channels, rates.pop(), callback, self.max_pending_seconds)
+
+        started = []
+        for index, driver in active.items():
+            driver.set_ai_sample_mode(USB5121Driver.MODE_CONTINUOUS)
+            if not driver.start_continuous_acquisition(self._make_card_callback(index, driver)):
+                logger.error(f"采集卡 dev{index} 启动失败")
+                for other in started:
+                    other.stop_continuous_acquisition()
+                return False
+            started.append(driver)
+
+        self.is_acquiring = True
+        logger.info(f"多卡连续采集已启动: {len(started)} 张卡, {len(self.aligner.channels)} 个通道")
+        return True
+
+    def _make_card_callback(self, index: int, driver: USB5121Driver) -> Callable[[AiPacket], None]:
+        aligner = self.aligner
+
+        def card_callback(packet: AiPacket):
+            aligner.push(index, packet, driver.ai_trigger_time)
+        return card_callback
+
+    def stop(self) -> bool:
+        """停止所有卡的采集"""
+        if not self.is_acquiring:
+            return True
+        self.is_acquiring = False
+        success = True
+        for driver in self.drivers.values():
+            if driver.is_acquiring:
+                success = driver.stop_continuous_acquisition() and success
+        logger.info("多卡连续采集已停止")
+        return success
+
+    def get_status(self) -> Dict:
+        """各卡状态与对齐统计"""
+        return {
+            'devices': {f"dev{index}": driver.get_device_status() for index, driver in self.drivers.items()},
+            'enabled_channels': self.enabled_channels,
+            'is_acquiring': self.is_acquiring,
+            'alignment': self.aligner.metrics() if self.aligner else {},
+            'timestamp': time.time(),
+        }
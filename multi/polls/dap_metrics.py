@@ -0,0 +1,142 @@
+"""
+采集链路的低开销计时统计
+各环节（FIFO驻留、处理队列等待、数据回调、WebSocket发送）的耗时记入对数分桶直方图，
+记录一次只做一次对数运算与一次计数，可在每个数据包上调用；
+FIFO积压、每次读取点数、队列深度等计数量记入按2的幂分桶的 ValueStats
+"""
+import math
+from typing import Dict, List, Optional
+
+import numpy as np
+
+
+class LatencyStats:
+    """
+    耗时直方图
+
+    以 1µs 起、每十倍 BUCKETS_PER_DECADE 个对数分桶累计耗时，分位数按桶上沿估算（相对误差约12%）。
+    record() 由单一线程调用，metrics() 可在任意线程读取（读取到的是近似一致的快照）。
+    """
+
+    MIN_SECONDS = 1e-6
+    DECADES = 8  # 1µs ~ 100s
+    BUCKETS_PER_DECADE = 20
+
+    def __init__(self, name: str = ''):
+        self.name = name
+        self.reset()
+
+    def reset(self):
+        self.counts = np.zeros(self.DECADES * self.BUCKETS_PER_DECADE + 2, dtype=np.int64)
+        self.count = 0
+        self.total = 0.0
+        self.total_sq = 0.0
+        self.max = 0.0
+
+    def record(self, seconds: float):
+        """记录一次耗时（秒）"""
+        if seconds < self.MIN_SECONDS:
+            bucket = 0
+        else:
+            bucket = min(len(self.counts) - 1,
+                         1 + int(math.log10(seconds / self.MIN_SECONDS) * self.BUCKETS_PER_DECADE))
+        self.counts[bucket] += 1
+        self.count += 1
+        self.total += seconds
+        self.total_sq += seconds * seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def _bucket_upper(self, bucket: int) -> float:
+        return self.MIN_SECONDS * 10 ** (bucket / self.BUCKETS_PER_DECADE)
+
+    def percentile(self, q: float) -> Optional[float]:
+        """第q百分位耗时（秒），无记录时为None"""
+        if self.count == 0:
+            return None
+        target = max(1, math.ceil(self.count * q / 100.0))
+        bucket = int(np.searchsorted(np.cumsum(self.counts), target))
+        return min(self.max, self._bucket_upper(bucket))
+
+    def std(self) -> Optional[float]:
+        """耗时标准差（秒，即抖动），无记录时为None"""
+        if self.count == 0:
+            return None
+        mean = self.total / self.count
+        return math.sqrt(max(0.0, self.total_sq / self.count - mean * mean))
+
+    def histogram(self) -> List[Dict]:
+        """非空分桶 [{'le_ms': 桶上沿(毫秒), 'count': 次数}]"""
+        return [{'le_ms': round(self._bucket_upper(int(bucket)) * 1000, 4), 'count': int(self.counts[bucket])}
+                for bucket in np.flatnonzero(self.counts)]
+
+    def metrics(self) -> Dict:
+        """统计结果（毫秒）"""
+        def ms(value: Optional[float]) -> Optional[float]:
+            return None if value is None else round(value * 1000, 4)
+
+        return {
+            'count': self.count,
+            'mean_ms': ms(self.total / self.count) if self.count else None,
+            'std_ms': ms(self.std()),
+            'p50_ms': ms(self.percentile(50)),
+            'p90_ms': ms(self.percentile(90)),
+            'p99_ms': ms(self.percentile(99)),
+            'max_ms': ms(self.max) if self.count else None,
+        }
+
+
+class ValueStats:
+    """
+    非负计数量（点数、队列深度等）的直方图
+
+    0 单独一桶，其余按 [2^(k-1), 2^k) 分桶，分桶只需一次 int.bit_length()；分位数按桶上沿估算。
+    与 LatencyStats 一样由单一线程记录、任意线程读取。
+    """
+
+    BUCKETS = 40  # 0 ~ 2^39
+
+    def __init__(self, name: str = ''):
+        self.name = name
+        self.reset()
+
+    def reset(self):
+        self.counts = np.zeros(self.BUCKETS + 1, dtype=np.int64)
+        self.count = 0
+        self.total = 0
+        self.max = 0
+        self.last = 0
+
+    def record(self, value: int):
+        """记录一个取值（负数按0计）"""
+        value = max(0, int(value))
+        self.counts[min(self.BUCKETS, value.bit_length())] += 1
+        self.count += 1
+        self.total += value
+        self.last = value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, q: float) -> Optional[int]:
+        """第q百分位取值（桶上沿），无记录时为None"""
+        if self.count == 0:
+            return None
+        target = max(1, math.ceil(self.count * q / 100.0))
+        bucket = int(np.searchsorted(np.cumsum(self.counts), target))
+        return min(self.max, (1 << bucket) - 1)
+
+    def histogram(self) -> List[Dict]:
+        """非空分桶 [{'le': 桶上沿, 'count': 次数}]"""
+        return [{'le': (1 << int(bucket)) - 1, 'count': int(self.counts[bucket])}
+                for bucket in np.flatnonzero(self.counts)]
+
+    def metrics(self) -> Dict:
+        return {
+            'count': self.count,
+            'mean': round(self.total / self.count, 2) if self.count else None,
+            'last': self.last,
+            'p50': self.percentile(50),
+            'p90': self.percentile(90),
+            'p99': self.percentile(99),
+            'max': self.max if self.count else None,
+        }
@@ -0,0 +1,182 @@
+"""
+AI采集数据包
+以 (通道数, 每通道点数) 的float32数组承载数据，在驱动、消费者与持久化之间原样传递，仅在网络/磁盘边界转换
+"""
+import logging
+from typing import Optional, Dict, Tuple, Any
+
+import numpy as np
+
+from .dap_buffer import AiBlock
+
+logger = logging.getLogger(__name__)
+
+
+class AiPacket:
+    """
+    AI数据包
+
+    Attributes:
+        data: (通道数, 每通道点数) float32数组，通常为环形缓冲区的只读视图
+        channels: 与data行对应的通道号
+        start_index: 本包第一个样本在本次采集中的样本序号（每通道计）
+        sample_rate: 采样率(Hz)
+        timestamp: 读取完成时的系统时间
+        seq: 数据块序号
+        remaining_points: 读取后FIFO剩余点数
+        block: 数据所在的环形缓冲区块（拷贝后的数据为None）
+        is_final / oneshot_progress / total_points: 单次采集状态，连续采集时 oneshot_progress/total_points 为None
+        units: 与data行对应的工程量单位（驱动已完成标定换算），None表示未标定、单位为伏
+    """
+
+    __slots__ = ('data', 'channels', 'start_index', 'sample_rate', 'timestamp', 'seq',
+                 'remaining_points', 'block', 'is_final', 'oneshot_progress', 'total_points', 'units')
+
+    def __init__(self,
+                 data: np.ndarray,
+                 channels: Tuple,
+                 start_index: int,
+                 sample_rate: int,
+                 timestamp: float,
+                 seq: int = 0,
+                 remaining_points: int = 0,
+                 block: Optional[AiBlock] = None,
+                 is_final: bool = False,
+                 oneshot_progress: Optional[int] = None,
+                 total_points: Optional[int] = None,
+                 units: Optional[Tuple[str, ...]] = None):
+        self.data = data
+        self.channels = tuple(channels)
+        self.start_index = start_index
+        self.sample_rate = sample_rate
+        self.timestamp = timestamp
+        self.seq = seq
+        self.remaining_points = remaining_points
+        self.block = block
+        self.is_final = is_final
+        self.oneshot_progress = oneshot_progress
+        self.total_points = total_points
+        self.units = tuple(units) if units is not None else None
+
+    @property
+    def num_channels(self) -> int:
+        return self.data.shape[0]
+
+    @property
+    def points_per_channel(self) -> int:
+        return self.data.shape[1]
+
+    @property
+    def end_index(self) -> int:
+        """下一个包的起始样本序号"""
+        return self.start_index + self.points_per_channel
+
+    def channel(self, ch) -> np.ndarray:
+        """返回指定通道的数据视图"""
+        return self.data[self.channels.index(ch)]
+
+    def is_valid(self) -> bool:
+        """数据是否仍然可用（引用的环形缓冲区槽位尚未被覆盖）"""
+        return self.block is None or self.block.is_valid()
+
+    def copy(self) -> 'AiPacket':
+        """拷贝数据，使数据包脱离环形缓冲区独立存在"""
+        return AiPacket(np.array(self.data, dtype=np.float32), self.channels, self.start_index,
+                        self.sample_rate, self.timestamp, self.seq, self.remaining_points, None,
+                        self.is_final, self.oneshot_progress, self.total_points, self.units)
+
+    def concat(self, other: 'AiPacket') -> 'AiPacket':
+        """
+        合并时间上相邻的两个数据包（队列coalesce策略使用）
+
+        Returns:
+            AiPacket: 数据拷贝后拼接的新数据包，不再引用环形缓冲区
+        """
+        if self.channels != other.channels or self.end_index != other.start_index or self.units != other.units:
+            raise ValueError(f"数据包不连续，无法合并: {self!r} + {other!r}")
+        data = np.concatenate((self.data, other.data), axis=1)
+        if not (self.is_valid() and other.is_valid()):
+            raise ValueError(f"数据块 #{self.seq}/#{other.seq} 已被覆盖，无法合并")
+        return AiPacket(data, self.channels, self.start_index, other.sample_rate, other.timestamp,
+                        other.seq, other.remaining_points, None, other.is_final,
+                        other.oneshot_progress, other.total_points, other.units)
+
+    def stats(self) -> Dict[Any, Dict[str, float]]:
+        """
+        一次性向量化计算各通道统计量
+
+        Returns:
+            {通道号: {'min', 'max', 'mean', 'rms'}}
+        """
+        if self.points_per_channel == 0:
+            return {}
+        data = self.data
+        v_min = data.min(axis=1)
+        v_max = data.max(axis=1)
+        v_mean = data.mean(axis=1, dtype=np.float64)
+        v_rms = np.sqrt(np.einsum('ij,ij->i', data, data, dtype=np.float64) / data.shape[1])
+        return {
+            ch: {'min': float(v_min[i]), 'max': float(v_max[i]), 'mean': float(v_mean[i]), 'rms': float(v_rms[i])}
+            for i, ch in enumerate(self.channels)
+        }
+
+    def to_dict(self) -> Optional[Dict]:
+        """
+        转换为JSON可用的字典（网络边界）
+
+        Returns:
+            Optional[Dict]: 与原有 data_packet 格式兼容的字典；数据所在槽位已被覆盖时返回 None
+        """
+        channel_data = {str(ch): self.data[i].tolist() for i, ch in enumerate(self.channels)}
+        # 先拷贝后校验：拷贝期间槽位若被覆盖，则丢弃该包
+        if not self.is_valid():
+            logger.warning(f"数据块 #{self.seq} 在发送前已被覆盖，丢弃")
+            return None
+        return {
+            'timestamp': self.timestamp,
+            'sample_rate': self.sample_rate,
+            'points_per_channel': self.points_per_channel,
+            'remaining_points': self.remaining_points,
+            'channel_data': channel_data,
+            'enabled_channels': list(self.channels),
+            'seq': self.seq,
+            'start_index': self.start_index,
+            'oneshot_progress': self.oneshot_progress,
+            'is_final': self.is_final,
+            'total_points': self.total_points,
+            'calibrated': self.units is not None,
+            'units': {str(ch): unit for ch, unit in zip(self.channels, self.units)} if self.units else None,
+        }
+
+    def __repr__(self):
+        return (f"AiPacket(seq={self.seq}, channels={list(self.channels)}, "
+                f"points={self.points_per_channel}, start_index={self.start_index})")
+
+
+def coalesce_pending(queued: Tuple['AiPacket', Dict[str, Any]], item: Tuple['AiPacket', Dict[str, Any]],
+                     max_seconds: float = 0.5) -> Optional[Tuple['AiPacket', Dict[str, Any]]]:
+    """
+    合并发送队列中两个待发送的 (数据包, 附加字段)，供 AsyncStream 的 merge 使用
+
+    数据包需同一数据流且样本连续、合并后不超过 max_seconds 秒；附加字段取新数据的，
+    time_start_index 取排队数据的，coalesced 累计被合并进来的数据包数
+
+    Returns:
+        合并后的 (数据包, 附加字段)，不可合并时为 None
+    """
+    packet, extra = queued
+    new_packet, new_extra = item
+    if (packet.channels != new_packet.channels or packet.sample_rate != new_packet.sample_rate
+            or packet.end_index != new_packet.start_index or packet.is_final
+            or packet.points_per_channel + new_packet.points_per_channel > max_seconds * packet.sample_rate):
+        return None
+    try:
+        merged = packet.concat(new_packet)
+    except ValueError:
+        # 已排队的数据所在槽位被覆盖，留给发送时丢弃并计数
+        return None
+    merged_extra = dict(new_extra)
+    if 'time_start_index' in extra:
+        merged_extra['time_start_index'] = extra['time_start_index']
+    merged_extra['coalesced'] = extra.get('coalesced', 0) + new_extra.get('coalesced', 0) + 1
+    return merged, merged_extra
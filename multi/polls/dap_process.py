@@ -0,0 +1,501 @@
+"""
+独立采集进程
+由单独的进程持有采集卡并运行 USB5121Driver，采集数据写入 multiprocessing.shared_memory 环形缓冲区；
+Web进程通过控制管道下发配置/启动/停止/触发命令，只映射并读取共享内存中的数据，不与采集线程争用GIL
+"""
+import os
+import uuid
+import logging
+import threading
+import functools
+import itertools
+import multiprocessing
+from concurrent.futures import Future
+from multiprocessing import shared_memory
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+from .dap_buffer import AiBlock
+from .dap_layout import AiLayout
+from .dap_config import ConfigTransaction
+from .dap_driver import USB5121Driver
+from .dap_packet import AiPacket
+from .dap_trigger import TriggerEvent
+from .dap_integrity import StreamIntegrity
+
+logger = logging.getLogger(__name__)
+
+# 控制管道中代替回调函数的占位符：回调函数无法跨进程传递，由采集进程替换为共享内存发布函数
+CALLBACK_PLACEHOLDER = '__callback__'
+
+
+class SharedAiRing:
+    """
+    基于共享内存的AI数据环形缓冲区
+
+    布局: [头部 64字节: write_seq(int64)...][槽位0][槽位1]...，每个槽位为slot_points个float32。
+    仅采集进程写入；读取进程按序号映射只读视图，序号有效性规则与 AiRingBuffer 相同。
+    """
+
+    HEADER_BYTES = 64
+
+    def __init__(self, slot_points: int, num_slots: int, name: Optional[str] = None, create: bool = False):
+        """
+        创建或映射共享内存环形缓冲区
+
+        Args:
+            slot_points: 每个槽位的容量（所有通道合计的数据点数）
+            num_slots: 槽位数量
+            name: 共享内存名称
+            create: True为创建（Web进程），False为映射已有共享内存（采集进程）
+        """
+        self.slot_points = slot_points
+        self.num_slots = num_slots
+        size = self.HEADER_BYTES + slot_points * num_slots * 4
+        if create:
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        else:
+            # spawn方式启动的子进程与创建方共用resource_tracker，由创建方负责unlink
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.name = self.shm.name
+        self._header = np.ndarray((self.HEADER_BYTES // 8,), dtype=np.int64, buffer=self.shm.buf)
+        self._storage = np.ndarray((num_slots, slot_points), dtype=np.float32,
+                                   buffer=self.shm.buf, offset=self.HEADER_BYTES)
+        if create:
+            self._header[:] = 0
+
+    @property
+    def write_seq(self) -> int:
+        return int(self._header[0])
+
+    def write(self, data: np.ndarray) -> int:
+        """
+        写入一个 (通道数, 每通道点数) 的数据块（仅采集进程调用）
+
+        Returns:
+            int: 数据块序号
+        """
+        total = data.size
+        if total > self.slot_points:
+            raise ValueError(f"数据块点数({total})超过共享内存槽位容量({self.slot_points})")
+        seq = self.write_seq
+        slot = self._storage[seq % self.num_slots, :total].reshape(data.shape)
+        np.copyto(slot, data)
+        self._header[0] = seq + 1
+        return seq
+
+    def view(self, seq: int, layout: AiLayout, points_per_channel: int) -> AiBlock:
+        """映射序号为seq的数据块为只读视图（不拷贝），共享内存中按通道分块存放"""
+        data = layout.view(self._storage[seq % self.num_slots], points_per_channel)
+        data.flags.writeable = False
+        return AiBlock(self, seq, data, layout)
+
+    def is_valid(self, seq: int) -> bool:
+        """判断序号为seq的块是否仍然有效"""
+        write_seq = self.write_seq
+        return write_seq - self.num_slots < seq < write_seq
+
+    def close(self, unlink: bool = False):
+        """解除映射；unlink为True时同时删除共享内存（仅创建方调用）"""
+        self._header = None
+        self._storage = None
+        try:
+            self.shm.close()
+        except BufferError:
+            # 仍有数据包引用共享内存视图，映射随这些对象释放
+            logger.debug("共享内存仍被引用，延迟解除映射")
+        if unlink:
+            try:
+                self.shm.unlink()
+            except FileNotFoundError:
+                pass
+
+
+def _acquisition_host_main(control_conn, data_conn, shm_name: str, slot_points: int, num_slots: int,
+                           driver_kwargs: Dict):
+    """
+    采集进程入口：持有设备，执行控制命令，把数据包写入共享内存并通过数据管道发送元数据
+
+    控制消息: ('call', 方法名, args, kwargs) / ('getattr', 属性名) / ('exit',)
+    控制应答: ('ok', 返回值) / ('method', None) / ('future', 编号) / ('error', 信息)
+    数据消息: ('data', seq, channels, 每通道点数, start_index, sample_rate, timestamp,
+              remaining_points, is_final, oneshot_progress, total_points) / ('trigger',) /
+              ('event', TriggerEvent) / ('future', 编号, 是否成功, 结果或错误信息)
+    """
+    logging.basicConfig(level=logging.INFO)
+    ring = SharedAiRing(slot_points, num_slots, name=shm_name)
+    driver = USB5121Driver(**driver_kwargs)
+    send_lock = threading.Lock()
+
+    def send(message):
+        with send_lock:
+            data_conn.send(message)
+
+    def publish(packet: AiPacket):
+        # 超过共享内存槽位容量的数据包按点数拆分发布；抽取预览可能产生空数据包，仍需发布以传递 is_final
+        max_points = max(1, ring.slot_points // packet.num_channels)
+        for offset in range(0, max(packet.points_per_channel, 1), max_points):
+            chunk = packet.data[:, offset:offset + max_points]
+            last = offset + max_points >= packet.points_per_channel
+            seq = ring.write(chunk)
+            send(('data', seq, packet.channels, chunk.shape[1], packet.start_index + offset,
+                  packet.sample_rate, packet.timestamp, packet.remaining_points,
+                  packet.is_final and last, packet.oneshot_progress, packet.total_points, packet.units))
+
+    def notify_trigger():
+        send(('trigger',))
+
+    def publish_event(event: TriggerEvent):
+        # 触发事件数据量小，直接经数据管道发送
+        send(('event', event))
+
+    future_ids = itertools.count(1)
+
+    def forward_future(future: Future) -> int:
+        # 返回Future的方法（如 acquire_burst）：完成结果经数据管道送回，排在该次采集的数据之后
+        future_id = next(future_ids)
+
+        def done(f: Future):
+            error = f.exception()
+            send(('future', future_id, error is None, f.result() if error is None else str(error)))
+        future.add_done_callback(done)
+        return future_id
+
+    def substitute(value):
+        if isinstance(value, str) and value == CALLBACK_PLACEHOLDER:
+            return publish
+        return value
+
+    logger.info(f"采集进程启动: pid={os.getpid()}, 共享内存={shm_name}")
+    try:
+        while True:
+            try:
+                message = control_conn.recv()
+            except EOFError:
+                break
+            op = message[0]
+            if op == 'exit':
+                break
+            try:
+                if op == 'getattr':
+                    value = getattr(driver, message[1])
+                    control_conn.send(('method', None) if callable(value) else ('ok', value))
+                elif op == 'call':
+                    _, name, args, kwargs = message
+                    args = [substitute(a) for a in args]
+                    kwargs = {k: substitute(v) for k, v in kwargs.items()}
+                    if kwargs.get('trigger_callback') is publish:
+                        kwargs['trigger_callback'] = notify_trigger
+                    if kwargs.get('on_event') is publish:
+                        kwargs['on_event'] = publish_event
+                    result = getattr(driver, name)(*args, **kwargs)
+                    if isinstance(result, Future):
+                        control_conn.send(('future', forward_future(result)))
+                    else:
+                        control_conn.send(('ok', result))
+                else:
+                    control_conn.send(('error', f"未知的控制命令: {op}"))
+            except Exception as e:
+                logger.error(f"采集进程执行命令异常: {e}")
+                control_conn.send(('error', str(e)))
+    finally:
+        try:
+            driver.stop_ai_acquisition()
+            driver.close_device()
+        except Exception as e:
+            logger.error(f"采集进程关闭设备异常: {e}")
+        ring.close()
+        send(('exit',))
+        logger.info("采集进程退出")
+
+
+class ProcessUSB5121Driver:
+    """
+    运行在独立采集进程中的 USB5121Driver 代理
+
+    接口与 USB5121Driver 一致：方法调用与属性读取经控制管道转发到采集进程执行；
+    数据回调在本进程的数据接收线程中执行，数据包直接引用共享内存，不经过管道传输数据。
+    采集进程在首次使用时启动，close_device/shutdown 后退出，再次使用时重新启动。
+    """
+
+    def __init__(self,
+                 dll_path: Optional[str] = None,
+                 backend: Any = None,
+                 device_index: int = 0,
+                 slot_points: int = 512 * 1024,
+                 num_slots: int = 32):
+        """
+        初始化代理
+
+        Args:
+            dll_path: DLL文件路径，None时使用驱动默认路径
+            backend: 设备后端名称（'dll'/'simulated'），须可跨进程传递
+            device_index: 采集卡序号
+            slot_points: 共享内存槽位容量（所有通道合计的数据点数）
+            num_slots: 共享内存槽位数量
+        """
+        driver_kwargs = {}
+        if dll_path is not None:
+            driver_kwargs['dll_path'] = dll_path
+        if backend is not None:
+            driver_kwargs['backend'] = backend
+        if device_index:
+            driver_kwargs['device_index'] = device_index
+        self._driver_kwargs = driver_kwargs
+        self._slot_points = slot_points
+        self._num_slots = num_slots
+
+        self._process = None
+        self._control_conn = None
+        self._data_conn = None
+        self._ring: Optional[SharedAiRing] = None
+        self._listener_thread = None
+        self._control_lock = threading.Lock()
+        self._methods = set()
+        self._futures_lock = threading.Lock()
+        self._futures: Dict[int, Future] = {}
+        self._future_results: Dict[int, tuple] = {}  # 先于控制应答到达的Future结果
+
+        self.data_callback: Optional[Callable] = None
+        self.trigger_callback: Optional[Callable] = None
+        self.event_callback: Optional[Callable] = None
+        self.received_packets = 0
+        self.stale_packets = 0  # 读取前共享内存槽位已被覆盖而丢弃的数据包数
+        # 本进程收到的数据流完整性（数据包序号为共享内存块序号）
+        self.integrity = StreamIntegrity('采集进程代理')
+
+    def _ensure_host(self):
+        """启动采集进程并映射共享内存"""
+        if self._process is not None and self._process.is_alive():
+            return
+        # Web进程中存在多个线程，使用spawn方式启动以避免fork带来的锁状态问题
+        ctx = multiprocessing.get_context('spawn')
+        self._ring = SharedAiRing(self._slot_points, self._num_slots,
+                                  name=f"usb5121_{os.getpid()}_{uuid.uuid4().hex[:8]}", create=True)
+        self._control_conn, child_control = ctx.Pipe()
+        data_conn, child_data = ctx.Pipe(duplex=False)
+        self._data_conn = data_conn
+        self._process = ctx.Process(
+            target=_acquisition_host_main,
+            args=(child_control, child_data, self._ring.name, self._slot_points, self._num_slots,
+                  self._driver_kwargs),
+            daemon=True
+        )
+        self._process.start()
+        child_control.close()
+        child_data.close()
+        self._listener_thread = threading.Thread(
+            target=self._listen, args=(data_conn, self._ring), daemon=True
+        )
+        self._listener_thread.start()
+        logger.info(f"采集进程已启动: pid={self._process.pid}, 共享内存={self._ring.name}")
+
+    def _request(self, message):
+        """发送控制消息并等待应答"""
+        self._ensure_host()
+        with self._control_lock:
+            self._control_conn.send(message)
+            return self._control_conn.recv()
+
+    def _call(self, name: str, *args, **kwargs):
+        """在采集进程中调用驱动方法"""
+        try:
+            status, value = self._request(('call', name, args, kwargs))
+        except (EOFError, OSError) as e:
+            logger.error(f"采集进程通信异常: {e}")
+            return False
+        if status == 'error':
+            logger.error(f"采集进程执行{name}失败: {value}")
+            return False
+        if status == 'future':
+            return self._bind_future(value)
+        return value
+
+    def _bind_future(self, future_id: int) -> Future:
+        """为采集进程中的Future创建本地Future"""
+        future = Future()
+        with self._futures_lock:
+            early = self._future_results.pop(future_id, None)
+            if early is None:
+                self._futures[future_id] = future
+        if early is not None:
+            self._resolve_future(future, *early)
+        return future
+
+    @staticmethod
+    def _resolve_future(future: Future, ok: bool, value: Any):
+        # 调用方可能已取消等待（如超时），此时丢弃结果，不能让数据接收线程因异常退出
+        if future.done():
+            return
+        if ok:
+            future.set_result(value)
+        else:
+            future.set_exception(RuntimeError(value))
+
+    def __getattr__(self, name: str):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        if name in self._methods:
+            return functools.partial(self._call, name)
+        try:
+            status, value = self._request(('getattr', name))
+        except (EOFError, OSError) as e:
+            raise AttributeError(f"采集进程不可用: {e}")
+        if status == 'method':
+            self._methods.add(name)
+            return functools.partial(self._call, name)
+        if status == 'error':
+            raise AttributeError(value)
+        return value
+
+    def start_ai_acquisition(self, data_callback: Optional[Callable] = None,
+                             trigger_callback: Optional[Callable] = None) -> bool:
+        """开始AI采集，回调在本进程中执行"""
+        self.data_callback = data_callback
+        self.trigger_callback = trigger_callback
+        self.integrity.reset()
+        return self._call('start_ai_acquisition',
+                          data_callback=CALLBACK_PLACEHOLDER if data_callback else None,
+                          trigger_callback=CALLBACK_PLACEHOLDER if trigger_callback else None)
+
+    def start_continuous_acquisition(self, callback) -> bool:
+        """开始连续采集，回调在本进程中执行"""
+        self.data_callback = callback
+        self.integrity.reset()
+        return self._call('start_continuous_acquisition', CALLBACK_PLACEHOLDER)
+
+    def start_burst_mode(self, data_callback: Optional[Callable] = None,
+                         sample_rate_hz: Optional[int] = None,
+                         oneshot_points: Optional[int] = None) -> bool:
+        """进入连发单次采集模式，回调在本进程中执行"""
+        self.data_callback = data_callback
+        self.integrity.reset()
+        return self._call('start_burst_mode', CALLBACK_PLACEHOLDER if data_callback else None,
+                          sample_rate_hz, oneshot_points)
+
+    def start_event_capture(self, conditions: List[Any], pre_points: int = 1000, post_points: int = 1000,
+                            holdoff_points: int = 0, on_event: Optional[Callable] = None) -> bool:
+        """开始触发事件采集，事件回调在本进程中执行"""
+        self.event_callback = on_event
+        return self._call('start_event_capture', conditions, pre_points, post_points, holdoff_points,
+                          on_event=CALLBACK_PLACEHOLDER if on_event else None)
+
+    def get_integrity_metrics(self) -> Dict:
+        """采集进程中的完整性核算，附加本进程经共享内存收到的数据流核算(transport)"""
+        metrics = self._call('get_integrity_metrics')
+        transport = self.integrity.metrics()
+        metrics['transport'] = transport
+        metrics['lossless'] = metrics['lossless'] and transport['lossless']
+        return metrics
+
+    def configure_transaction(self, force: bool = False) -> ConfigTransaction:
+        """在本进程中暂存配置，commit 时整批发送到采集进程下发"""
+        return ConfigTransaction(self, force)
+
+    def close_device(self) -> bool:
+        """关闭设备并退出采集进程"""
+        if self._process is None:
+            return True
+        result = self._call('close_device')
+        self.shutdown()
+        return result
+
+    def shutdown(self, timeout: float = 5.0):
+        """通知采集进程退出并释放共享内存"""
+        process = self._process
+        if process is None:
+            return
+        try:
+            with self._control_lock:
+                self._control_conn.send(('exit',))
+        except (EOFError, OSError):
+            pass
+        process.join(timeout)
+        if process.is_alive():
+            logger.warning("采集进程未能按时退出，强制结束")
+            process.terminate()
+            process.join(1.0)
+        if self._listener_thread and self._listener_thread.is_alive():
+            self._listener_thread.join(timeout=1.0)
+        self._control_conn.close()
+        self._ring.close(unlink=True)
+        with self._futures_lock:
+            pending = list(self._futures.values())
+            self._futures.clear()
+            self._future_results.clear()
+        for future in pending:
+            if not future.done():
+                future.set_exception(RuntimeError("采集进程已退出"))
+        self._process = None
+        self._ring = None
+        self._methods.clear()
+        logger.info("采集进程已退出")
+
+    def _listen(self, data_conn, ring: SharedAiRing):
+        """数据接收线程：根据采集进程发送的元数据映射共享内存并执行回调"""
+        while True:
+            try:
+                message = data_conn.recv()
+            except (EOFError, OSError):
+                break
+            if message[0] == 'exit':
+                break
+            if message[0] == 'future':
+                _, future_id, ok, value = message
+                with self._futures_lock:
+                    future = self._futures.pop(future_id, None)
+                    if future is None:
+                        self._future_results[future_id] = (ok, value)
+                if future is not None:
+                    self._resolve_future(future, ok, value)
+                continue
+            if message[0] == 'trigger':
+                if self.trigger_callback:
+                    try:
+                        self.trigger_callback()
+                    except Exception as e:
+                        logger.error(f"触发回调异常: {e}")
+                continue
+            if message[0] == 'event':
+                if self.event_callback:
+                    try:
+                        self.event_callback(message[1])
+                    except Exception as e:
+                        logger.error(f"触发事件回调异常: {e}")
+                continue
+            (_, seq, channels, points, start_index, sample_rate, timestamp,
+             remaining_points, is_final, oneshot_progress, total_points, units) = message
+            block = ring.view(seq, AiLayout(channels), points)
+            if not block.is_valid():
+                self.stale_packets += 1
+                self.integrity.drop(points, 'stale')
+                logger.warning(f"共享内存数据块 #{seq} 读取前已被覆盖，丢弃")
+                continue
+            packet = AiPacket(block.data, channels, start_index, sample_rate, timestamp, seq,
+                              remaining_points, block, is_final, oneshot_progress, total_points, units)
+            self.received_packets += 1
+            self.integrity.observe_packet(packet)
+            if self.data_callback:
+                try:
+                    self.data_callback(packet)
+                except Exception as e:
+                    logger.error(f"数据回调异常: {e}")
+        data_conn.close()
+
+    def __del__(self):
+        try:
+            self.shutdown(timeout=1.0)
+        except Exception:
+            pass
+
+
+def create_driver(**kwargs):
+    """
+    创建采集卡驱动
+
+    环境变量 USB5121_ISOLATED 为 1/true/yes 时在独立采集进程中运行驱动，否则在当前进程中运行
+    """
+    if os.environ.get('USB5121_ISOLATED', '').lower() in ('1', 'true', 'yes'):
+        return ProcessUSB5121Driver(**kwargs)
+    return USB5121Driver(**kwargs)
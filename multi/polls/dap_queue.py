@@ -0,0 +1,183 @@
+"""
+采集读取线程与数据处理线程之间的有界单生产者/单消费者队列
+读取线程只负责排空采集卡FIFO并入队，下游处理再慢也不会阻塞DLL读取
+"""
+import time
+import logging
+import threading
+from collections import deque
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class SpscQueue:
+    """
+    有界SPSC队列
+
+    溢出策略：
+        block: 队满时生产者最多等待 block_timeout 秒，仍无空位则丢弃新数据（读取线程不会无限期阻塞）
+        drop_oldest: 丢弃队首最旧的数据
+        coalesce: 将新数据合并到队尾数据中（需提供 merge 函数，不可合并时向前找同一数据流的数据），不丢失样本
+    """
+
+    POLICY_BLOCK = 'block'
+    POLICY_DROP_OLDEST = 'drop_oldest'
+    POLICY_COALESCE = 'coalesce'
+    POLICIES = (POLICY_BLOCK, POLICY_DROP_OLDEST, POLICY_COALESCE)
+
+    # put 返回值
+    QUEUED = 'queued'  # 数据本身进入队列
+    COALESCED = 'coalesced'  # 数据已合并到队尾数据中
+    DROPPED = 'dropped'  # 数据被丢弃
+
+    def __init__(self,
+                 capacity: int,
+                 policy: str = POLICY_DROP_OLDEST,
+                 merge: Optional[Callable[[Any, Any], Any]] = None,
+                 block_timeout: float = 0.05,
+                 on_drop: Optional[Callable[[Any], None]] = None):
+        """
+        初始化队列
+
+        Args:
+            capacity: 最大容量
+            policy: 溢出策略
+            merge: coalesce策略的合并函数 merge(队尾数据, 新数据) -> 合并后的数据
+            block_timeout: block策略下生产者的最长等待时间(秒)
+            on_drop: 数据被丢弃时调用 on_drop(被丢弃的数据)，用于丢失核算（持有队列锁时调用，应尽量轻量）
+        """
+        if capacity < 1:
+            raise ValueError(f"队列容量无效: {capacity}")
+        if policy not in self.POLICIES:
+            raise ValueError(f"未知的溢出策略: {policy}")
+        if policy == self.POLICY_COALESCE and merge is None:
+            raise ValueError("coalesce策略需要提供merge函数")
+        self.capacity = capacity
+        self.policy = policy
+        self.merge = merge
+        self.block_timeout = block_timeout
+        self.on_drop = on_drop
+
+        self._items = deque()
+        self._cond = threading.Condition()
+        self._closed = False
+
+        # 统计
+        self.put_count = 0
+        self.get_count = 0
+        self.dropped_count = 0
+        self.coalesced_count = 0
+        self.blocked_count = 0
+        self.blocked_seconds = 0.0
+        self.high_watermark = 0
+
+    def __len__(self):
+        return len(self._items)
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def put(self, item: Any) -> str:
+        """
+        生产者入队
+
+        Returns:
+            str: QUEUED / COALESCED / DROPPED；非QUEUED时队列不再引用item
+        """
+        with self._cond:
+            if self._closed:
+                return self.DROPPED
+            self.put_count += 1
+
+            if len(self._items) >= self.capacity:
+                if self.policy == self.POLICY_DROP_OLDEST:
+                    self._dropped(self._items.popleft())
+                elif self.policy == self.POLICY_COALESCE:
+                    # 从队尾向前找可合并的数据（多个数据流交错入队时合并到同一数据流的最后一项）
+                    error = None
+                    for i in range(len(self._items) - 1, -1, -1):
+                        try:
+                            self._items[i] = self.merge(self._items[i], item)
+                        except Exception as e:
+                            error = error or e
+                            continue
+                        self.coalesced_count += 1
+                        self._cond.notify()
+                        return self.COALESCED
+                    logger.error(f"队列数据合并异常: {error}")
+                    self._dropped(item)
+                    return self.DROPPED
+                else:
+                    self.blocked_count += 1
+                    start = time.perf_counter()
+                    deadline = start + self.block_timeout
+                    while len(self._items) >= self.capacity and not self._closed:
+                        remaining = deadline - time.perf_counter()
+                        if remaining <= 0:
+                            break
+                        self._cond.wait(remaining)
+                    self.blocked_seconds += time.perf_counter() - start
+                    if len(self._items) >= self.capacity or self._closed:
+                        self._dropped(item)
+                        return self.DROPPED
+
+            self._items.append(item)
+            if len(self._items) > self.high_watermark:
+                self.high_watermark = len(self._items)
+            self._cond.notify()
+            return self.QUEUED
+
+    def _dropped(self, item: Any):
+        self.dropped_count += 1
+        if self.on_drop is not None:
+            try:
+                self.on_drop(item)
+            except Exception as e:
+                logger.error(f"队列丢弃回调异常: {e}")
+
+    def get(self, timeout: Optional[float] = None) -> Any:
+        """
+        消费者出队
+
+        Args:
+            timeout: 等待超时(秒)，None表示一直等待
+
+        Returns:
+            队首数据；超时或队列已关闭且为空时返回None
+        """
+        with self._cond:
+            if not self._items and not self._closed:
+                self._cond.wait_for(lambda: self._items or self._closed, timeout)
+            if not self._items:
+                return None
+            item = self._items.popleft()
+            self.get_count += 1
+            self._cond.notify()
+            return item
+
+    def close(self):
+        """关闭队列：不再接受新数据，消费者取完剩余数据后 get 返回None"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def drained(self) -> bool:
+        """队列已关闭且数据已全部取出"""
+        return self._closed and not self._items
+
+    def metrics(self) -> Dict:
+        """队列统计"""
+        return {
+            'policy': self.policy,
+            'capacity': self.capacity,
+            'depth': len(self._items),
+            'high_watermark': self.high_watermark,
+            'put_count': self.put_count,
+            'get_count': self.get_count,
+            'dropped_count': self.dropped_count,
+            'coalesced_count': self.coalesced_count,
+            'blocked_count': self.blocked_count,
+            'blocked_ms': self.blocked_seconds * 1000,
+        }
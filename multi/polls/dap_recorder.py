@@ -0,0 +1,548 @@
+"""
+AI数据直接落盘记录
+读取线程把每个数据块原样追加写入本地二进制文件（按通道分块的float32），
+后台线程定期fsync并维护块索引；WebSocket只接收抽取后的预览数据，长时间多通道记录内存占用恒定
+
+记录由三类文件组成（base 为记录路径去掉扩展名）：
+    base.json       元数据：通道、单位、采样率、数据类型、分段列表、总点数、数据缺口
+    base.idx        块索引：每个数据块一条 INDEX_RECORD
+    base.NNNN.dat   数据分段：各块依次为 (通道数, 点数) 的float32数组（通道为行，C顺序）
+索引记录总是在对应数据写入之后追加，异常中断时以索引为准，末尾未写完的数据被忽略。
+记录内样本连续存放，采集中的缺口（FIFO溢出等）体现为相邻块的采集内样本序号不连续，
+并在元数据的 integrity 中列出；读取时可由索引重新核对。
+"""
+import os
+import json
+import time
+import struct
+import logging
+import threading
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from .dap_packet import AiPacket
+from .dap_integrity import StreamGap, StreamIntegrity, index_gaps
+
+logger = logging.getLogger(__name__)
+
+RECORDING_FORMAT = 'usb5000-ai-recording/1'
+
+# 块索引记录：分段号, 每通道点数, 段内偏移(字节), 记录内起始样本序号, 采集内起始样本序号, 数据块序号, 时间戳
+INDEX_RECORD = struct.Struct('<IIQQqQd')
+
+
+def recording_base(path: str) -> str:
+    """记录路径去掉扩展名（.json/.idx/.dat）"""
+    base, ext = os.path.splitext(path)
+    return base if ext in ('.json', '.idx', '.dat') else path
+
+
+def preview_step(sample_rate: int, preview_rate_hz: Optional[float]) -> int:
+    """
+    预览抽取步长：不超过 sample_rate/preview_rate_hz 且能整除采样率的最大整数，
+    保证预览数据包的采样率仍为整数
+    """
+    if not preview_rate_hz or sample_rate <= 0 or preview_rate_hz >= sample_rate:
+        return 1
+    step = max(1, int(sample_rate // preview_rate_hz))
+    while sample_rate % step:
+        step -= 1
+    return step
+
+
+def preview_packet(packet: AiPacket, preview_rate_hz: Optional[float]) -> AiPacket:
+    """
+    按 preview_rate_hz 等间隔抽取的预览数据包（跨步视图，不拷贝）
+
+    抽取相位按采集内样本序号对齐，相邻数据包的预览样本间隔保持一致；
+    预览包的 start_index / sample_rate 以抽取后的样本计。
+    """
+    step = preview_step(packet.sample_rate, preview_rate_hz)
+    if step == 1:
+        return packet
+    phase = -packet.start_index % step
+    return AiPacket(packet.data[:, phase::step], packet.channels, (packet.start_index + phase) // step,
+                    packet.sample_rate // step, packet.timestamp, packet.seq, packet.remaining_points,
+                    packet.block, packet.is_final, packet.oneshot_progress, packet.total_points, packet.units)
+
+
+class AiRecorder:
+    """
+    AI数据记录器
+
+    write() 由驱动读取线程调用：数据块与其索引记录直接写入带缓冲的文件，
+    后台线程每 fsync_interval_s 秒将数据与索引刷写到磁盘。
+    单个分段超过 segment_bytes 时切换到新分段。
+    """
+
+    def __init__(self, path: str, metadata: Optional[Dict[str, Any]] = None,
+                 segment_bytes: int = 1024 * 1024 * 1024,
+                 fsync_interval_s: float = 1.0,
+                 buffer_bytes: int = 1024 * 1024):
+        """
+        Args:
+            path: 记录路径（目录不存在时自动创建）
+            metadata: 附加到元数据文件的用户信息（任务名称、通道配置等）
+            segment_bytes: 单个数据分段文件的大小上限
+            fsync_interval_s: 定期刷写到磁盘的间隔
+            buffer_bytes: 数据文件的写缓冲区大小
+        """
+        self.base = recording_base(os.path.abspath(path))
+        self.metadata = dict(metadata or {})
+        self.segment_bytes = segment_bytes
+        self.fsync_interval_s = fsync_interval_s
+        self.buffer_bytes = buffer_bytes
+
+        # 记录参数：首个数据块写入时确定
+        self.channels: Optional[Tuple] = None
+        self.units: Optional[Tuple[str, ...]] = None
+        self.sample_rate = 0
+
+        self._lock = threading.Lock()  # 保护文件对象与待写索引
+        self._sync_lock = threading.Lock()  # fsync 与分段切换互斥
+        self._data_file = None
+        self._index_file = None
+        self._segment = -1
+        self._segment_bytes_written = 0
+        self._segments: List[str] = []
+        self._sync_thread = None
+        self._stop_event = threading.Event()
+
+        self.is_open = False
+        self.error: Optional[str] = None
+        self.started_at: Optional[float] = None
+        self.points = 0  # 已记录的每通道点数
+        self.bytes_written = 0
+        self.blocks = 0
+        self.rejected_blocks = 0
+        self.fsyncs = 0
+        self.max_write_ms = 0.0
+        self.max_fsync_ms = 0.0
+        self.integrity = StreamIntegrity('落盘记录')
+
+    @property
+    def metadata_path(self) -> str:
+        return self.base + '.json'
+
+    @property
+    def index_path(self) -> str:
+        return self.base + '.idx'
+
+    def segment_path(self, segment: int) -> str:
+        return f"{self.base}.{segment:04d}.dat"
+
+    def open(self) -> bool:
+        """创建索引文件并启动定期刷写线程（数据分段在首个数据块写入时创建）"""
+        try:
+            os.makedirs(os.path.dirname(self.base) or '.', exist_ok=True)
+            self._index_file = open(self.index_path, 'wb')
+            self.started_at = time.time()
+            self.is_open = True
+            self._write_metadata(closed=False)
+            self._stop_event.clear()
+            self._sync_thread = threading.Thread(target=self._sync_loop, daemon=True)
+            self._sync_thread.start()
+            logger.info(f"开始记录AI数据: {self.base}")
+            return True
+        except Exception as e:
+            logger.error(f"创建记录文件异常: {e}")
+            self.error = str(e)
+            self.is_open = False
+            return False
+
+    def write(self, packet: AiPacket) -> bool:
+        """
+        追加一个数据包（读取线程调用）
+
+        Returns:
+            bool: 是否已写入；通道/采样率与记录不一致或文件出错时返回 False
+        """
+        if not self.is_open or packet.points_per_channel == 0:
+            return False
+        start = time.perf_counter()
+        try:
+            with self._lock:
+                if self.channels is None:
+                    self._begin(packet)
+                elif (packet.channels != self.channels or packet.sample_rate != self.sample_rate
+                      or packet.units != self.units):
+                    self.rejected_blocks += 1
+                    self.integrity.drop(packet.points_per_channel, 'rejected')
+                    if self.rejected_blocks == 1:
+                        logger.error(f"数据包与记录参数不一致，未记录: {packet!r}")
+                    return False
+
+                data = np.ascontiguousarray(packet.data, dtype=np.float32)
+                if self._segment_bytes_written + data.nbytes > self.segment_bytes and self._segment_bytes_written:
+                    self._next_segment()
+                offset = self._segment_bytes_written
+                self._data_file.write(data)
+                self._index_file.write(INDEX_RECORD.pack(self._segment, packet.points_per_channel, offset,
+                                                         self.points, packet.start_index, packet.seq,
+                                                         packet.timestamp))
+                self._segment_bytes_written += data.nbytes
+                self.bytes_written += data.nbytes
+                self.points += packet.points_per_channel
+                self.blocks += 1
+                self.integrity.observe_packet(packet)
+        except Exception as e:
+            self._fail(f"写入记录数据异常: {e}")
+            return False
+        self.max_write_ms = max(self.max_write_ms, (time.perf_counter() - start) * 1000)
+        return True
+
+    def mark_gap(self, gap: StreamGap, sample_rate: Optional[int] = None):
+        """
+        记录驱动测得的数据缺口（如FIFO溢出），下一个数据块从缺口之后开始
+
+        Args:
+            sample_rate: 缺口样本序号所用的采样率，与记录的采样率不同时忽略（多速率采集的降速组）
+        """
+        if self.is_open and (sample_rate is None or not self.sample_rate or sample_rate == self.sample_rate):
+            self.integrity.record_gap(gap.start_index, gap.points, gap.reason, gap.seq, gap.timestamp)
+
+    def close(self) -> Dict:
+        """刷写到磁盘并关闭文件"""
+        if self._sync_thread is not None:
+            self._stop_event.set()
+            self._sync_thread.join(timeout=5.0)
+            self._sync_thread = None
+        with self._lock, self._sync_lock:
+            if self._index_file is None:
+                return self.metrics()
+            self.is_open = False
+            try:
+                for f in (self._data_file, self._index_file):
+                    if f is not None:
+                        f.flush()
+                        os.fsync(f.fileno())
+            except Exception as e:
+                logger.error(f"关闭记录文件异常: {e}")
+                self.error = self.error or str(e)
+            finally:
+                for f in (self._data_file, self._index_file):
+                    if f is not None:
+                        f.close()
+                self._data_file = self._index_file = None
+            self._write_metadata(closed=True)
+            logger.info(f"AI数据记录结束: {self.points}点/通道, {self.bytes_written / 1e6:.1f}MB, "
+                        f"{len(self._segments)}个分段")
+        return self.metrics()
+
+    def metrics(self) -> Dict:
+        """记录状态与统计"""
+        return {
+            'path': self.metadata_path,
+            'is_recording': self.is_open,
+            'error': self.error,
+            'channels': list(self.channels) if self.channels else [],
+            'sample_rate': self.sample_rate,
+            'points_per_channel': self.points,
+            'duration_s': self.points / self.sample_rate if self.sample_rate else 0.0,
+            'bytes_written': self.bytes_written,
+            'segments': len(self._segments),
+            'blocks': self.blocks,
+            'rejected_blocks': self.rejected_blocks,
+            'fsyncs': self.fsyncs,
+            'max_write_ms': self.max_write_ms,
+            'max_fsync_ms': self.max_fsync_ms,
+            'integrity': self.integrity.metrics(include_gaps=False),
+        }
+
+    def _begin(self, packet: AiPacket):
+        """由首个数据包确定记录参数并创建第一个数据分段"""
+        self.channels = packet.channels
+        self.units = packet.units
+        self.sample_rate = packet.sample_rate
+        self._next_segment()
+        self._write_metadata(closed=False)
+
+    def _next_segment(self):
+        """切换到新的数据分段（调用方持有 _lock）"""
+        with self._sync_lock:
+            if self._data_file is not None:
+                self._data_file.flush()
+                os.fsync(self._data_file.fileno())
+                self._data_file.close()
+            self._segment += 1
+            path = self.segment_path(self._segment)
+            self._data_file = open(path, 'wb', buffering=self.buffer_bytes)
+        self._segments.append(os.path.basename(path))
+        self._segment_bytes_written = 0
+
+    def _sync_loop(self):
+        """定期刷写线程：将缓冲区写入文件后fsync数据与索引（fsync期间不阻塞读取线程）"""
+        while not self._stop_event.wait(self.fsync_interval_s):
+            with self._lock:
+                if not self.is_open:
+                    break
+                try:
+                    files = [f for f in (self._data_file, self._index_file) if f is not None]
+                    for f in files:
+                        f.flush()
+                except Exception as e:
+                    self._fail(f"刷写记录文件异常: {e}")
+                    break
+            # 锁顺序与分段切换一致（_lock → _sync_lock），分段切换时由读取线程自行同步旧分段
+            with self._sync_lock:
+                start = time.perf_counter()
+                try:
+                    # 数据先于索引落盘：已落盘的索引记录总是指向已落盘的数据
+                    for f in files:
+                        if not f.closed:
+                            os.fsync(f.fileno())
+                except Exception as e:
+                    self._fail(f"同步记录文件异常: {e}")
+                    break
+                self.fsyncs += 1
+                self.max_fsync_ms = max(self.max_fsync_ms, (time.perf_counter() - start) * 1000)
+
+    def _write_metadata(self, closed: bool):
+        """原子更新元数据文件"""
+        metadata = {
+            'format': RECORDING_FORMAT,
+            'channels': list(self.channels) if self.channels else [],
+            'units': list(self.units) if self.units else None,
+            'sample_rate': self.sample_rate,
+            'dtype': 'float32',
+            'layout': 'channel_major',
+            'index_record': INDEX_RECORD.format,
+            'segments': list(self._segments),
+            'started_at': self.started_at,
+            'closed': closed,
+            'points_per_channel': self.points,
+            'bytes_written': self.bytes_written,
+            'integrity': self.integrity.metrics(),
+            'metadata': self.metadata,
+        }
+        try:
+            tmp_path = self.metadata_path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(metadata, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.metadata_path)
+        except Exception as e:
+            logger.error(f"写入记录元数据异常: {e}")
+
+    def _fail(self, message: str):
+        """记录出错：停止继续写入，采集本身不受影响"""
+        if self.error is None:
+            logger.error(message)
+            self.error = message
+        self.is_open = False
+
+
+class MultiRateRecorder:
+    """
+    多速率采集的记录器：每个输出采样率一个 AiRecorder
+
+    首个数据包的采样率组（最高速率组）记录在 path，其余速率组在首次出现时创建 path_<采样率>Hz 记录；
+    接口与 AiRecorder 相同，metrics() 为首个速率组的统计，另在 groups 中列出其余速率组的统计。
+    """
+
+    def __init__(self, path: str, metadata: Optional[Dict[str, Any]] = None, **options):
+        """
+        Args:
+            path: 最高速率组的记录路径
+            metadata: 附加到各记录元数据的用户信息
+            **options: AiRecorder 参数
+        """
+        self.base = recording_base(os.path.abspath(path))
+        self.metadata = dict(metadata or {})
+        self.options = options
+        self.primary = AiRecorder(self.base, self.metadata, **options)
+        self.groups: Dict[int, AiRecorder] = {}  # 采样率 -> 其余速率组的记录器
+
+    @property
+    def is_open(self) -> bool:
+        return self.primary.is_open
+
+    @property
+    def error(self) -> Optional[str]:
+        return next((r.error for r in self._recorders() if r.error), None)
+
+    @property
+    def integrity(self) -> StreamIntegrity:
+        return self.primary.integrity
+
+    def _recorders(self) -> List[AiRecorder]:
+        return [self.primary] + list(self.groups.values())
+
+    def open(self) -> bool:
+        return self.primary.open()
+
+    def write(self, packet: AiPacket) -> bool:
+        primary = self.primary
+        if primary.channels is None or packet.sample_rate == primary.sample_rate:
+            return primary.write(packet)
+        recorder = self.groups.get(packet.sample_rate)
+        if recorder is None:
+            if not primary.is_open:
+                return False
+            metadata = dict(self.metadata, rate_group={'primary': primary.metadata_path,
+                                                       'sample_rate': packet.sample_rate})
+            recorder = AiRecorder(f"{self.base}_{packet.sample_rate}Hz", metadata, **self.options)
+            recorder.open()
+            self.groups[packet.sample_rate] = recorder
+        return recorder.write(packet)
+
+    def mark_gap(self, gap: StreamGap, sample_rate: Optional[int] = None):
+        """
+        记录驱动测得的数据缺口（样本序号以采集采样率计）
+
+        只计入采样率相同的速率组；降速组的抽取器在缺口处重新对齐，其缺口由样本序号核对得出
+        """
+        for recorder in self._recorders():
+            recorder.mark_gap(gap, sample_rate)
+
+    def close(self) -> Dict:
+        for recorder in self._recorders():
+            recorder.close()
+        return self.metrics()
+
+    def metrics(self) -> Dict:
+        metrics = self.primary.metrics()
+        metrics['groups'] = [r.metrics() for r in self.groups.values()]
+        return metrics
+
+
+class AiRecording:
+    """
+    读取 AiRecorder 生成的记录
+
+    数据分段以内存映射方式打开，按记录内样本序号随机读取，或按块顺序遍历
+    """
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path: 记录路径（元数据、索引或数据分段文件均可）
+        """
+        self.base = recording_base(os.path.abspath(path))
+        with open(self.base + '.json', encoding='utf-8') as f:
+            self.info: Dict[str, Any] = json.load(f)
+        if self.info.get('format') != RECORDING_FORMAT:
+            raise ValueError(f"不支持的记录格式: {self.info.get('format')}")
+        self.channels: Tuple = tuple(self.info['channels'])
+        self.units = tuple(self.info['units']) if self.info.get('units') else None
+        self.sample_rate = int(self.info['sample_rate'])
+        self._segments: Dict[int, np.memmap] = {}
+
+        raw = np.fromfile(self.base + '.idx', dtype=np.uint8)
+        count = raw.size // INDEX_RECORD.size
+        self.index = np.frombuffer(raw[:count * INDEX_RECORD.size].tobytes(), dtype=np.dtype([
+            ('segment', '<u4'), ('points', '<u4'), ('offset', '<u8'), ('record_index', '<u8'),
+            ('start_index', '<i8'), ('seq', '<u8'), ('timestamp', '<f8'),
+        ]))
+        self.index = self.index[self._complete_blocks()]
+
+    @property
+    def num_channels(self) -> int:
+        return len(self.channels)
+
+    @property
+    def points_per_channel(self) -> int:
+        if not len(self.index):
+            return 0
+        last = self.index[-1]
+        return int(last['record_index'] + last['points'])
+
+    @property
+    def duration_s(self) -> float:
+        return self.points_per_channel / self.sample_rate if self.sample_rate else 0.0
+
+    def _complete_blocks(self) -> np.ndarray:
+        """剔除数据未完整写入分段文件的索引记录（异常中断的记录）"""
+        if not len(self.index):
+            return np.zeros(0, dtype=bool)
+        sizes = []
+        for segment in range(int(self.index['segment'].max()) + 1):
+            path = self.segment_path(segment)
+            sizes.append(os.path.getsize(path) if os.path.exists(path) else 0)
+        block_bytes = self.index['points'].astype(np.uint64) * np.uint64(self.num_channels * 4)
+        return self.index['offset'] + block_bytes <= np.array(sizes, dtype=np.uint64)[self.index['segment']]
+
+    def segment_path(self, segment: int) -> str:
+        return f"{self.base}.{segment:04d}.dat"
+
+    def _segment(self, segment: int) -> np.memmap:
+        mm = self._segments.get(segment)
+        if mm is None:
+            mm = self._segments[segment] = np.memmap(self.segment_path(segment), dtype=np.float32, mode='r')
+        return mm
+
+    def block(self, i: int) -> np.ndarray:
+        """第i个数据块的 (通道数, 点数) 只读视图"""
+        entry = self.index[i]
+        start = int(entry['offset']) // 4
+        points = int(entry['points'])
+        return self._segment(int(entry['segment']))[start:start + points * self.num_channels].reshape(
+            self.num_channels, points)
+
+    def iter_blocks(self) -> Iterator[Tuple[int, np.ndarray]]:
+        """按顺序遍历各数据块 (记录内起始样本序号, 数据视图)"""
+        for i in range(len(self.index)):
+            yield int(self.index[i]['record_index']), self.block(i)
+
+    def read(self, start: int = 0, points: Optional[int] = None) -> np.ndarray:
+        """
+        读取记录内 [start, start+points) 的数据
+
+        Returns:
+            np.ndarray: (通道数, 点数) float32 数组（拷贝）
+        """
+        total = self.points_per_channel
+        end = total if points is None else min(total, start + points)
+        out = np.empty((self.num_channels, max(0, end - start)), dtype=np.float32)
+        if end <= start:
+            return out
+        first = max(0, int(np.searchsorted(self.index['record_index'], start, side='right')) - 1)
+        for i in range(first, len(self.index)):
+            block_start = int(self.index[i]['record_index'])
+            if block_start >= end:
+                break
+            data = self.block(i)
+            lo = max(start, block_start)
+            hi = min(end, block_start + data.shape[1])
+            out[:, lo - start:hi - start] = data[:, lo - block_start:hi - block_start]
+        return out
+
+    def export_csv(self, csv_path: str, channel_order: Optional[List] = None,
+                   time_header: str = 'Time(s)') -> int:
+        """
+        按块流式导出为CSV（内存占用与记录长度无关）
+
+        Args:
+            csv_path: 输出文件
+            channel_order: 输出列的通道顺序，记录中没有的通道填充NaN；None时为记录中的全部通道
+            time_header: 时间列列名
+
+        Returns:
+            int: 导出的行数
+        """
+        channel_order = list(self.channels) if channel_order is None else list(channel_order)
+        rows = [self.channels.index(ch) if ch in self.channels else None for ch in channel_order]
+        time_step = 1.0 / self.sample_rate if self.sample_rate else 0.0
+        with open(csv_path, 'w', encoding='utf-8', newline='') as f:
+            f.write(','.join([time_header] + [f'CH{ch}' for ch in channel_order]) + '\n')
+            for start, data in self.iter_blocks():
+                table = np.full((data.shape[1], len(rows) + 1), np.nan)
+                table[:, 0] = np.arange(start, start + data.shape[1]) * time_step
+                for col, row in enumerate(rows, start=1):
+                    if row is not None:
+                        table[:, col] = data[row]
+                np.savetxt(f, table, delimiter=',', fmt='%.9g')
+        return self.points_per_channel
+
+    def gaps(self) -> List[StreamGap]:
+        """由块索引核对出的数据缺口（不依赖元数据，异常中断的记录同样适用）"""
+        return index_gaps(self.index['start_index'], self.index['points'], self.index['seq'],
+                          self.index['timestamp'])
+
+    def is_lossless(self) -> bool:
+        """记录是否完整：索引中没有缺口，且记录过程中没有因参数不一致而拒绝的数据块"""
+        integrity = self.info.get('integrity') or {}
+        return not self.gaps() and not integrity.get('dropped_packets', 0)
+
+    def close(self):
+        self._segments.clear()
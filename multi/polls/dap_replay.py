@@ -0,0 +1,379 @@
+"""
+历史数据回放后端
+把已保存的监控任务（MonitorTask 的CSV或落盘记录）作为采集卡数据源，以1×、N×或尽可能快的速度
+送入 USB5121Driver 的完整采集链路（读取调度、环形缓冲、标定、事件检测、记录、WebSocket推送），
+用现场数据在没有采集卡的机器上复现生产负载并做基准测试
+"""
+import os
+import json
+import time
+import logging
+import threading
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from .dap_layout import AiLayout
+from .dap_metrics import LatencyStats
+from .dap_recorder import AiRecording
+from .dap_simulator import (
+    SimulatedUSB5000, _SimDevice, _value, DEFAULT_AI_FIFO_POINTS, SIM_OK, SIM_ERR_NOT_OPENED, SIM_ERR_TIMEOUT,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class ReplaySource:
+    """
+    回放数据源：按物理通道号组织的一段等间隔采样数据
+
+    数据可以是内存中的 (通道数, 点数) 数组（由CSV加载），也可以是以内存映射方式读取的落盘记录。
+    """
+
+    def __init__(self, channels: List[int], sample_rate: float, data: Optional[np.ndarray] = None,
+                 recording: Optional[AiRecording] = None, description: str = ''):
+        """
+        Args:
+            channels: 数据中各行对应的物理通道号
+            sample_rate: 每通道采样率(Hz)
+            data: (通道数, 点数) float32 数组，与 recording 二选一
+            recording: 落盘记录
+            description: 数据来源说明
+        """
+        if (data is None) == (recording is None):
+            raise ValueError("data 与 recording 必须且只能提供一个")
+        self.channels = [int(ch) for ch in channels]
+        self.sample_rate = float(sample_rate)
+        self.data = data
+        self.recording = recording
+        self.description = description
+        self.total_points = data.shape[1] if data is not None else recording.points_per_channel
+        self._rows = {ch: i for i, ch in enumerate(self.channels)}
+
+    @property
+    def duration_s(self) -> float:
+        return self.total_points / self.sample_rate if self.sample_rate else 0.0
+
+    def row(self, channel: int) -> Optional[int]:
+        """物理通道在数据中的行号，数据中没有该通道时为None"""
+        return self._rows.get(channel)
+
+    def read(self, start: int, points: int) -> np.ndarray:
+        """读取 [start, start+points) 的全部通道数据，(通道数, 点数)，调用方保证不越界"""
+        if self.data is not None:
+            return self.data[:, start:start + points]
+        return self.recording.read(start, points)
+
+    @classmethod
+    def from_csv(cls, path: str, sample_rate: Optional[float] = None) -> 'ReplaySource':
+        """
+        加载监控数据CSV（Time(s) 列 + CHn 列）
+
+        Args:
+            path: CSV文件
+            sample_rate: 采样率，None时由时间列的采样间隔推算
+        """
+        with open(path, encoding='utf-8') as f:
+            header = [name.strip() for name in f.readline().strip().split(',')]
+        columns = [i for i, name in enumerate(header) if name.upper().startswith('CH') and name[2:].isdigit()]
+        if not columns:
+            raise ValueError(f"CSV中没有CHn数据列: {path}")
+        # 保存时缺失的值为空字段，按NaN读取
+        table = np.genfromtxt(path, delimiter=',', skip_header=1, dtype=np.float64, ndmin=2)
+        if sample_rate is None:
+            if 'Time(s)' not in header or len(table) < 2:
+                raise ValueError(f"无法由时间列推算采样率，请指定采样率: {path}")
+            step = float(np.median(np.diff(table[:, header.index('Time(s)')])))
+            if step <= 0:
+                raise ValueError(f"时间列采样间隔无效({step}): {path}")
+            sample_rate = round(1.0 / step, 6)
+        data = np.ascontiguousarray(table[:, columns].T, dtype=np.float32)
+        nan_count = int(np.count_nonzero(np.isnan(data)))
+        if nan_count:
+            # 保存时用NaN填充的缺失通道/缺失点按0回放，避免NaN污染统计与推理
+            logger.warning(f"回放数据中有{nan_count}个NaN点，按0回放: {path}")
+            np.nan_to_num(data, copy=False)
+        channels = [int(header[i][2:]) for i in columns]
+        logger.info(f"加载回放CSV: {path}, 通道={channels}, {data.shape[1]}点/通道, 采样率={sample_rate}Hz")
+        return cls(channels, sample_rate, data=data, description=path)
+
+    @classmethod
+    def from_recording(cls, path: str) -> 'ReplaySource':
+        """打开 AiRecorder 生成的落盘记录（内存映射，不整体加载）"""
+        recording = AiRecording(path)
+        logger.info(f"打开回放记录: {recording.base}, 通道={list(recording.channels)}, "
+                    f"{recording.points_per_channel}点/通道, 采样率={recording.sample_rate}Hz")
+        return cls(list(recording.channels), recording.sample_rate, recording=recording,
+                   description=recording.base)
+
+    @classmethod
+    def from_task(cls, task: Any) -> 'ReplaySource':
+        """
+        由监控任务创建数据源
+
+        保存时由落盘记录导出的任务优先回放原始记录（float32，无需解析CSV），否则加载任务的CSV文件，
+        采样率取任务配置。
+        """
+        integrity_path = os.path.splitext(task.csv_file_path)[0] + '.integrity.json'
+        if os.path.exists(integrity_path):
+            try:
+                with open(integrity_path, encoding='utf-8') as f:
+                    name = (json.load(f).get('recording') or {}).get('recording_name')
+                if name:
+                    from .consumers_monitor import monitor_recording_dir
+                    record_path = os.path.join(monitor_recording_dir(), name)
+                    if os.path.exists(record_path + '.json'):
+                        return cls.from_recording(record_path)
+            except Exception as e:
+                logger.warning(f"读取任务落盘记录失败，改用CSV回放: {e}")
+        return cls.from_csv(task.csv_file_path, task.sample_rate or None)
+
+    @classmethod
+    def open(cls, spec: str, sample_rate: Optional[float] = None) -> 'ReplaySource':
+        """
+        按说明打开数据源：CSV文件、落盘记录（.json/.idx/.dat 或去掉扩展名的路径），或监控任务ID
+        """
+        if spec.lower().endswith('.csv'):
+            return cls.from_csv(spec, sample_rate)
+        if os.path.splitext(spec)[1] in ('.json', '.idx', '.dat') or os.path.exists(spec + '.json'):
+            return cls.from_recording(spec)
+
+        # 监控任务ID：独立采集进程中Django尚未初始化
+        import django
+        from django.apps import apps
+        if not apps.ready:
+            django.setup()
+        from .models import MonitorTask
+        task = MonitorTask.objects.filter(task_id=spec, is_deleted=False).first()
+        if task is None:
+            raise ValueError(f"回放数据源不存在: {spec}")
+        logger.info(f"回放监控任务: {task.task_name} ({task.task_id})")
+        return cls.from_task(task)
+
+
+class _ReplayDevice(_SimDevice):
+    """回放采集卡：样本节拍为配置采样率×回放倍速，数据取自回放数据源"""
+
+    def __init__(self, fifo_points: int, speed: float, total_points: int, loop: bool):
+        super().__init__(fifo_points)
+        self.speed = speed
+        self.total_points = total_points
+        self.loop = loop
+        self.replay_base = 0  # 本次触发的第一个样本在数据源中的位置
+        self.replay_next = 0  # 下一个未回放样本在数据源中的位置（单次采集的下一发从这里继续）
+        self.finished = False
+        self.started_at: Optional[float] = None
+        self.replayed_points = 0  # 已回放的每通道点数
+
+    @property
+    def ai_rate_hz(self) -> float:
+        """回放节拍（配置采样率×倍速）"""
+        rate = 1e9 / self.ai_period_ns
+        return rate * self.speed if self.speed > 0 else rate
+
+    def produced(self, now: float) -> int:
+        if self.ai_trigger_time is None:
+            return 0
+        if self.speed > 0:
+            count = int((now - self.ai_trigger_time) * self.ai_rate_hz)
+        else:
+            # 尽可能快：FIFO始终接近写满（不触发溢出判定），每次读取都立即返回最大读取量
+            count = self.ai_read_index + self.fifo_points // max(1, len(self.enabled_channels())) - 1
+        if self.ai_sample_mode == 1:
+            count = min(count, self.ai_oneshot_points)
+        if not self.loop:
+            count = min(count, self.total_points - self.replay_base)
+        return max(0, count)
+
+
+class ReplayUSB5000(SimulatedUSB5000):
+    """
+    以回放数据源代替模拟波形的 USB5000.dll 实现
+
+    连续采集每次触发从数据源开头回放；单次采集（含连发单次采集）的每一发从上一发结束处继续。
+    数据源中没有的已启用通道输出0。不循环回放时，数据源剩余数据不足一次读取即视为回放结束，
+    之后的读取超时返回-7（末尾不足一次读取的数据不回放）。
+    """
+
+    def __init__(self, source: ReplaySource, speed: float = 1.0, loop: bool = False,
+                 num_devices: int = 1, fifo_points: int = DEFAULT_AI_FIFO_POINTS,
+                 fifo_order: str = AiLayout.CHANNEL_MAJOR):
+        """
+        Args:
+            source: 回放数据源
+            speed: 回放倍速，1为实时，<=0为尽可能快
+            loop: 数据源回放完后是否从头循环
+            num_devices: 采集卡数量（各卡回放同一数据源）
+            fifo_points: AI FIFO容量（数据点）
+            fifo_order: USB5GetAi 输出的样本排列方式
+        """
+        super().__init__(num_devices=num_devices, fifo_points=fifo_points, fifo_order=fifo_order)
+        self.source = source
+        self.speed = max(0.0, float(speed))
+        self.loop = loop
+        self.devices = [_ReplayDevice(fifo_points, self.speed, source.total_points, loop)
+                        for _ in range(num_devices)]
+        self.ready_latency = [LatencyStats('fifo') for _ in range(num_devices)]
+        self.finished_event = threading.Event()
+        self._warned_channels = set()
+        self._warned_rate = False
+
+    # ------------------------------------------------------------------
+    # 回放专用接口
+
+    def wait_finished(self, timeout: Optional[float] = None) -> bool:
+        """等待任一采集卡回放结束（不循环回放时）"""
+        return self.finished_event.wait(timeout)
+
+    def get_replay_stats(self, dev_index: int = 0) -> Dict:
+        """
+        回放统计
+
+        Returns:
+            Dict: 数据源、倍速、进度，实际达到的每通道采样率与倍速（按首次触发以来的墙钟时间计），
+                  数据就绪到被读走的延迟（fifo_latency，尽可能快模式下无意义、不统计）
+        """
+        dev = self._device(dev_index)
+        if dev is None:
+            return {}
+        with dev.lock:
+            elapsed = time.perf_counter() - dev.started_at if dev.started_at is not None else 0.0
+            achieved = dev.replayed_points / elapsed if elapsed > 0 else 0.0
+            return {
+                'source': self.source.description,
+                'source_channels': self.source.channels,
+                'source_sample_rate': self.source.sample_rate,
+                'source_points': self.source.total_points,
+                'speed': self.speed if self.speed > 0 else 'max',
+                'loop': self.loop,
+                'position': dev.replay_next,
+                'progress': dev.replay_next / self.source.total_points if self.source.total_points else 0.0,
+                'finished': dev.finished,
+                'elapsed_s': elapsed,
+                'replayed_points': dev.replayed_points,
+                'achieved_samples_per_s': achieved,
+                'achieved_total_samples_per_s': achieved * len(dev.enabled_channels()),
+                'achieved_speed': achieved / self.source.sample_rate if self.source.sample_rate else 0.0,
+                'fifo_latency': self.ready_latency[_value(dev_index)].metrics(),
+            }
+
+    # ------------------------------------------------------------------
+
+    def _generate(self, dev: _ReplayDevice, channels: List[int], start: int, points: int, out: np.ndarray):
+        """把数据源中 [replay_base+start, +points) 的样本按 fifo_order 写入out"""
+        rows = AiLayout(channels, self.fifo_order).view(out, points)
+        source_rows = [self.source.row(ch) for ch in channels]
+        missing = [ch for ch, row in zip(channels, source_rows) if row is None and ch not in self._warned_channels]
+        if missing:
+            self._warned_channels.update(missing)
+            logger.warning(f"回放数据源中没有通道{missing}，这些通道输出0")
+
+        total = self.source.total_points
+        position = (dev.replay_base + start) % total
+        done = 0
+        while done < points:
+            n = min(points - done, total - position)
+            block = self.source.read(position, n)
+            for i, (ch, row) in enumerate(zip(channels, source_rows)):
+                if row is None:
+                    rows[i, done:done + n] = 0.0
+                else:
+                    np.clip(block[row], -dev.ai_range[ch], dev.ai_range[ch], out=rows[i, done:done + n])
+            done += n
+            position = 0
+        dev.replay_next = dev.replay_base + start + points
+        if self.loop:
+            dev.replay_next %= total
+        dev.replayed_points += points
+
+    def USB5OpenDevice(self, dev_index) -> int:
+        result = super().USB5OpenDevice(dev_index)
+        if result == SIM_OK:
+            dev = self._device(dev_index)
+            with dev.lock:
+                dev.replay_base = dev.replay_next = 0
+                dev.replayed_points = 0
+                dev.started_at = None
+                dev.finished = False
+            self.ready_latency[_value(dev_index)].reset()
+            self.finished_event.clear()
+        return result
+
+    def SetUSB5AiSoftTrig(self, dev_index) -> int:
+        def setter(dev: _ReplayDevice):
+            rate = 1e9 / dev.ai_period_ns
+            mismatch = abs(rate - self.source.sample_rate) > 1e-6 * self.source.sample_rate
+            if mismatch and not self._warned_rate:
+                self._warned_rate = True
+                logger.warning(f"采集卡采样率({rate:g}Hz)与回放数据采样率"
+                               f"({self.source.sample_rate:g}Hz)不一致，数据包时间轴将按采集卡采样率计算")
+            now = time.perf_counter()
+            if dev.ai_sample_mode == 1:
+                dev.replay_base = dev.replay_next
+            else:
+                dev.replay_base = dev.replay_next = 0
+                dev.replayed_points = 0
+                dev.started_at = now
+                dev.finished = False
+                self.finished_event.clear()
+            if dev.started_at is None:
+                dev.started_at = now
+            dev.ai_trigger_time = now
+            dev.ai_read_index = 0
+            return True
+        return self._set_ai(dev_index, setter)
+
+    def USB5GetAi(self, dev_index, points, ai_buffer, timeout) -> int:
+        dev = self._opened_device(dev_index)
+        if dev is None:
+            return SIM_ERR_NOT_OPENED
+        wanted = int(_value(points))
+        if not self.loop and wanted > 0:
+            with dev.lock:
+                exhausted = (dev.ai_trigger_time is not None
+                             and dev.replay_base + dev.ai_read_index + wanted > dev.total_points)
+                if exhausted and not dev.finished:
+                    dev.finished = True
+                    logger.info(f"回放结束: 已回放{dev.replayed_points}点/通道 ({self.source.description})")
+            if exhausted:
+                self.finished_event.set()
+                # 与采集卡无数据时相同：等到超时返回
+                time.sleep(max(0, _value(timeout)) / 1000.0)
+                return SIM_ERR_TIMEOUT
+
+        result = super().USB5GetAi(dev_index, points, ai_buffer, timeout)
+        if result >= 0 and wanted > 0 and self.speed > 0:
+            with dev.lock:
+                ready = dev.ai_trigger_time + dev.ai_read_index / dev.ai_rate_hz
+            self.ready_latency[_value(dev_index)].record(max(0.0, time.perf_counter() - ready))
+        return result
+
+
+_shared_replay: Optional[ReplayUSB5000] = None
+_shared_lock = threading.Lock()
+
+
+def get_shared_replay() -> ReplayUSB5000:
+    """
+    获取进程内共享的回放采集卡，由环境变量配置：
+
+        USB5121_REPLAY: 数据源（CSV文件、落盘记录路径或监控任务ID）
+        USB5121_REPLAY_SPEED: 回放倍速，默认1，0为尽可能快
+        USB5121_REPLAY_LOOP: 1/true/yes 时循环回放
+        USB5121_REPLAY_RATE: CSV数据的采样率，默认由时间列推算
+    """
+    global _shared_replay
+    with _shared_lock:
+        if _shared_replay is None:
+            spec = os.environ.get('USB5121_REPLAY')
+            if not spec:
+                raise ValueError("未指定回放数据源（环境变量 USB5121_REPLAY）")
+            rate = os.environ.get('USB5121_REPLAY_RATE')
+            source = ReplaySource.open(spec, float(rate) if rate else None)
+            _shared_replay = ReplayUSB5000(
+                source,
+                speed=float(os.environ.get('USB5121_REPLAY_SPEED', '1')),
+                loop=os.environ.get('USB5121_REPLAY_LOOP', '').lower() in ('1', 'true', 'yes'),
+                num_devices=int(os.environ.get('USB5121_SIM_DEVICES', '1')),
+            )
+        return _shared_replay
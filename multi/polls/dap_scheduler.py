@@ -0,0 +1,172 @@
+"""
+连续采集读取调度器
+根据FIFO积压、采样率与目标端到端延迟决定每次 USB5GetAi 的读取点数，并记录调度决策指标；
+由积压变化趋势预警FIFO溢出，并在读取前FIFO已满时判定发生溢出
+"""
+import time
+import logging
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+AI_FIFO_POINTS = 2 * 1024 * 1024  # USB5000 AI FIFO容量（所有通道合计的数据点数）
+
+
+class ReadScheduler:
+    """
+    闭环读取点数调度
+
+    每次读取的每通道点数 = clamp(max(目标延迟对应点数, 当前积压点数), 最小点数, 最大点数)：
+    无积压时每次读取约 target_latency_s 的数据，USB5GetAi 阻塞等待数据就绪而无需 sleep；
+    出现积压时一次读走积压数据（此时数据已在FIFO中，调用立即返回），积压消失后自动回落。
+
+    积压以每秒增长点数的指数平均值跟踪：以最大点数读取仍持续增长说明读取跟不上采样，
+    按增长速率估计FIFO写满的剩余时间并告警；读取前积压已达FIFO容量即判定为溢出（数据已丢失）。
+    """
+
+    TREND_SMOOTHING = 0.2  # 积压增长速率的指数平均系数
+    OVERRUN_WARNING_S = 2.0  # 预计FIFO写满的剩余时间低于该值时告警
+
+    def __init__(self,
+                 sample_rate_hz: int,
+                 num_channels: int,
+                 target_latency_s: float = 0.05,
+                 max_latency_s: float = 0.2,
+                 min_points: int = 32,
+                 fifo_points: int = AI_FIFO_POINTS):
+        """
+        初始化调度器
+
+        Args:
+            sample_rate_hz: 每通道采样率
+            num_channels: 启用通道数
+            target_latency_s: 目标端到端延迟（无积压时单次读取的时长）
+            max_latency_s: 单次读取的最大时长（决定槽位容量上限）
+            min_points: 每通道最小读取点数
+            fifo_points: 采集卡FIFO容量（所有通道合计）
+        """
+        self.sample_rate_hz = max(1, int(sample_rate_hz))
+        self.num_channels = max(1, int(num_channels))
+        self.target_latency_s = target_latency_s
+        self.fifo_points = fifo_points
+
+        fifo_per_channel = fifo_points // self.num_channels
+        self.fifo_per_channel = fifo_per_channel
+        self.max_points = max(min_points, min(int(self.sample_rate_hz * max_latency_s), fifo_per_channel))
+        self.base_points = min(self.max_points, max(min_points, int(self.sample_rate_hz * target_latency_s)))
+        self.min_points = min(min_points, self.base_points)
+
+        # 调度状态与指标
+        self.backlog_points = 0  # 最近一次读取后的每通道积压点数
+        self.max_backlog_points = 0
+        self.last_points = self.base_points
+        self.reads = 0
+        self.timeouts = 0
+        self.errors = 0
+        self.total_points = 0
+        self.total_read_seconds = 0.0
+        self.max_read_seconds = 0.0
+        self.catchup_reads = 0  # 因积压而扩大读取点数的次数
+        self.backlog_trend = 0.0  # 积压增长速率（每通道点/秒，指数平均）
+        self.overrun = False  # 最近一次读取前FIFO已满
+        self.overruns = 0
+        self.overrun_warnings = 0
+        self._warned = False
+        self._last_record_time: Optional[float] = None
+
+    def next_points(self) -> int:
+        """计算下一次读取的每通道点数"""
+        points = max(self.base_points, self.backlog_points)
+        points = max(self.min_points, min(points, self.max_points))
+        if points > self.base_points:
+            self.catchup_reads += 1
+        self.last_points = points
+        return points
+
+    def timeout_ms(self, points: int, minimum_ms: int = 1000) -> int:
+        """本次读取的DLL超时时间：至少为数据就绪所需时间的两倍"""
+        expected_ms = points * 1000.0 / self.sample_rate_hz
+        return max(minimum_ms, int(expected_ms * 2) + 100)
+
+    def record(self, points: int, result: int, read_seconds: float):
+        """
+        记录一次读取结果
+
+        Args:
+            points: 请求的每通道点数
+            result: USB5GetAi 返回值（>=0为FIFO剩余点数，所有通道合计）
+            read_seconds: 调用耗时
+        """
+        self.reads += 1
+        self.total_read_seconds += read_seconds
+        if read_seconds > self.max_read_seconds:
+            self.max_read_seconds = read_seconds
+        self.overrun = False
+        if result >= 0:
+            self.total_points += points
+            backlog = result // self.num_channels
+            self._update_trend(backlog)
+            if backlog > self.max_backlog_points:
+                self.max_backlog_points = backlog
+            # 读取前的积压 = 本次读走的点数 + 剩余积压
+            if backlog + points >= self.fifo_per_channel:
+                self.overrun = True
+                self.overruns += 1
+        elif result == -7:
+            self.timeouts += 1
+        else:
+            self.errors += 1
+            if result == -8:  # 数据溢出
+                self.overrun = True
+                self.overruns += 1
+
+    def _update_trend(self, backlog: int):
+        """更新积压增长速率，读取跟不上采样、FIFO即将写满时告警"""
+        now = time.perf_counter()
+        if self._last_record_time is not None and now > self._last_record_time:
+            rate = (backlog - self.backlog_points) / (now - self._last_record_time)
+            self.backlog_trend += self.TREND_SMOOTHING * (rate - self.backlog_trend)
+        self._last_record_time = now
+        self.backlog_points = backlog
+        time_to_full = self.time_to_overrun_s()
+        if time_to_full is not None and time_to_full < self.OVERRUN_WARNING_S:
+            if not self._warned:
+                self._warned = True
+                self.overrun_warnings += 1
+                logger.warning(f"FIFO积压持续增长({self.backlog_trend:.0f}点/秒)，"
+                               f"预计{time_to_full:.1f}秒后溢出: 积压{backlog}/{self.fifo_per_channel}点/通道")
+        elif self._warned and self.backlog_trend <= 0:
+            self._warned = False
+
+    def time_to_overrun_s(self) -> Optional[float]:
+        """按当前积压增长速率估计的FIFO写满剩余时间，积压未增长时为None"""
+        if self.backlog_trend <= 0:
+            return None
+        return max(0.0, (self.fifo_per_channel - self.backlog_points) / self.backlog_trend)
+
+    def metrics(self) -> Dict:
+        """调度决策与读取统计"""
+        fifo_per_channel = self.fifo_per_channel
+        return {
+            'sample_rate_hz': self.sample_rate_hz,
+            'num_channels': self.num_channels,
+            'target_latency_ms': self.target_latency_s * 1000,
+            'base_points': self.base_points,
+            'max_points': self.max_points,
+            'last_points': self.last_points,
+            'backlog_points': self.backlog_points,
+            'max_backlog_points': self.max_backlog_points,
+            'fifo_fill_ratio': self.backlog_points / fifo_per_channel if fifo_per_channel else 0,
+            'reads': self.reads,
+            'catchup_reads': self.catchup_reads,
+            'backlog_trend': self.backlog_trend,
+            'time_to_overrun_s': self.time_to_overrun_s(),
+            'overruns': self.overruns,
+            'overrun_warnings': self.overrun_warnings,
+            'timeouts': self.timeouts,
+            'errors': self.errors,
+            'total_points': self.total_points,
+            'avg_points_per_read': self.total_points / self.reads if self.reads else 0,
+            'avg_read_ms': self.total_read_seconds * 1000 / self.reads if self.reads else 0,
+            'max_read_ms': self.max_read_seconds * 1000,
+        }
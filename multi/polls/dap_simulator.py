@@ -0,0 +1,574 @@
+"""
+USB5121数据采集卡软件模拟后端
+实现与USB5000.dll相同的函数入口，用于在Linux构建/测试机上驱动完整的采集链路并做吞吐量基准测试
+"""
+import os
+import ctypes
+import threading
+import time
+import logging
+from typing import Optional, Dict, List, Callable, Any
+
+import numpy as np
+
+from .dap_layout import AiLayout
+
+logger = logging.getLogger(__name__)
+
+# 与 USB5121Driver.ERROR_CODES 保持一致的返回码
+SIM_OK = 0
+SIM_ERR_NOT_FOUND = -1
+SIM_ERR_ALREADY_OPENED = -2
+SIM_ERR_NOT_OPENED = -3
+SIM_ERR_PARAM = -4
+SIM_ERR_TIMEOUT = -7
+
+# 采集FIFO缓冲区大小为2M数据点（所有启用通道共享）
+DEFAULT_AI_FIFO_POINTS = 2 * 1024 * 1024
+AI_CHANNEL_COUNT = 16
+AO_CHANNEL_COUNT = 4
+
+
+def _value(arg: Any):
+    """将ctypes参数或Python数值统一转换为Python数值"""
+    value = getattr(arg, 'value', arg)
+    if isinstance(value, bytes):
+        return value[0] if value else 0
+    return value
+
+
+def _float_view(ptr: Any, length: int) -> np.ndarray:
+    """将DLL调用中传入的float指针映射为可写的numpy数组（不拷贝）"""
+    if isinstance(ptr, np.ndarray):
+        return ptr.reshape(-1)[:length]
+    return np.ctypeslib.as_array(ctypes.cast(ptr, ctypes.POINTER(ctypes.c_float)), shape=(length,))
+
+
+def default_waveform(channel: int) -> Dict:
+    """默认波形：CH n 输出 10*(n+1) Hz 的正弦波，幅值随通道递增"""
+    return {
+        'type': 'sine',
+        'frequency': 10.0 * (channel + 1),
+        'amplitude': 1.0 + 0.1 * channel,
+        'offset': 0.0,
+        'phase': 0.0,
+        'noise': 0.0,
+    }
+
+
+def generate_waveform(spec: Dict, t: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+    """
+    按波形描述生成一段波形
+
+    Args:
+        spec: 波形描述，type 可选 sine/square/triangle/chirp/dc/noise，也可传入 callable(t)
+        t: 时间轴(秒)
+        rng: 随机数发生器（用于噪声）
+
+    Returns:
+        np.ndarray: 与t等长的float64波形
+    """
+    if callable(spec):
+        return np.asarray(spec(t), dtype=np.float64)
+
+    wave_type = spec.get('type', 'sine')
+    amplitude = spec.get('amplitude', 1.0)
+    frequency = spec.get('frequency', 50.0)
+    phase = spec.get('phase', 0.0)
+
+    if wave_type == 'sine':
+        data = amplitude * np.sin(2 * np.pi * frequency * t + phase)
+    elif wave_type == 'square':
+        data = amplitude * np.sign(np.sin(2 * np.pi * frequency * t + phase))
+    elif wave_type == 'triangle':
+        data = amplitude * (2 / np.pi) * np.arcsin(np.sin(2 * np.pi * frequency * t + phase))
+    elif wave_type == 'chirp':
+        # 线性扫频：在 sweep_seconds 内从 frequency 扫到 frequency_end，之后重复
+        f_end = spec.get('frequency_end', frequency * 10)
+        sweep = spec.get('sweep_seconds', 1.0)
+        tau = np.mod(t, sweep)
+        k = (f_end - frequency) / sweep
+        data = amplitude * np.sin(2 * np.pi * (frequency * tau + 0.5 * k * tau * tau) + phase)
+    elif wave_type == 'dc':
+        data = np.full(t.shape, amplitude, dtype=np.float64)
+    elif wave_type == 'noise':
+        data = amplitude * rng.standard_normal(t.shape)
+    else:
+        raise ValueError(f"未知波形类型: {wave_type}")
+
+    offset = spec.get('offset', 0.0)
+    if offset:
+        data += offset
+    noise = spec.get('noise', 0.0)
+    if noise:
+        data += noise * rng.standard_normal(t.shape)
+    return data
+
+
+class _SimAoChannel:
+    """模拟AO通道状态"""
+
+    LEVEL_HISTORY = 64  # 保留的直流电平变化记录数
+
+    def __init__(self):
+        self.sample_mode = 1
+        self.period_ns = 100000
+        self.cycle = 0
+        self.fifo = np.zeros(0, dtype=np.float32)
+        self.trigger_time: Optional[float] = None
+        self.immediate_voltage = 0.0
+        # 直流电平的变化时刻与电平：AI数据在读取时才生成，回环通道需按样本时刻取当时的电平
+        self.level_times = np.array([-np.inf])
+        self.level_values = np.array([0.0])
+
+    def set_level(self, voltage: float, now: float):
+        """立即输出直流电平（记录变化时刻）"""
+        self.immediate_voltage = float(voltage)
+        self.level_times = np.append(self.level_times, now)[-self.LEVEL_HISTORY:]
+        self.level_values = np.append(self.level_values, self.immediate_voltage)[-self.LEVEL_HISTORY:]
+        self.level_times[0] = -np.inf
+
+    def level_at(self, t: np.ndarray) -> np.ndarray:
+        """绝对时间t处的直流电平"""
+        return self.level_values[np.searchsorted(self.level_times, t, side='right') - 1]
+
+    def value_at(self, t: np.ndarray) -> np.ndarray:
+        """返回绝对时间t(秒, time.perf_counter时基)处的AO输出电压"""
+        if self.trigger_time is None or len(self.fifo) == 0:
+            return self.level_at(t)
+        idx = np.floor((t - self.trigger_time) * 1e9 / self.period_ns).astype(np.int64)
+        out = self.level_at(t)
+        started = idx >= 0
+        n = len(self.fifo)
+        if self.sample_mode == 1:
+            # 循环输出：cycle为0表示无限循环
+            limit = n * self.cycle if self.cycle > 0 else None
+            active = started if limit is None else started & (idx < limit)
+            out[active] = self.fifo[idx[active] % n]
+            if limit is not None:
+                out[idx >= limit] = self.fifo[-1]
+        else:
+            active = started & (idx < n)
+            out[active] = self.fifo[idx[active]]
+            out[idx >= n] = self.fifo[-1]
+        return out
+
+
+class _SimDevice:
+    """单张模拟采集卡的寄存器与FIFO状态"""
+
+    def __init__(self, fifo_points: int):
+        self.lock = threading.Lock()
+        self.opened = False
+        self.fifo_points = fifo_points
+
+        self.ai_chan_sel = [False] * AI_CHANNEL_COUNT
+        self.ai_range = [10.0] * AI_CHANNEL_COUNT
+        self.ai_sample_mode = 0
+        self.ai_period_ns = 1000000
+        self.ai_oneshot_points = 1000
+        self.ai_trig_source = 0
+        self.ai_conv_source = 0
+
+        # FIFO状态：以每通道样本序号计
+        self.ai_trigger_time: Optional[float] = None
+        self.ai_read_index = 0
+        self.ai_lost_points = 0
+        self.ai_overrun_count = 0
+        self.ai_total_read_points = 0
+
+        self.ao = [_SimAoChannel() for _ in range(AO_CHANNEL_COUNT)]
+
+    @property
+    def ai_rate_hz(self) -> float:
+        return 1e9 / self.ai_period_ns
+
+    def enabled_channels(self) -> List[int]:
+        return [i for i, enabled in enumerate(self.ai_chan_sel) if enabled]
+
+    def produced(self, now: float) -> int:
+        """截至now时刻已产生的每通道样本数"""
+        if self.ai_trigger_time is None:
+            return 0
+        count = int((now - self.ai_trigger_time) * self.ai_rate_hz)
+        if self.ai_sample_mode == 1:
+            count = min(count, self.ai_oneshot_points)
+        return max(0, count)
+
+    def backlog(self, now: float) -> int:
+        """FIFO中尚未读取的每通道样本数（溢出时丢弃最旧数据并计数）"""
+        backlog = self.produced(now) - self.ai_read_index
+        n_channels = max(1, len(self.enabled_channels()))
+        capacity = self.fifo_points // n_channels
+        if backlog > capacity:
+            lost = backlog - capacity
+            self.ai_read_index += lost
+            self.ai_lost_points += lost * n_channels
+            self.ai_overrun_count += 1
+            backlog = capacity
+        return backlog
+
+
+class SimulatedUSB5000:
+    """
+    USB5000.dll 的软件模拟实现
+
+    与真实DLL保持相同的函数名与参数顺序，可直接作为 USB5121Driver.dll 使用。
+    AI数据按触发后的真实时间节拍产生，FIFO容量、单次/连续模式、超时返回-7等语义与采集卡一致；
+    USB5GetAi 返回值为读取后FIFO中剩余的数据点数（所有启用通道合计）。
+    """
+
+    def __init__(self,
+                 num_devices: int = 1,
+                 waveforms: Optional[Dict[int, Any]] = None,
+                 fifo_points: int = DEFAULT_AI_FIFO_POINTS,
+                 loopback: Optional[Dict[int, int]] = None,
+                 seed: Optional[int] = None,
+                 fifo_order: str = AiLayout.CHANNEL_MAJOR):
+        """
+        初始化模拟采集卡
+
+        Args:
+            num_devices: 模拟的采集卡数量
+            waveforms: 各AI通道的波形描述 {通道号: spec}
+            fifo_points: AI FIFO容量（数据点）
+            loopback: AO回环映射 {AI通道号: AO通道号}，被映射的AI通道读取对应AO的输出
+            seed: 噪声随机种子
+            fifo_order: USB5GetAi 输出的样本排列方式（AiLayout.CHANNEL_MAJOR / SAMPLE_MAJOR）
+        """
+        self.devices = [_SimDevice(fifo_points) for _ in range(num_devices)]
+        self.waveforms: Dict[int, Any] = {ch: default_waveform(ch) for ch in range(AI_CHANNEL_COUNT)}
+        if waveforms:
+            self.waveforms.update(waveforms)
+        self.loopback: Dict[int, int] = dict(loopback or {})
+        self.rng = np.random.default_rng(seed)
+        self.fifo_order = fifo_order
+
+    # ------------------------------------------------------------------
+    # 模拟器专用接口
+
+    def set_waveform(self, channel: int, spec: Any):
+        """设置AI通道的模拟波形"""
+        self.waveforms[channel] = spec
+
+    def get_sim_stats(self, dev_index: int = 0) -> Dict:
+        """获取模拟FIFO统计（丢点数、溢出次数等）"""
+        dev = self._device(dev_index)
+        if dev is None:
+            return {}
+        with dev.lock:
+            backlog = dev.backlog(time.perf_counter())
+            return {
+                'opened': dev.opened,
+                'sample_rate_hz': dev.ai_rate_hz,
+                'enabled_channels': dev.enabled_channels(),
+                'backlog_points': backlog * len(dev.enabled_channels()),
+                'read_points': dev.ai_total_read_points,
+                'lost_points': dev.ai_lost_points,
+                'overrun_count': dev.ai_overrun_count,
+            }
+
+    def _device(self, dev_index: Any) -> Optional[_SimDevice]:
+        index = _value(dev_index)
+        if 0 <= index < len(self.devices):
+            return self.devices[index]
+        return None
+
+    def _opened_device(self, dev_index: Any) -> Optional[_SimDevice]:
+        dev = self._device(dev_index)
+        if dev is None or not dev.opened:
+            return None
+        return dev
+
+    def _generate(self, dev: _SimDevice, channels: List[int], start: int, points: int, out: np.ndarray):
+        """生成[start, start+points)样本并按 fifo_order 排列写入out"""
+        t = (start + np.arange(points, dtype=np.float64)) / dev.ai_rate_hz
+        rows = AiLayout(channels, self.fifo_order).view(out, points)
+        for i, ch in enumerate(channels):
+            if ch in self.loopback:
+                data = dev.ao[self.loopback[ch]].value_at(dev.ai_trigger_time + t)
+            else:
+                data = generate_waveform(self.waveforms.get(ch, default_waveform(ch)), t, self.rng)
+            rng = dev.ai_range[ch]
+            np.clip(data, -rng, rng, out=data)
+            rows[i] = data
+
+    # ------------------------------------------------------------------
+    # 设备管理
+
+    def FindUSB5DAQ(self) -> int:
+        return len(self.devices)
+
+    def USB5OpenDevice(self, dev_index) -> int:
+        dev = self._device(dev_index)
+        if dev is None:
+            return SIM_ERR_NOT_FOUND
+        with dev.lock:
+            if dev.opened:
+                return SIM_ERR_ALREADY_OPENED
+            dev.opened = True
+            dev.ai_trigger_time = None
+            dev.ai_read_index = 0
+        return SIM_OK
+
+    def USB5CloseDevice(self, dev_index) -> int:
+        dev = self._opened_device(dev_index)
+        if dev is None:
+            return SIM_ERR_NOT_OPENED
+        with dev.lock:
+            dev.opened = False
+            dev.ai_trigger_time = None
+        return SIM_OK
+
+    # ------------------------------------------------------------------
+    # AI配置
+
+    def _set_ai(self, dev_index, setter: Callable[[_SimDevice], bool]) -> int:
+        dev = self._opened_device(dev_index)
+        if dev is None:
+            return SIM_ERR_NOT_OPENED
+        with dev.lock:
+            return SIM_OK if setter(dev) else SIM_ERR_PARAM
+
+    def SetUSB5AiSampleRate(self, dev_index, sample_period) -> int:
+        period = _value(sample_period)
+
+        def setter(dev):
+            if period <= 0:
+                return False
+            dev.ai_period_ns = period
+            return True
+        return self._set_ai(dev_index, setter)
+
+    def SetUSB5AiSampleMode(self, dev_index, mode) -> int:
+        mode = _value(mode)
+
+        def setter(dev):
+            if mode not in (0, 1):
+                return False
+            dev.ai_sample_mode = mode
+            return True
+        return self._set_ai(dev_index, setter)
+
+    def SetUSB5AiRange(self, dev_index, chan, ai_range) -> int:
+        chan, ai_range = _value(chan), _value(ai_range)
+
+        def setter(dev):
+            if not (0 <= chan < AI_CHANNEL_COUNT) or ai_range <= 0:
+                return False
+            dev.ai_range[chan] = float(ai_range)
+            return True
+        return self._set_ai(dev_index, setter)
+
+    def SetUSB5AiChanSel(self, dev_index, chan, sel) -> int:
+        chan, sel = _value(chan), _value(sel)
+
+        def setter(dev):
+            if not (0 <= chan < AI_CHANNEL_COUNT):
+                return False
+            dev.ai_chan_sel[chan] = bool(sel)
+            return True
+        return self._set_ai(dev_index, setter)
+
+    def SetUSB5AiTrigSource(self, dev_index, source) -> int:
+        source = _value(source)
+
+        def setter(dev):
+            dev.ai_trig_source = source
+            return True
+        return self._set_ai(dev_index, setter)
+
+    def SetUSB5AiConvSource(self, dev_index, source) -> int:
+        source = _value(source)
+
+        def setter(dev):
+            dev.ai_conv_source = source
+            return True
+        return self._set_ai(dev_index, setter)
+
+    def SetUSB5AiPreTrigPoints(self, dev_index, points) -> int:
+        return self._set_ai(dev_index, lambda dev: True)
+
+    def SetUSB5AiOneShotPoints(self, dev_index, points) -> int:
+        points = _value(points)
+
+        def setter(dev):
+            if points <= 0:
+                return False
+            dev.ai_oneshot_points = points
+            return True
+        return self._set_ai(dev_index, setter)
+
+    def SetUSB5ClrAiFifo(self, dev_index) -> int:
+        def setter(dev):
+            dev.ai_read_index = dev.produced(time.perf_counter())
+            return True
+        return self._set_ai(dev_index, setter)
+
+    def SetUSB5AiSoftTrig(self, dev_index) -> int:
+        def setter(dev):
+            dev.ai_trigger_time = time.perf_counter()
+            dev.ai_read_index = 0
+            return True
+        return self._set_ai(dev_index, setter)
+
+    def SetUSB5ClrAiTrigger(self, dev_index) -> int:
+        def setter(dev):
+            dev.ai_trigger_time = None
+            dev.ai_read_index = 0
+            return True
+        return self._set_ai(dev_index, setter)
+
+    def SetUSB5ClrTrigger(self, dev_index) -> int:
+        return self.SetUSB5ClrAiTrigger(dev_index)
+
+    # ------------------------------------------------------------------
+    # AI数据读取
+
+    def USB5GetAi(self, dev_index, points, ai_buffer, timeout) -> int:
+        """
+        从模拟FIFO读取每通道points个点，按 fifo_order（默认[CHa的N点][CHb的N点]...）写入ai_buffer
+
+        Returns:
+            int: 成功返回FIFO剩余数据点数，超时返回-7
+        """
+        dev = self._opened_device(dev_index)
+        if dev is None:
+            return SIM_ERR_NOT_OPENED
+        points = int(_value(points))
+        timeout_s = max(0, _value(timeout)) / 1000.0
+        deadline = time.perf_counter() + timeout_s
+
+        with dev.lock:
+            channels = dev.enabled_channels()
+            if points < 0 or not channels:
+                return SIM_ERR_PARAM
+            if points == 0:
+                return dev.backlog(time.perf_counter()) * len(channels)
+
+        while True:
+            with dev.lock:
+                # 取得锁之后再读时钟：等锁期间（读取线程被阻塞）产生的数据也要计入积压与溢出
+                now = time.perf_counter()
+                backlog = dev.backlog(now)
+                if backlog >= points:
+                    start = dev.ai_read_index
+                    dev.ai_read_index += points
+                    dev.ai_total_read_points += points * len(channels)
+                    self._generate(dev, channels, start, points, _float_view(ai_buffer, points * len(channels)))
+                    return (backlog - points) * len(channels)
+                rate = dev.ai_rate_hz
+                triggered = dev.ai_trigger_time is not None
+            if now >= deadline:
+                return SIM_ERR_TIMEOUT
+            wait = (points - backlog) / rate if triggered else timeout_s
+            time.sleep(max(0.0005, min(wait, deadline - now)))
+
+    # ------------------------------------------------------------------
+    # AO配置与输出
+
+    def _set_ao(self, dev_index, chan, setter: Callable[[_SimAoChannel], bool]) -> int:
+        dev = self._opened_device(dev_index)
+        if dev is None:
+            return SIM_ERR_NOT_OPENED
+        chan = _value(chan)
+        if not (0 <= chan < AO_CHANNEL_COUNT):
+            return SIM_ERR_PARAM
+        with dev.lock:
+            return SIM_OK if setter(dev.ao[chan]) else SIM_ERR_PARAM
+
+    def SetUSB5AoSampleRate(self, dev_index, chan, sample_period) -> int:
+        period = _value(sample_period)
+
+        def setter(ao):
+            if period <= 0:
+                return False
+            ao.period_ns = period
+            return True
+        return self._set_ao(dev_index, chan, setter)
+
+    def SetUSB5AoSampleMode(self, dev_index, chan, mode) -> int:
+        mode = _value(mode)
+
+        def setter(ao):
+            ao.sample_mode = mode
+            return True
+        return self._set_ao(dev_index, chan, setter)
+
+    def SetUSB5AoTrigSource(self, dev_index, chan, source) -> int:
+        return self._set_ao(dev_index, chan, lambda ao: True)
+
+    def SetUSB5AoConvSource(self, dev_index, chan, source) -> int:
+        return self._set_ao(dev_index, chan, lambda ao: True)
+
+    def SetUSB5AoCycle(self, dev_index, chan, cycle) -> int:
+        cycle = _value(cycle)
+
+        def setter(ao):
+            ao.cycle = cycle
+            return True
+        return self._set_ao(dev_index, chan, setter)
+
+    def SetUSB5AoDataFifo(self, dev_index, chan, voltage, length) -> int:
+        length = _value(length)
+        data = np.array(_float_view(voltage, length), dtype=np.float32)
+
+        def setter(ao):
+            ao.fifo = np.concatenate([ao.fifo, data]) if len(ao.fifo) else data
+            return True
+        return self._set_ao(dev_index, chan, setter)
+
+    def SetUSB5ClrAoFifo(self, dev_index, chan) -> int:
+        def setter(ao):
+            ao.fifo = np.zeros(0, dtype=np.float32)
+            return True
+        return self._set_ao(dev_index, chan, setter)
+
+    def SetUSB5AoSoftTrig(self, dev_index, chan) -> int:
+        def setter(ao):
+            ao.trigger_time = time.perf_counter()
+            return True
+        return self._set_ao(dev_index, chan, setter)
+
+    def SetUSB5ClrAoTrigger(self, dev_index, chan) -> int:
+        def setter(ao):
+            ao.trigger_time = None
+            return True
+        return self._set_ao(dev_index, chan, setter)
+
+    def SetUSB5AoImmediately(self, dev_index, chan, voltage) -> int:
+        voltage = _value(voltage)
+
+        def setter(ao):
+            ao.trigger_time = None
+            ao.set_level(voltage, time.perf_counter())
+            return True
+        return self._set_ao(dev_index, chan, setter)
+
+
+def parse_loopback(spec: Optional[str]) -> Dict[int, int]:
+    """解析 "AI通道号:AO通道号,..." 形式的回环映射"""
+    loopback = {}
+    for item in filter(None, (spec or '').split(',')):
+        ai, ao = item.split(':')
+        loopback[int(ai)] = int(ao)
+    return loopback
+
+
+_shared_simulator: Optional[SimulatedUSB5000] = None
+_shared_lock = threading.Lock()
+
+
+def get_shared_simulator() -> SimulatedUSB5000:
+    """
+    获取进程内共享的模拟采集卡（同一张卡被多个驱动实例打开时行为与真实硬件一致）
+
+    模拟的采集卡数量由环境变量 USB5121_SIM_DEVICES 指定，默认1张；
+    AO回环由 USB5121_SIM_LOOPBACK 指定，如 "0:0,1:1"（AI通道号:AO通道号）
+    """
+    global _shared_simulator
+    with _shared_lock:
+        if _shared_simulator is None:
+            _shared_simulator = SimulatedUSB5000(num_devices=int(os.environ.get('USB5121_SIM_DEVICES', '1')),
+                                                 loopback=parse_loopback(os.environ.get('USB5121_SIM_LOOPBACK')))
+        return _shared_simulator
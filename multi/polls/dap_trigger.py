@@ -0,0 +1,409 @@
+"""
+连续采集数据流上的软件触发事件采集
+读取线程对每个数据块向量化地检测电平/边沿/窗口触发条件，触发时输出固定长度的触发前+触发后记录，
+以全采样率捕获偶发瞬态而无需记录全部数据；触发前数据来自每通道固定长度的预触发缓冲区，内存占用恒定
+"""
+import time
+import queue
+import logging
+import threading
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .dap_packet import AiPacket
+
+logger = logging.getLogger(__name__)
+
+
+class TriggerCondition:
+    """
+    单通道触发条件
+
+    level: 信号满足阈值条件（rising: ≥threshold，falling: ≤threshold）即触发，保持时间后仍满足则再次触发
+    edge: 信号穿越阈值时触发；需先回到阈值另一侧 hysteresis 以外重新布防，抑制噪声导致的重复触发
+    window: 信号进入（region='inside'）或离开（region='outside'）[low, high] 区间时触发，布防规则同 edge
+    """
+
+    KIND_LEVEL = 'level'
+    KIND_EDGE = 'edge'
+    KIND_WINDOW = 'window'
+    KINDS = (KIND_LEVEL, KIND_EDGE, KIND_WINDOW)
+
+    SLOPE_RISING = 'rising'
+    SLOPE_FALLING = 'falling'
+
+    REGION_OUTSIDE = 'outside'
+    REGION_INSIDE = 'inside'
+
+    __slots__ = ('channel', 'kind', 'threshold', 'slope', 'low', 'high', 'region', 'hysteresis')
+
+    def __init__(self, channel: int, kind: str = KIND_EDGE, threshold: float = 0.0, slope: str = SLOPE_RISING,
+                 low: Optional[float] = None, high: Optional[float] = None, region: str = REGION_OUTSIDE,
+                 hysteresis: float = 0.0):
+        """
+        Args:
+            channel: 触发通道（物理通道号）
+            kind: 触发类型 level/edge/window
+            threshold: 电平/边沿触发阈值（与数据同单位，已标定通道为工程量）
+            slope: 电平/边沿触发方向 rising/falling
+            low, high: 窗口触发的区间
+            region: 窗口触发在进入(inside)还是离开(outside)区间时触发
+            hysteresis: 重新布防的回差
+        """
+        if kind not in self.KINDS:
+            raise ValueError(f"未知的触发类型: {kind}")
+        if slope not in (self.SLOPE_RISING, self.SLOPE_FALLING):
+            raise ValueError(f"未知的触发方向: {slope}")
+        if region not in (self.REGION_OUTSIDE, self.REGION_INSIDE):
+            raise ValueError(f"未知的窗口触发区域: {region}")
+        if kind == self.KIND_WINDOW and (low is None or high is None or low >= high):
+            raise ValueError(f"窗口触发区间无效: [{low}, {high}]")
+        if hysteresis < 0:
+            raise ValueError(f"回差不能为负: {hysteresis}")
+        self.channel = int(channel)
+        self.kind = kind
+        self.threshold = float(threshold)
+        self.slope = slope
+        self.low = float(low) if low is not None else None
+        self.high = float(high) if high is not None else None
+        self.region = region
+        self.hysteresis = float(hysteresis)
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any]) -> 'TriggerCondition':
+        """由配置字典构造，键与构造参数同名"""
+        keys = ('kind', 'threshold', 'slope', 'low', 'high', 'region', 'hysteresis')
+        return cls(int(config['channel']), **{key: config[key] for key in keys if config.get(key) is not None})
+
+    @property
+    def always_armed(self) -> bool:
+        return self.kind == self.KIND_LEVEL
+
+    def fire_mask(self, x: np.ndarray) -> np.ndarray:
+        """满足触发条件的样本"""
+        if self.kind == self.KIND_WINDOW:
+            outside = (x < self.low) | (x > self.high)
+            return outside if self.region == self.REGION_OUTSIDE else ~outside
+        return x >= self.threshold if self.slope == self.SLOPE_RISING else x <= self.threshold
+
+    def rearm_mask(self, x: np.ndarray) -> np.ndarray:
+        """可重新布防的样本（已回到触发条件另一侧回差以外）"""
+        h = self.hysteresis
+        if self.kind == self.KIND_WINDOW:
+            if self.region == self.REGION_OUTSIDE:
+                return (x >= self.low + h) & (x <= self.high - h)
+            return (x < self.low - h) | (x > self.high + h)
+        return x < self.threshold - h if self.slope == self.SLOPE_RISING else x > self.threshold + h
+
+    def first_trigger(self, x: np.ndarray, armed: bool) -> Tuple[int, bool]:
+        """
+        在一段数据中查找第一个触发点
+
+        Args:
+            x: 单通道数据
+            armed: 该段数据开始时是否已布防
+
+        Returns:
+            (触发点在x中的位置或-1, 未触发时该段数据结束时是否已布防)
+        """
+        fire = np.flatnonzero(self.fire_mask(x))
+        if self.always_armed:
+            return (int(fire[0]) if fire.size else -1), True
+        if not armed:
+            rearm = np.flatnonzero(self.rearm_mask(x))
+            if not rearm.size:
+                return -1, False
+            fire = fire[fire > rearm[0]]
+        return (int(fire[0]) if fire.size else -1), True
+
+    def describe(self) -> str:
+        if self.kind == self.KIND_WINDOW:
+            action = '离开' if self.region == self.REGION_OUTSIDE else '进入'
+            return f"CH{self.channel} {action}[{self.low:g}, {self.high:g}]"
+        sign = '≥' if self.slope == self.SLOPE_RISING else '≤'
+        label = '电平' if self.kind == self.KIND_LEVEL else ('上升沿' if self.slope == self.SLOPE_RISING else '下降沿')
+        return f"CH{self.channel} {label}{sign}{self.threshold:g}"
+
+    def to_dict(self) -> Dict:
+        return {key: getattr(self, key) for key in self.__slots__}
+
+    def __repr__(self):
+        return f"TriggerCondition({self.describe()})"
+
+
+class TriggerEvent:
+    """
+    一次触发事件记录
+
+    data 为 (通道数, pre_points+post_points) 的float32数组，第 pre_points 列为触发点；
+    触发前数据不足（采集刚开始或数据不连续后）时缺失部分为NaN，truncated 为 True
+    """
+
+    __slots__ = ('trigger_index', 'timestamp', 'data', 'channels', 'units', 'sample_rate',
+                 'pre_points', 'condition', 'seq', 'truncated')
+
+    def __init__(self, trigger_index: int, timestamp: float, data: np.ndarray, channels: Tuple,
+                 units: Optional[Tuple[str, ...]], sample_rate: int, pre_points: int, condition: str,
+                 seq: int = 0, truncated: bool = False):
+        self.trigger_index = trigger_index
+        self.timestamp = timestamp
+        self.data = data
+        self.channels = tuple(channels)
+        self.units = units
+        self.sample_rate = sample_rate
+        self.pre_points = pre_points
+        self.condition = condition
+        self.seq = seq
+        self.truncated = truncated
+
+    @property
+    def post_points(self) -> int:
+        return self.data.shape[1] - self.pre_points
+
+    def channel(self, ch) -> np.ndarray:
+        return self.data[self.channels.index(ch)]
+
+    def to_dict(self) -> Dict:
+        """转换为JSON可用的字典（网络边界）"""
+        data = np.where(np.isnan(self.data), None, self.data).tolist() if self.truncated else self.data.tolist()
+        return {
+            'event_id': self.seq,
+            'trigger_index': self.trigger_index,
+            'timestamp': self.timestamp,
+            'sample_rate': self.sample_rate,
+            'pre_points': self.pre_points,
+            'post_points': self.post_points,
+            'condition': self.condition,
+            'truncated': self.truncated,
+            'enabled_channels': list(self.channels),
+            'channel_data': {str(ch): data[i] for i, ch in enumerate(self.channels)},
+            'calibrated': self.units is not None,
+            'units': {str(ch): unit for ch, unit in zip(self.channels, self.units)} if self.units else None,
+        }
+
+    def __repr__(self):
+        return (f"TriggerEvent(#{self.seq}, index={self.trigger_index}, {self.condition}, "
+                f"points={self.pre_points}+{self.post_points})")
+
+
+class TriggerCapture:
+    """
+    触发事件采集器
+
+    process() 由驱动读取线程对每个全速率数据包调用，只做向量化比较与少量拷贝；
+    完成的事件放入有界队列，由独立的分发线程执行 on_event，回调耗时不影响读取。
+    一个事件的触发后数据采集完成并经过 holdoff_points 后才检测下一次触发（事件不重叠）。
+    数据包不连续（样本序号跳变，如连发单次采集的每一次）时清空预触发缓冲区，未完成的事件丢弃。
+    """
+
+    def __init__(self, conditions: Sequence[TriggerCondition], pre_points: int = 1000, post_points: int = 1000,
+                 holdoff_points: int = 0, on_event: Optional[Callable[[TriggerEvent], None]] = None,
+                 max_pending_events: int = 64):
+        """
+        Args:
+            conditions: 触发条件（任一满足即触发）
+            pre_points: 每个事件的触发前点数（每通道）
+            post_points: 每个事件的触发后点数（每通道，含触发点）
+            holdoff_points: 事件结束后不检测触发的点数
+            on_event: 事件回调，在分发线程中执行
+            max_pending_events: 等待分发的事件上限，超出时丢弃新事件
+        """
+        if not conditions:
+            raise ValueError("未设置触发条件")
+        if pre_points < 0 or post_points <= 0 or holdoff_points < 0:
+            raise ValueError(f"事件长度无效: 触发前{pre_points}点, 触发后{post_points}点, 保持{holdoff_points}点")
+        self.conditions: List[TriggerCondition] = list(conditions)
+        self.pre_points = int(pre_points)
+        self.post_points = int(post_points)
+        self.holdoff_points = int(holdoff_points)
+        self.on_event = on_event
+
+        self.channels: Optional[Tuple] = None
+        self._rows: List[Optional[int]] = []
+        self._armed: List[bool] = [c.always_armed for c in self.conditions]
+        self._history: Optional[np.ndarray] = None  # (通道数, pre_points) 最近的样本
+        self._history_len = 0
+        self._next_index: Optional[int] = None
+        self._resume_index = 0  # 下一次检测触发的起始样本序号
+        self._pending: Optional[TriggerEvent] = None
+        self._pending_filled = 0
+
+        self._events: 'queue.Queue[Optional[TriggerEvent]]' = queue.Queue(max_pending_events)
+        self._dispatch_thread = None
+
+        self.event_count = 0
+        self.dropped_events = 0
+        self.incomplete_events = 0
+        self.discontinuities = 0
+        self.blocks = 0
+        self.max_process_ms = 0.0
+
+    def start(self):
+        """启动事件分发线程"""
+        if self._dispatch_thread is None:
+            self._dispatch_thread = threading.Thread(target=self._dispatch_loop, daemon=True)
+            self._dispatch_thread.start()
+
+    def stop(self, timeout: float = 2.0):
+        """停止分发线程（已完成的事件先分发完）"""
+        if self._dispatch_thread is not None:
+            self._events.put(None)
+            self._dispatch_thread.join(timeout)
+            self._dispatch_thread = None
+
+    def process(self, packet: AiPacket):
+        """检测一个数据包中的触发并采集事件数据（读取线程调用）"""
+        start = time.perf_counter()
+        if packet.channels != self.channels:
+            self._bind(packet.channels)
+        if self._next_index is not None and packet.start_index != self._next_index:
+            self.discontinuities += 1
+            self._reset()
+        if self._next_index is None:
+            self._resume_index = max(self._resume_index, packet.start_index)
+        self._next_index = packet.end_index
+
+        data = packet.data
+        n = data.shape[1]
+        pos = 0
+        while pos < n:
+            if self._pending is not None:
+                pos = self._fill_pending(data, pos)
+                continue
+            search_from = max(pos, self._resume_index - packet.start_index)
+            if search_from >= n:
+                break
+            offset, condition = self._find_trigger(data, search_from)
+            if offset < 0:
+                break
+            self._begin_event(packet, offset, condition)
+            pos = offset
+
+        self._update_history(data)
+        self.blocks += 1
+        self.max_process_ms = max(self.max_process_ms, (time.perf_counter() - start) * 1000)
+
+    def metrics(self) -> Dict:
+        return {
+            'conditions': [c.describe() for c in self.conditions],
+            'pre_points': self.pre_points,
+            'post_points': self.post_points,
+            'holdoff_points': self.holdoff_points,
+            'events': self.event_count,
+            'dropped_events': self.dropped_events,
+            'incomplete_events': self.incomplete_events,
+            'discontinuities': self.discontinuities,
+            'blocks': self.blocks,
+            'max_process_ms': self.max_process_ms,
+            'capturing': self._pending is not None,
+        }
+
+    def _bind(self, channels: Tuple):
+        """数据包通道变化：重新对应触发通道所在行并清空状态"""
+        self.channels = channels
+        self._rows = []
+        for condition in self.conditions:
+            if condition.channel in channels:
+                self._rows.append(channels.index(condition.channel))
+            else:
+                logger.error(f"触发通道CH{condition.channel}未启用，忽略该触发条件")
+                self._rows.append(None)
+        self._history = np.full((len(channels), self.pre_points), np.nan, dtype=np.float32)
+        self._next_index = None
+        self._reset()
+
+    def _reset(self):
+        """数据不连续：丢弃未完成的事件，清空预触发缓冲区与布防状态"""
+        if self._pending is not None:
+            self.incomplete_events += 1
+            logger.warning(f"数据不连续，丢弃未完成的触发事件 #{self._pending.seq}")
+            self._pending = None
+        self._history_len = 0
+        self._armed = [c.always_armed for c in self.conditions]
+        self._resume_index = 0
+        self._next_index = None
+
+    def _find_trigger(self, data: np.ndarray, search_from: int) -> Tuple[int, Optional[TriggerCondition]]:
+        """所有条件中最早的触发点在数据块中的位置及对应条件，没有触发时位置为-1并更新布防状态"""
+        first = -1
+        first_condition = None
+        armed_after = list(self._armed)
+        for i, (condition, row) in enumerate(zip(self.conditions, self._rows)):
+            if row is None:
+                continue
+            offset, armed_after[i] = condition.first_trigger(data[row, search_from:], self._armed[i])
+            if offset >= 0 and (first < 0 or offset < first):
+                first, first_condition = offset, condition
+        if first < 0:
+            self._armed = armed_after
+            return -1, None
+        # 触发后边沿/窗口条件全部撤防，事件结束并经过保持时间后需重新布防
+        self._armed = [c.always_armed for c in self.conditions]
+        return search_from + first, first_condition
+
+    def _begin_event(self, packet: AiPacket, offset: int, condition: TriggerCondition):
+        """在数据块第offset个样本处触发：由预触发缓冲区与本块数据组装触发前部分"""
+        trigger_index = packet.start_index + offset
+        record = np.empty((len(self.channels), self.pre_points + self.post_points), dtype=np.float32)
+        from_block = min(offset, self.pre_points)
+        from_history = self.pre_points - from_block
+        if from_history:
+            record[:, :from_history] = self._history[:, self.pre_points - from_history:]
+        record[:, from_history:self.pre_points] = packet.data[:, offset - from_block:offset]
+        truncated = from_history > self._history_len
+        if truncated:
+            record[:, :from_history - self._history_len] = np.nan
+
+        timestamp = packet.timestamp - (packet.end_index - trigger_index) / packet.sample_rate \
+            if packet.sample_rate else packet.timestamp
+        self.event_count += 1
+        self._pending = TriggerEvent(trigger_index, timestamp, record, self.channels, packet.units,
+                                     packet.sample_rate, self.pre_points, condition.describe(),
+                                     seq=self.event_count, truncated=truncated)
+        self._pending_filled = 0
+
+    def _fill_pending(self, data: np.ndarray, pos: int) -> int:
+        """向当前事件填充触发后数据，返回数据块中的新位置"""
+        event = self._pending
+        take = min(self.post_points - self._pending_filled, data.shape[1] - pos)
+        start = self.pre_points + self._pending_filled
+        event.data[:, start:start + take] = data[:, pos:pos + take]
+        self._pending_filled += take
+        if self._pending_filled >= self.post_points:
+            self._pending = None
+            self._resume_index = event.trigger_index + self.post_points + self.holdoff_points
+            self._emit(event)
+        return pos + take
+
+    def _update_history(self, data: np.ndarray):
+        """用数据块末尾的样本更新预触发缓冲区"""
+        pre = self.pre_points
+        if pre == 0:
+            return
+        n = data.shape[1]
+        if n >= pre:
+            self._history[:] = data[:, n - pre:]
+        else:
+            self._history[:, :pre - n] = self._history[:, n:]
+            self._history[:, pre - n:] = data
+        self._history_len = min(pre, self._history_len + n)
+
+    def _emit(self, event: TriggerEvent):
+        try:
+            self._events.put_nowait(event)
+        except queue.Full:
+            self.dropped_events += 1
+            logger.warning(f"触发事件分发队列已满，丢弃事件 #{event.seq}")
+
+    def _dispatch_loop(self):
+        """分发线程：执行事件回调"""
+        while True:
+            event = self._events.get()
+            if event is None:
+                break
+            if self.on_event:
+                try:
+                    self.on_event(event)
+                except Exception as e:
+                    logger.error(f"触发事件回调异常: {e}")
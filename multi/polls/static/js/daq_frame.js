@@ -0,0 +1,107 @@
+/**
+ * 采样数据二进制帧解码（帧格式见 polls/dap_frame.py）
+ *
+ * 用法：
+ *   socket.binaryType = 'arraybuffer';
+ *   socket.send(JSON.stringify({ type: 'set_data_format', format: 'binary', dtype: 'float32' }));
+ *   socket.onmessage = (event) => {
+ *       const message = event.data instanceof ArrayBuffer ? decodeDaqFrame(event.data) : JSON.parse(event.data);
+ *   };
+ *
+ * 解码结果与JSON数据消息相同：{ type: 'acquisition_data' | 'monitor_data', data: {...} }，
+ * channel_data 为 {通道号: 数组}。数据消息不带逐点时间轴，只带 time_start_index 与 dt，
+ * 需要时间轴时用 daqTimeAxis(data) 生成：第i个样本的时刻为 (time_start_index + i) × dt。
+ * 发送 { type: 'subscribe', channels, window_s, width } 后数据消息为按像素的 min/max 包络（带 envelope 字段，
+ * 各通道数据按 min、max 交错排列，dt 为半个像素），可直接按时间轴绘制。
+ */
+(function (global) {
+    const MAGIC = 0x46514144; // 'DAQF' 小端
+    const HEADER_SIZE = 50;
+    const KINDS = ['acquisition_data', 'monitor_data'];
+    const DTYPES = ['float32', 'int16'];
+    const FLAG_FINAL = 0x01;
+    const FLAG_CALIBRATED = 0x02;
+
+    function align4(n) {
+        return (n + 3) & ~3;
+    }
+
+    function decodeDaqFrame(buffer) {
+        const view = new DataView(buffer);
+        if (view.getUint32(0, true) !== MAGIC || view.getUint8(4) !== 1) {
+            throw new Error('不支持的数据帧');
+        }
+        const kind = KINDS[view.getUint8(5)];
+        const dtype = DTYPES[view.getUint8(6)];
+        const flags = view.getUint8(7);
+        const numChannels = view.getUint16(8, true);
+        const metaLength = view.getUint32(10, true);
+        const seq = Number(view.getBigUint64(14, true));
+        const startIndex = Number(view.getBigInt64(22, true));
+        const points = view.getUint32(30, true);
+        const sampleRate = view.getFloat64(34, true);
+        const timestamp = view.getFloat64(42, true);
+
+        let offset = HEADER_SIZE;
+        const channels = [];
+        for (let i = 0; i < numChannels; i++) {
+            channels.push(view.getUint16(offset + 2 * i, true));
+        }
+        offset += 2 * numChannels;
+        const meta = JSON.parse(new TextDecoder().decode(new Uint8Array(buffer, offset, metaLength)));
+        offset = align4(offset + metaLength);
+
+        const channelData = {};
+        if (dtype === 'int16') {
+            const scales = new Float32Array(buffer, offset, 2 * numChannels);
+            offset += 8 * numChannels;
+            const samples = new Int16Array(buffer, offset, numChannels * points);
+            channels.forEach((ch, i) => {
+                const base = scales[2 * i], scale = scales[2 * i + 1];
+                const values = new Array(points);
+                for (let j = 0; j < points; j++) {
+                    values[j] = base + samples[i * points + j] * scale;
+                }
+                channelData[ch] = values;
+            });
+        } else {
+            const samples = new Float32Array(buffer, offset, numChannels * points);
+            channels.forEach((ch, i) => {
+                channelData[ch] = Array.from(samples.subarray(i * points, (i + 1) * points));
+            });
+        }
+
+        return {
+            type: kind,
+            data: Object.assign(meta, {
+                seq: seq,
+                start_index: startIndex,
+                points_per_channel: points,
+                sample_rate: sampleRate,
+                timestamp: timestamp,
+                enabled_channels: channels,
+                channel_data: channelData,
+                is_final: (flags & FLAG_FINAL) !== 0,
+                calibrated: (flags & FLAG_CALIBRATED) !== 0,
+                dtype: dtype
+            })
+        };
+    }
+
+    function daqTimeAxis(data) {
+        if (Array.isArray(data.time_axis)) {
+            return data.time_axis; // 旧版消息自带时间轴
+        }
+        const points = data.points_per_channel || 0;
+        const start = data.time_start_index !== undefined ? data.time_start_index : (data.start_index || 0);
+        const dt = data.dt !== undefined ? data.dt : (data.sample_rate ? 1 / data.sample_rate : 0);
+        const timeAxis = new Array(points);
+        for (let j = 0; j < points; j++) {
+            timeAxis[j] = (start + j) * dt;
+        }
+        return timeAxis;
+    }
+
+    global.decodeDaqFrame = decodeDaqFrame;
+    global.daqTimeAxis = daqTimeAxis;
+})(window);
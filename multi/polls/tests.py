@@ -1,3 +1,1015 @@
-from django.test import TestCase
+"""
+采集链路（polls/dap_*）的单元测试：只用 numpy 与模拟采集卡，不访问数据库
 
-# Create your tests here.
+    python manage.py test polls
+"""
+import os
+import json
+import time
+import asyncio
+import tempfile
+import threading
+from unittest import mock
+
+import numpy as np
+from channels.layers import get_channel_layer
+from channels.testing import WebsocketCommunicator
+from django.test import SimpleTestCase, override_settings
+
+from . import dap_hub
+from .consumers import SignalAcquisitionConsumer
+from .consumers_monitor import SignalMonitorConsumer
+from .dap_async import AsyncStream
+from .dap_decimate import DecimationChain, EnvelopeDecimator, RateGroupSplitter, split_factor
+from .dap_driver import USB5121Driver
+from .dap_frame import FRAME_HEADER, INT16_FULL_SCALE, decode_frame, encode_frame
+from .dap_hub import StreamView
+from .dap_integrity import StreamGap, StreamIntegrity
+from .dap_packet import AiPacket, coalesce_pending
+from .dap_queue import SpscQueue
+from .dap_recorder import AiRecorder, AiRecording, MultiRateRecorder, INDEX_RECORD
+from .dap_simulator import SimulatedUSB5000
+from .dap_trigger import TriggerCapture, TriggerCondition
+
+
+class SpscQueueTests(SimpleTestCase):
+    """有界SPSC队列的三种溢出策略"""
+
+    def test_drop_oldest_discards_head_and_reports_it(self):
+        dropped = []
+        queue = SpscQueue(2, SpscQueue.POLICY_DROP_OLDEST, on_drop=dropped.append)
+        results = [queue.put(item) for item in (1, 2, 3)]
+
+        self.assertEqual(results, [SpscQueue.QUEUED] * 3)
+        self.assertEqual(dropped, [1])
+        self.assertEqual([queue.get(0), queue.get(0)], [2, 3])
+        self.assertEqual(queue.metrics()['dropped_count'], 1)
+        self.assertEqual(queue.metrics()['high_watermark'], 2)
+
+    def test_block_times_out_and_drops_new_item(self):
+        dropped = []
+        queue = SpscQueue(1, SpscQueue.POLICY_BLOCK, block_timeout=0.01, on_drop=dropped.append)
+        self.assertEqual(queue.put('a'), SpscQueue.QUEUED)
+        self.assertEqual(queue.put('b'), SpscQueue.DROPPED)
+
+        self.assertEqual(dropped, ['b'])
+        self.assertEqual(queue.get(0), 'a')
+        self.assertEqual(queue.blocked_count, 1)
+        self.assertGreater(queue.blocked_seconds, 0)
+
+    def test_block_waits_for_consumer(self):
+        queue = SpscQueue(1, SpscQueue.POLICY_BLOCK, block_timeout=5.0)
+        queue.put('a')
+        consumer = threading.Timer(0.02, queue.get)
+        consumer.start()
+        self.assertEqual(queue.put('b'), SpscQueue.QUEUED)
+        consumer.join()
+
+        self.assertEqual(queue.get(0), 'b')
+        self.assertEqual(queue.dropped_count, 0)
+
+    def test_coalesce_merges_into_same_stream(self):
+        def merge(queued, item):
+            if queued[0] != item[0]:
+                raise ValueError("不同数据流")
+            return queued[0], queued[1] + item[1]
+
+        queue = SpscQueue(2, SpscQueue.POLICY_COALESCE, merge=merge)
+        queue.put(('a', [1]))
+        queue.put(('b', [2]))
+        # 队尾是b流，a流的新数据向前合并到a流最后一项
+        self.assertEqual(queue.put(('a', [3])), SpscQueue.COALESCED)
+        self.assertEqual(queue.put(('b', [4])), SpscQueue.COALESCED)
+
+        self.assertEqual([queue.get(0), queue.get(0)], [('a', [1, 3]), ('b', [2, 4])])
+        self.assertEqual(queue.coalesced_count, 2)
+        self.assertEqual(queue.dropped_count, 0)
+
+    def test_coalesce_drops_when_nothing_merges(self):
+        def merge(queued, item):
+            raise ValueError("不可合并")
+
+        dropped = []
+        queue = SpscQueue(1, SpscQueue.POLICY_COALESCE, merge=merge, on_drop=dropped.append)
+        queue.put(1)
+        self.assertEqual(queue.put(2), SpscQueue.DROPPED)
+        self.assertEqual(dropped, [2])
+        self.assertEqual(queue.get(0), 1)
+
+    def test_close_drains_then_returns_none(self):
+        queue = SpscQueue(4)
+        queue.put(1)
+        queue.close()
+
+        self.assertEqual(queue.put(2), SpscQueue.DROPPED)
+        self.assertEqual(queue.get(0), 1)
+        self.assertIsNone(queue.get(0))
+        self.assertTrue(queue.drained())
+
+    def test_invalid_configuration(self):
+        with self.assertRaises(ValueError):
+            SpscQueue(0)
+        with self.assertRaises(ValueError):
+            SpscQueue(1, 'unknown')
+        with self.assertRaises(ValueError):
+            SpscQueue(1, SpscQueue.POLICY_COALESCE)
+
+
+class StreamIntegrityTests(SimpleTestCase):
+    """按包序号与样本序号核算数据流连续性"""
+
+    def test_contiguous_stream_is_lossless(self):
+        integrity = StreamIntegrity('test')
+        for seq in range(3):
+            self.assertIsNone(integrity.observe(seq, seq * 100, 100))
+        metrics = integrity.metrics()
+        self.assertTrue(metrics['lossless'])
+        self.assertEqual((metrics['packets'], metrics['points']), (3, 300))
+
+    def test_sample_gap_is_recorded(self):
+        integrity = StreamIntegrity('test')
+        integrity.observe(0, 0, 100)
+        gap = integrity.observe(3, 300, 100)
+
+        self.assertEqual((gap.start_index, gap.points, gap.lost_packets, gap.reason),
+                         (100, 200, 2, StreamGap.MISSING))
+        self.assertFalse(integrity.lossless)
+        self.assertEqual(integrity.gap_points, 200)
+
+    def test_merged_packets_and_restarts_are_not_gaps(self):
+        integrity = StreamIntegrity('test')
+        integrity.observe(0, 0, 100)
+        integrity.observe(3, 100, 300)  # 三个数据包合并为一个，样本连续
+        integrity.observe(4, 0, 100)  # 连发单次采集的下一发
+
+        self.assertTrue(integrity.lossless)
+        self.assertEqual(integrity.merged_packets, 2)
+        self.assertEqual(integrity.restarts, 1)
+
+    def test_recorded_gap_is_not_counted_twice(self):
+        integrity = StreamIntegrity('test')
+        integrity.observe(0, 0, 100)
+        integrity.record_gap(100, 50, StreamGap.FIFO_OVERRUN, seq=1)
+        self.assertIsNone(integrity.observe(1, 150, 100))
+
+        self.assertEqual((integrity.gap_count, integrity.gap_points), (1, 50))
+        self.assertEqual(integrity.gaps[0].reason, StreamGap.FIFO_OVERRUN)
+
+    def test_streams_are_checked_separately(self):
+        integrity = StreamIntegrity('test')
+        integrity.observe(0, 0, 1000, stream=(0, 1))
+        integrity.observe(0, 0, 10, stream=(2,))
+        integrity.observe(1, 1000, 1000, stream=(0, 1))
+        integrity.observe(1, 10, 10, stream=(2,))
+        self.assertTrue(integrity.lossless)
+
+    def test_drops_are_accounted_by_reason(self):
+        integrity = StreamIntegrity('test')
+        integrity.drop(100, 'queue')
+        integrity.drop(50, 'queue')
+        metrics = integrity.metrics()
+
+        self.assertFalse(metrics['lossless'])
+        self.assertEqual((metrics['dropped_packets'], metrics['dropped_points']), (2, 150))
+        self.assertEqual(metrics['drop_reasons'], {'queue': 2})
+
+
+class FifoOverrunTests(SimpleTestCase):
+    """读取线程停顿使模拟采集卡FIFO溢出：驱动记录的缺口应与模拟器丢弃的点数一致"""
+
+    SAMPLE_RATE = 50000
+    CHANNELS = 2
+    FIFO_POINTS = 20000  # 每通道10000点，即0.2秒
+
+    def test_overrun_gap_matches_lost_points(self):
+        simulator = SimulatedUSB5000(fifo_points=self.FIFO_POINTS, seed=0)
+        driver = USB5121Driver(backend=simulator)
+        driver.ai_fifo_points = self.FIFO_POINTS
+        self.assertTrue(driver.open_device())
+        for ch in range(self.CHANNELS):
+            driver.configure_ai_channel(ch, True, 10.0)
+        driver.set_ai_sample_rate(self.SAMPLE_RATE)
+        driver.set_ai_sample_mode(USB5121Driver.MODE_CONTINUOUS)
+
+        packets = []
+        self.assertTrue(driver.start_continuous_acquisition(
+            lambda packet: packets.append((packet.start_index, packet.points_per_channel))))
+        try:
+            time.sleep(0.3)
+            # 占住模拟采集卡的锁，读取线程停顿0.5秒（FIFO只能容纳0.2秒）
+            with simulator.devices[0].lock:
+                time.sleep(0.5)
+            time.sleep(0.3)
+        finally:
+            driver.stop_continuous_acquisition()
+        stats = simulator.get_sim_stats(0)
+        integrity = driver.get_integrity_metrics()
+        driver.close_device()
+
+        lost = stats['lost_points'] // self.CHANNELS
+        self.assertEqual(stats['overrun_count'], 1)
+        reader = integrity['reader']
+        self.assertEqual(reader['gap_count'], 1)
+        gap = reader['gaps'][0]
+        self.assertEqual(gap['reason'], StreamGap.FIFO_OVERRUN)
+        # 缺口由采样时钟推算，允许少量时钟误差
+        self.assertAlmostEqual(gap['points'], lost, delta=max(50, lost // 50))
+
+        # 送达的数据在缺口处样本序号跳变恰好为缺口长度，其余连续
+        jumps = [(a[0] + a[1], b[0] - (a[0] + a[1])) for a, b in zip(packets, packets[1:]) if b[0] != a[0] + a[1]]
+        self.assertEqual(jumps, [(gap['start_index'], gap['points'])])
+        self.assertEqual(integrity['delivery']['gap_points'], gap['points'])
+        end_index = packets[-1][0] + packets[-1][1]
+        self.assertEqual(end_index, stats['read_points'] // self.CHANNELS + gap['points'])
+
+
+def split_blocks(points: int, rng: np.random.Generator, max_block: int = 700):
+    """把 [0, points) 随机切成若干数据块，返回各块的 (起点, 终点)"""
+    edges = [0]
+    while edges[-1] < points:
+        edges.append(min(points, edges[-1] + int(rng.integers(1, max_block))))
+    return list(zip(edges[:-1], edges[1:]))
+
+
+class DecimationChainTests(SimpleTestCase):
+    """多相FIR流式抽取：分块处理与整段处理结果一致，输出样本序号连续"""
+
+    def test_split_factor(self):
+        self.assertEqual(split_factor(100), [5, 5, 4])
+        self.assertEqual(split_factor(8), [8])
+        self.assertEqual(split_factor(22), [11, 2])
+
+    def test_streaming_matches_one_shot(self):
+        rng = np.random.default_rng(0)
+        signal = rng.standard_normal((2, 5000)).astype(np.float32)
+        for factor in (4, 10, 100):
+            expected, first = DecimationChain(factor).process(signal, 0, final=True)
+            self.assertEqual(first, 0)
+            self.assertEqual(expected.shape, (2, -(-signal.shape[1] // factor)))
+
+            chain = DecimationChain(factor)
+            outputs, next_index = [], 0
+            blocks = split_blocks(signal.shape[1], rng)
+            for i, (start, end) in enumerate(blocks):
+                out, index = chain.process(signal[:, start:end], start, final=i == len(blocks) - 1)
+                if out.shape[1]:
+                    self.assertEqual(index, next_index)
+                    next_index += out.shape[1]
+                outputs.append(out)
+            np.testing.assert_allclose(np.concatenate(outputs, axis=1), expected, atol=1e-5)
+
+    def test_dc_gain_and_alias_rejection(self):
+        factor, rate = 10, 10000
+        t = np.arange(20000) / rate
+        chain = DecimationChain(factor)
+        dc, _ = chain.process(np.full((1, t.size), 2.5, dtype=np.float32), 0, final=True)
+        np.testing.assert_allclose(dc, 2.5, rtol=1e-4)
+
+        # 高于输出奈奎斯特频率(500Hz)的分量应被滤除
+        tone = np.sin(2 * np.pi * 3100 * t).astype(np.float32)[None, :]
+        out, _ = chain.process(tone, 0, final=True)
+        self.assertLess(np.abs(out[:, 100:-100]).max(), 1e-3)
+
+    def test_discontinuity_restarts_filter(self):
+        block = np.ones((1, 1000), dtype=np.float32)
+        chain = DecimationChain(10)
+        chain.process(block, 0)
+        out, first = chain.process(block * 3, 5000)
+        self.assertEqual(first, 500)
+        np.testing.assert_allclose(out, 3, rtol=1e-4)
+
+
+class RateGroupSplitterTests(SimpleTestCase):
+    """按速率组拆分数据包"""
+
+    def test_groups_split_and_decimate(self):
+        splitter = RateGroupSplitter({100: [2]}, (0, 1, 2), 1000)
+        self.assertTrue(splitter.active)
+        data = np.vstack([np.full(500, value, dtype=np.float32) for value in (0.0, 1.0, 2.0)])
+        packets = splitter.split(AiPacket(data, (0, 1, 2), 0, 1000, 0.0, seq=7))
+
+        self.assertEqual([(p.channels, p.sample_rate, p.seq) for p in packets],
+                         [((0, 1), 1000, 7), ((2,), 100, 7)])
+        np.testing.assert_array_equal(packets[0].data, data[:2])
+        self.assertEqual(packets[1].start_index, 0)
+
+    def test_rejects_disabled_channels_and_bad_rates(self):
+        with self.assertRaises(ValueError):
+            RateGroupSplitter({100: [5]}, (0, 1), 1000)
+        with self.assertRaises(ValueError):
+            RateGroupSplitter({300: [1]}, (0, 1), 1000)
+
+
+class _OverwrittenBlock:
+    """环形缓冲区中已被覆盖的槽位"""
+
+    def is_valid(self) -> bool:
+        return False
+
+
+def make_packet(seq: int, start_index: int, points: int = 100, channels=(0, 1), sample_rate: int = 1000,
+                **kwargs) -> AiPacket:
+    """数据值为样本序号（各通道相差1000）的测试数据包"""
+    index = np.arange(start_index, start_index + points, dtype=np.float32)
+    data = np.vstack([index + 1000 * i for i in range(len(channels))])
+    return AiPacket(data, channels, start_index, sample_rate, float(seq), seq=seq, **kwargs)
+
+
+class CoalescingStreamTests(SimpleTestCase):
+    """发送队列的合并背压：消费者落后时连续的数据包合并为一个更大的数据块"""
+
+    def test_coalesce_pending_merges_contiguous_packets(self):
+        merged, extra = coalesce_pending((make_packet(1, 0), {'time_start_index': 50, 'packet_id': 1}),
+                                         (make_packet(2, 100), {'time_start_index': 150, 'packet_id': 2}))
+        self.assertEqual((merged.seq, merged.start_index, merged.points_per_channel), (2, 0, 200))
+        np.testing.assert_array_equal(merged.data[1], np.arange(1000, 1200))
+        self.assertEqual(extra, {'time_start_index': 50, 'packet_id': 2, 'coalesced': 1})
+
+    def test_coalesce_pending_refuses(self):
+        queued = (make_packet(1, 0), {})
+        self.assertIsNone(coalesce_pending(queued, (make_packet(2, 150), {})))  # 样本不连续
+        self.assertIsNone(coalesce_pending(queued, (make_packet(2, 100, channels=(0,)), {})))  # 通道不同
+        self.assertIsNone(coalesce_pending(queued, (make_packet(2, 100, points=500), {}), max_seconds=0.5))
+        self.assertIsNone(coalesce_pending((make_packet(1, 0, is_final=True), {}), (make_packet(2, 100), {})))
+        stale = (make_packet(1, 0, block=_OverwrittenBlock()), {})
+        self.assertIsNone(coalesce_pending(stale, (make_packet(2, 100), {})))
+
+    def test_slow_consumer_receives_larger_blocks(self):
+        async def run():
+            stream = AsyncStream(maxlen=4, merge=coalesce_pending)
+            producer = threading.Thread(target=lambda: [stream.publish((make_packet(seq, seq * 100), {}))
+                                                        for seq in range(10)])
+            producer.start()
+            producer.join()
+            stream.close()
+            return [item async for item in stream], stream.metrics()
+
+        items, metrics = asyncio.run(run())
+        # 每个合并后的数据块最长0.5秒（500点）
+        self.assertEqual([(packet.seq, packet.start_index, packet.points_per_channel, extra['coalesced'])
+                          for packet, extra in items], [(4, 0, 500, 4), (9, 500, 500, 4)])
+        self.assertEqual((metrics['published'], metrics['coalesced'], metrics['dropped']), (10, 8, 0))
+
+    def test_unmergeable_items_drop_oldest(self):
+        async def run():
+            dropped = []
+            stream = AsyncStream(maxlen=2, merge=coalesce_pending, on_drop=dropped.append)
+            for seq in range(4):
+                stream.publish((make_packet(seq, seq * 200), {}))  # 相邻数据包之间都有缺口
+            stream.close()
+            return [item async for item in stream], dropped, stream.metrics()
+
+        items, dropped, metrics = asyncio.run(run())
+        self.assertEqual([packet.seq for packet, _ in items], [2, 3])
+        self.assertEqual([packet.seq for packet, _ in dropped], [0, 1])
+        self.assertEqual((metrics['dropped'], metrics['coalesced'], metrics['high_watermark']), (2, 0, 2))
+
+
+class FrameRoundTripTests(SimpleTestCase):
+    """数据消息的三种编码（JSON、float32帧、int16帧）编码后解码应还原数据与元数据"""
+
+    EXTRA = {'packet_id': 42, 'time_start_index': 1200, 'dt': 0.0001}
+
+    def make_packet(self, **kwargs) -> AiPacket:
+        rng = np.random.default_rng(1)
+        data = (rng.standard_normal((3, 257)) * [[0.5], [3.0], [8.0]]).astype(np.float32)
+        data[2] = 1.25  # 常量通道
+        options = dict(seq=9, remaining_points=64, is_final=True, oneshot_progress=100, total_points=1457,
+                       units=('V', 'g', 'mm/s'))
+        options.update(kwargs)
+        return AiPacket(data, (3, 7, 12), 1200, 10000, 1700000000.25, **options)
+
+    def assert_metadata(self, decoded, packet: AiPacket):
+        self.assertEqual(decoded['type'], 'acquisition_data')
+        self.assertEqual(decoded['enabled_channels'], list(packet.channels))
+        for key in ('seq', 'start_index', 'points_per_channel', 'sample_rate', 'timestamp', 'remaining_points',
+                    'is_final', 'oneshot_progress', 'total_points'):
+            self.assertEqual(decoded[key], getattr(packet, key), key)
+        self.assertEqual(decoded['calibrated'], packet.units is not None)
+        self.assertEqual(decoded['units'], {'3': 'V', '7': 'g', '12': 'mm/s'} if packet.units else None)
+        for key, value in self.EXTRA.items():
+            self.assertEqual(decoded[key], value)
+
+    def test_header_layout(self):
+        # static/js/daq_frame.js 按50字节帧头解码
+        self.assertEqual(FRAME_HEADER.format, '<4sBBBBHIQqIdd')
+        self.assertEqual(FRAME_HEADER.size, 50)
+
+    def test_json_round_trip(self):
+        packet = self.make_packet()
+        payload = packet.to_dict()
+        payload.update(self.EXTRA)
+        decoded = json.loads(json.dumps({'type': 'acquisition_data', 'data': payload}))
+        data = dict(decoded['data'], type=decoded['type'])
+
+        self.assert_metadata(data, packet)
+        for i, ch in enumerate(packet.channels):
+            np.testing.assert_array_equal(np.array(data['channel_data'][str(ch)], dtype=np.float32), packet.data[i])
+
+    def test_float32_round_trip(self):
+        packet = self.make_packet()
+        frame = encode_frame(packet, 'acquisition_data', 'float32', self.EXTRA)
+        decoded = decode_frame(frame)
+
+        self.assertEqual(decoded['dtype'], 'float32')
+        self.assert_metadata(decoded, packet)
+        for i, ch in enumerate(packet.channels):
+            np.testing.assert_array_equal(decoded['channel_data'][str(ch)], packet.data[i])
+        # 帧头 + 通道号 + 元数据（4字节对齐）之后每样本4字节
+        self.assertEqual(len(frame) % 4, 0)
+        self.assertGreaterEqual(len(frame) - packet.data.nbytes, FRAME_HEADER.size)
+
+    def test_int16_round_trip(self):
+        packet = self.make_packet(units=None, is_final=False)
+        decoded = decode_frame(encode_frame(packet, 'acquisition_data', 'int16', self.EXTRA))
+
+        self.assertEqual(decoded['dtype'], 'int16')
+        self.assert_metadata(decoded, packet)
+        for i, ch in enumerate(packet.channels):
+            values = packet.data[i]
+            resolution = max(float(values.max() - values.min()) / (2 * INT16_FULL_SCALE), 1e-6)
+            np.testing.assert_allclose(decoded['channel_data'][str(ch)], values, atol=resolution)
+        np.testing.assert_allclose(decoded['channel_data']['12'], 1.25)
+
+    def test_empty_packet_and_monitor_kind(self):
+        packet = AiPacket(np.zeros((2, 0), dtype=np.float32), (0, 1), 0, 1000, 0.0, seq=3, is_final=True)
+        for dtype in ('float32', 'int16'):
+            decoded = decode_frame(encode_frame(packet, 'monitor_data', dtype))
+            self.assertEqual((decoded['type'], decoded['points_per_channel'], decoded['is_final']),
+                             ('monitor_data', 0, True))
+            self.assertEqual(decoded['channel_data']['1'].shape, (0,))
+
+    def test_overwritten_slot_and_invalid_input(self):
+        stale = self.make_packet(block=_OverwrittenBlock())
+        self.assertIsNone(encode_frame(stale))
+        self.assertIsNone(stale.to_dict())
+        with self.assertRaises(ValueError):
+            encode_frame(self.make_packet(), dtype='float64')
+        with self.assertRaises(ValueError):
+            decode_frame(b'JUNK' + bytes(FRAME_HEADER.size))
+
+
+def reference_envelope(signal: np.ndarray, start_index: int, bucket: int) -> np.ndarray:
+    """逐桶计算的 min/max 包络：桶边界对齐到 bucket 的整数倍样本序号"""
+    edges = sorted({0, signal.shape[1]} | {i - start_index for i in range(0, start_index + signal.shape[1], bucket)
+                                          if i > start_index})
+    out = []
+    for lo, hi in zip(edges[:-1], edges[1:]):
+        out.append(signal[:, lo:hi].min(axis=1))
+        out.append(signal[:, lo:hi].max(axis=1))
+    return np.stack(out, axis=1)
+
+
+class EnvelopeDecimatorTests(SimpleTestCase):
+    """显示用 min/max 包络：分块处理与整段处理一致，输出序号连续"""
+
+    def test_one_shot_matches_reference(self):
+        signal = np.random.default_rng(2).standard_normal((3, 1003)).astype(np.float32)
+        for start_index in (0, 37):
+            out, first = EnvelopeDecimator(50).process(signal, start_index, final=True)
+            self.assertEqual(first, 2 * (start_index // 50))
+            np.testing.assert_array_equal(out, reference_envelope(signal, start_index, 50))
+
+    def test_streaming_matches_one_shot(self):
+        rng = np.random.default_rng(3)
+        signal = rng.standard_normal((2, 6000)).astype(np.float32)
+        for bucket in (1, 7, 100):
+            expected, _ = EnvelopeDecimator(bucket).process(signal, 0, final=True)
+            decimator = EnvelopeDecimator(bucket)
+            outputs, next_index = [], 0
+            blocks = split_blocks(signal.shape[1], rng)
+            for i, (start, end) in enumerate(blocks):
+                out, index = decimator.process(signal[:, start:end], start, final=i == len(blocks) - 1)
+                if out.shape[1]:
+                    self.assertEqual(index, next_index)
+                    next_index += out.shape[1]
+                outputs.append(out)
+            np.testing.assert_array_equal(np.concatenate(outputs, axis=1), expected)
+
+    def test_partial_bucket_waits_for_next_block(self):
+        decimator = EnvelopeDecimator(100)
+        out, _ = decimator.process(np.arange(60, dtype=np.float32)[None, :], 0)
+        self.assertEqual(out.shape, (1, 0))
+        out, first = decimator.process(np.arange(60, 200, dtype=np.float32)[None, :], 60)
+        self.assertEqual(first, 0)
+        np.testing.assert_array_equal(out, [[0, 99, 100, 199]])
+
+    def test_discontinuity_drops_partial_bucket(self):
+        decimator = EnvelopeDecimator(10)
+        decimator.process(np.full((1, 15), 9.0, dtype=np.float32), 0)
+        out, first = decimator.process(np.arange(20, dtype=np.float32)[None, :], 100)
+        self.assertEqual(first, 20)
+        np.testing.assert_array_equal(out, [[0, 9, 10, 19]])
+
+    def test_stream_view(self):
+        full = StreamView()
+        self.assertEqual((full.key, full.bucket(10000), full.rows((0, 1))), ('', 1, None))
+
+        view = StreamView([3, 1, 1], 2.0, 800)
+        self.assertEqual(view.channels, (1, 3))
+        self.assertEqual(view.key, 'ma.p2500000')
+        self.assertEqual(view.bucket(100000), 250)
+        self.assertEqual(view.bucket(100), 1)  # 每像素不足一个样本时不抽取
+        self.assertEqual(view.rows((0, 1, 2, 3)), [1, 3])
+        self.assertIsNone(view.rows((1, 3)))
+        self.assertEqual(view.to_dict(), {'channels': [1, 3], 'window_s': 2.0, 'width': 800})
+        # 像素时长相同的视图共用一个广播组与包络
+        self.assertEqual(StreamView([1, 3], 1.0, 400).key, view.key)
+
+        for args in (([], None, None), ([-1], None, None), (None, 0, 800), (None, 1.0, 0)):
+            with self.assertRaises(ValueError):
+                StreamView(*args)
+
+
+
+class RecorderTests(SimpleTestCase):
+    """落盘记录的文件格式：写入后由 AiRecording 读取、导出CSV并由索引核对缺口"""
+
+    BLOCK = 100
+    CHANNELS = (0, 3)
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.path = os.path.join(self.tmp.name, 'run', 'record.dat')
+
+    def record(self, recorder, packets):
+        self.assertTrue(recorder.open())
+        for packet in packets:
+            self.assertTrue(recorder.write(packet))
+        return recorder.close()
+
+    def packets_with_gap(self, count: int = 7, gap_at: int = 4, gap_points: int = 250):
+        """count 个数据块，第 gap_at 块之前FIFO溢出丢失 gap_points 点"""
+        packets = []
+        for seq in range(count):
+            start_index = seq * self.BLOCK + (gap_points if seq >= gap_at else 0)
+            packets.append(make_packet(seq, start_index, self.BLOCK, self.CHANNELS))
+        return packets
+
+    def test_round_trip_with_segment_rollover_and_gap(self):
+        packets = self.packets_with_gap()
+        block_bytes = len(self.CHANNELS) * self.BLOCK * 4
+        recorder = AiRecorder(self.path, {'task': 'test'}, segment_bytes=2 * block_bytes)
+        self.assertTrue(recorder.open())
+        for packet in packets[:4]:
+            self.assertTrue(recorder.write(packet))
+        recorder.mark_gap(StreamGap(4 * self.BLOCK, 250, 4, 0, StreamGap.FIFO_OVERRUN))
+        for packet in packets[4:]:
+            self.assertTrue(recorder.write(packet))
+        metrics = recorder.close()
+
+        self.assertEqual((metrics['points_per_channel'], metrics['blocks'], metrics['segments']), (700, 7, 4))
+        self.assertEqual(metrics['bytes_written'], 7 * block_bytes)
+        self.assertEqual(os.path.getsize(recorder.index_path), 7 * INDEX_RECORD.size)
+        self.assertEqual(sorted(os.listdir(os.path.dirname(recorder.base))),
+                         ['record.0000.dat', 'record.0001.dat', 'record.0002.dat', 'record.0003.dat',
+                          'record.idx', 'record.json'])
+
+        recording = AiRecording(recorder.index_path)
+        self.assertTrue(recording.info['closed'])
+        self.assertEqual(recording.info['metadata'], {'task': 'test'})
+        self.assertEqual(recording.info['integrity']['gap_count'], 1)
+        self.assertEqual((recording.channels, recording.sample_rate, recording.points_per_channel),
+                         (self.CHANNELS, 1000, 700))
+        self.assertEqual(list(recording.index['segment']), [0, 0, 1, 1, 2, 2, 3])
+        self.assertEqual([start for start, _ in recording.iter_blocks()], list(range(0, 700, self.BLOCK)))
+
+        # 记录内样本连续存放，缺口只体现在采集内样本序号上
+        expected = np.hstack([packet.data for packet in packets])
+        np.testing.assert_array_equal(recording.read(), expected)
+        np.testing.assert_array_equal(recording.read(150, 300), expected[:, 150:450])
+        self.assertEqual(recording.read(650, 500).shape, (2, 50))
+
+        gaps = recording.gaps()
+        self.assertEqual([(gap.start_index, gap.points, gap.seq) for gap in gaps], [(400, 250, 4)])
+        self.assertFalse(recording.is_lossless())
+
+        csv_path = os.path.join(self.tmp.name, 'record.csv')
+        self.assertEqual(recording.export_csv(csv_path, channel_order=[3, 0, 7]), 700)
+        with open(csv_path, encoding='utf-8') as f:
+            self.assertEqual(f.readline().strip(), 'Time(s),CH3,CH0,CH7')
+        table = np.loadtxt(csv_path, delimiter=',', skiprows=1)
+        self.assertEqual(table.shape, (700, 4))
+        np.testing.assert_allclose(table[:, 0], np.arange(700) / 1000)
+        np.testing.assert_array_equal(table[:, 1], expected[1])
+        np.testing.assert_array_equal(table[:, 2], expected[0])
+        self.assertTrue(np.isnan(table[:, 3]).all())
+        recording.close()
+
+    def test_interrupted_recording_ignores_incomplete_block(self):
+        recorder = AiRecorder(self.path)
+        self.record(recorder, [make_packet(seq, seq * self.BLOCK, self.BLOCK, self.CHANNELS) for seq in range(3)])
+        with open(recorder.segment_path(0), 'r+b') as f:
+            f.truncate(os.path.getsize(recorder.segment_path(0)) - 4)
+
+        recording = AiRecording(recorder.base)
+        self.assertEqual(len(recording.index), 2)
+        self.assertEqual(recording.points_per_channel, 200)
+        self.assertTrue(recording.is_lossless())
+
+    def test_mismatched_block_is_rejected(self):
+        recorder = AiRecorder(self.path)
+        self.assertTrue(recorder.open())
+        self.assertTrue(recorder.write(make_packet(0, 0, self.BLOCK, self.CHANNELS)))
+        self.assertFalse(recorder.write(make_packet(1, self.BLOCK, self.BLOCK, (0, 1))))
+        self.assertTrue(recorder.write(make_packet(2, 2 * self.BLOCK, self.BLOCK, self.CHANNELS)))
+        metrics = recorder.close()
+
+        self.assertEqual((metrics['blocks'], metrics['rejected_blocks']), (2, 1))
+        recording = AiRecording(recorder.base)
+        self.assertEqual([(gap.start_index, gap.points) for gap in recording.gaps()], [(100, 100)])
+        self.assertFalse(recording.is_lossless())
+
+    def test_multi_rate_recorder_writes_one_recording_per_rate(self):
+        recorder = MultiRateRecorder(self.path)
+        packets = [make_packet(seq, seq * self.BLOCK, self.BLOCK, self.CHANNELS) for seq in range(3)]
+        packets += [make_packet(seq, seq * 10, 10, (5,), sample_rate=100) for seq in range(3)]
+        metrics = self.record(recorder, packets)
+
+        self.assertEqual(metrics['points_per_channel'], 300)
+        self.assertEqual([group['points_per_channel'] for group in metrics['groups']], [30])
+        slow = AiRecording(recorder.base + '_100Hz')
+        self.assertEqual((slow.channels, slow.sample_rate), ((5,), 100))
+        self.assertEqual(slow.info['metadata']['rate_group']['sample_rate'], 100)
+        np.testing.assert_array_equal(slow.read(), np.hstack([packet.data for packet in packets[3:]]))
+
+
+
+def capture_events(capture: TriggerCapture, data: np.ndarray, blocks, channels=(0,), sample_rate: int = 1000,
+                   start_index: int = 0):
+    """按 blocks（(起点, 终点) 列表）逐块送入触发采集器，返回分发的事件"""
+    events = []
+    capture.on_event = events.append
+    capture.start()
+    for seq, (lo, hi) in enumerate(blocks):
+        capture.process(AiPacket(data[:, lo:hi], channels, start_index + lo, sample_rate, float(seq), seq=seq))
+    capture.stop()
+    return events
+
+
+class TriggerCaptureTests(SimpleTestCase):
+    """软件触发：电平/边沿/窗口检测、回差重新布防、跨数据块的触发前数据、保持时间与数据不连续"""
+
+    PERIOD = 100  # 采样率1000Hz下10Hz正弦的周期点数
+
+    def sine(self, periods: int = 5, rows: int = 1) -> np.ndarray:
+        phase = 2 * np.pi * np.arange(periods * self.PERIOD) / self.PERIOD
+        return np.vstack([np.sin(phase) * (i + 1) for i in range(rows)]).astype(np.float32)
+
+    def test_rising_edge_once_per_period(self):
+        data = self.sine()
+        capture = TriggerCapture([TriggerCondition(0, threshold=0.5, hysteresis=0.1)], pre_points=20, post_points=30)
+        events = capture_events(capture, data, [(0, data.shape[1])])
+
+        # sin 在第9个样本首次≥0.5；每周期回到0.4以下后重新布防
+        self.assertEqual([e.trigger_index for e in events], [9 + k * self.PERIOD for k in range(5)])
+        self.assertEqual([e.seq for e in events], [1, 2, 3, 4, 5])
+        self.assertEqual(events[0].condition, 'CH0 上升沿≥0.5')
+        for event in events[1:]:
+            self.assertFalse(event.truncated)
+            np.testing.assert_array_equal(event.data, data[:, event.trigger_index - 20:event.trigger_index + 30])
+        self.assertEqual(capture.metrics()['events'], 5)
+
+    def test_streaming_matches_one_shot(self):
+        data = self.sine(periods=20, rows=2)
+        points = data.shape[1]
+
+        def run(blocks):
+            condition = TriggerCondition(1, slope=TriggerCondition.SLOPE_FALLING, threshold=-1.0, hysteresis=0.2)
+            return capture_events(TriggerCapture([condition], pre_points=45, post_points=60),
+                                  data, blocks, channels=(0, 1), start_index=1000)
+
+        one_shot = run([(0, points)])
+        # 最后一个事件到数据结束仍未采满
+        self.assertEqual([e.trigger_index for e in one_shot], [1059 + k * self.PERIOD for k in range(19)])
+        rng = np.random.default_rng(3)
+        for max_block in (8, 50, 300):
+            # 数据块比触发前点数短：触发前数据来自多个数据块的预触发缓冲区
+            streamed = run(split_blocks(points, rng, max_block))
+            self.assertEqual([e.trigger_index for e in streamed], [e.trigger_index for e in one_shot])
+            for a, b in zip(streamed, one_shot):
+                np.testing.assert_array_equal(a.data, b.data)
+                self.assertEqual(a.truncated, b.truncated)
+            trigger = streamed[3].trigger_index - 1000
+            np.testing.assert_array_equal(streamed[3].channel(0), data[0, trigger - 45:trigger + 60])
+
+    def test_hysteresis_suppresses_chatter(self):
+        data = np.array([[0, 0.6, 0.45, 0.6, 0.45, 0.6, 0.3, 0.6]], dtype=np.float32)
+
+        def triggers(hysteresis):
+            capture = TriggerCapture([TriggerCondition(0, threshold=0.5, hysteresis=hysteresis)],
+                                     pre_points=0, post_points=1)
+            return [e.trigger_index for e in capture_events(capture, data, [(0, 8)])]
+
+        self.assertEqual(triggers(0.0), [1, 3, 5, 7])
+        self.assertEqual(triggers(0.1), [1, 7])
+
+    def test_level_retriggers_after_holdoff(self):
+        data = np.ones((1, 50), dtype=np.float32)
+        capture = TriggerCapture([TriggerCondition(0, TriggerCondition.KIND_LEVEL, threshold=0.5)],
+                                 pre_points=0, post_points=10, holdoff_points=5)
+        events = capture_events(capture, data, [(0, 20), (20, 50)])
+
+        # 第45点触发的事件到数据结束仍未采满
+        self.assertEqual([e.trigger_index for e in events], [0, 15, 30])
+        self.assertTrue(capture.metrics()['capturing'])
+
+    def test_window_leave_and_enter(self):
+        data = np.zeros((2, 100), dtype=np.float32)
+        data[0, 50:60] = 1.0
+        data[1, :30] = 2.0
+        leave = TriggerCondition(0, TriggerCondition.KIND_WINDOW, low=-0.5, high=0.5)
+        enter = TriggerCondition(1, TriggerCondition.KIND_WINDOW, low=-0.5, high=0.5,
+                                 region=TriggerCondition.REGION_INSIDE)
+
+        events = capture_events(TriggerCapture([leave], pre_points=0, post_points=5), data, [(0, 100)], (0, 1))
+        self.assertEqual([(e.trigger_index, e.condition) for e in events], [(50, 'CH0 离开[-0.5, 0.5]')])
+        # 任一条件满足即触发，取最早的触发点
+        events = capture_events(TriggerCapture([leave, enter], pre_points=0, post_points=5), data, [(0, 100)],
+                                (0, 1))
+        self.assertEqual([(e.trigger_index, e.condition) for e in events],
+                         [(30, 'CH1 进入[-0.5, 0.5]'), (50, 'CH0 离开[-0.5, 0.5]')])
+
+    def test_truncated_pre_trigger_at_start(self):
+        data = self.sine(periods=1)
+        capture = TriggerCapture([TriggerCondition(0, threshold=0.5)], pre_points=20, post_points=10)
+        event, = capture_events(capture, data, [(0, 5), (5, 100)])
+
+        self.assertTrue(event.truncated)
+        self.assertTrue(np.isnan(event.data[0, :11]).all())
+        np.testing.assert_array_equal(event.data[0, 11:], data[0, :19])
+        self.assertIsNone(event.to_dict()['channel_data']['0'][0])
+
+    def test_discontinuity_discards_pending_event(self):
+        data = self.sine(periods=3)
+        capture = TriggerCapture([TriggerCondition(0, threshold=0.5)], pre_points=20, post_points=30)
+        # 第9点触发的事件采满前样本序号跳变
+        events = capture_events(capture, data, [(0, 20), (25, 300)])
+
+        metrics = capture.metrics()
+        self.assertEqual((metrics['discontinuities'], metrics['incomplete_events']), (1, 1))
+        # 跳变后重新布防，预触发缓冲区清空
+        self.assertEqual([e.trigger_index for e in events], [109, 209])
+        self.assertEqual([e.seq for e in events], [2, 3])
+        self.assertFalse(events[0].truncated)
+        np.testing.assert_array_equal(events[0].data, data[:, 89:139])
+
+    def test_invalid_configuration(self):
+        for kwargs in ({'kind': 'glitch'}, {'slope': 'up'}, {'region': 'edge'}, {'hysteresis': -1},
+                       {'kind': TriggerCondition.KIND_WINDOW, 'low': 1.0, 'high': 1.0}):
+            with self.assertRaises(ValueError):
+                TriggerCondition(0, **kwargs)
+        with self.assertRaises(ValueError):
+            TriggerCapture([])
+        with self.assertRaises(ValueError):
+            TriggerCapture([TriggerCondition(0)], post_points=0)
+        condition = TriggerCondition.from_config({'channel': '2', 'kind': 'level', 'threshold': 1.5, 'slope': None})
+        self.assertEqual((condition.channel, condition.kind, condition.threshold, condition.slope),
+                         (2, 'level', 1.5, 'rising'))
+
+
+IN_MEMORY_LAYERS = {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}}
+
+
+async def receive_messages(communicator: WebsocketCommunicator, seconds: float):
+    """收集一段时间内连接收到的JSON消息"""
+    messages = []
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + seconds
+    while loop.time() < deadline:
+        try:
+            output = await asyncio.wait_for(communicator.output_queue.get(), max(0.01, deadline - loop.time()))
+        except asyncio.TimeoutError:
+            break
+        if output.get('text'):
+            messages.append(json.loads(output['text']))
+    return messages
+
+
+async def close_hubs():
+    """关闭测试中创建的共享采集中心（模拟采集卡为进程内单例，测试之间不能遗留打开的设备）"""
+    async with dap_hub._lock():
+        for hub in list(dap_hub._hubs.values()):
+            await dap_hub._close_hub(hub)
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_LAYERS)
+@mock.patch.dict(os.environ, {'USB5121_BACKEND': 'simulated'})
+class SharedDeviceConsumerTests(SimpleTestCase):
+    """多个页面连接同一采集卡：后连接的页面加入进行中的采集，不重新打开设备"""
+
+    async def connect(self, consumer=SignalAcquisitionConsumer) -> WebsocketCommunicator:
+        communicator = WebsocketCommunicator(consumer.as_asgi(), '/ws/signal/')
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        return communicator
+
+    async def test_second_page_joins_running_acquisition(self):
+        first = await self.connect()
+        second = None
+        try:
+            for message in ({'type': 'open_device'},
+                            {'type': 'configure_channels', 'channels': [{'channel': 0, 'enabled': True},
+                                                                        {'channel': 1, 'enabled': True}]},
+                            {'type': 'configure_acquisition', 'config': {'mode': 0, 'sample_rate': 10000}},
+                            {'type': 'start_acquisition'}):
+                await first.send_json_to(message)
+            await receive_messages(first, 0.3)
+            hub = dap_hub._hubs[0]
+            self.assertTrue(hub.driver.is_acquiring)
+
+            # 页面连接后立即请求打开设备
+            second = await self.connect()
+            await second.send_json_to({'type': 'open_device'})
+            messages = await receive_messages(second, 0.5)
+
+            self.assertIn({'type': 'success', 'message': '设备打开成功'}, messages)
+            self.assertFalse([m for m in messages if m['type'] == 'error'])
+            self.assertTrue(any(m['type'] == 'acquisition_data' for m in messages))
+            self.assertTrue(hub.driver.is_acquiring)
+            self.assertEqual(hub.driver.driver.ai_layout().channels, (0, 1))
+            self.assertTrue(hub.driver.driver.get_integrity_metrics()['reader']['lossless'])
+        finally:
+            await first.disconnect()
+            if second is not None:
+                await second.disconnect()
+            await close_hubs()
+
+    async def test_monitor_page_joins_opened_device(self):
+        first = await self.connect()
+        monitor = await self.connect(SignalMonitorConsumer)
+        try:
+            await first.send_json_to({'type': 'open_device'})
+            await receive_messages(first, 0.2)
+            await monitor.send_json_to({'type': 'open_device'})
+            messages = await receive_messages(monitor, 0.2)
+
+            self.assertEqual([m['type'] for m in messages], ['success'])
+            self.assertTrue(dap_hub._hubs[0].driver.is_opened)
+        finally:
+            await first.disconnect()
+            await monitor.disconnect()
+            await close_hubs()
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_LAYERS)
+@mock.patch.dict(os.environ, {'USB5121_BACKEND': 'simulated'})
+class AcquisitionHubTests(SimpleTestCase):
+    """共享采集中心：订阅、按格式编码一次的广播、控制权与空闲关闭"""
+
+    async def subscribe(self, hub, layer, kind=dap_hub.KIND_ACQUISITION, data_format='json', view=None) -> str:
+        channel_name = await layer.new_channel()
+        await hub.subscribe(layer, channel_name, kind, data_format, view)
+        return channel_name
+
+    @staticmethod
+    def groups_of(layer, channel_name: str) -> set:
+        return {group for group, members in layer.groups.items() if channel_name in members}
+
+    async def test_subscribe_resubscribe_and_unsubscribe(self):
+        layer = get_channel_layer()
+        hub = await dap_hub.acquire_hub(0)
+        try:
+            viewer = await self.subscribe(hub, layer)
+            await hub.subscribe(layer, viewer, dap_hub.KIND_ACQUISITION, 'json')  # 重复订阅不变
+            self.assertEqual(hub.metrics(dap_hub.KIND_ACQUISITION)['subscribers'], 1)
+
+            # 改订监控数据的二进制帧：离开原广播组
+            await hub.subscribe(layer, viewer, dap_hub.KIND_MONITOR, 'int16')
+            self.assertEqual(hub.groups(dap_hub.KIND_ACQUISITION), {})
+            self.assertEqual(list(hub.groups(dap_hub.KIND_MONITOR)), [('int16', '')])
+            self.assertEqual(self.groups_of(layer, viewer), {hub.group_name(dap_hub.KIND_MONITOR, 'int16')})
+
+            with self.assertRaises(ValueError):
+                await hub.subscribe(layer, viewer, dap_hub.KIND_MONITOR, 'float64')
+
+            await hub.unsubscribe(layer, viewer)
+            self.assertEqual(hub.subscribers, {})
+            self.assertEqual(self.groups_of(layer, viewer), set())
+        finally:
+            await close_hubs()
+
+    async def test_each_format_is_encoded_once(self):
+        layer = get_channel_layer()
+        hub = await dap_hub.acquire_hub(0)
+        try:
+            json_viewers = [await self.subscribe(hub, layer) for _ in range(2)]
+            binary_viewers = [await self.subscribe(hub, layer, data_format='float32') for _ in range(2)]
+            envelope_viewer = await self.subscribe(hub, layer, view=StreamView([1], window_s=1.0, width=100))
+            encoded = []
+            encode = hub.encode
+            with mock.patch.object(hub, 'encode', lambda kind, fmt, *args: encoded.append(fmt) or encode(
+                    kind, fmt, *args)):
+                packet = make_packet(1, 0, points=200)
+                self.assertTrue(hub.publish(dap_hub.KIND_ACQUISITION, packet, {'packet_id': 1}))
+                messages = {name: await asyncio.wait_for(layer.receive(name), 1.0)
+                            for name in json_viewers + binary_viewers + [envelope_viewer]}
+
+            # 五个订阅者、三个 (格式, 视图)：每个编码一次
+            self.assertEqual(sorted(encoded), ['float32', 'json', 'json'])
+            texts = {messages[name]['text'] for name in json_viewers}
+            self.assertEqual(len(texts), 1)
+            self.assertEqual(json.loads(texts.pop())['data']['packet_id'], 1)
+            frames = {messages[name]['bytes'] for name in binary_viewers}
+            self.assertEqual(len(frames), 1)
+            np.testing.assert_array_equal(decode_frame(frames.pop())['channel_data']['1'], packet.data[1])
+
+            envelope = messages[envelope_viewer]
+            self.assertEqual((envelope['type'], envelope['seq'], envelope['points']), ('daq.block', 1, 200))
+            data = json.loads(envelope['text'])['data']
+            self.assertEqual(list(data['channel_data']), ['1'])
+            self.assertEqual(len(data['channel_data']['1']), 2 * 200 // 10)
+            self.assertEqual(hub.metrics(dap_hub.KIND_ACQUISITION)['integrity']['dropped_points'], 0)
+        finally:
+            await close_hubs()
+
+    async def test_control_is_held_by_the_starting_connection(self):
+        layer = get_channel_layer()
+        hub = await dap_hub.acquire_hub(0)
+        try:
+            controller, viewer = await self.subscribe(hub, layer), await self.subscribe(hub, layer)
+            self.assertTrue(hub.may_control(viewer))
+            self.assertTrue(await hub.open_device())
+            await hub.driver.configure_ai_channel(0, True, 10.0)
+
+            self.assertTrue(await hub.start_continuous_acquisition(controller))
+            self.assertEqual(hub.controller, controller)
+            # 采集中其他连接加入观看，不能取得控制权
+            self.assertTrue(await hub.start_continuous_acquisition(viewer))
+            self.assertEqual(hub.controller, controller)
+            self.assertFalse(hub.may_control(viewer))
+            self.assertFalse(hub.take_control(viewer))
+            hub.release_control(viewer)
+            self.assertEqual(hub.metrics(dap_hub.KIND_ACQUISITION)['controller'], controller)
+
+            # 控制者断开后控制权释放，采集继续
+            await hub.unsubscribe(layer, controller)
+            self.assertIsNone(hub.controller)
+            self.assertTrue(hub.driver.is_acquiring)
+            self.assertTrue(hub.take_control(viewer))
+        finally:
+            await close_hubs()
+
+    async def test_release_hub_closes_idle_device(self):
+        layer = get_channel_layer()
+        hub = await dap_hub.acquire_hub(0)
+        viewer = await self.subscribe(hub, layer)
+        self.assertTrue(await hub.open_device())
+        await dap_hub.release_hub(hub)
+        self.assertIn(0, dap_hub._hubs)  # 仍有订阅者
+
+        await hub.unsubscribe(layer, viewer)
+        await dap_hub.release_hub(hub)
+        self.assertNotIn(0, dap_hub._hubs)
+        self.assertFalse(hub.driver.is_opened)
+
+    @mock.patch.object(dap_hub, 'IDLE_SHUTDOWN_S', 0.2)
+    async def test_release_hub_keeps_acquisition_until_idle_timeout(self):
+        layer = get_channel_layer()
+        hub = await dap_hub.acquire_hub(0)
+        try:
+            viewer = await self.subscribe(hub, layer)
+            self.assertTrue(await hub.open_device())
+            await hub.driver.configure_ai_channel(0, True, 10.0)
+            self.assertTrue(await hub.start_continuous_acquisition(viewer))
+
+            # 刷新页面：空闲期内重新连接取消关闭
+            await hub.unsubscribe(layer, viewer)
+            await dap_hub.release_hub(hub)
+            self.assertIsNotNone(hub.idle_task)
+            self.assertIs(await dap_hub.acquire_hub(0), hub)
+            self.assertIsNone(hub.idle_task)
+            viewer = await self.subscribe(hub, layer)
+            await asyncio.sleep(0.3)
+            self.assertTrue(hub.driver.is_acquiring)
+
+            # 无人重新连接：超时后停止采集并关闭设备
+            await hub.unsubscribe(layer, viewer)
+            await dap_hub.release_hub(hub)
+            self.assertTrue(hub.driver.is_acquiring)
+            await asyncio.sleep(0.4)
+            self.assertNotIn(0, dap_hub._hubs)
+            self.assertFalse(hub.driver.is_acquiring or hub.driver.is_opened)
+        finally:
+            await close_hubs()
+
+    def test_stale_loop_hub_closes_device_before_replacing(self):
+        async def open_and_acquire(acquire: bool):
+            hub = await dap_hub.acquire_hub(0)
+            opened = await hub.open_device()
+            if acquire:
+                await hub.driver.configure_ai_channel(0, True, 10.0)
+                await hub.start_continuous_acquisition('viewer')
+            return hub, opened
+
+        try:
+            # 每次 asyncio.run 结束后旧中心的事件循环随之关闭，设备仍应可以再次打开
+            first, opened = asyncio.run(open_and_acquire(True))
+            self.assertTrue(opened and first.driver.is_acquiring)
+            second, opened = asyncio.run(open_and_acquire(False))
+            self.assertTrue(opened)
+            self.assertIsNot(second, first)
+            self.assertFalse(first.driver.is_opened or first.driver.is_acquiring)
+        finally:
+            asyncio.run(close_hubs())
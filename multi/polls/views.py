@@ -808,6 +808,33 @@ def detect_trigger_points(reference_signal, sampling_rate, threshold_ratio=0.5):
     return np.array(filtered_triggers)
 
 
+def export_monitor_recording(record_path, csv_path, channels):
+    """
+    由落盘记录流式导出CSV
+
+    Returns:
+        (导出的每通道点数, 由记录索引重新核对的完整性信息)
+    """
+    from .dap_recorder import AiRecording
+    record = AiRecording(record_path)
+    try:
+        total_points = record.export_csv(csv_path, channels)
+        # 由记录索引重新核对缺口，记录过程中驱动测得的缺口原因见记录元数据
+        integrity = dict(record.info.get('integrity') or {},
+                         recording_name=os.path.basename(record.base),
+                         index_gaps=[gap.to_dict() for gap in record.gaps()],
+                         lossless=record.is_lossless())
+    finally:
+        record.close()
+    logger.info(f"由落盘记录导出CSV: {record_path} -> {csv_path}, {total_points}点/通道")
+    return total_points, integrity
+
+
+def materialize_time_axis(time_base: dict) -> np.ndarray:
+    """由隐式时间基准 {'t0', 'dt', 'points'} 生成时间列（秒）"""
+    return time_base.get('t0', 0.0) + np.arange(int(time_base['points'])) * float(time_base['dt'])
+
+
 @csrf_exempt
 @require_http_methods(["POST"])
 def save_monitor_data(request):
@@ -826,8 +853,9 @@ def save_monitor_data(request):
         
         # 获取监控数据
         monitor_data = data.get('monitor_data', {})
-        time_axis = monitor_data.get('time_axis', [])
         channel_data = monitor_data.get('channel_data', {})
+        # 时间轴以 (t0, dt, 点数) 隐式传递，只在导出CSV时生成时间列
+        time_base = monitor_data.get('time_base')
         
         # 获取用户信息
         user_email = request.session.get('user_email', '')
@@ -842,67 +870,119 @@ def save_monitor_data(request):
         os.makedirs(csv_dir, exist_ok=True)
         csv_path = os.path.join(csv_dir, filename)
         
-        # 保存数据到CSV文件
-        import pandas as pd
-        
-        # 创建数据框
-        df_data = {'Time(s)': time_axis}
-        
-        # 添加调试信息，检查channel_data的键
-        logger.info(f"=== 数据传递调试 ===")
-        logger.info(f"enabled_channels: {enabled_channels}")
-        logger.info(f"channel_data键: {list(channel_data.keys())}")
-        logger.info(f"channel_data键类型: {[type(k) for k in channel_data.keys()]}")
-        
-        # 确保所有启用的通道都有数据列
-        for ch in enabled_channels:
-            logger.info(f"检查通道{ch}，类型: {type(ch)}")
-            # 尝试整数键和字符串键
-            ch_data = None
-            if ch in channel_data:
-                ch_data = channel_data[ch]
-                logger.info(f"找到整数键CH{ch}")
-            elif str(ch) in channel_data:
-                ch_data = channel_data[str(ch)]
-                logger.info(f"找到字符串键CH{ch}")
+        recording = data.get('recording')
+        integrity = dict(data.get('integrity') or {})
+        # 多速率采集：降速组各自导出 <CSV名>_<采样率>Hz.csv，主CSV只含以监控采样率采集的通道
+        rate_groups = (recording or {}).get('groups') or monitor_data.get('rate_groups') or []
+        grouped_channels = {int(ch) for group in rate_groups for ch in group['channels']}
+        main_channels = [ch for ch in enabled_channels if int(ch) not in grouped_channels]
+        csv_base = os.path.splitext(csv_path)[0]
+        group_files = []
+        if recording:
+            # 直接落盘记录：由记录文件按块流式导出CSV，数据不经过浏览器，内存占用与记录时长无关
+            from .consumers_monitor import monitor_recording_dir
+            record_dir = monitor_recording_dir()
+            total_points, integrity['recording'] = export_monitor_recording(
+                os.path.join(record_dir, os.path.basename(recording.get('name', ''))), csv_path, main_channels)
+            integrity['lossless'] = integrity['recording']['lossless']
+            for group in rate_groups:
+                group_csv = f"{csv_base}_{group['sample_rate']}Hz.csv"
+                points, group_integrity = export_monitor_recording(
+                    os.path.join(record_dir, os.path.basename(group['name'])), group_csv, group['channels'])
+                integrity['lossless'] = integrity['lossless'] and group_integrity['lossless']
+                group_files.append(dict(group, csv_file=os.path.basename(group_csv), points_per_channel=points,
+                                        integrity=group_integrity))
+        else:
+            # 保存数据到CSV文件
+            import pandas as pd
+        
+            # 创建数据框（兼容仍逐点传递 time_axis 的旧客户端）
+            time_axis = materialize_time_axis(time_base) if time_base else monitor_data.get('time_axis', [])
+            df_data = {'Time(s)': time_axis}
+        
+            # 添加调试信息，检查channel_data的键
+            logger.info(f"=== 数据传递调试 ===")
+            logger.info(f"enabled_channels: {enabled_channels}")
+            logger.info(f"channel_data键: {list(channel_data.keys())}")
+            logger.info(f"channel_data键类型: {[type(k) for k in channel_data.keys()]}")
+        
+            # 确保所有启用的通道都有数据列（降速组的通道另存）
+            for ch in main_channels:
+                logger.info(f"检查通道{ch}，类型: {type(ch)}")
+                # 尝试整数键和字符串键
+                ch_data = None
+                if ch in channel_data:
+                    ch_data = channel_data[ch]
+                    logger.info(f"找到整数键CH{ch}")
+                elif str(ch) in channel_data:
+                    ch_data = channel_data[str(ch)]
+                    logger.info(f"找到字符串键CH{ch}")
             
-            if ch_data:
-                logger.info(f"准备保存CH{ch}，数据长度: {len(ch_data)}")
                 if ch_data:
-                    logger.info(f"CH{ch} 前5个值: {ch_data[:5]}")
-                df_data[f'CH{ch}'] = ch_data
-            else:
-                # 如果某个启用的通道没有数据，用NaN填充
-                logger.info(f"CH{ch} 没有数据，用NaN填充")
-                df_data[f'CH{ch}'] = [float('nan')] * len(time_axis)
-        
-        # 添加调试信息
-        logger.info(f"保存CSV文件: {csv_path}")
-        logger.info(f"时间轴长度: {len(time_axis)}")
-        logger.info(f"启用通道: {enabled_channels}")
-        logger.info(f"数据列: {list(df_data.keys())}")
-        
-        df = pd.DataFrame(df_data)
-        
-        # 验证数据完整性
-        logger.info(f"DataFrame形状: {df.shape}")
-        logger.info(f"DataFrame列: {df.columns.tolist()}")
-        
-        # 检查DataFrame中的数据
-        for col in df.columns:
-            if col != 'Time(s)':
-                logger.info(f"DataFrame中{col}列:")
-                logger.info(f"  数据类型: {df[col].dtype}")
-                logger.info(f"  非空值数量: {df[col].count()}")
-                logger.info(f"  前5个值: {df[col].head().tolist()}")
-        
-        df.to_csv(csv_path, index=False)
-        
-        # 验证保存的文件
-        saved_df = pd.read_csv(csv_path)
-        logger.info(f"保存的CSV文件形状: {saved_df.shape}")
-        logger.info(f"保存的CSV文件列: {saved_df.columns.tolist()}")
-        
+                    logger.info(f"准备保存CH{ch}，数据长度: {len(ch_data)}")
+                    if ch_data:
+                        logger.info(f"CH{ch} 前5个值: {ch_data[:5]}")
+                    df_data[f'CH{ch}'] = ch_data
+                else:
+                    # 如果某个启用的通道没有数据，用NaN填充
+                    logger.info(f"CH{ch} 没有数据，用NaN填充")
+                    df_data[f'CH{ch}'] = [float('nan')] * len(time_axis)
+        
+            # 添加调试信息
+            logger.info(f"保存CSV文件: {csv_path}")
+            logger.info(f"时间轴长度: {len(time_axis)}")
+            logger.info(f"启用通道: {enabled_channels}")
+            logger.info(f"数据列: {list(df_data.keys())}")
+        
+            df = pd.DataFrame(df_data)
+        
+            # 验证数据完整性
+            logger.info(f"DataFrame形状: {df.shape}")
+            logger.info(f"DataFrame列: {df.columns.tolist()}")
+        
+            # 检查DataFrame中的数据
+            for col in df.columns:
+                if col != 'Time(s)':
+                    logger.info(f"DataFrame中{col}列:")
+                    logger.info(f"  数据类型: {df[col].dtype}")
+                    logger.info(f"  非空值数量: {df[col].count()}")
+                    logger.info(f"  前5个值: {df[col].head().tolist()}")
+        
+            df.to_csv(csv_path, index=False)
+        
+            # 验证保存的文件
+            saved_df = pd.read_csv(csv_path)
+            logger.info(f"保存的CSV文件形状: {saved_df.shape}")
+            logger.info(f"保存的CSV文件列: {saved_df.columns.tolist()}")
+        
+            total_points = len(time_axis)
+            for group in rate_groups:
+                group_csv = f"{csv_base}_{group['sample_rate']}Hz.csv"
+                group_time_axis = (materialize_time_axis(group['time_base']) if group.get('time_base')
+                                   else group['time_axis'])
+                columns = {'Time(s)': group_time_axis}
+                for ch in group['channels']:
+                    group_data = group['channel_data']
+                    columns[f'CH{ch}'] = group_data.get(ch, group_data.get(str(ch)))
+                pd.DataFrame(columns).to_csv(group_csv, index=False)
+                group_files.append({'sample_rate': group['sample_rate'], 'channels': group['channels'],
+                                    'csv_file': os.path.basename(group_csv),
+                                    'points_per_channel': len(group_time_axis)})
+                logger.info(f"保存{group['sample_rate']}Hz速率组CSV: {group_csv}")
+
+        if group_files:
+            integrity['rate_groups'] = group_files
+        if time_base:
+            # 各次采集在时间轴上的起点与采集时刻随完整性信息保存
+            integrity['time_base'] = time_base
+
+        # 数据完整性（缺口、丢弃、NaN填充的通道）与CSV一同保存
+        integrity_path = os.path.splitext(csv_path)[0] + '.integrity.json'
+        with open(integrity_path, 'w', encoding='utf-8') as f:
+            json.dump(integrity, f, ensure_ascii=False, indent=2)
+        if not integrity.get('lossless', True):
+            logger.warning(f"保存的监控数据不完整，详见: {integrity_path}")
+
         # 计算文件大小
         file_size = os.path.getsize(csv_path)
         
@@ -923,7 +1003,8 @@ def save_monitor_data(request):
             csv_file_path=csv_path,
             data_file_size=file_size,
             total_acquisitions=data.get('total_acquisitions', 0),
-            total_data_points=len(time_axis) * len(enabled_channels),
+            total_data_points=total_points * len(main_channels) + sum(
+                group['points_per_channel'] * len(group['channels']) for group in group_files),
             user_email=user_email,
             user_name=user_name,
             is_completed=True
@@ -934,7 +1015,8 @@ def save_monitor_data(request):
             'message': f'监控数据保存成功，任务ID: {task.task_id}',
             'task_id': task.task_id,
             'file_path': csv_path,
-            'file_size_mb': task.file_size_mb
+            'file_size_mb': task.file_size_mb,
+            'lossless': integrity.get('lossless')
         })
         
     except Exception as e: